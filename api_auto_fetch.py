@@ -38,6 +38,9 @@ class PC28DataFetcher:
         self.dataset_id = 'pc28_lab'
         self.table_id = 'draws_14w_clean'  # 使用实际的表而不是视图
         
+        # 复用连接的HTTP会话（实例被缓存时多次采集共用TLS连接）
+        self.session = requests.Session()
+        
         # 初始化BigQuery客户端
         try:
             self.bq_client = bigquery.Client(project=self.project_id)
@@ -91,7 +94,7 @@ class PC28DataFetcher:
             logger.debug(f"请求参数: {params}")
             
             # 发送请求
-            response = requests.get(
+            response = self.session.get(
                 self.api_url, 
                 params=params,
                 timeout=30,
@@ -316,13 +319,16 @@ class PC28DataFetcher:
             logger.error(f"BigQuery插入异常: {e}")
             return False
     
-    def run_fetch_cycle(self) -> bool:
-        """执行一次完整的数据采集周期"""
+    def run_fetch_cycle(self, timings: Optional[Dict[str, float]] = None) -> bool:
+        """执行一次完整的数据采集周期；timings 不为空时记录 fetch / write 阶段毫秒数"""
         logger.info("开始数据采集周期")
+        timings = {} if timings is None else timings
         
         try:
             # 1. 从API获取数据
+            start = time.perf_counter()
             raw_data = self.fetch_data_from_api()
+            timings['fetch'] = round((time.perf_counter() - start) * 1000, 2)
             if not raw_data:
                 logger.error("API数据获取失败")
                 return False
@@ -334,7 +340,9 @@ class PC28DataFetcher:
                 return True
             
             # 3. 插入到BigQuery
+            start = time.perf_counter()
             success = self.insert_to_bigquery(cleaned_data)
+            timings['write'] = round((time.perf_counter() - start) * 1000, 2)
             
             if success:
                 logger.info("数据采集周期完成")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cloud Function 运行时公共部分
+实例在两次调用之间会被复用（热启动），这里把 HTTP 会话、客户端等放在模块全局变量里，
+冷启动时只创建一次；入口模块只在需要的操作里再导入重量级依赖，并按阶段记录耗时。
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_warm: Dict[str, Any] = {}
+_warm_lock = threading.Lock()
+_invocations = 0
+
+
+def warm(key: str, factory: Callable[[], Any]) -> Any:
+    """取模块全局缓存的对象，不存在时调用 factory 创建（同一实例内只创建一次）"""
+    value = _warm.get(key)
+    if value is None:
+        with _warm_lock:
+            value = _warm.get(key)
+            if value is None:
+                value = factory()
+                _warm[key] = value
+    return value
+
+
+def reset_warm_state():
+    """清空缓存的客户端和会话（测试或凭证轮换时使用）"""
+    global _invocations
+    with _warm_lock:
+        _warm.clear()
+        _invocations = 0
+
+
+def begin_invocation() -> bool:
+    """登记一次调用，返回是否为该实例的第一次调用（冷启动）"""
+    global _invocations
+    with _warm_lock:
+        _invocations += 1
+        return _invocations == 1
+
+
+class PhaseTimer:
+    """按阶段累计耗时（毫秒），同名阶段多次进入时累加"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 2)
+
+    def as_dict(self) -> Dict[str, float]:
+        result = dict(self.timings)
+        result['total'] = round((time.perf_counter() - self._start) * 1000, 2)
+        return result
+
+
+def http_session():
+    """实例内共享的 requests 会话，热调用复用已建立的 TLS 连接"""
+    def create():
+        import requests
+        return requests.Session()
+    return warm('http_session', create)
+
+
+def send_alert(message: str, timeout: float = 10) -> bool:
+    """通过 Telegram Bot API 发送告警（BOT_TOKEN / CHAT_ID），不再启动 shell 脚本"""
+    bot_token = os.getenv('BOT_TOKEN', '')
+    chat_id = os.getenv('CHAT_ID', '')
+    if not bot_token or not chat_id:
+        logger.warning("Telegram配置未设置，无法发送告警")
+        return False
+
+    try:
+        response = http_session().post(
+            f"https://api.telegram.org/bot{bot_token}/sendMessage",
+            json={'chat_id': chat_id, 'text': f"🚨 PC28系统告警\n\n{message}"},
+            timeout=timeout
+        )
+        if response.status_code == 200:
+            return True
+        logger.error(f"告警消息发送失败: {response.status_code}")
+        return False
+    except Exception as e:
+        logger.error(f"发送告警异常: {e}")
+        return False
@@ -7,13 +7,14 @@
 
 import hashlib
 import json
+import math
 import sqlite3
 import threading
 import time
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Set, Tuple, Any
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
 
 # 配置日志
@@ -49,15 +50,92 @@ class DeduplicationRule:
     similarity_threshold: float  # 相似度阈值
     enabled: bool = True
 
+class BloomFilter:
+    """布隆过滤器，输入为十六进制哈希串（双重哈希生成 k 个位置）
+    
+    位数和哈希个数按预期键数 capacity 与目标误判率 error_rate 计算：
+    m = -n·ln(p) / (ln2)²，k = m/n·ln2。写入超过 capacity 个键后误判率不再有保证。
+    """
+    
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray(self.num_bits // 8 + 1)
+        self.count = 0
+    
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+    
+    def _positions(self, key_hash: str):
+        value = int(key_hash[:32], 16)
+        h1 = value & 0xFFFFFFFFFFFFFFFF
+        h2 = (value >> 64) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+    
+    def add(self, key_hash: str):
+        if key_hash in self:
+            return
+        for pos in self._positions(key_hash):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+    
+    def __contains__(self, key_hash: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key_hash))
+
+class WindowedBloomFilter:
+    """按时间窗口轮换、写满后扩容的布隆过滤器
+    
+    保留当前与上一代两代，每代覆盖 window 秒，
+    因此时间窗口内写入的键一定可查到；不在其中的键必然不在窗口内。
+    每代从一个容量 capacity 的过滤器开始，写满后追加容量翻倍、误判率减半的过滤器，
+    每代总误判率不超过 error_rate，窗口内键数超出预期时也不会退化。
+    """
+    
+    def __init__(self, window: int, capacity: int = 100000, error_rate: float = 0.01):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.generations: List[Tuple[float, List[BloomFilter]]] = []
+    
+    def _rotate(self, now: float):
+        if not self.generations or now - self.generations[-1][0] >= self.window:
+            self.generations.append((now, [BloomFilter(self.capacity, self.error_rate / 2)]))
+            self.generations = self.generations[-2:]
+    
+    def add(self, key_hash: str, now: Optional[float] = None):
+        self._rotate(now if now is not None else time.time())
+        filters = self.generations[-1][1]
+        if filters[-1].is_full:
+            filters.append(BloomFilter(filters[-1].capacity * 2, filters[-1].error_rate / 2))
+        filters[-1].add(key_hash)
+    
+    def might_contain(self, key_hash: str, now: Optional[float] = None) -> bool:
+        self._rotate(now if now is not None else time.time())
+        return any(key_hash in bloom for _, filters in self.generations for bloom in filters)
+
 class DataDeduplicationSystem:
-    """数据去重系统"""
+    """数据去重系统
     
-    def __init__(self, db_path: str = "deduplication.db"):
+    查重顺序：最近记录 LRU -> 每条规则按时间窗口轮换的布隆过滤器（判定必然唯一则跳过查库）
+    -> 批量 IN 查询 record_hashes。布隆过滤器启动时加载窗口内的哈希，每批判定前再按自增 id
+    补入其他进程在上次之后写入的哈希，因此"必然唯一"的判定对共享同一库的多个进程也成立。
+    """
+    
+    def __init__(self, db_path: str = "deduplication.db", max_cache_size: int = 100000,
+                 bloom_capacity: int = 100000, bloom_error_rate: float = 0.01):
         self.db_path = db_path
         self.lock = threading.RLock()
-        self.memory_cache: Dict[str, Dict] = {}
+        self.max_cache_size = max_cache_size
+        self.bloom_capacity = bloom_capacity  # 每条规则一个时间窗口内的预期键数
+        self.bloom_error_rate = bloom_error_rate
+        self.memory_cache: "OrderedDict[str, Dict]" = OrderedDict()  # 有界LRU
         self.hash_index: Dict[str, str] = {}  # hash -> record_id
         self.time_index: Dict[str, List[Tuple[datetime, str]]] = defaultdict(list)  # date -> [(time, hash)]
+        self._conn: Optional[sqlite3.Connection] = None
         
         # 默认去重规则
         self.rules = [
@@ -83,6 +161,11 @@ class DataDeduplicationSystem:
         
         self.stats = DeduplicationStats()
         self._init_database()
+        
+        # 每条规则一个时间窗口布隆过滤器，从库中预热窗口内的哈希
+        self.bloom_filters: Dict[str, WindowedBloomFilter] = {}
+        self._bloom_high_water = 0  # 已载入布隆过滤器的 record_hashes 最大 id
+        self._warm_bloom_filters()
     
     def _init_database(self):
         """初始化数据库"""
@@ -198,30 +281,139 @@ class DataDeduplicationSystem:
             logger.error(f"计算相似度失败: {e}")
             return 0.0
     
-    def is_duplicate(self, record: Dict, record_id: str) -> Tuple[bool, Optional[DuplicateRecord]]:
-        """检查是否为重复记录"""
-        start_time = time.time()
+    def _get_connection(self) -> sqlite3.Connection:
+        """复用的数据库连接（调用方需持有 self.lock）"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+    
+    def _warm_bloom_filters(self):
+        """用时间窗口内已有的哈希预热布隆过滤器"""
+        with self.lock:
+            now = datetime.now()
+            conn = self._get_connection()
+            # 先取高水位，预热期间新写入的行下次补入时会再读一遍，重复加入无害
+            (self._bloom_high_water,) = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM record_hashes"
+            ).fetchone()
+            for rule in self.rules:
+                since = now - timedelta(seconds=rule.time_window)
+                (warm_count,) = conn.execute("""
+                    SELECT COUNT(*) FROM record_hashes WHERE rule_name = ? AND timestamp > ?
+                """, (rule.rule_name, since)).fetchone()
+                bloom = self._new_bloom(rule, expected_keys=warm_count)
+                cursor = conn.execute("""
+                    SELECT record_hash FROM record_hashes
+                    WHERE rule_name = ? AND timestamp > ?
+                """, (rule.rule_name, since))
+                for (record_hash,) in cursor:
+                    bloom.add(record_hash)
+                self.bloom_filters[rule.rule_name] = bloom
+    
+    def _catch_up_bloom_filters(self, conn: sqlite3.Connection, now_ts: float):
+        """补入高水位之后写入的哈希（含其他进程的写入），调用方需持有 self.lock
         
-        try:
-            with self.lock:
-                current_time = datetime.now()
-                
-                for rule in self.rules:
-                    if not rule.enabled:
-                        continue
-                    
-                    # 生成记录哈希
-                    record_hash = self.generate_record_hash(record, rule)
+        id 为 AUTOINCREMENT 且写事务串行提交，已提交的行 id 单调递增，按 id 续读不会漏行
+        """
+        rules = {rule.rule_name: rule for rule in self.rules}
+        cursor = conn.execute(
+            "SELECT id, rule_name, record_hash FROM record_hashes WHERE id > ? ORDER BY id",
+            (self._bloom_high_water,)
+        )
+        for row_id, rule_name, record_hash in cursor:
+            rule = rules.get(rule_name)
+            if rule is not None:
+                self._get_bloom(rule).add(record_hash, now_ts)
+            self._bloom_high_water = row_id
+    
+    def _new_bloom(self, rule: DeduplicationRule, expected_keys: int = 0) -> WindowedBloomFilter:
+        """按预期键数（至少 bloom_capacity）和目标误判率创建过滤器"""
+        return WindowedBloomFilter(rule.time_window, capacity=max(self.bloom_capacity, expected_keys),
+                                   error_rate=self.bloom_error_rate)
+    
+    def _get_bloom(self, rule: DeduplicationRule) -> WindowedBloomFilter:
+        bloom = self.bloom_filters.get(rule.rule_name)
+        if bloom is None:
+            bloom = self._new_bloom(rule)
+            self.bloom_filters[rule.rule_name] = bloom
+        return bloom
+    
+    def _cache_put(self, record_hash: str, record: Dict, record_id: str):
+        """写入有界LRU，超出容量时淘汰最久未用的键"""
+        self.memory_cache[record_hash] = record.copy()
+        self.memory_cache.move_to_end(record_hash)
+        self.hash_index[record_hash] = record_id
+        while len(self.memory_cache) > self.max_cache_size:
+            evicted, _ = self.memory_cache.popitem(last=False)
+            self.hash_index.pop(evicted, None)
+    
+    def _lookup_existing(self, conn: sqlite3.Connection, rule: DeduplicationRule,
+                         hashes: Set[str], since: datetime) -> Dict[str, str]:
+        """一次 IN 查询取出窗口内已存在的哈希 -> 时间戳"""
+        found: Dict[str, str] = {}
+        hash_list = list(hashes)
+        for offset in range(0, len(hash_list), 900):
+            chunk = hash_list[offset:offset + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(f"""
+                SELECT record_hash, timestamp FROM record_hashes
+                WHERE rule_name = ? AND timestamp > ? AND record_hash IN ({placeholders})
+            """, [rule.rule_name, since] + chunk)
+            for record_hash, timestamp in cursor:
+                found[record_hash] = timestamp
+        return found
+    
+    def _resolve(self, records: List[Tuple[Dict, str]]) -> List[Optional[DuplicateRecord]]:
+        """
+        批量判定重复，结果与逐条按顺序调用 is_duplicate 一致
+        
+        每条规则最多一次 IN 查询和一次 executemany 写入；LRU 和布隆过滤器在写入提交成功后才更新，
+        写入失败时回滚并抛出异常，内存状态不会先于数据库记下这批哈希
+        """
+        results: List[Optional[DuplicateRecord]] = []
+        with self.lock:
+            current_time = datetime.now()
+            now_ts = time.time()
+            rules = [rule for rule in self.rules if rule.enabled]
+            conn = self._get_connection()
+            
+            # 计算各规则哈希，布隆过滤器判定可能存在的才需要查库
+            self._catch_up_bloom_filters(conn, now_ts)
+            hashes = [[self.generate_record_hash(record, rule) for rule in rules] for record, _ in records]
+            existing: List[Dict[str, str]] = []
+            for index, rule in enumerate(rules):
+                bloom = self._get_bloom(rule)
+                candidates = {
+                    row[index] for row in hashes
+                    if row[index] and bloom.might_contain(row[index], now_ts)
+                }
+                since = current_time - timedelta(seconds=rule.time_window)
+                existing.append(self._lookup_existing(conn, rule, candidates, since) if candidates else {})
+            
+            unique_rows: Dict[str, List[Tuple]] = defaultdict(list)
+            duplicate_rows: List[Tuple] = []
+            batch_cache: Dict[str, Dict] = {}  # 本批新增的唯一记录，提交后再写入 LRU
+            committed: List[Tuple[DeduplicationRule, str, Dict, str]] = []
+            
+            for (record, record_id), record_hashes in zip(records, hashes):
+                duplicate = None
+                for index, rule in enumerate(rules):
+                    record_hash = record_hashes[index]
                     if not record_hash:
                         continue
                     
-                    # 检查内存缓存
-                    if record_hash in self.memory_cache:
-                        cached_record = self.memory_cache[record_hash]
+                    # 检查本批和内存缓存
+                    cached_record = batch_cache.get(record_hash)
+                    if cached_record is None:
+                        cached_record = self.memory_cache.get(record_hash)
+                        if cached_record is not None:
+                            self.memory_cache.move_to_end(record_hash)
+                    if cached_record is not None:
                         similarity = self.calculate_similarity(record, cached_record)
-                        
                         if similarity >= rule.similarity_threshold:
-                            duplicate_record = DuplicateRecord(
+                            duplicate = DuplicateRecord(
                                 original_hash=record_hash,
                                 duplicate_hash=self.generate_content_hash(record),
                                 original_timestamp=cached_record.get('timestamp', current_time),
@@ -229,44 +421,85 @@ class DataDeduplicationSystem:
                                 duplicate_fields=rule.key_fields,
                                 similarity_score=similarity
                             )
-                            
-                            self._record_duplicate(duplicate_record, rule.rule_name)
-                            return True, duplicate_record
                     
-                    # 检查数据库
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.execute("""
-                            SELECT record_id, content_hash, timestamp 
-                            FROM record_hashes 
-                            WHERE record_hash = ? AND rule_name = ?
-                            AND timestamp > ?
-                        """, (
-                            record_hash, 
-                            rule.rule_name,
-                            current_time - timedelta(seconds=rule.time_window)
+                    # 检查数据库（批量查询结果）
+                    if duplicate is None and record_hash in existing[index]:
+                        # 基于哈希匹配的高相似度
+                        similarity = 0.95
+                        if similarity >= rule.similarity_threshold:
+                            original = existing[index][record_hash]
+                            duplicate = DuplicateRecord(
+                                original_hash=record_hash,
+                                duplicate_hash=self.generate_content_hash(record),
+                                original_timestamp=datetime.fromisoformat(original) if isinstance(original, str) else original,
+                                duplicate_timestamp=current_time,
+                                duplicate_fields=rule.key_fields,
+                                similarity_score=similarity
+                            )
+                    
+                    if duplicate is not None:
+                        duplicate_rows.append((
+                            duplicate.original_hash, duplicate.duplicate_hash,
+                            duplicate.original_timestamp, duplicate.duplicate_timestamp,
+                            ','.join(duplicate.duplicate_fields), duplicate.similarity_score,
+                            rule.rule_name
                         ))
-                        
-                        existing = cursor.fetchone()
-                        if existing:
-                            # 找到潜在重复，进行详细比较
-                            similarity = 0.95  # 基于哈希匹配的高相似度
-                            
-                            if similarity >= rule.similarity_threshold:
-                                duplicate_record = DuplicateRecord(
-                                    original_hash=record_hash,
-                                    duplicate_hash=self.generate_content_hash(record),
-                                    original_timestamp=datetime.fromisoformat(existing[2]),
-                                    duplicate_timestamp=current_time,
-                                    duplicate_fields=rule.key_fields,
-                                    similarity_score=similarity
-                                )
-                                
-                                self._record_duplicate(duplicate_record, rule.rule_name)
-                                return True, duplicate_record
+                        break
                 
-                # 记录新的唯一记录
-                self._record_unique(record, record_id)
-                return False, None
+                results.append(duplicate)
+                if duplicate is not None:
+                    continue
+                
+                # 记录新的唯一记录：后续同批记录可直接命中
+                content_hash = self.generate_content_hash(record)
+                for index, rule in enumerate(rules):
+                    record_hash = record_hashes[index]
+                    if not record_hash:
+                        continue
+                    batch_cache[record_hash] = record.copy()
+                    committed.append((rule, record_hash, record, record_id))
+                    existing[index][record_hash] = current_time
+                    unique_rows[rule.rule_name].append((
+                        record_hash, record_id, ','.join(rule.key_fields),
+                        content_hash, current_time, rule.rule_name
+                    ))
+            
+            try:
+                for rule_name, rows in unique_rows.items():
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO record_hashes 
+                        (record_hash, record_id, key_fields, content_hash, timestamp, rule_name)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, rows)
+                if duplicate_rows:
+                    conn.executemany("""
+                        INSERT INTO duplicate_records 
+                        (original_hash, duplicate_hash, original_timestamp, duplicate_timestamp, 
+                         duplicate_fields, similarity_score, rule_name)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, duplicate_rows)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"写入去重记录失败: {e}")
+                raise
+            
+            for rule, record_hash, record, record_id in committed:
+                self._cache_put(record_hash, record, record_id)
+                self._get_bloom(rule).add(record_hash, now_ts)
+            
+            self.stats.unique_records += sum(1 for duplicate in results if duplicate is None)
+            self.stats.duplicates_found += len(duplicate_rows)
+        
+        return results
+    
+    def is_duplicate(self, record: Dict, record_id: str) -> Tuple[bool, Optional[DuplicateRecord]]:
+        """检查是否为重复记录"""
+        start_time = time.time()
+        
+        try:
+            duplicate_record = self._resolve([(record, record_id)])[0]
+            return duplicate_record is not None, duplicate_record
                 
         except Exception as e:
             logger.error(f"重复检查失败: {e}")
@@ -278,34 +511,36 @@ class DataDeduplicationSystem:
         """记录唯一记录"""
         try:
             current_time = datetime.now()
+            content_hash = self.generate_content_hash(record)
             
-            for rule in self.rules:
-                if not rule.enabled:
-                    continue
-                
-                record_hash = self.generate_record_hash(record, rule)
-                content_hash = self.generate_content_hash(record)
-                
-                if record_hash:
-                    # 更新内存缓存
-                    self.memory_cache[record_hash] = record.copy()
-                    self.hash_index[record_hash] = record_id
+            with self.lock:
+                conn = self._get_connection()
+                written = []
+                with conn:  # 整体提交，失败时回滚
+                    for rule in self.rules:
+                        if not rule.enabled:
+                            continue
                     
-                    # 更新数据库
-                    with sqlite3.connect(self.db_path) as conn:
-                        conn.execute("""
-                            INSERT OR REPLACE INTO record_hashes 
-                            (record_hash, record_id, key_fields, content_hash, timestamp, rule_name)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (
-                            record_hash,
-                            record_id,
-                            ','.join(rule.key_fields),
-                            content_hash,
-                            current_time,
-                            rule.rule_name
-                        ))
-                        conn.commit()
+                        record_hash = self.generate_record_hash(record, rule)
+                        if record_hash:
+                            written.append((rule, record_hash))
+                            conn.execute("""
+                                INSERT OR REPLACE INTO record_hashes 
+                                (record_hash, record_id, key_fields, content_hash, timestamp, rule_name)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            """, (
+                                record_hash,
+                                record_id,
+                                ','.join(rule.key_fields),
+                                content_hash,
+                                current_time,
+                                rule.rule_name
+                            ))
+                
+                # 提交成功后再更新内存缓存和布隆过滤器
+                for rule, record_hash in written:
+                    self._cache_put(record_hash, record, record_id)
+                    self._get_bloom(rule).add(record_hash)
             
             self.stats.unique_records += 1
             
@@ -356,13 +591,31 @@ class DataDeduplicationSystem:
             logger.error(f"处理记录失败: {e}")
             return True  # 出错时允许写入，避免数据丢失
     
-    def batch_process(self, records: List[Tuple[Dict, str]]) -> List[Tuple[Dict, str]]:
-        """批量处理记录"""
+    def batch_process(self, records: List[Tuple[Dict, str]], batch_size: int = 5000) -> List[Tuple[Dict, str]]:
+        """批量处理记录
+        
+        按 batch_size 分批，每批每条规则一次 IN 查询和一次批量写入；
+        批内判定结果与逐条调用 process_record 一致
+        """
         unique_records = []
         
-        for record, record_id in records:
-            if self.process_record(record, record_id):
-                unique_records.append((record, record_id))
+        for offset in range(0, len(records), batch_size):
+            batch = records[offset:offset + batch_size]
+            start_time = time.time()
+            try:
+                results = self._resolve(batch)
+            except Exception as e:
+                logger.error(f"批量去重失败: {e}")
+                results = [None] * len(batch)  # 出错时允许写入，避免数据丢失
+            self.stats.processing_time += time.time() - start_time
+            self.stats.total_processed += len(batch)
+            
+            for (record, record_id), duplicate in zip(batch, results):
+                if duplicate is not None:
+                    self.stats.duplicates_blocked += 1
+                    logger.info(f"阻止重复记录写入: {record_id}, 相似度: {duplicate.similarity_score:.2f}")
+                else:
+                    unique_records.append((record, record_id))
         
         return unique_records
     
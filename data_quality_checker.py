@@ -5,6 +5,7 @@
 实现自动化的数据质量监控、完整性验证和质量报告生成
 """
 
+import os
 import sqlite3
 import json
 import logging
@@ -16,6 +17,7 @@ from typing import List, Dict, Optional, Any, Tuple
 from pathlib import Path
 import statistics
 import hashlib
+import math
 
 # 配置日志
 logging.basicConfig(
@@ -70,6 +72,245 @@ class DataProfile:
     data_types_valid: bool
     timestamp: datetime
 
+@dataclass
+class ColumnProfile:
+    """单列概况"""
+    name: str
+    declared_type: str
+    null_count: int
+    type_counts: Dict[str, int]  # SQLite 存储类直方图: integer/real/text/blob
+    min_value: Any
+    max_value: Any
+    distinct_estimate: int
+    top_values: Optional[Dict[str, int]]  # 低基数列的精确取值直方图
+    affinity_violations: int
+
+@dataclass
+class TableProfile:
+    """整表概况（单次扫描得到）"""
+    table_name: str
+    row_count: int
+    max_rowid: Optional[int]
+    columns: Dict[str, ColumnProfile]
+    primary_keys: List[str]
+    profiled_at: float
+
+class _DistinctSketch:
+    """SQLite 聚合函数：去重计数草图
+    
+    不超过 exact_limit 个取值时精确计数（同时作为取值直方图），
+    超过后转为 HyperLogLog（2^precision 个寄存器）估算去重数。
+    """
+    
+    exact_limit = 32
+    precision = 12
+    
+    def __init__(self):
+        self.counts: Optional[Dict[Any, int]] = {}
+        self.registers: Optional[bytearray] = None
+    
+    @staticmethod
+    def _hash64(value: Any) -> int:
+        # splitmix64 混合，避免小整数哈希分布过于集中
+        h = (hash(value) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return h ^ (h >> 31)
+    
+    def _add_hll(self, value: Any):
+        h = self._hash64(value)
+        index = h >> (64 - self.precision)
+        rest = (h << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - self.precision + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def step(self, value):
+        if value is None:
+            return
+        if self.counts is not None:
+            self.counts[value] = self.counts.get(value, 0) + 1
+            if len(self.counts) > self.exact_limit:
+                self.registers = bytearray(1 << self.precision)
+                for seen in self.counts:
+                    self._add_hll(seen)
+                self.counts = None
+        else:
+            self._add_hll(value)
+    
+    def finalize(self):
+        if self.counts is not None:
+            return json.dumps({'exact': [[str(k), v] for k, v in self.counts.items()]})
+        
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return json.dumps({'estimate': int(round(estimate))})
+
+class TableProfiler:
+    """单次扫描的表概况引擎
+    
+    一条聚合查询同时算出行数和所有列的空值数、存储类直方图、最值和去重估计，
+    结果按 (数据库文件状态, 表结构) 缓存，表未变化时直接复用，max_age 秒后强制刷新。
+    行数和最大 rowid 的任何变化以及不改变两者的 UPDATE 都伴随一次提交，必然改变文件状态，
+    因此命中缓存前无需再 COUNT(*)；只读取目标库，不在其中建表或触发器。
+    """
+    
+    # 单条查询的最大结果列数，超宽表分组查询
+    max_result_columns = 1000
+    
+    def __init__(self, max_age: float = 3600.0):
+        self.max_age = max_age
+        self._cache: Dict[Tuple[str, str], Tuple[Tuple, TableProfile]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'profiled': 0, 'cache_hits': 0}
+    
+    @staticmethod
+    def _quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+    
+    @staticmethod
+    def affinity_violations(declared_type: str, type_counts: Dict[str, int]) -> int:
+        """按声明类型的亲和性统计不符合的值个数"""
+        declared = (declared_type or '').upper()
+        if 'INT' in declared:
+            return type_counts['real'] + type_counts['text'] + type_counts['blob']
+        if any(token in declared for token in ('CHAR', 'CLOB', 'TEXT')):
+            return type_counts['integer'] + type_counts['real'] + type_counts['blob']
+        if any(token in declared for token in ('REAL', 'FLOA', 'DOUB')) or declared in ('NUMERIC', 'DECIMAL', 'BOOLEAN'):
+            return type_counts['text'] + type_counts['blob']
+        return 0
+    
+    @staticmethod
+    def _file_signature(db_path: str) -> Tuple:
+        """数据库文件头的修改计数器，以及主文件和 WAL 文件的 (修改时间, 大小)
+        
+        UPDATE 不改变行数和最大 rowid，但任何提交的写事务都会递增文件头计数器（回滚日志模式）
+        或追加 WAL 帧。PRAGMA data_version 只在同一连接内有意义，而每次检查都新开连接，因此看文件状态。
+        """
+        signature = []
+        try:
+            with open(db_path, 'rb') as f:
+                f.seek(24)
+                signature.append(f.read(4))
+        except OSError:
+            signature.append(None)
+        for path in (db_path, db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def _max_rowid(self, conn: sqlite3.Connection, table_name: str) -> Optional[int]:
+        try:
+            return conn.execute(f"SELECT MAX(rowid) FROM {self._quote(table_name)}").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None  # WITHOUT ROWID 表
+    
+    def profile(self, conn: sqlite3.Connection, db_path: str, table_name: str,
+                force: bool = False) -> Optional[TableProfile]:
+        """获取表概况，表不存在时返回 None"""
+        schema = conn.execute(f"PRAGMA table_info({self._quote(table_name)})").fetchall()
+        if not schema:
+            return None
+        
+        # 先于扫描读取文件状态，扫描期间的写入会让下次检查重新扫描
+        state = (self._file_signature(db_path), tuple(schema))
+        cache_key = (str(Path(db_path).resolve()), table_name)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+        if (not force and cached and cached[0] == state
+                and time.time() - cached[1].profiled_at < self.max_age):
+            self.stats['cache_hits'] += 1
+            return cached[1]
+        
+        profile = self._scan(conn, table_name, schema, self._max_rowid(conn, table_name))
+        with self._lock:
+            self._cache[cache_key] = (state, profile)
+        self.stats['profiled'] += 1
+        return profile
+    
+    def _scan(self, conn: sqlite3.Connection, table_name: str, schema: List[Tuple],
+              max_rowid: Optional[int]) -> TableProfile:
+        conn.create_aggregate('dq_distinct', 1, _DistinctSketch)
+        table = self._quote(table_name)
+        
+        per_column = 8
+        group_size = max(1, (self.max_result_columns - 1) // per_column)  # 首列为 COUNT(*)
+        columns: Dict[str, ColumnProfile] = {}
+        row_count = 0
+        
+        for start in range(0, len(schema), group_size):
+            group = schema[start:start + group_size]
+            expressions = ["COUNT(*)"]
+            for column_info in group:
+                col = self._quote(column_info[1])
+                expressions.extend([
+                    f"SUM({col} IS NULL)",
+                    f"SUM(TYPEOF({col}) = 'integer')",
+                    f"SUM(TYPEOF({col}) = 'real')",
+                    f"SUM(TYPEOF({col}) = 'text')",
+                    f"SUM(TYPEOF({col}) = 'blob')",
+                    f"MIN({col})",
+                    f"MAX({col})",
+                    f"dq_distinct({col})",
+                ])
+            row = conn.execute(f"SELECT {', '.join(expressions)} FROM {table}").fetchone()
+            row_count, row = row[0], row[1:]
+            
+            for offset, column_info in enumerate(group):
+                values = row[offset * per_column:(offset + 1) * per_column]
+                type_counts = {
+                    'integer': values[1] or 0,
+                    'real': values[2] or 0,
+                    'text': values[3] or 0,
+                    'blob': values[4] or 0,
+                }
+                sketch = json.loads(values[7]) if values[7] else {'exact': []}
+                if 'exact' in sketch:
+                    top_values = dict(sketch['exact'])
+                    distinct = len(top_values)
+                else:
+                    top_values = None
+                    distinct = sketch['estimate']
+                
+                declared_type = column_info[2] or ''
+                columns[column_info[1]] = ColumnProfile(
+                    name=column_info[1],
+                    declared_type=declared_type,
+                    null_count=values[0] or 0,
+                    type_counts=type_counts,
+                    min_value=values[5],
+                    max_value=values[6],
+                    distinct_estimate=distinct,
+                    top_values=top_values,
+                    affinity_violations=self.affinity_violations(declared_type, type_counts)
+                )
+        
+        return TableProfile(
+            table_name=table_name,
+            row_count=row_count,
+            max_rowid=max_rowid,
+            columns=columns,
+            primary_keys=[info[1] for info in sorted(schema, key=lambda i: i[5]) if info[5]],
+            profiled_at=time.time()
+        )
+    
+    def invalidate(self, db_path: Optional[str] = None):
+        """清除缓存"""
+        with self._lock:
+            if db_path is None:
+                self._cache.clear()
+            else:
+                resolved = str(Path(db_path).resolve())
+                for cache_key in [k for k in self._cache if k[0] == resolved]:
+                    del self._cache[cache_key]
+
 class DataQualityChecker:
     """数据质量和完整性检查器"""
     
@@ -79,6 +320,9 @@ class DataQualityChecker:
         self.check_interval = 3600  # 1小时检查一次
         self.monitor_thread = None
         
+        # 表概况引擎：各项检查共用一次扫描结果
+        self.profiler = TableProfiler(max_age=self.check_interval)
+        
         # 质量阈值配置
         self.quality_thresholds = {
             'null_percentage': {'warning': 5.0, 'critical': 15.0},
@@ -160,6 +404,25 @@ class DataQualityChecker:
             
             conn.commit()
     
+    def get_table_profile(self, db_path: str, table_name: str, force: bool = False) -> Optional[TableProfile]:
+        """获取表概况（单次扫描，表未变化时复用缓存）"""
+        with sqlite3.connect(db_path) as conn:
+            return self.profiler.profile(conn, db_path, table_name, force=force)
+    
+    @staticmethod
+    def _column_max(profile: Optional[TableProfile], column_name: str) -> Any:
+        """从概况中取列最大值，列不存在时抛出 KeyError"""
+        if profile is None:
+            raise KeyError(column_name)
+        return profile.columns[column_name].max_value
+    
+    @staticmethod
+    def _id_is_rowid_alias(profile: TableProfile) -> bool:
+        """id 为 INTEGER PRIMARY KEY 时即 rowid，不可能重复"""
+        column = profile.columns.get('id')
+        return (column is not None and profile.primary_keys == ['id']
+                and column.declared_type.upper() == 'INTEGER')
+    
     def check_data_completeness(self, db_path: str, table_name: str) -> QualityMetric:
         """检查数据完整性"""
         try:
@@ -173,54 +436,43 @@ class DataQualityChecker:
                     timestamp=datetime.now()
                 )
             
-            with sqlite3.connect(db_path) as conn:
-                # 获取表结构
-                cursor = conn.execute(f"PRAGMA table_info({table_name})")
-                columns = [row[1] for row in cursor.fetchall()]
-                
-                if not columns:
-                    return QualityMetric(
-                        metric_name="completeness",
-                        value=0.0,
-                        threshold=self.quality_thresholds['completeness_score']['critical'],
-                        status="critical",
-                        description=f"表不存在或无列: {table_name}",
-                        timestamp=datetime.now()
-                    )
-                
-                # 计算完整性分数
-                total_records = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-                
-                if total_records == 0:
-                    completeness_score = 0.0
-                else:
-                    null_counts = []
-                    for column in columns:
-                        null_count = conn.execute(
-                            f"SELECT COUNT(*) FROM {table_name} WHERE {column} IS NULL"
-                        ).fetchone()[0]
-                        null_counts.append(null_count)
-                    
-                    total_nulls = sum(null_counts)
-                    total_cells = total_records * len(columns)
-                    completeness_score = ((total_cells - total_nulls) / total_cells) * 100
-                
-                # 确定状态
-                if completeness_score >= self.quality_thresholds['completeness_score']['warning']:
-                    status = "good"
-                elif completeness_score >= self.quality_thresholds['completeness_score']['critical']:
-                    status = "warning"
-                else:
-                    status = "critical"
-                
+            profile = self.get_table_profile(db_path, table_name)
+            if profile is None:
                 return QualityMetric(
                     metric_name="completeness",
-                    value=completeness_score,
-                    threshold=self.quality_thresholds['completeness_score']['warning'],
-                    status=status,
-                    description=f"数据完整性分数: {completeness_score:.2f}%",
+                    value=0.0,
+                    threshold=self.quality_thresholds['completeness_score']['critical'],
+                    status="critical",
+                    description=f"表不存在或无列: {table_name}",
                     timestamp=datetime.now()
                 )
+            
+            # 计算完整性分数
+            total_records = profile.row_count
+            
+            if total_records == 0:
+                completeness_score = 0.0
+            else:
+                total_nulls = sum(column.null_count for column in profile.columns.values())
+                total_cells = total_records * len(profile.columns)
+                completeness_score = ((total_cells - total_nulls) / total_cells) * 100
+            
+            # 确定状态
+            if completeness_score >= self.quality_thresholds['completeness_score']['warning']:
+                status = "good"
+            elif completeness_score >= self.quality_thresholds['completeness_score']['critical']:
+                status = "warning"
+            else:
+                status = "critical"
+            
+            return QualityMetric(
+                metric_name="completeness",
+                value=completeness_score,
+                threshold=self.quality_thresholds['completeness_score']['warning'],
+                status=status,
+                description=f"数据完整性分数: {completeness_score:.2f}%",
+                timestamp=datetime.now()
+            )
         
         except Exception as e:
             logger.error(f"检查数据完整性时出错: {e}")
@@ -246,70 +498,56 @@ class DataQualityChecker:
                     timestamp=datetime.now()
                 )
             
-            with sqlite3.connect(db_path) as conn:
-                # 检查数据类型一致性
-                cursor = conn.execute(f"PRAGMA table_info({table_name})")
-                schema_info = cursor.fetchall()
-                
-                if not schema_info:
-                    return QualityMetric(
-                        metric_name="consistency",
-                        value=0.0,
-                        threshold=self.quality_thresholds['consistency_score']['critical'],
-                        status="critical",
-                        description=f"表不存在: {table_name}",
-                        timestamp=datetime.now()
-                    )
-                
-                consistency_issues = 0
-                total_checks = 0
-                
-                # 检查每列的数据类型一致性
-                for column_info in schema_info:
-                    column_name = column_info[1]
-                    expected_type = column_info[2]
-                    
-                    # 简单的类型检查
-                    if expected_type.upper() in ['INTEGER', 'INT']:
-                        invalid_count = conn.execute(f"""
-                            SELECT COUNT(*) FROM {table_name} 
-                            WHERE {column_name} IS NOT NULL 
-                            AND TYPEOF({column_name}) != 'integer'
-                        """).fetchone()[0]
-                        consistency_issues += invalid_count
-                        total_checks += 1
-                    
-                    elif expected_type.upper() in ['REAL', 'FLOAT', 'DOUBLE']:
-                        invalid_count = conn.execute(f"""
-                            SELECT COUNT(*) FROM {table_name} 
-                            WHERE {column_name} IS NOT NULL 
-                            AND TYPEOF({column_name}) NOT IN ('real', 'integer')
-                        """).fetchone()[0]
-                        consistency_issues += invalid_count
-                        total_checks += 1
-                
-                # 计算一致性分数
-                if total_checks == 0:
-                    consistency_score = 100.0
-                else:
-                    consistency_score = max(0, (total_checks - consistency_issues) / total_checks * 100)
-                
-                # 确定状态
-                if consistency_score >= self.quality_thresholds['consistency_score']['warning']:
-                    status = "good"
-                elif consistency_score >= self.quality_thresholds['consistency_score']['critical']:
-                    status = "warning"
-                else:
-                    status = "critical"
-                
+            profile = self.get_table_profile(db_path, table_name)
+            if profile is None:
                 return QualityMetric(
                     metric_name="consistency",
-                    value=consistency_score,
-                    threshold=self.quality_thresholds['consistency_score']['warning'],
-                    status=status,
-                    description=f"数据一致性分数: {consistency_score:.2f}%",
+                    value=0.0,
+                    threshold=self.quality_thresholds['consistency_score']['critical'],
+                    status="critical",
+                    description=f"表不存在: {table_name}",
                     timestamp=datetime.now()
                 )
+            
+            consistency_issues = 0
+            total_checks = 0
+            
+            # 检查每列的数据类型一致性（基于概况中的存储类直方图）
+            for column in profile.columns.values():
+                expected_type = column.declared_type.upper()
+                counts = column.type_counts
+                
+                # 简单的类型检查
+                if expected_type in ['INTEGER', 'INT']:
+                    consistency_issues += counts['real'] + counts['text'] + counts['blob']
+                    total_checks += 1
+                
+                elif expected_type in ['REAL', 'FLOAT', 'DOUBLE']:
+                    consistency_issues += counts['text'] + counts['blob']
+                    total_checks += 1
+            
+            # 计算一致性分数
+            if total_checks == 0:
+                consistency_score = 100.0
+            else:
+                consistency_score = max(0, (total_checks - consistency_issues) / total_checks * 100)
+            
+            # 确定状态
+            if consistency_score >= self.quality_thresholds['consistency_score']['warning']:
+                status = "good"
+            elif consistency_score >= self.quality_thresholds['consistency_score']['critical']:
+                status = "warning"
+            else:
+                status = "critical"
+            
+            return QualityMetric(
+                metric_name="consistency",
+                value=consistency_score,
+                threshold=self.quality_thresholds['consistency_score']['warning'],
+                status=status,
+                description=f"数据一致性分数: {consistency_score:.2f}%",
+                timestamp=datetime.now()
+            )
         
         except Exception as e:
             logger.error(f"检查数据一致性时出错: {e}")
@@ -335,59 +573,55 @@ class DataQualityChecker:
                     timestamp=datetime.now()
                 )
             
-            with sqlite3.connect(db_path) as conn:
-                # 获取最新记录的时间戳
-                try:
-                    latest_timestamp = conn.execute(
-                        f"SELECT MAX({timestamp_column}) FROM {table_name}"
-                    ).fetchone()[0]
-                    
-                    if latest_timestamp is None:
-                        freshness_hours = 999.0
-                    else:
-                        # 解析时间戳
-                        if isinstance(latest_timestamp, str):
-                            latest_time = datetime.fromisoformat(latest_timestamp.replace('Z', '+00:00'))
-                        else:
-                            latest_time = latest_timestamp
-                        
-                        freshness_hours = (datetime.now() - latest_time).total_seconds() / 3600
+            profile = self.get_table_profile(db_path, table_name)
+            # 获取最新记录的时间戳
+            try:
+                latest_timestamp = self._column_max(profile, timestamp_column)
                 
-                except Exception:
-                    # 如果时间戳列不存在，尝试其他常见的时间列名
-                    for col in ['created_at', 'updated_at', 'date', 'time']:
-                        try:
-                            latest_timestamp = conn.execute(
-                                f"SELECT MAX({col}) FROM {table_name}"
-                            ).fetchone()[0]
-                            if latest_timestamp:
-                                if isinstance(latest_timestamp, str):
-                                    latest_time = datetime.fromisoformat(latest_timestamp.replace('Z', '+00:00'))
-                                else:
-                                    latest_time = latest_timestamp
-                                freshness_hours = (datetime.now() - latest_time).total_seconds() / 3600
-                                break
-                        except Exception:
-                            continue
+                if latest_timestamp is None:
+                    freshness_hours = 999.0
+                else:
+                    # 解析时间戳
+                    if isinstance(latest_timestamp, str):
+                        latest_time = datetime.fromisoformat(latest_timestamp.replace('Z', '+00:00'))
                     else:
-                        freshness_hours = 999.0
-                
-                # 确定状态
-                if freshness_hours <= self.quality_thresholds['data_freshness_hours']['warning']:
-                    status = "good"
-                elif freshness_hours <= self.quality_thresholds['data_freshness_hours']['critical']:
-                    status = "warning"
+                        latest_time = latest_timestamp
+                    
+                    freshness_hours = (datetime.now() - latest_time).total_seconds() / 3600
+            
+            except Exception:
+                # 如果时间戳列不存在，尝试其他常见的时间列名
+                for col in ['created_at', 'updated_at', 'date', 'time']:
+                    try:
+                        latest_timestamp = self._column_max(profile, col)
+                        if latest_timestamp:
+                            if isinstance(latest_timestamp, str):
+                                latest_time = datetime.fromisoformat(latest_timestamp.replace('Z', '+00:00'))
+                            else:
+                                latest_time = latest_timestamp
+                            freshness_hours = (datetime.now() - latest_time).total_seconds() / 3600
+                            break
+                    except Exception:
+                        continue
                 else:
-                    status = "critical"
-                
-                return QualityMetric(
-                    metric_name="freshness",
-                    value=freshness_hours,
-                    threshold=self.quality_thresholds['data_freshness_hours']['warning'],
-                    status=status,
-                    description=f"数据新鲜度: {freshness_hours:.1f}小时前",
-                    timestamp=datetime.now()
-                )
+                    freshness_hours = 999.0
+            
+            # 确定状态
+            if freshness_hours <= self.quality_thresholds['data_freshness_hours']['warning']:
+                status = "good"
+            elif freshness_hours <= self.quality_thresholds['data_freshness_hours']['critical']:
+                status = "warning"
+            else:
+                status = "critical"
+            
+            return QualityMetric(
+                metric_name="freshness",
+                value=freshness_hours,
+                threshold=self.quality_thresholds['data_freshness_hours']['warning'],
+                status=status,
+                description=f"数据新鲜度: {freshness_hours:.1f}小时前",
+                timestamp=datetime.now()
+            )
         
         except Exception as e:
             logger.error(f"检查数据新鲜度时出错: {e}")
@@ -415,18 +649,19 @@ class DataQualityChecker:
                     timestamp=datetime.now()
                 )
             
+            profile = self.get_table_profile(db_path, table_name)
+            if profile is None:
+                raise sqlite3.OperationalError(f"no such table: {table_name}")
+            
             with sqlite3.connect(db_path) as conn:
                 # 检查记录数量
-                actual_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                actual_count = profile.row_count
                 
                 # 检查重复记录
                 duplicate_records = []
                 try:
-                    # 尝试找到主键或唯一标识符
-                    cursor = conn.execute(f"PRAGMA table_info({table_name})")
-                    columns = [row[1] for row in cursor.fetchall()]
-                    
-                    if 'id' in columns:
+                    # 尝试找到主键或唯一标识符；id 为 rowid 别名时不可能重复，无需扫描
+                    if 'id' in profile.columns and not self._id_is_rowid_alias(profile):
                         duplicates = conn.execute(f"""
                             SELECT id, COUNT(*) as count 
                             FROM {table_name} 
@@ -485,9 +720,13 @@ class DataQualityChecker:
                     timestamp=datetime.now()
                 )
             
+            profile = self.get_table_profile(db_path, table_name)
+            if profile is None:
+                raise sqlite3.OperationalError(f"no such table: {table_name}")
+            
             with sqlite3.connect(db_path) as conn:
                 # 总记录数
-                total_records = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                total_records = profile.row_count
                 
                 if total_records == 0:
                     return DataProfile(
@@ -502,22 +741,13 @@ class DataQualityChecker:
                     )
                 
                 # 计算空值百分比
-                cursor = conn.execute(f"PRAGMA table_info({table_name})")
-                columns = [row[1] for row in cursor.fetchall()]
-                
-                total_nulls = 0
-                for column in columns:
-                    null_count = conn.execute(
-                        f"SELECT COUNT(*) FROM {table_name} WHERE {column} IS NULL"
-                    ).fetchone()[0]
-                    total_nulls += null_count
-                
-                total_cells = total_records * len(columns)
+                total_nulls = sum(column.null_count for column in profile.columns.values())
+                total_cells = total_records * len(profile.columns)
                 null_percentage = (total_nulls / total_cells) * 100 if total_cells > 0 else 0
                 
                 # 计算重复百分比
                 duplicate_percentage = 0.0
-                if 'id' in columns:
+                if 'id' in profile.columns and not self._id_is_rowid_alias(profile):
                     duplicates = conn.execute(f"""
                         SELECT COUNT(*) FROM (
                             SELECT id FROM {table_name} 
@@ -538,7 +768,7 @@ class DataQualityChecker:
                     duplicate_percentage=duplicate_percentage,
                     data_freshness_hours=data_freshness_hours,
                     schema_consistency=True,
-                    data_types_valid=True,
+                    data_types_valid=not any(c.affinity_violations for c in profile.columns.values()),
                     timestamp=datetime.now()
                 )
         
@@ -100,6 +100,127 @@ class DataTypeMapper:
         logger.debug(f"Mapped BigQuery type {bigquery_type} to PostgreSQL type {postgres_type}")
         return postgres_type
     
+    @staticmethod
+    def _to_integer(value: Any) -> Any:
+        return int(float(value)) if value != '' else None
+    
+    @staticmethod
+    def _to_decimal(value: Any) -> Any:
+        if isinstance(value, decimal.Decimal):
+            return float(value)  # 转换为 float 以避免 JSON 序列化问题
+        return float(value) if value != '' else None
+    
+    @staticmethod
+    def _to_float(value: Any) -> Any:
+        return float(value) if value != '' else None
+    
+    @staticmethod
+    def _to_boolean(value: Any) -> Any:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            return value.lower() in ('true', '1', 'yes', 'on')
+        return bool(value)
+    
+    @staticmethod
+    def _to_date(value: Any) -> Any:
+        if isinstance(value, str):
+            # 尝试解析不同的日期格式
+            for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y']:
+                try:
+                    return datetime.strptime(value, fmt).date()
+                except ValueError:
+                    continue
+            return value  # 保持原值，让数据库处理
+        if isinstance(value, datetime):
+            return value.date()
+        return value
+    
+    @staticmethod
+    def _to_timestamp(value: Any) -> Any:
+        if isinstance(value, str):
+            # 尝试解析不同的时间戳格式
+            for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']:
+                try:
+                    return datetime.strptime(value, fmt)
+                except ValueError:
+                    continue
+            return value  # 保持原值，让数据库处理
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value)
+        return value
+    
+    @staticmethod
+    def _to_time(value: Any) -> Any:
+        if isinstance(value, str):
+            try:
+                return datetime.strptime(value, '%H:%M:%S').time()
+            except ValueError:
+                return value
+        return value
+    
+    @staticmethod
+    def _to_json(value: Any) -> Any:
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except json.JSONDecodeError:
+                return value
+        if isinstance(value, (dict, list)):
+            return value
+        return str(value)
+    
+    @staticmethod
+    def _to_array(value: Any) -> Any:
+        if isinstance(value, str):
+            try:
+                # 尝试解析 JSON 数组
+                converted = json.loads(value)
+                return converted if isinstance(converted, list) else [converted]
+            except json.JSONDecodeError:
+                # 尝试解析逗号分隔的值
+                return [item.strip() for item in value.split(',')]
+        if isinstance(value, list):
+            return value
+        return [value]
+    
+    @staticmethod
+    def _to_text(value: Any) -> Any:
+        return str(value)
+    
+    def get_converter(self, target_type: str):
+        """
+        按目标类型选出转换函数，供按列预编译使用
+        
+        Args:
+            target_type: 目标数据类型
+            
+        Returns:
+            转换函数 f(value) -> converted（value 不为 None）
+        """
+        target_type = target_type.upper()
+        
+        # 判断顺序与类型前缀的包含关系有关（DATE/TIMESTAMP/TIME）
+        if target_type.startswith('INTEGER') or target_type.startswith('BIGINT'):
+            return self._to_integer
+        if target_type.startswith('DECIMAL') or target_type.startswith('NUMERIC'):
+            return self._to_decimal
+        if target_type.startswith('DOUBLE PRECISION') or target_type.startswith('REAL'):
+            return self._to_float
+        if target_type.startswith('BOOLEAN'):
+            return self._to_boolean
+        if target_type.startswith('DATE'):
+            return self._to_date
+        if target_type.startswith('TIMESTAMP'):
+            return self._to_timestamp
+        if target_type.startswith('TIME'):
+            return self._to_time
+        if target_type.startswith('JSONB') or target_type.startswith('JSON'):
+            return self._to_json
+        if target_type.startswith('ARRAY'):
+            return self._to_array
+        return self._to_text  # TEXT, VARCHAR, CHAR 等字符串类型
+    
     def convert_value(self, value: Any, target_type: str) -> Any:
         """
         转换数据值以匹配目标数据类型
@@ -118,97 +239,7 @@ class DataTypeMapper:
                 return None
             
             target_type = target_type.upper()
-            
-            # 处理不同的目标类型
-            if target_type.startswith('INTEGER') or target_type.startswith('BIGINT'):
-                converted = int(float(value)) if value != '' else None
-            
-            elif target_type.startswith('DECIMAL') or target_type.startswith('NUMERIC'):
-                if isinstance(value, decimal.Decimal):
-                    converted = float(value)  # 转换为 float 以避免 JSON 序列化问题
-                else:
-                    converted = float(value) if value != '' else None
-            
-            elif target_type.startswith('DOUBLE PRECISION') or target_type.startswith('REAL'):
-                converted = float(value) if value != '' else None
-            
-            elif target_type.startswith('BOOLEAN'):
-                if isinstance(value, bool):
-                    converted = value
-                elif isinstance(value, str):
-                    converted = value.lower() in ('true', '1', 'yes', 'on')
-                else:
-                    converted = bool(value)
-            
-            elif target_type.startswith('DATE'):
-                if isinstance(value, str):
-                    # 尝试解析不同的日期格式
-                    for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y']:
-                        try:
-                            converted = datetime.strptime(value, fmt).date()
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        converted = value  # 保持原值，让数据库处理
-                elif isinstance(value, datetime):
-                    converted = value.date()
-                else:
-                    converted = value
-            
-            elif target_type.startswith('TIMESTAMP'):
-                if isinstance(value, str):
-                    # 尝试解析不同的时间戳格式
-                    for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']:
-                        try:
-                            converted = datetime.strptime(value, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        converted = value  # 保持原值，让数据库处理
-                elif isinstance(value, (int, float)):
-                    converted = datetime.fromtimestamp(value)
-                else:
-                    converted = value
-            
-            elif target_type.startswith('TIME'):
-                if isinstance(value, str):
-                    try:
-                        converted = datetime.strptime(value, '%H:%M:%S').time()
-                    except ValueError:
-                        converted = value
-                else:
-                    converted = value
-            
-            elif target_type.startswith('JSONB') or target_type.startswith('JSON'):
-                if isinstance(value, str):
-                    try:
-                        converted = json.loads(value)
-                    except json.JSONDecodeError:
-                        converted = value
-                elif isinstance(value, (dict, list)):
-                    converted = value
-                else:
-                    converted = str(value)
-            
-            elif target_type.startswith('ARRAY'):
-                if isinstance(value, str):
-                    try:
-                        # 尝试解析 JSON 数组
-                        converted = json.loads(value)
-                        if not isinstance(converted, list):
-                            converted = [converted]
-                    except json.JSONDecodeError:
-                        # 尝试解析逗号分隔的值
-                        converted = [item.strip() for item in value.split(',')]
-                elif isinstance(value, list):
-                    converted = value
-                else:
-                    converted = [value]
-            
-            else:  # TEXT, VARCHAR, CHAR 等字符串类型
-                converted = str(value) if value is not None else None
+            converted = self.get_converter(target_type)(value)
             
             self.conversion_stats['successful_conversions'] += 1
             
@@ -224,6 +255,41 @@ class DataTypeMapper:
             logger.error(f"Failed to convert value {value} to type {target_type}: {e}")
             return value  # 返回原值，让数据库处理错误
     
+    def compile_sqlite_row_converter(self, schema: Dict[str, str]):
+        """
+        根据 SQLite 表结构预编译整行转换函数，类型映射只做一次
+        
+        Args:
+            schema: 列名到 SQLite 类型的映射
+            
+        Returns:
+            转换函数 f(row_dict) -> converted_row
+        """
+        converters = {
+            column: self.get_converter(self.map_sqlite_type(sqlite_type))
+            for column, sqlite_type in schema.items()
+        }
+        
+        def convert(row: Dict[str, Any]) -> Dict[str, Any]:
+            converted_row = {}
+            for column, value in row.items():
+                if value is None:
+                    converted_row[column] = None
+                    continue
+                converter = converters.get(column)
+                if converter is None:
+                    # 处理 datetime 对象的 JSON 序列化
+                    converted_row[column] = value.isoformat() if isinstance(value, datetime) else value
+                    continue
+                try:
+                    converted_row[column] = converter(value)
+                except Exception as e:
+                    logger.error(f"Failed to convert value {value} for column {column}: {e}")
+                    converted_row[column] = value  # 返回原值，让数据库处理错误
+            return converted_row
+        
+        return convert
+    
     def convert_row(self, row: Dict[str, Any], column_types: Dict[str, str]) -> Dict[str, Any]:
         """
         转换整行数据
@@ -5,6 +5,8 @@ PC28增强数据流转系统
 利用优化后的字段结构，实现高效的实时数据拉取和历史数据回填
 """
 
+import os
+import sys
 import json
 import time
 import sqlite3
@@ -19,6 +21,9 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # 导入现有模块
 from data_deduplication_system import DataDeduplicationSystem
 
+sys.path.append(os.path.join(os.path.dirname(__file__), 'python'))
+from draw_event_bus import CHINA_TZ, get_default_draw_ingest, parse_china_time
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -60,9 +65,14 @@ class OptimizedDrawData:
 class EnhancedDataFlowSystem:
     """增强数据流转系统"""
     
-    def __init__(self, api_config=None, db_path: str = "optimized_lottery.db"):
+    def __init__(self, api_config=None, db_path: str = "optimized_lottery.db", ingest=None,
+                 legacy_polling: bool = False):
         self.api_config = api_config
         self.db_path = db_path
+        # 共享开奖接入组件（draw_event_bus.DrawIngest），未传入时启动时按配置的上游账号获取并订阅新开奖事件；
+        # 只有显式 legacy_polling=True 才定时自行拉取
+        self.ingest = ingest
+        self.legacy_polling = legacy_polling and ingest is None
         # 初始化云端数据源API系统
         self.api_system = self._init_cloud_api_system()
         self.dedup_system = DataDeduplicationSystem("flow_deduplication.db")
@@ -196,8 +206,9 @@ class EnhancedDataFlowSystem:
     
     def _setup_scheduled_tasks(self):
         """设置定时任务"""
-        # 实时数据拉取 - 每5分钟
-        schedule.every(5).minutes.do(self._realtime_data_pull)
+        # 实时数据拉取 - 每5分钟（仅 legacy_polling；默认由共享接入的新开奖事件驱动）
+        if self.legacy_polling:
+            schedule.every(5).minutes.do(self._realtime_data_pull)
         
         # 历史数据回填 - 每小时检查一次
         schedule.every().hour.do(self._historical_data_backfill)
@@ -240,6 +251,43 @@ class EnhancedDataFlowSystem:
         except Exception as e:
             logger.error(f"实时数据拉取失败: {e}")
     
+    def _on_new_draw_event(self, event):
+        """新开奖事件写入优化数据库"""
+        start_time = time.time()
+        
+        try:
+            draw = event.draw
+            numbers = list(draw.get('result_numbers') or [])
+            sum_value = sum(numbers)
+            next_time = draw.get('next_time')
+            next_moment = parse_china_time(next_time)
+            countdown = None
+            if next_moment is not None:
+                countdown = max(0, int((next_moment - datetime.now(CHINA_TZ)).total_seconds()))
+            
+            record = OptimizedDrawData(
+                draw_id=str(draw['draw_id']),
+                issue=str(draw['draw_id']),
+                numbers=numbers,
+                sum_value=sum_value,
+                big_small='big' if sum_value >= 14 else 'small',
+                odd_even='odd' if sum_value % 2 else 'even',
+                dragon_tiger='dragon' if numbers[0] > numbers[-1] else 'tiger' if numbers[0] < numbers[-1] else 'tie',
+                timestamp=draw.get('timestamp'),
+                next_draw_id=draw.get('next_issue'),
+                next_draw_time=next_time,
+                countdown_seconds=countdown,
+                processing_time=time.time() - start_time
+            )
+            saved_count = self._batch_save_optimized_records([record])
+            
+            with self.lock:
+                self.metrics.realtime_pulls += saved_count
+                self.metrics.processing_speed_improvement = self._calculate_speed_improvement(time.time() - start_time)
+            
+        except Exception as e:
+            logger.error(f"新开奖事件处理失败: {e}")
+    
     def _convert_to_optimized_format(self, record) -> OptimizedDrawData:
         """转换为优化格式 - 移除未使用字段"""
         start_time = time.time()
@@ -575,6 +623,12 @@ class EnhancedDataFlowSystem:
         scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
         scheduler_thread.start()
         
+        if self.ingest is None and not self.legacy_polling:
+            self.ingest = get_default_draw_ingest()
+        if self.ingest is not None:
+            self.ingest.bus.subscribe('enhanced_data_flow_system', self._on_new_draw_event, topics=['new_draw'])
+            self.ingest.start()
+        
         logger.info("数据流转系统已启动")
     
     def get_system_status(self) -> Dict[str, Any]:
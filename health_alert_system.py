@@ -22,6 +22,8 @@ from email.mime.base import MIMEBase
 from email import encoders
 import hashlib
 
+from python.metrics_store import get_shared_metrics_store
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -127,6 +129,9 @@ class HealthAlertSystem:
         # 健康指标收集器
         self.metric_collectors = {}
         
+        # 指标数值写入共享时序存储，health_metrics 表只保留历史数据
+        self.metrics_store = get_shared_metrics_store()
+        
         self._init_database()
         self._setup_default_rules()
     
@@ -634,20 +639,12 @@ class HealthAlertSystem:
         return report
     
     def _save_metrics(self, metrics: List[HealthMetric]):
-        """保存指标到数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            for metric in metrics:
-                conn.execute("""
-                    INSERT INTO health_metrics 
-                    (metric_name, current_value, threshold_warning, threshold_critical, 
-                     status, trend, description, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    metric.metric_name, metric.current_value, metric.threshold_warning,
-                    metric.threshold_critical, metric.status, metric.trend,
-                    metric.description, metric.timestamp
-                ))
-            conn.commit()
+        """保存指标到时序存储（数值和状态等级：healthy=0 / warning=1 / critical=2）"""
+        status_levels = {'healthy': 0, 'warning': 1, 'critical': 2}
+        for metric in metrics:
+            self.metrics_store.append(f"health.{metric.metric_name}", metric.current_value, metric.timestamp)
+            self.metrics_store.append(f"health.{metric.metric_name}.status",
+                                      status_levels.get(metric.status, 2), metric.timestamp)
     
     def _save_alert(self, alert: Alert):
         """保存告警到数据库"""
@@ -10,9 +10,13 @@ import os
 import sys
 import json
 import logging
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from google.cloud import bigquery
 from google.cloud import storage
 from google.auth import default
@@ -24,18 +28,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# PC28 每3分钟一期，用于估算分片应有的记录数
+DRAW_INTERVAL_MINUTES = 3
+
+# 各数据源的最大并发请求数
+DEFAULT_SOURCE_CONCURRENCY = {
+    'bigquery': 8,
+    'external_api': 2,
+    'gcs': 4
+}
+
+@dataclass
+class ShardResult:
+    """单个时间分片的获取结果"""
+    start_time: datetime
+    end_time: datetime
+    expected: int
+    records: List[Dict] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    complete: bool = False
+
 class HistoricalDataAPI:
     """历史数据API接口类"""
     
-    def __init__(self, project_id: str = None, dataset_id: str = None):
+    def __init__(self, project_id: str = None, dataset_id: str = None,
+                 source_concurrency: Dict[str, int] = None, min_coverage: float = 0.95):
         """初始化API接口
         
         Args:
             project_id: Google Cloud项目ID
             dataset_id: BigQuery数据集ID
+            source_concurrency: 各数据源的最大并发数，默认见 DEFAULT_SOURCE_CONCURRENCY
+            min_coverage: 分片记录数达到应有期数的该比例即视为完整，不再查询后续数据源
         """
         self.project_id = project_id or os.getenv('PROJECT', 'wprojectl')
         self.dataset_id = dataset_id or os.getenv('DS_DRAW', 'pc２８')
+        self.min_coverage = min_coverage
+        
+        concurrency = dict(DEFAULT_SOURCE_CONCURRENCY)
+        concurrency.update(source_concurrency or {})
+        self.source_concurrency = concurrency
+        self._source_limits = {
+            key: threading.BoundedSemaphore(max(1, limit)) for key, limit in concurrency.items()
+        }
+        
+        # GCS按天的备份文件会被同一天的多个小时分片复用
+        self._gcs_day_cache: "OrderedDict[str, Optional[List[Dict]]]" = OrderedDict()
+        self._gcs_cache_lock = threading.Lock()
+        self._target_table = None
         
         # 初始化Google Cloud客户端
         try:
@@ -212,14 +252,9 @@ class HistoricalDataAPI:
             end_date = end_time.date()
             
             while current_date <= end_date:
-                blob_name = f"pc28_backup/{current_date.strftime('%Y/%m/%d')}/draws.json"
-                blob = bucket.blob(blob_name)
+                daily_data = self._load_gcs_day(bucket, current_date)
                 
-                if blob.exists():
-                    logger.info(f"找到备份文件: {blob_name}")
-                    content = blob.download_as_text()
-                    daily_data = json.loads(content)
-                    
+                if daily_data:
                     # 过滤时间范围内的数据
                     for record in daily_data:
                         record_time = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
@@ -235,7 +270,129 @@ class HistoricalDataAPI:
             logger.error(f"从GCS备份获取数据失败: {e}")
             return []
     
-    def get_historical_data(self, start_time: datetime, end_time: datetime) -> List[Dict]:
+    def _load_gcs_day(self, bucket, day) -> Optional[List[Dict]]:
+        """读取某天的GCS备份文件，最近读取的几天保留在内存中"""
+        blob_name = f"pc28_backup/{day.strftime('%Y/%m/%d')}/draws.json"
+        with self._gcs_cache_lock:
+            if blob_name in self._gcs_day_cache:
+                self._gcs_day_cache.move_to_end(blob_name)
+                return self._gcs_day_cache[blob_name]
+        
+        daily_data = None
+        blob = bucket.blob(blob_name)
+        if blob.exists():
+            logger.info(f"找到备份文件: {blob_name}")
+            daily_data = json.loads(blob.download_as_text())
+        
+        with self._gcs_cache_lock:
+            self._gcs_day_cache[blob_name] = daily_data
+            while len(self._gcs_day_cache) > 8:
+                self._gcs_day_cache.popitem(last=False)
+        return daily_data
+    
+    def _data_sources(self):
+        """按优先级排列的数据源 (名称, 并发限制键, 获取函数)"""
+        return [
+            ("BigQuery历史表", 'bigquery', self.fetch_from_bigquery_history),
+            ("外部API", 'external_api', self.fetch_from_external_api),
+            ("GCS备份", 'gcs', self.fetch_from_gcs_backup)
+        ]
+    
+    @staticmethod
+    def plan_shards(start_time: datetime, end_time: datetime,
+                    shard_size: timedelta = None) -> List[Tuple[datetime, datetime]]:
+        """把时间范围切成首尾不重叠的分片
+        
+        Args:
+            start_time: 开始时间
+            end_time: 结束时间（包含）
+            shard_size: 分片长度，默认两天以内按小时、更长按天
+            
+        Returns:
+            [(分片开始, 分片结束)]，分片结束时间包含在内
+        """
+        if end_time < start_time:
+            return []
+        if shard_size is None:
+            shard_size = timedelta(hours=1) if end_time - start_time <= timedelta(days=2) else timedelta(days=1)
+        
+        shards = []
+        shard_start = start_time
+        while shard_start <= end_time:
+            next_start = shard_start + shard_size
+            shards.append((shard_start, min(next_start - timedelta(microseconds=1), end_time)))
+            shard_start = next_start
+        return shards
+    
+    @staticmethod
+    def _record_key(record: Dict) -> str:
+        return str(record.get('issue') or record.get('timestamp'))
+    
+    def _expected_draws(self, start_time: datetime, end_time: datetime) -> int:
+        minutes = (end_time - start_time).total_seconds() / 60
+        return max(1, int(minutes // DRAW_INTERVAL_MINUTES))
+    
+    def _fetch_shard(self, start_time: datetime, end_time: datetime) -> ShardResult:
+        """按优先级依次查询数据源，直到分片记录数达到覆盖率要求；各源结果按期号合并"""
+        result = ShardResult(start_time, end_time, self._expected_draws(start_time, end_time))
+        required = result.expected * self.min_coverage
+        merged: Dict[str, Dict] = {}
+        
+        for source_name, limit_key, fetch_func in self._data_sources():
+            try:
+                with self._source_limits[limit_key]:
+                    data = fetch_func(start_time, end_time)
+            except Exception as e:
+                logger.error(f"从 {source_name} 获取分片 {start_time} 失败: {e}")
+                continue
+            
+            if data:
+                before = len(merged)
+                for record in data:
+                    merged.setdefault(self._record_key(record), record)
+                if len(merged) > before:
+                    result.sources.append(source_name)
+            
+            if len(merged) >= required:
+                break
+        
+        result.records = sorted(merged.values(), key=lambda record: str(record.get('timestamp', '')))
+        result.complete = len(merged) >= required
+        return result
+    
+    def iter_historical_shards(self, start_time: datetime, end_time: datetime,
+                               shard_size: timedelta = None) -> Iterator[ShardResult]:
+        """并发获取各分片，按完成顺序产出
+        
+        每个分片在自己的线程里依次尝试数据源，数据源的并发由各自的信号量限制，
+        因此BigQuery能并发跑满，外部API不会被打爆。
+        同时在途的分片数不超过线程数，每完成一个再提交下一个，产出后即释放，
+        内存占用与范围长度无关；调用方提前退出时只等待在途分片。
+        """
+        shards = iter(self.plan_shards(start_time, end_time, shard_size))
+        window = max(1, sum(self.source_concurrency.values()))
+        
+        with ThreadPoolExecutor(max_workers=window, thread_name_prefix='history-shard') as executor:
+            pending = set()
+            
+            def submit_next() -> bool:
+                shard = next(shards, None)
+                if shard is None:
+                    return False
+                pending.add(executor.submit(self._fetch_shard, *shard))
+                return True
+            
+            while len(pending) < window and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    submit_next()
+                    yield future.result()
+    
+    def get_historical_data(self, start_time: datetime, end_time: datetime,
+                            shard_size: timedelta = None) -> List[Dict]:
         """获取历史数据（多源策略）
         
         Args:
@@ -247,52 +404,103 @@ class HistoricalDataAPI:
         """
         logger.info(f"获取历史数据: {start_time} 到 {end_time}")
         
-        # 尝试多个数据源
-        data_sources = [
-            ("BigQuery历史表", self.fetch_from_bigquery_history),
-            ("外部API", self.fetch_from_external_api),
-            ("GCS备份", self.fetch_from_gcs_backup)
-        ]
+        merged: Dict[str, Dict] = {}
+        incomplete = 0
+        for shard in self.iter_historical_shards(start_time, end_time, shard_size):
+            if not shard.complete:
+                incomplete += 1
+                logger.warning(f"分片 {shard.start_time} ~ {shard.end_time} 不完整: "
+                               f"{len(shard.records)}/{shard.expected}")
+            for record in shard.records:
+                merged.setdefault(self._record_key(record), record)
         
-        for source_name, fetch_func in data_sources:
-            try:
-                logger.info(f"尝试从 {source_name} 获取数据")
-                data = fetch_func(start_time, end_time)
-                
-                if data:
-                    logger.info(f"成功从 {source_name} 获取到 {len(data)} 条记录")
-                    return data
-                else:
-                    logger.warning(f"{source_name} 未返回数据")
-                    
-            except Exception as e:
-                logger.error(f"从 {source_name} 获取数据失败: {e}")
-                continue
+        if not merged:
+            logger.warning("所有数据源都未能获取到历史数据")
+            return []
         
-        logger.warning("所有数据源都未能获取到历史数据")
-        return []
+        logger.info(f"获取到 {len(merged)} 条历史记录，不完整分片 {incomplete} 个")
+        return sorted(merged.values(), key=lambda record: str(record.get('timestamp', '')))
     
-    def insert_historical_data(self, data: List[Dict]) -> bool:
+    def backfill_range(self, start_time: datetime, end_time: datetime,
+                       chunk_size: int = 500, shard_size: timedelta = None) -> Dict:
+        """并发获取并分块写入历史数据，分片完成即写入，不在内存中汇总整个范围
+        
+        Args:
+            start_time: 开始时间
+            end_time: 结束时间
+            chunk_size: 每次 insert_rows_json 的行数
+            shard_size: 分片长度
+            
+        Returns:
+            回填摘要
+        """
+        summary = {
+            'shards': 0,
+            'incomplete_shards': [],
+            'fetched': 0,
+            'inserted': 0,
+            'failed_rows': 0,
+            'sources': {}
+        }
+        buffer: List[Dict] = []
+        
+        def flush(rows: List[Dict]):
+            inserted, failed = self.insert_historical_data(rows, chunk_size=chunk_size)
+            summary['inserted'] += inserted
+            summary['failed_rows'] += failed
+        
+        for shard in self.iter_historical_shards(start_time, end_time, shard_size):
+            summary['shards'] += 1
+            summary['fetched'] += len(shard.records)
+            for source_name in shard.sources:
+                summary['sources'][source_name] = summary['sources'].get(source_name, 0) + 1
+            if not shard.complete:
+                summary['incomplete_shards'].append(
+                    (shard.start_time.isoformat(), shard.end_time.isoformat(), len(shard.records), shard.expected)
+                )
+            
+            buffer.extend(shard.records)
+            while len(buffer) >= chunk_size:
+                flush(buffer[:chunk_size])
+                buffer = buffer[chunk_size:]
+        
+        if buffer:
+            flush(buffer)
+        
+        logger.info(f"回填完成: {summary['shards']} 个分片, 获取 {summary['fetched']} 条, "
+                    f"写入 {summary['inserted']} 条, 不完整分片 {len(summary['incomplete_shards'])} 个")
+        return summary
+    
+    def insert_historical_data(self, data: List[Dict], chunk_size: int = 500) -> Tuple[int, int]:
         """插入历史数据到BigQuery
         
         Args:
             data: 历史数据列表
+            chunk_size: 每次 insert_rows_json 的行数
             
         Returns:
-            是否成功
+            (写入行数, 失败行数)，按 insert_rows_json 返回的行级错误逐行统计，
+            某个分块请求异常时该分块整体计为失败，其余分块继续写入
         """
         if not data:
             logger.warning("没有数据需要插入")
-            return True
+            return 0, 0
         
         try:
-            table_id = f"{self.project_id}.{self.dataset_id}.draws_14w"
-            table = self.bq_client.get_table(table_id)
-            
+            if self._target_table is None:
+                table_id = f"{self.project_id}.{self.dataset_id}.draws_14w"
+                self._target_table = self.bq_client.get_table(table_id)
+            table = self._target_table
+        except Exception as e:
+            logger.error(f"插入历史数据失败: {e}")
+            return 0, len(data)
+        
+        inserted = 0
+        failed = 0
+        for start in range(0, len(data), chunk_size):
             # 转换数据格式
-            rows_to_insert = []
-            for record in data:
-                row = {
+            rows_to_insert = [
+                {
                     'issue': record.get('issue'),
                     'timestamp': record.get('timestamp'),
                     'result': record.get('result'),
@@ -300,21 +508,28 @@ class HistoricalDataAPI:
                     'big_small': record.get('big_small'),
                     'odd_even': record.get('odd_even')
                 }
-                rows_to_insert.append(row)
+                for record in data[start:start + chunk_size]
+            ]
             
             # 插入数据
-            errors = self.bq_client.insert_rows_json(table, rows_to_insert)
+            try:
+                errors = self.bq_client.insert_rows_json(table, rows_to_insert)
+            except Exception as e:
+                logger.error(f"插入数据分块失败 ({start}~{start + len(rows_to_insert)}): {e}")
+                failed += len(rows_to_insert)
+                continue
             
             if errors:
                 logger.error(f"插入数据时发生错误: {errors}")
-                return False
+                # 未跳过无效行时，同一请求中被连带拒绝的行也会以 stopped 出现在错误列表中
+                failed_rows = len({error.get('index') for error in errors})
+                failed += failed_rows
+                inserted += len(rows_to_insert) - failed_rows
             else:
-                logger.info(f"成功插入 {len(rows_to_insert)} 条历史数据")
-                return True
-                
-        except Exception as e:
-            logger.error(f"插入历史数据失败: {e}")
-            return False
+                inserted += len(rows_to_insert)
+        
+        logger.info(f"成功插入 {inserted}/{len(data)} 条历史数据，失败 {failed} 条")
+        return inserted, failed
 
 def main():
     """主函数 - 用于测试"""
@@ -330,18 +545,15 @@ def main():
             if time_diff.total_seconds() > 7200:  # 超过2小时
                 logger.info(f"检测到数据缺口: {time_diff}")
                 
-                # 获取历史数据
-                historical_data = api.get_historical_data(latest_time, current_time)
+                # 分片并发获取并分块写入
+                summary = api.backfill_range(latest_time, current_time)
                 
-                if historical_data:
-                    # 插入数据
-                    success = api.insert_historical_data(historical_data)
-                    if success:
-                        logger.info("历史数据回填完成")
-                    else:
-                        logger.error("历史数据回填失败")
-                else:
+                if not summary['fetched']:
                     logger.warning("未获取到历史数据")
+                elif summary['failed_rows']:
+                    logger.error("历史数据回填失败")
+                else:
+                    logger.info("历史数据回填完成")
             else:
                 logger.info("数据时间正常，无需回填")
         else:
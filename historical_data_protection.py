@@ -18,6 +18,8 @@ import os
 import shutil
 from pathlib import Path
 import gzip
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入相关系统
 
@@ -25,6 +27,27 @@ import gzip
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 每个备份分块的记录数
+BACKUP_CHUNK_ROWS = 5000
+BACKUP_MANIFEST_VERSION = 2
+BACKUP_MANIFEST_SUFFIX = ".manifest.json"
+
+# 脏日期桶超过该数量时直接全表校验，避免过长的 IN 列表
+MERKLE_MAX_DIRTY_BUCKETS = 500
+
+
+def _encode_backup_chunk(rows: List[tuple], compression: bool) -> Tuple[bytes, str]:
+    """将一块记录编码为JSON行并压缩，返回 (字节, SHA256)
+
+    每块是独立的gzip成员，zlib压缩时释放GIL，可在线程池中并行执行
+    """
+    payload = "".join(
+        json.dumps(list(row), ensure_ascii=False, default=str) + "\n" for row in rows
+    ).encode('utf-8')
+    if compression:
+        payload = gzip.compress(payload, compresslevel=6, mtime=0)
+    return payload, hashlib.sha256(payload).hexdigest()
+
 @dataclass
 class DataIntegrityCheck:
     """数据完整性检查结果"""
@@ -79,9 +102,11 @@ class ProtectionRule:
 class HistoricalDataProtection:
     """历史数据保护系统"""
     
-    def __init__(self, db_path: str = "lottery_data.db", backup_dir: str = "backups"):
+    def __init__(self, db_path: str = "lottery_data.db", backup_dir: str = "backups",
+                 backup_workers: Optional[int] = None):
         self.db_path = db_path
         self.backup_dir = Path(backup_dir)
+        self.backup_workers = backup_workers or min(4, os.cpu_count() or 1)
         self.protection_db = "data_protection.db"
         self.lock = threading.RLock()
         
@@ -102,6 +127,18 @@ class HistoricalDataProtection:
         }
         
         self._init_protection_database()
+        self._init_change_tracking()
+    
+    def _init_change_tracking(self, table_names: Tuple[str, ...] = ("lottery_records",)):
+        """在数据库中为已存在的受保护表安装 Merkle 变更跟踪（脏日期桶表和触发器）"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for table_name in table_names:
+                    if table_name in existing:
+                        self.install_change_tracking(conn, table_name)
+        except Exception as e:
+            logger.error(f"安装变更跟踪失败: {e}")
     
     def _init_protection_database(self):
         """初始化保护数据库"""
@@ -171,10 +208,31 @@ class HistoricalDataProtection:
                     )
                 """)
                 
+                # Merkle 树节点：level 0=天，1=月，2=根
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS merkle_nodes (
+                        table_name TEXT NOT NULL,
+                        level INTEGER NOT NULL,
+                        node_key TEXT NOT NULL,
+                        digest TEXT NOT NULL,
+                        row_count INTEGER NOT NULL,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (table_name, level, node_key)
+                    )
+                """)
+                
                 # 创建索引
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_check_time ON integrity_checks(check_time)")
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_backup_time ON backup_records(backup_time)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_data_hash ON data_hashes(record_id, table_name)")
+                
+                # 叶子哈希按 (record_id, table_name) 唯一，INSERT OR REPLACE 才会覆盖而不是追加
+                conn.execute("""
+                    DELETE FROM data_hashes WHERE id NOT IN (
+                        SELECT MAX(id) FROM data_hashes GROUP BY record_id, table_name
+                    )
+                """)
+                conn.execute("DROP INDEX IF EXISTS idx_data_hash")
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_data_hash_record ON data_hashes(record_id, table_name)")
                 
                 conn.commit()
                 logger.info("数据保护数据库初始化完成")
@@ -256,38 +314,57 @@ class HistoricalDataProtection:
             )
         ]
     
-    def create_backup(self, backup_type: str = "full", compression: bool = True) -> BackupInfo:
-        """创建数据备份"""
+    def create_backup(self, backup_type: str = "full", compression: bool = True,
+                      chunk_rows: int = BACKUP_CHUNK_ROWS) -> BackupInfo:
+        """创建数据备份
+
+        游标按 chunk_rows 条流式读取，每块编码后在线程池中并行压缩，
+        按顺序追加到同一个备份文件（压缩时为多成员gzip），并写出分块清单。
+        内存中最多保留 2 * backup_workers 个在途分块，与历史数据量无关。
+        """
         try:
             self.protection_stats['total_backups'] += 1
             
-            backup_id = f"backup_{backup_type}_{int(time.time())}"
+            backup_id = f"backup_{backup_type}_{int(time.time() * 1000)}"
             backup_time = datetime.now()
             
             # 确定备份文件路径
-            file_extension = ".gz" if compression else ".sql"
+            file_extension = ".gz" if compression else ".jsonl"
             backup_file = self.backup_dir / f"{backup_id}{file_extension}"
             
             logger.info(f"开始创建{backup_type}备份: {backup_id}")
             
-            # 获取数据
-            records = self._get_backup_data(backup_type)
-            record_count = len(records)
+            with sqlite3.connect(self.db_path) as conn:
+                query, params, since, since_rowid, high_water_rowid = self._get_backup_query(conn, backup_type)
+                cursor = conn.execute(query, params)
+                columns = [description[0] for description in cursor.description]
+                chunks, checksum = self._write_backup_chunks(cursor, columns, backup_file,
+                                                             compression, chunk_rows)
+                schema_row = conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lottery_records'"
+                ).fetchone()
             
-            # 生成SQL备份内容
-            sql_content = self._generate_backup_sql(records)
+            record_count = sum(chunk['rows'] for chunk in chunks)
             
-            # 写入文件（可选压缩）
-            if compression:
-                with gzip.open(backup_file, 'wt', encoding='utf-8') as f:
-                    f.write(sql_content)
-            else:
-                with open(backup_file, 'w', encoding='utf-8') as f:
-                    f.write(sql_content)
+            manifest = {
+                'version': BACKUP_MANIFEST_VERSION,
+                'backup_id': backup_id,
+                'backup_type': backup_type,
+                'backup_time': backup_time.isoformat(),
+                'table': 'lottery_records',
+                'schema_sql': schema_row[0] if schema_row else None,
+                'columns': columns,
+                'compression': compression,
+                'chunk_rows': chunk_rows,
+                'since': since,
+                'since_rowid': since_rowid,
+                'high_water_rowid': high_water_rowid,
+                'record_count': record_count,
+                'chunks': chunks
+            }
+            self._write_manifest(backup_file, manifest)
             
-            # 计算文件大小和校验和
             file_size = backup_file.stat().st_size
-            checksum = self._calculate_file_checksum(backup_file)
             
             # 创建备份信息
             backup_info = BackupInfo(
@@ -308,7 +385,8 @@ class HistoricalDataProtection:
             # 更新统计
             self.protection_stats['successful_backups'] += 1
             
-            logger.info(f"备份创建完成: {backup_id}, 记录数: {record_count}, 文件大小: {file_size} bytes")
+            logger.info(f"备份创建完成: {backup_id}, 记录数: {record_count}, "
+                        f"分块数: {len(chunks)}, 文件大小: {file_size} bytes")
             
             return backup_info
             
@@ -329,104 +407,183 @@ class HistoricalDataProtection:
                 status="failed"
             )
     
-    def _get_backup_data(self, backup_type: str) -> List[LotteryRecord]:
-        """获取备份数据"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                if backup_type == "full":
-                    # 全量备份
-                    cursor = conn.execute("""
-                        SELECT * FROM lottery_records ORDER BY timestamp
-                    """)
-                elif backup_type == "incremental":
-                    # 增量备份（最近1小时的数据）
-                    cutoff_time = datetime.now() - timedelta(hours=1)
-                    cursor = conn.execute("""
-                        SELECT * FROM lottery_records 
-                        WHERE timestamp > ? ORDER BY timestamp
-                    """, (cutoff_time.isoformat(),))
-                elif backup_type == "differential":
-                    # 差异备份（最近24小时的数据）
-                    cutoff_time = datetime.now() - timedelta(days=1)
-                    cursor = conn.execute("""
-                        SELECT * FROM lottery_records 
-                        WHERE timestamp > ? ORDER BY timestamp
-                    """, (cutoff_time.isoformat(),))
-                else:
-                    raise ValueError(f"不支持的备份类型: {backup_type}")
-                
-                rows = cursor.fetchall()
-                
-                # 转换为LotteryRecord对象
-                records = []
-                for row in rows:
-                    try:
-                        numbers = json.loads(row[2]) if row[2] else []
-                        timestamp = datetime.fromisoformat(row[7]) if row[7] else datetime.now()
-                        
-                        record = LotteryRecord(
-                            draw_id=row[0],
-                            issue=row[1],
-                            numbers=numbers,
-                            sum_value=row[3],
-                            big_small=row[4],
-                            odd_even=row[5],
-                            dragon_tiger=row[6],
-                            timestamp=timestamp
-                        )
-                        records.append(record)
-                    except Exception as e:
-                        logger.warning(f"解析记录失败: {e}, 跳过记录: {row[0]}")
-                        continue
+    def _get_backup_query(self, conn: sqlite3.Connection,
+                          backup_type: str) -> Tuple[str, tuple, Optional[str], Optional[int], int]:
+        """生成备份查询，返回 (SQL, 参数, 回退起始时间, 起始rowid, 高水位rowid)
+
+        高水位记录写入顺序（rowid）而不是开奖时间：补录的旧期号、INSERT OR REPLACE 重写的记录
+        都会分配新的 rowid，即使开奖时间早于上次备份也会被下一次增量备份带上。
+        就地 UPDATE 不改变 rowid，只由全量备份覆盖。
+        
+        增量备份从最近一次备份清单的高水位开始，差异备份从最近一次全量备份的高水位开始；
+        找不到清单时分别退回开奖时间在最近1小时和最近24小时内的记录。
+        查询上限为开始时的 MAX(rowid)，备份期间新写入的行留给下一次增量备份。
+        """
+        high_water_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM lottery_records").fetchone()[0]
+        
+        if backup_type in ("full", "emergency"):
+            return ("SELECT * FROM lottery_records WHERE rowid <= ? ORDER BY timestamp",
+                    (high_water_rowid,), None, None, high_water_rowid)
+        
+        if backup_type == "incremental":
+            manifest = self._get_latest_manifest(("full", "incremental", "differential", "emergency"))
+            fallback = datetime.now() - timedelta(hours=1)
+        elif backup_type == "differential":
+            manifest = self._get_latest_manifest(("full", "emergency"))
+            fallback = datetime.now() - timedelta(days=1)
+        else:
+            raise ValueError(f"不支持的备份类型: {backup_type}")
+        
+        since_rowid = manifest.get('high_water_rowid') if manifest else None
+        if since_rowid is not None:
+            return ("SELECT * FROM lottery_records WHERE rowid > ? AND rowid <= ? ORDER BY timestamp",
+                    (since_rowid, high_water_rowid), None, since_rowid, high_water_rowid)
+        
+        since = fallback.isoformat()
+        return ("SELECT * FROM lottery_records WHERE timestamp > ? AND rowid <= ? ORDER BY timestamp",
+                (since, high_water_rowid), since, None, high_water_rowid)
+    
+    def _write_backup_chunks(self, cursor: sqlite3.Cursor, columns: List[str], backup_file: Path,
+                             compression: bool, chunk_rows: int) -> Tuple[List[Dict[str, Any]], str]:
+        """流式写出备份分块，返回 (分块清单, 整个文件的MD5)"""
+        key_index = columns.index('draw_id') if 'draw_id' in columns else 0
+        timestamp_index = columns.index('timestamp') if 'timestamp' in columns else None
+        max_pending = max(1, self.backup_workers * 2)
+        
+        chunks = []
+        pending = deque()
+        file_hash = hashlib.md5()
+        
+        with open(backup_file, 'wb') as f, ThreadPoolExecutor(max_workers=self.backup_workers) as executor:
+            def drain(limit: int):
+                # 按提交顺序落盘，保证分块在文件中的顺序与清单一致
+                while len(pending) > limit:
+                    future, meta = pending.popleft()
+                    payload, digest = future.result()
+                    meta['offset'] = f.tell()
+                    meta['length'] = len(payload)
+                    meta['sha256'] = digest
+                    f.write(payload)
+                    file_hash.update(payload)
+                    chunks.append(meta)
+            
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
                 
-                return records
+                meta = {
+                    'index': len(chunks) + len(pending),
+                    'rows': len(rows),
+                    'first_key': rows[0][key_index],
+                    'last_key': rows[-1][key_index]
+                }
+                if timestamp_index is not None:
+                    # 查询按时间排序，首尾即为本块的时间范围
+                    meta['min_timestamp'] = rows[0][timestamp_index]
+                    meta['max_timestamp'] = rows[-1][timestamp_index]
                 
-        except Exception as e:
-            logger.error(f"获取备份数据失败: {e}")
-            return []
+                pending.append((executor.submit(_encode_backup_chunk, rows, compression), meta))
+                drain(max_pending)
+            
+            drain(0)
+        
+        return chunks, file_hash.hexdigest()
     
-    def _generate_backup_sql(self, records: List[LotteryRecord]) -> str:
-        """生成备份SQL"""
+    @staticmethod
+    def _manifest_path(backup_file: Path) -> Path:
+        return Path(f"{backup_file}{BACKUP_MANIFEST_SUFFIX}")
+    
+    def _write_manifest(self, backup_file: Path, manifest: Dict[str, Any]):
+        """写出分块清单（先写临时文件再替换，避免留下半个清单）"""
+        manifest_path = self._manifest_path(backup_file)
+        temp_path = Path(f"{manifest_path}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, default=str)
+        os.replace(temp_path, manifest_path)
+    
+    def _load_manifest(self, backup_info: BackupInfo) -> Optional[Dict[str, Any]]:
+        """读取备份的分块清单"""
+        manifest_path = self._manifest_path(Path(backup_info.file_path))
+        if not manifest_path.exists():
+            return None
         try:
-            sql_lines = [
-                "-- PC28历史数据备份",
-                f"-- 备份时间: {datetime.now().isoformat()}",
-                f"-- 记录数量: {len(records)}",
-                "",
-                "-- 创建表结构",
-                "CREATE TABLE IF NOT EXISTS lottery_records (",
-                "    draw_id TEXT PRIMARY KEY,",
-                "    issue TEXT NOT NULL,",
-                "    numbers TEXT NOT NULL,",
-                "    sum_value INTEGER NOT NULL,",
-                "    big_small TEXT NOT NULL,",
-                "    odd_even TEXT NOT NULL,",
-                "    dragon_tiger TEXT NOT NULL,",
-                "    timestamp DATETIME NOT NULL",
-                ");",
-                "",
-                "-- 插入数据",
-                "BEGIN TRANSACTION;"
-            ]
-            
-            for record in records:
-                numbers_json = json.dumps(record.numbers)
-                timestamp_str = record.timestamp.isoformat()
-                
-                sql_line = f"INSERT OR REPLACE INTO lottery_records VALUES ('{record.draw_id}', '{record.issue}', '{numbers_json}', {record.sum_value}, '{record.big_small}', '{record.odd_even}', '{record.dragon_tiger}', '{timestamp_str}');"
-                sql_lines.append(sql_line)
-            
-            sql_lines.extend([
-                "COMMIT;",
-                "",
-                "-- 备份完成"
-            ])
-            
-            return "\n".join(sql_lines)
-            
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
         except Exception as e:
-            logger.error(f"生成备份SQL失败: {e}")
-            return ""
+            logger.error(f"读取备份清单失败 {manifest_path}: {e}")
+            return None
+    
+    def _get_latest_manifest(self, backup_types: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """获取指定类型中最近一次已完成备份的清单"""
+        placeholders = ",".join("?" * len(backup_types))
+        with sqlite3.connect(self.protection_db) as conn:
+            rows = conn.execute(f"""
+                SELECT file_path FROM backup_records
+                WHERE status = 'completed' AND backup_type IN ({placeholders})
+                ORDER BY backup_time DESC, id DESC
+            """, backup_types).fetchall()
+        
+        for (file_path,) in rows:
+            manifest_path = self._manifest_path(Path(file_path))
+            if manifest_path.exists():
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        return None
+    
+    def _read_backup_chunk(self, f, manifest: Dict[str, Any], meta: Dict[str, Any]) -> List[list]:
+        """读取并校验单个分块，返回行列表"""
+        f.seek(meta['offset'])
+        payload = f.read(meta['length'])
+        if hashlib.sha256(payload).hexdigest() != meta['sha256']:
+            raise ValueError(f"备份分块校验和不匹配: 分块 {meta['index']}")
+        if manifest['compression']:
+            payload = gzip.decompress(payload)
+        return [json.loads(line) for line in payload.decode('utf-8').splitlines() if line]
+    
+    def verify_backup(self, backup_id: str, chunk_index: Optional[int] = None) -> Dict[str, Any]:
+        """校验备份分块，chunk_index 为空时校验全部分块"""
+        result = {
+            'backup_id': backup_id,
+            'valid': False,
+            'chunks_checked': 0,
+            'corrupted_chunks': [],
+            'error': None
+        }
+        
+        backup_info = self._get_backup_info(backup_id)
+        if not backup_info:
+            result['error'] = "未找到备份"
+            return result
+        
+        manifest = self._load_manifest(backup_info)
+        if manifest is None:
+            result['error'] = "备份清单不存在"
+            return result
+        
+        chunks = manifest['chunks']
+        if chunk_index is not None:
+            chunks = [meta for meta in chunks if meta['index'] == chunk_index]
+            if not chunks:
+                result['error'] = f"分块不存在: {chunk_index}"
+                return result
+        
+        try:
+            with open(backup_info.file_path, 'rb') as f:
+                for meta in chunks:
+                    f.seek(meta['offset'])
+                    payload = f.read(meta['length'])
+                    if hashlib.sha256(payload).hexdigest() != meta['sha256']:
+                        result['corrupted_chunks'].append(meta['index'])
+                    result['chunks_checked'] += 1
+        except OSError as e:
+            result['error'] = str(e)
+            return result
+        
+        result['valid'] = not result['corrupted_chunks']
+        if not result['valid']:
+            logger.warning(f"备份 {backup_id} 存在损坏分块: {result['corrupted_chunks']}")
+        return result
     
     def _calculate_file_checksum(self, file_path: Path) -> str:
         """计算文件校验和"""
@@ -464,8 +621,13 @@ class HistoricalDataProtection:
         except Exception as e:
             logger.error(f"保存备份记录失败: {e}")
     
-    def verify_data_integrity(self, table_name: str = "lottery_records") -> DataIntegrityCheck:
-        """验证数据完整性"""
+    def verify_data_integrity(self, table_name: str = "lottery_records",
+                              full_hash_scan: bool = False) -> DataIntegrityCheck:
+        """验证数据完整性
+
+        哈希校验基于增量维护的 Merkle 索引，只重新校验触发器标记过的日期桶；
+        绕过触发器的静默损坏只有 full_hash_scan=True 全表重新校验时才能发现
+        """
         try:
             self.protection_stats['total_integrity_checks'] += 1
             
@@ -492,7 +654,7 @@ class HistoricalDataProtection:
                 missing_records = self._check_missing_records(conn, table_name)
                 
                 # 检查哈希不匹配
-                hash_mismatches = self._check_hash_integrity(conn, table_name)
+                hash_mismatches = self._check_hash_integrity(conn, table_name, full_hash_scan)
                 
                 # 计算完整性得分
                 integrity_score = self._calculate_integrity_score(
@@ -607,30 +769,197 @@ class HistoricalDataProtection:
             logger.error(f"检查缺失记录失败: {e}")
             return 0
     
-    def _check_hash_integrity(self, conn: sqlite3.Connection, table_name: str) -> int:
-        """检查哈希完整性"""
+    @staticmethod
+    def _leaf_hash(draw_id: Any, numbers: Any, sum_value: Any, timestamp: Any) -> str:
+        """单条记录的哈希（Merkle 树叶子）"""
+        data_str = f"{draw_id}|{numbers}|{sum_value}|{timestamp}"
+        return hashlib.md5(data_str.encode()).hexdigest()
+    
+    @staticmethod
+    def _node_digest(children: List[Tuple[str, str]]) -> str:
+        """由按键排序的 (子节点键, 子节点摘要) 计算父节点摘要"""
+        digest = hashlib.md5()
+        for key, child_digest in children:
+            digest.update(f"{key}:{child_digest}\n".encode())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _tracking_triggers(table_name: str) -> List[str]:
+        return [f"trg_{table_name}_merkle_{event}" for event in ("insert", "update", "delete", "count")]
+    
+    def install_change_tracking(self, conn: sqlite3.Connection, table_name: str):
+        """在数据表上安装触发器，写入时把受影响的日期桶标记为脏并维护行数（在调用方事务中执行，由调用方提交）
+        
+        行数在 BEFORE INSERT 中按主键是否已存在加 1 或不变（INSERT OR REPLACE/IGNORE 覆盖已有行时行数不变），
+        DELETE 时减 1；旧版本安装的触发器没有行数维护，首次升级时重建并按现有数据初始化行数
+        """
+        bucket = "COALESCE(substr({}.timestamp, 1, 10), '')"
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS merkle_dirty_buckets (
+                table_name TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                PRIMARY KEY (table_name, bucket)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS merkle_row_counts (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            )
+        """)
+        if conn.execute("SELECT 1 FROM merkle_row_counts WHERE table_name = ?", (table_name,)).fetchone() is None:
+            for trigger in self._tracking_triggers(table_name):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(f"INSERT INTO merkle_row_counts SELECT ?, COUNT(*) FROM {table_name}", (table_name,))
+        
+        for event, refs in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            marks = "".join(
+                f"INSERT OR IGNORE INTO merkle_dirty_buckets VALUES ('{table_name}', {bucket.format(ref)}); "
+                for ref in refs
+            )
+            if event == "DELETE":
+                marks += f"UPDATE merkle_row_counts SET row_count = row_count - 1 WHERE table_name = '{table_name}'; "
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table_name}_merkle_{event.lower()}
+                AFTER {event} ON {table_name}
+                BEGIN {marks}END
+            """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table_name}_merkle_count
+            BEFORE INSERT ON {table_name}
+            BEGIN
+                UPDATE merkle_row_counts
+                SET row_count = row_count + 1 - EXISTS (SELECT 1 FROM {table_name} WHERE draw_id = NEW.draw_id)
+                WHERE table_name = '{table_name}';
+            END
+        """)
+    
+    def _change_tracking_installed(self, conn: sqlite3.Connection, table_name: str) -> bool:
+        """脏桶表、行数表和四个触发器是否都存在"""
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+        return ({'merkle_dirty_buckets', 'merkle_row_counts'} <= names
+                and all(t in names for t in self._tracking_triggers(table_name)))
+    
+    def _stored_root_consistent(self, pconn: sqlite3.Connection, table_name: str) -> bool:
+        """由已存的天摘要重新计算月节点和根节点，与已存的根比较
+        
+        只读 merkle_nodes 的天节点，不扫描数据表；能发现索引本身被改写或损坏，
+        但数据表绕过触发器的修改（如直接改文件、触发器被删除期间的写入）只有全表扫描能发现
+        """
+        months: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        total = 0
+        for key, digest, row_count in pconn.execute("""
+            SELECT node_key, digest, row_count FROM merkle_nodes
+            WHERE table_name = ? AND level = 0 ORDER BY node_key
+        """, (table_name,)):
+            months[key[:7]].append((key, digest))
+            total += row_count
+        
+        expected = self._node_digest([(month, self._node_digest(days)) for month, days in sorted(months.items())])
+        root = pconn.execute("""
+            SELECT digest, row_count FROM merkle_nodes
+            WHERE table_name = ? AND level = 2 AND node_key = ''
+        """, (table_name,)).fetchone()
+        return root is not None and tuple(root) == (expected, total)
+    
+    def _check_hash_integrity(self, conn: sqlite3.Connection, table_name: str,
+                              full_scan: bool = False) -> int:
+        """检查哈希完整性
+
+        按日期桶维护持久化的 Merkle 树（记录 -> 天 -> 月 -> 根），
+        只重新计算触发器标记为脏的日期桶；桶摘要与已存摘要不一致时才下钻比较记录哈希。
+        没有脏桶时由已存的天摘要重算根节点，并与触发器维护的行数核对，不扫描数据表。
+        首次运行、未安装变更跟踪、根节点或记录数不符、或 full_scan=True 时全表重建。
+        有哈希不匹配的桶保持为脏，下次检查仍会报告。
+        
+        注意：增量校验只覆盖经过触发器的写入，静默损坏（绕过触发器的修改、文件级损坏）
+        只有 full_scan=True 才能发现。
+        """
         try:
-            # 获取所有记录和对应的哈希
-            cursor = conn.execute(f"""
-                SELECT lr.draw_id, lr.numbers, lr.sum_value, lr.timestamp, dh.data_hash
-                FROM {table_name} lr
-                LEFT JOIN data_hashes dh ON lr.draw_id = dh.record_id AND dh.table_name = ?
-            """, (table_name,))
+            tracked = self._change_tracking_installed(conn, table_name)
+            if not tracked:
+                logger.warning(f"{table_name} 未安装变更跟踪，执行全表哈希校验")
+                full_scan = True
             
-            mismatches = 0
-            
-            for row in cursor.fetchall():
-                draw_id, numbers, sum_value, timestamp, stored_hash = row
+            with sqlite3.connect(self.protection_db) as pconn:
+                root = pconn.execute("""
+                    SELECT row_count FROM merkle_nodes
+                    WHERE table_name = ? AND level = 2 AND node_key = ''
+                """, (table_name,)).fetchone()
+                
+                dirty = [row[0] for row in conn.execute(
+                    "SELECT bucket FROM merkle_dirty_buckets WHERE table_name = ?", (table_name,)
+                )] if tracked else []
                 
-                # 计算当前数据的哈希
-                data_str = f"{draw_id}|{numbers}|{sum_value}|{timestamp}"
-                current_hash = hashlib.md5(data_str.encode()).hexdigest()
+                if len(dirty) > MERKLE_MAX_DIRTY_BUCKETS:
+                    full_scan = True
                 
-                if stored_hash and stored_hash != current_hash:
-                    mismatches += 1
-                elif not stored_hash:
-                    # 如果没有存储哈希，创建一个
-                    self._store_data_hash(draw_id, table_name, current_hash)
+                if not full_scan and root is not None:
+                    if not self._stored_root_consistent(pconn, table_name):
+                        logger.warning(f"{table_name} Merkle根与天摘要重算结果不一致，重建哈希索引")
+                        full_scan = True
+                    elif not dirty:
+                        counted = conn.execute(
+                            "SELECT row_count FROM merkle_row_counts WHERE table_name = ?", (table_name,)
+                        ).fetchone()
+                        if counted is not None and counted[0] == root[0]:
+                            return 0
+                        logger.warning(f"{table_name} 记录数与Merkle根不一致，重建哈希索引")
+                        full_scan = True
+                else:
+                    full_scan = True
+                
+                # 先清除脏标记再扫描，扫描期间新写入的行会重新标记
+                if not tracked:
+                    buckets = None
+                elif full_scan:
+                    # 全表重建时顺带校正行数（与清除脏标记在同一事务中）
+                    conn.execute("DELETE FROM merkle_dirty_buckets WHERE table_name = ?", (table_name,))
+                    conn.execute(
+                        f"UPDATE merkle_row_counts SET row_count = (SELECT COUNT(*) FROM {table_name}) "
+                        f"WHERE table_name = ?", (table_name,)
+                    )
+                    buckets = None
+                else:
+                    conn.executemany(
+                        "DELETE FROM merkle_dirty_buckets WHERE table_name = ? AND bucket = ?",
+                        [(table_name, bucket) for bucket in dirty]
+                    )
+                    buckets = set(dirty)
+                conn.commit()
+                
+                mismatches = 0
+                still_dirty = []
+                seen = set()
+                for bucket, rows in self._iter_bucket_rows(conn, table_name, buckets):
+                    seen.add(bucket)
+                    bucket_mismatches = self._verify_bucket(pconn, table_name, bucket, rows)
+                    if bucket_mismatches:
+                        mismatches += bucket_mismatches
+                        still_dirty.append(bucket)
+                
+                # 已清空的桶
+                if full_scan:
+                    stale = [row[0] for row in pconn.execute(
+                        "SELECT node_key FROM merkle_nodes WHERE table_name = ? AND level = 0", (table_name,)
+                    ) if row[0] not in seen]
+                else:
+                    stale = [bucket for bucket in buckets if bucket not in seen]
+                pconn.executemany(
+                    "DELETE FROM merkle_nodes WHERE table_name = ? AND level = 0 AND node_key = ?",
+                    [(table_name, bucket) for bucket in stale]
+                )
+                
+                months = {bucket[:7] for bucket in seen} | {bucket[:7] for bucket in stale}
+                self._update_upper_nodes(pconn, table_name, months, full_scan)
+                pconn.commit()
+            
+            if still_dirty and tracked:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO merkle_dirty_buckets VALUES (?, ?)",
+                    [(table_name, bucket) for bucket in still_dirty]
+                )
+                conn.commit()
             
             return mismatches
             
@@ -638,18 +967,114 @@ class HistoricalDataProtection:
             logger.error(f"检查哈希完整性失败: {e}")
             return 0
     
-    def _store_data_hash(self, record_id: str, table_name: str, data_hash: str):
-        """存储数据哈希"""
-        try:
-            with sqlite3.connect(self.protection_db) as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO data_hashes 
-                    (record_id, table_name, data_hash, updated_at)
-                    VALUES (?, ?, ?, ?)
-                """, (record_id, table_name, data_hash, datetime.now()))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"存储数据哈希失败: {e}")
+    def _iter_bucket_rows(self, conn: sqlite3.Connection, table_name: str,
+                          buckets: Optional[Set[str]]):
+        """一次扫描按日期桶分组产出记录，buckets 为空时扫描全表"""
+        bucket_expr = "COALESCE(substr(timestamp, 1, 10), '')"
+        query = f"SELECT {bucket_expr}, draw_id, numbers, sum_value, timestamp FROM {table_name}"
+        params: tuple = ()
+        if buckets is not None:
+            if not buckets:
+                return
+            query += f" WHERE {bucket_expr} IN ({','.join('?' * len(buckets))})"
+            params = tuple(buckets)
+        query += f" ORDER BY {bucket_expr}"
+        
+        current, rows = None, []
+        for bucket, draw_id, numbers, sum_value, timestamp in conn.execute(query, params):
+            if bucket != current and rows:
+                yield current, rows
+                rows = []
+            current = bucket
+            rows.append((str(draw_id), self._leaf_hash(draw_id, numbers, sum_value, timestamp)))
+        if rows:
+            yield current, rows
+    
+    def _verify_bucket(self, pconn: sqlite3.Connection, table_name: str, bucket: str,
+                       rows: List[Tuple[str, str]]) -> int:
+        """比较一个日期桶，补写缺失的叶子哈希并更新桶节点，返回不匹配数"""
+        rows.sort()
+        current_digest = self._node_digest(rows)
+        stored = pconn.execute("""
+            SELECT digest FROM merkle_nodes WHERE table_name = ? AND level = 0 AND node_key = ?
+        """, (table_name, bucket)).fetchone()
+        if stored and stored[0] == current_digest:
+            return 0
+        
+        # 摘要不同，下钻到记录哈希
+        stored_hashes = {}
+        for start in range(0, len(rows), 900):
+            chunk = [draw_id for draw_id, _ in rows[start:start + 900]]
+            stored_hashes.update(pconn.execute(f"""
+                SELECT record_id, data_hash FROM data_hashes
+                WHERE table_name = ? AND record_id IN ({','.join('?' * len(chunk))})
+            """, (table_name, *chunk)))
+        
+        mismatches = 0
+        missing = []
+        accepted = []
+        for draw_id, current_hash in rows:
+            stored_hash = stored_hashes.get(draw_id)
+            if stored_hash is None:
+                missing.append((draw_id, table_name, current_hash, datetime.now()))
+                stored_hash = current_hash
+            elif stored_hash != current_hash:
+                mismatches += 1
+            accepted.append((draw_id, stored_hash))
+        
+        if missing:
+            pconn.executemany("""
+                INSERT OR REPLACE INTO data_hashes (record_id, table_name, data_hash, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, missing)
+        
+        # 桶节点记录已确认的哈希，不匹配的记录在修复前会持续报告
+        pconn.execute("""
+            INSERT OR REPLACE INTO merkle_nodes (table_name, level, node_key, digest, row_count, updated_at)
+            VALUES (?, 0, ?, ?, ?, ?)
+        """, (table_name, bucket, self._node_digest(accepted), len(accepted), datetime.now()))
+        return mismatches
+    
+    def _update_upper_nodes(self, pconn: sqlite3.Connection, table_name: str,
+                            months: Set[str], full_scan: bool):
+        """由日期桶重新计算受影响的月节点和根节点"""
+        if full_scan:
+            pconn.execute("DELETE FROM merkle_nodes WHERE table_name = ? AND level = 1", (table_name,))
+        
+        for month in months:
+            children = pconn.execute("""
+                SELECT node_key, digest, row_count FROM merkle_nodes
+                WHERE table_name = ? AND level = 0 AND substr(node_key, 1, 7) = ?
+                ORDER BY node_key
+            """, (table_name, month)).fetchall()
+            if children:
+                pconn.execute("""
+                    INSERT OR REPLACE INTO merkle_nodes (table_name, level, node_key, digest, row_count, updated_at)
+                    VALUES (?, 1, ?, ?, ?, ?)
+                """, (table_name, month, self._node_digest([(key, digest) for key, digest, _ in children]),
+                      sum(count for _, _, count in children), datetime.now()))
+            else:
+                pconn.execute("""
+                    DELETE FROM merkle_nodes WHERE table_name = ? AND level = 1 AND node_key = ?
+                """, (table_name, month))
+        
+        months_rows = pconn.execute("""
+            SELECT node_key, digest, row_count FROM merkle_nodes
+            WHERE table_name = ? AND level = 1 ORDER BY node_key
+        """, (table_name,)).fetchall()
+        pconn.execute("""
+            INSERT OR REPLACE INTO merkle_nodes (table_name, level, node_key, digest, row_count, updated_at)
+            VALUES (?, 2, '', ?, ?, ?)
+        """, (table_name, self._node_digest([(key, digest) for key, digest, _ in months_rows]),
+              sum(count for _, _, count in months_rows), datetime.now()))
+    
+    def get_merkle_root(self, table_name: str = "lottery_records") -> Optional[str]:
+        """获取表的Merkle根摘要"""
+        with sqlite3.connect(self.protection_db) as conn:
+            row = conn.execute("""
+                SELECT digest FROM merkle_nodes WHERE table_name = ? AND level = 2 AND node_key = ''
+            """, (table_name,)).fetchone()
+        return row[0] if row else None
     
     def _calculate_integrity_score(self, total: int, corrupted: int, missing: int, 
                                  duplicates: int, hash_mismatches: int) -> float:
@@ -695,8 +1120,14 @@ class HistoricalDataProtection:
         except Exception as e:
             logger.error(f"保存完整性检查结果失败: {e}")
     
-    def restore_from_backup(self, backup_id: str, target_table: str = "lottery_records") -> bool:
-        """从备份恢复数据"""
+    def restore_from_backup(self, backup_id: str, target_table: str = "lottery_records",
+                            batch_size: int = 1000) -> bool:
+        """从备份恢复数据
+
+        逐个分块读取、校验并批量插入，整个恢复在一个事务中完成。
+        全量备份先清空目标表；增量/差异备份按主键覆盖写入，不清空。
+        没有清单的旧格式备份（整份 SQL 转储）逐条执行其中的语句恢复。
+        """
         try:
             self.protection_stats['data_recovery_operations'] += 1
             
@@ -720,34 +1151,30 @@ class HistoricalDataProtection:
                 logger.error(f"备份文件校验和不匹配: {current_checksum} != {backup_info.checksum}")
                 return False
             
-            # 读取备份内容
-            if backup_info.compression:
-                with gzip.open(backup_file, 'rt', encoding='utf-8') as f:
-                    sql_content = f.read()
-            else:
-                with open(backup_file, 'r', encoding='utf-8') as f:
-                    sql_content = f.read()
+            manifest = self._load_manifest(backup_info)
+            if manifest is None:
+                logger.info(f"备份没有清单，按旧格式 SQL 转储恢复: {backup_id}")
+            
+            replace_all = backup_info.backup_type in ("full", "emergency")
+            
+            # 备份当前数据（以防恢复失败）
+            if replace_all:
+                self.create_backup("emergency")
             
-            # 执行恢复
             with sqlite3.connect(self.db_path) as conn:
-                # 备份当前数据（以防恢复失败）
-                temp_backup = self.create_backup("emergency")
-                
                 try:
-                    # 清空目标表
-                    conn.execute(f"DELETE FROM {target_table}")
-                    
-                    # 执行恢复SQL
-                    conn.executescript(sql_content)
-                    
+                    if manifest is None:
+                        restored = self._restore_sql_dump(conn, backup_file, backup_info.compression,
+                                                          target_table, replace_all)
+                    else:
+                        restored = self._restore_chunks(conn, backup_file, manifest, target_table,
+                                                        manifest['chunks'], replace_all, batch_size)
                     conn.commit()
                     
                     # 记录恢复操作
-                    self._record_recovery_operation(
-                        backup_id, target_table, backup_info.record_count, "success"
-                    )
+                    self._record_recovery_operation(backup_id, target_table, restored, "success")
                     
-                    logger.info(f"数据恢复成功: {backup_info.record_count} 条记录")
+                    logger.info(f"数据恢复成功: {restored} 条记录")
                     return True
                     
                 except Exception as e:
@@ -766,6 +1193,94 @@ class HistoricalDataProtection:
             logger.error(f"恢复数据失败: {e}")
             return False
     
+    def restore_chunk(self, backup_id: str, chunk_index: int,
+                      target_table: str = "lottery_records", batch_size: int = 1000) -> int:
+        """只恢复备份中的单个分块（按主键覆盖写入），返回恢复的记录数"""
+        backup_info = self._get_backup_info(backup_id)
+        if not backup_info:
+            raise ValueError(f"未找到备份: {backup_id}")
+        
+        manifest = self._load_manifest(backup_info)
+        if manifest is None:
+            raise ValueError(f"备份清单不存在: {backup_id}")
+        
+        chunks = [meta for meta in manifest['chunks'] if meta['index'] == chunk_index]
+        if not chunks:
+            raise ValueError(f"分块不存在: {chunk_index}")
+        
+        with sqlite3.connect(self.db_path) as conn:
+            restored = self._restore_chunks(conn, Path(backup_info.file_path), manifest,
+                                            target_table, chunks, False, batch_size)
+            conn.commit()
+        
+        self._record_recovery_operation(backup_id, target_table, restored, "success")
+        logger.info(f"分块恢复完成: {backup_id}#{chunk_index}, {restored} 条记录")
+        return restored
+    
+    def _restore_chunks(self, conn: sqlite3.Connection, backup_file: Path, manifest: Dict[str, Any],
+                        target_table: str, chunks: List[Dict[str, Any]], replace_all: bool,
+                        batch_size: int) -> int:
+        """在调用方事务中写入分块数据，由调用方提交或回滚"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (target_table,)
+        ).fetchone()
+        if not exists:
+            if target_table != manifest['table'] or not manifest.get('schema_sql'):
+                raise ValueError(f"目标表不存在: {target_table}")
+            conn.execute(manifest['schema_sql'])
+            self.install_change_tracking(conn, target_table)
+        
+        if replace_all:
+            conn.execute(f"DELETE FROM {target_table}")
+        
+        columns = manifest['columns']
+        insert_sql = (f"INSERT OR REPLACE INTO {target_table} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' * len(columns))})")
+        
+        restored = 0
+        with open(backup_file, 'rb') as f:
+            for meta in chunks:
+                rows = self._read_backup_chunk(f, manifest, meta)
+                for start in range(0, len(rows), batch_size):
+                    conn.executemany(insert_sql, rows[start:start + batch_size])
+                restored += len(rows)
+        return restored
+    
+    def _restore_sql_dump(self, conn: sqlite3.Connection, backup_file: Path, compression: bool,
+                          target_table: str, replace_all: bool) -> int:
+        """在调用方事务中执行旧格式 SQL 转储，由调用方提交或回滚
+        
+        转储自带 BEGIN/COMMIT，executescript 会在中途提交导致无法回滚，因此逐条执行并跳过事务语句。
+        """
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (target_table,)
+        ).fetchone()
+        if replace_all and existed:
+            conn.execute(f"DELETE FROM {target_table}")
+        
+        opener = gzip.open if compression else open
+        restored = 0
+        statement = ""
+        with opener(backup_file, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not statement and (not line.strip() or line.lstrip().startswith('--')):
+                    continue
+                statement += line
+                if not sqlite3.complete_statement(statement):
+                    continue
+                keyword = statement.split(None, 1)[0].upper()
+                if keyword not in ("BEGIN", "COMMIT", "END"):
+                    conn.execute(statement)
+                    if keyword == "INSERT":
+                        restored += 1
+                statement = ""
+        
+        if not existed and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (target_table,)
+        ).fetchone():
+            self.install_change_tracking(conn, target_table)
+        return restored
+    
     def _get_backup_info(self, backup_id: str) -> Optional[BackupInfo]:
         """获取备份信息"""
         try:
@@ -841,6 +1356,9 @@ class HistoricalDataProtection:
                         backup_file = Path(file_path)
                         if backup_file.exists():
                             backup_file.unlink()
+                        manifest_path = self._manifest_path(backup_file)
+                        if manifest_path.exists():
+                            manifest_path.unlink()
                         
                         # 更新数据库记录
                         conn.execute("""
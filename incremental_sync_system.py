@@ -45,6 +45,8 @@ class SyncConfig:
     max_retry_attempts: int = 3
     compression_enabled: bool = True
     checksum_validation: bool = True
+    detection_batch_size: int = 1000
+    full_reconcile_interval: int = 0  # 每N个同步周期执行一次全表校验和比对，0表示关闭
 
 @dataclass
 class SyncRecord:
@@ -80,6 +82,8 @@ class IncrementalSyncSystem:
         self.is_running = False
         self.sync_thread = None
         self.current_metrics = None
+        self.sync_cycles = 0
+        self._pending_watermarks: Dict[str, str] = {}
         
         # 初始化同步系统
         self._init_sync_system()
@@ -157,6 +161,15 @@ class IncrementalSyncSystem:
                 )
             ''')
             
+            # 创建变更检测水位表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_watermarks (
+                    table_name TEXT PRIMARY KEY,
+                    last_modified TEXT NOT NULL,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
             # 创建索引
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_metadata_table_record ON sync_metadata(table_name, record_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_metadata_status ON sync_metadata(sync_status)')
@@ -195,91 +208,158 @@ class IncrementalSyncSystem:
         import gzip
         return gzip.decompress(compressed_data).decode('utf-8')
     
-    def detect_changes(self, table_name: str) -> List[SyncRecord]:
-        """检测数据变更"""
+    def get_watermark(self, table_name: str) -> Optional[str]:
+        """获取表的变更检测水位(最后修改时间)"""
+        conn = sqlite3.connect(self.config.target_database)
+        try:
+            row = conn.execute(
+                'SELECT last_modified FROM sync_watermarks WHERE table_name = ?', (table_name,)
+            ).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    
+    def _commit_watermark(self, table_name: str, hold_at: Optional[str] = None):
+        """表同步结束后推进水位
+        
+        hold_at: 未能登记失败状态的记录中最小的修改时间，水位不越过它，下次扫描会重新检出
+        """
+        watermark = self._pending_watermarks.pop(table_name, None)
+        if hold_at and (not watermark or hold_at < watermark):
+            watermark = hold_at
+        if not watermark:
+            return
+        
+        conn = sqlite3.connect(self.config.target_database)
         try:
-            logger.info(f"检测表 {table_name} 的数据变更...")
+            conn.execute('''
+                INSERT INTO sync_watermarks (table_name, last_modified, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(table_name) DO UPDATE SET
+                    last_modified = MAX(sync_watermarks.last_modified, excluded.last_modified),
+                    updated_at = excluded.updated_at
+            ''', (table_name, watermark, datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def detect_changes(self, table_name: str, full_scan: bool = False) -> List[SyncRecord]:
+        """检测数据变更
+        
+        默认只扫描 COALESCE(updated_at, created_at) >= 水位 的记录，并通过 ATTACH
+        目标库一次性 LEFT JOIN sync_metadata 比对校验和；失败待重试的记录单独补查。
+        full_scan=True 时扫描全表做完整校验和比对。
+        """
+        self._pending_watermarks.pop(table_name, None)
+        source_conn = None
+        try:
+            logger.info(f"检测表 {table_name} 的数据变更{'(全量校验)' if full_scan else ''}...")
             
             changes = []
             
-            # 连接源数据库
             source_conn = sqlite3.connect(self.config.source_database)
-            source_cursor = source_conn.cursor()
-            
-            # 连接目标数据库
-            target_conn = sqlite3.connect(self.config.target_database)
-            target_cursor = target_conn.cursor()
-            
-            # 获取源数据库中的记录
-            source_cursor.execute(f'''
-                SELECT id, created_at, updated_at 
-                FROM {table_name} 
-                ORDER BY updated_at DESC
-            ''')
-            
-            source_records = source_cursor.fetchall()
-            
-            for record in source_records:
-                record_id = str(record[0])
-                last_modified = record[2] if record[2] else record[1]  # 优先使用updated_at
-                
-                # 获取完整记录数据用于校验和计算
-                source_cursor.execute(f'SELECT * FROM {table_name} WHERE id = ?', (record[0],))
-                full_record = source_cursor.fetchone()
-                record_data = json.dumps(full_record, default=str)
-                checksum = self._calculate_checksum(record_data)
-                
-                # 检查目标数据库中的同步状态
-                target_cursor.execute('''
-                    SELECT checksum, sync_status, retry_count 
-                    FROM sync_metadata 
-                    WHERE table_name = ? AND record_id = ?
-                ''', (table_name, record_id))
-                
-                existing_sync = target_cursor.fetchone()
-                
-                if not existing_sync:
-                    # 新记录
-                    changes.append(SyncRecord(
-                        table_name=table_name,
-                        record_id=record_id,
-                        last_modified=last_modified,
-                        checksum=checksum,
-                        sync_status="PENDING"
-                    ))
-                elif existing_sync[0] != checksum:
-                    # 记录已变更
-                    changes.append(SyncRecord(
-                        table_name=table_name,
-                        record_id=record_id,
-                        last_modified=last_modified,
-                        checksum=checksum,
-                        sync_status="PENDING",
-                        retry_count=existing_sync[2] if existing_sync[1] == "FAILED" else 0
-                    ))
-                elif existing_sync[1] == "FAILED" and existing_sync[2] < self.config.max_retry_attempts:
-                    # 失败记录重试
-                    changes.append(SyncRecord(
-                        table_name=table_name,
-                        record_id=record_id,
-                        last_modified=last_modified,
-                        checksum=checksum,
-                        sync_status="PENDING",
-                        retry_count=existing_sync[2]
-                    ))
-            
-            source_conn.close()
-            target_conn.close()
-            
-            logger.info(f"检测到 {len(changes)} 条变更记录")
+            source_conn.execute('ATTACH DATABASE ? AS target', (self.config.target_database,))
+            cursor = source_conn.cursor()
+            
+            # 确定修改时间字段
+            cursor.execute(f'PRAGMA main.table_info({table_name})')
+            columns = [column[1] for column in cursor.fetchall()]
+            column_count = len(columns)
+            time_columns = [col for col in ('updated_at', 'created_at') if col in columns]
+            if len(time_columns) == 2:
+                modified_expr = 'COALESCE(s.updated_at, s.created_at)'
+            elif time_columns:
+                modified_expr = f's.{time_columns[0]}'
+            else:
+                modified_expr = 'NULL'
+                full_scan = True
+            
+            watermark = None if full_scan else self.get_watermark(table_name)
+            
+            base_sql = f'''
+                SELECT s.*, {modified_expr}, m.checksum, m.sync_status, m.retry_count
+                FROM main.{table_name} s
+                LEFT JOIN target.sync_metadata m
+                  ON m.table_name = ? AND m.record_id = CAST(s.id AS TEXT)
+            '''
+            queries = []
+            if watermark:
+                queries.append((base_sql + f' WHERE {modified_expr} >= ? ORDER BY s.id',
+                                (table_name, watermark)))
+                # 水位之前仍需重试的失败记录
+                queries.append((base_sql + f''' WHERE {modified_expr} < ?
+                                  AND m.sync_status = 'FAILED' AND m.retry_count < ?
+                                ORDER BY s.id''',
+                                (table_name, watermark, self.config.max_retry_attempts)))
+            else:
+                queries.append((base_sql + ' ORDER BY s.id', (table_name,)))
+            
+            max_modified = watermark
+            scanned = 0
+            for sql, params in queries:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(self.config.detection_batch_size)
+                    if not rows:
+                        break
+                    scanned += len(rows)
+                    
+                    for row in rows:
+                        full_record = row[:column_count]
+                        last_modified, existing_checksum, sync_status, retry_count = row[column_count:]
+                        checksum = self._calculate_checksum(json.dumps(full_record, default=str))
+                        record_id = str(full_record[columns.index('id')])
+                        
+                        if last_modified and (max_modified is None or last_modified > max_modified):
+                            max_modified = last_modified
+                        
+                        if existing_checksum is None:
+                            # 新记录
+                            changes.append(SyncRecord(
+                                table_name=table_name,
+                                record_id=record_id,
+                                last_modified=last_modified,
+                                checksum=checksum,
+                                sync_status="PENDING"
+                            ))
+                        elif existing_checksum != checksum:
+                            # 记录已变更
+                            changes.append(SyncRecord(
+                                table_name=table_name,
+                                record_id=record_id,
+                                last_modified=last_modified,
+                                checksum=checksum,
+                                sync_status="PENDING",
+                                retry_count=retry_count if sync_status == "FAILED" else 0
+                            ))
+                        elif sync_status == "FAILED" and retry_count < self.config.max_retry_attempts:
+                            # 失败记录重试
+                            changes.append(SyncRecord(
+                                table_name=table_name,
+                                record_id=record_id,
+                                last_modified=last_modified,
+                                checksum=checksum,
+                                sync_status="PENDING",
+                                retry_count=retry_count
+                            ))
+            
+            if max_modified:
+                self._pending_watermarks[table_name] = max_modified
+            
+            logger.info(f"扫描 {scanned} 条记录，检测到 {len(changes)} 条变更记录")
             return changes
             
         except Exception as e:
             logger.error(f"检测数据变更失败: {e}")
             return []
+        finally:
+            if source_conn is not None:
+                source_conn.close()
     
     def sync_record(self, sync_record: SyncRecord) -> bool:
         """同步单条记录"""
+        source_conn = None
+        target_conn = None
         try:
             # 连接源数据库
             source_conn = sqlite3.connect(self.config.source_database)
@@ -302,11 +382,15 @@ class IncrementalSyncSystem:
             source_cursor.execute(f'PRAGMA table_info({sync_record.table_name})')
             columns = [column[1] for column in source_cursor.fetchall()]
             
-            # 确保目标表存在
-            source_cursor.execute(f'SELECT sql FROM sqlite_master WHERE type="table" AND name="{sync_record.table_name}"')
-            create_sql = source_cursor.fetchone()
-            if create_sql:
-                target_cursor.execute(create_sql[0])
+            # 确保目标表存在（sqlite_master 中的建表语句不带 IF NOT EXISTS，已存在时不能重复执行）
+            target_cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (sync_record.table_name,))
+            if not target_cursor.fetchone():
+                source_cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                      (sync_record.table_name,))
+                create_sql = source_cursor.fetchone()
+                if create_sql:
+                    target_cursor.execute(create_sql[0])
             
             # 插入或更新目标记录
             placeholders = ','.join(['?' for _ in columns])
@@ -333,14 +417,19 @@ class IncrementalSyncSystem:
             ))
             
             target_conn.commit()
-            source_conn.close()
-            target_conn.close()
             
+            sync_record.sync_status = "SYNCED"
             return True
             
         except Exception as e:
             logger.error(f"同步记录失败 {sync_record.table_name}#{sync_record.record_id}: {e}")
             
+            # 先释放本次连接（回滚未提交的写入），否则登记失败状态时目标库仍被锁住
+            for conn in (source_conn, target_conn):
+                if conn is not None:
+                    conn.close()
+            source_conn = target_conn = None
+            
             # 记录失败信息
             try:
                 target_conn = sqlite3.connect(self.config.target_database)
@@ -363,14 +452,30 @@ class IncrementalSyncSystem:
                 
                 target_conn.commit()
                 target_conn.close()
+                # 失败状态已登记，水位之前的记录由重试查询补回
+                sync_record.sync_status = "FAILED"
             except Exception as meta_error:
                 logger.error(f"记录同步失败信息时出错: {meta_error}")
             
             return False
+        finally:
+            for conn in (source_conn, target_conn):
+                if conn is not None:
+                    conn.close()
     
-    def run_incremental_sync(self, tables: List[str] = None) -> SyncMetrics:
-        """运行增量同步"""
-        session_id = f"sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    def run_incremental_sync(self, tables: List[str] = None, full_reconcile: bool = False) -> SyncMetrics:
+        """运行增量同步
+        
+        Args:
+            tables: 要同步的表
+            full_reconcile: 忽略水位，全表比对校验和；
+                配置 full_reconcile_interval 后也会按周期自动触发
+        """
+        self.sync_cycles += 1
+        if self.config.full_reconcile_interval > 0 and self.sync_cycles % self.config.full_reconcile_interval == 0:
+            full_reconcile = True
+        
+        session_id = f"sync_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
         start_time = datetime.now()
         
         logger.info(f"开始增量同步会话: {session_id}")
@@ -403,8 +508,9 @@ class IncrementalSyncSystem:
                 logger.info(f"同步表: {table_name}")
                 
                 # 检测变更
-                changes = self.detect_changes(table_name)
+                changes = self.detect_changes(table_name, full_scan=full_reconcile)
                 metrics.total_records += len(changes)
+                hold_at = None
                 
                 # 批量同步
                 for i in range(0, len(changes), self.config.batch_size):
@@ -415,9 +521,16 @@ class IncrementalSyncSystem:
                             metrics.synced_records += 1
                         else:
                             metrics.failed_records += 1
+                            # 失败未能登记到 sync_metadata 的记录不会被重试查询检出，水位需停在它之前
+                            if sync_record.sync_status != "FAILED" and sync_record.last_modified:
+                                if hold_at is None or sync_record.last_modified < hold_at:
+                                    hold_at = sync_record.last_modified
                     
                     # 批次间短暂休息
                     time.sleep(0.1)
+                
+                # 已登记的失败记录由重试查询补回；未登记的失败记录限制水位推进
+                self._commit_watermark(table_name, hold_at=hold_at)
             
             # 计算同步指标
             metrics.end_time = datetime.now()
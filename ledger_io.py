@@ -1,8 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, json, subprocess, shlex, time, datetime
-from typing import Dict, Any, List
+import os, json, subprocess, shlex, time, datetime, math, threading
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+# 单条 MERGE 的最大订单数（SQL 文本与参数体积都远低于 BigQuery 上限）
+LEDGER_BATCH_SIZE = 500
+# 结算时单条 MERGE 覆盖的最大期数
+SETTLE_BATCH_SIZE = 1000
+
+# 订单行字段（day_id_cst 由 created_at 按时区推导，outcome/pnl_u 由结算写入）
+ORDER_FIELDS = [
+    ("id", "STRING"),
+    ("market", "STRING"),
+    ("draw_id", "INT64"),
+    ("created_at", "TIMESTAMP"),
+    ("p_win", "FLOAT64"),
+    ("ev", "FLOAT64"),
+    ("kelly_frac", "FLOAT64"),
+    ("stake_u", "INT64"),
+    ("note", "STRING"),
+]
+ORDER_STRUCT_TYPE = "STRUCT<" + ", ".join(f"{name} {kind}" for name, kind in ORDER_FIELDS) + ">"
 
 def _bq(sql:str, loc:str):
     cmd = f"bq --location={shlex.quote(loc)} query --use_legacy_sql=false --format=none {shlex.quote(sql)}"
@@ -15,48 +34,231 @@ def _bq(sql:str, loc:str):
         raise
     return True
 
-def upsert_order(order:Dict[str,Any], env:Dict[str,str]):
-    proj, ds, loc, tz = env["PROJECT"], env["DS_LAB"], env["BQLOC"], env["TZ"]
-    sql = f"""
-INSERT INTO `{proj}.{ds}.score_ledger` (id,day_id_cst,market,draw_id,created_at,p_win,ev,kelly_frac,stake_u,outcome,pnl_u,tag,note)
-VALUES (
-  '{order["id"]}',
-  CURRENT_DATE('{tz}'),
-  '{order["market"]}',
-  {order["draw_id"]},
-  CURRENT_TIMESTAMP(),
-  {order["p_win"]},
-  {order["ev"]},
-  {order["kelly_frac"]},
-  {order["stake_u"]},
-  NULL,
-  NULL,
-  'prod',
-  '{order.get("note","")}'
-)
+def normalize_order(order:Dict[str,Any], created_at:Optional[datetime.datetime]=None)->Dict[str,Any]:
+    """把订单整理成账本行；created_at 在入队时确定，批量写入不会改变下单时间"""
+    created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "id": str(order["id"]),
+        "market": str(order["market"]),
+        "draw_id": int(order["draw_id"]),
+        "created_at": order.get("created_at") or created_at.isoformat(),
+        "p_win": float(order["p_win"]),
+        "ev": float(order["ev"]),
+        "kelly_frac": float(order["kelly_frac"]),
+        "stake_u": int(order["stake_u"]),
+        "note": str(order.get("note", "")),
+    }
+
+def _sql_literal(value:Any, kind:str)->str:
+    if value is None:
+        return "NULL"
+    if kind == "STRING":
+        return json.dumps(str(value))  # 双引号字符串，转义规则与 BigQuery 一致
+    if kind == "TIMESTAMP":
+        return f"TIMESTAMP {json.dumps(str(value))}"
+    if kind == "INT64":
+        return str(int(value))
+    value = float(value)
+    return repr(value) if math.isfinite(value) else "NULL"
+
+def orders_array_literal(rows:List[Dict[str,Any]])->str:
+    """订单行渲染为 ARRAY<STRUCT<...>> 字面量，供 bq 命令行在一条语句中使用"""
+    values = ",\n  ".join(
+        "(" + ", ".join(_sql_literal(row.get(name), kind) for name, kind in ORDER_FIELDS) + ")"
+        for row in rows
+    )
+    return f"ARRAY<{ORDER_STRUCT_TYPE}>[\n  {values}\n]"
+
+def order_merge_sql(proj:str, ds:str, tz:str, rows_expr:str)->str:
+    """按 id 去重写入订单：新订单插入，未结算的已有订单更新，已结算的保持不变
+
+    rows_expr 为订单数组：查询参数 @rows 或 orders_array_literal() 的结果
+    """
+    return f"""
+MERGE `{proj}.{ds}.score_ledger` T
+USING (SELECT * FROM UNNEST({rows_expr})) S
+ON T.id = S.id
+WHEN MATCHED AND T.outcome IS NULL THEN UPDATE SET
+  market = S.market, draw_id = S.draw_id, p_win = S.p_win, ev = S.ev,
+  kelly_frac = S.kelly_frac, stake_u = S.stake_u, note = S.note
+WHEN NOT MATCHED THEN INSERT (id,day_id_cst,market,draw_id,created_at,p_win,ev,kelly_frac,stake_u,outcome,pnl_u,tag,note)
+  VALUES (S.id, DATE(S.created_at, '{tz}'), S.market, S.draw_id, S.created_at, S.p_win, S.ev,
+          S.kelly_frac, S.stake_u, NULL, NULL, 'prod', S.note)
 """
-    _bq(sql, loc)
+
+def settle_merge_sql(proj:str, ds:str, draws_sql:str, sum_col:str)->str:
+    """一条 MERGE 结算 draws_sql 覆盖的所有期（draws_sql 需返回 draw_id 与和值列）"""
+    win = (f"CASE WHEN L.market='oe' THEN MOD(d.{sum_col},2)=0 "
+           f"WHEN L.market='size' THEN d.{sum_col}>=14 END")
+    return f"""
+MERGE `{proj}.{ds}.score_ledger` L
+USING ({draws_sql}) d
+ON L.draw_id = d.draw_id AND L.outcome IS NULL
+WHEN MATCHED AND L.market IN ('oe','size') THEN UPDATE SET
+  outcome = IF({win}, 'win', 'lose'),
+  pnl_u = IF({win}, L.stake_u, -L.stake_u)
+"""
+
+def _chunks(items:List[Any], size:int)->Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class LedgerWriter:
+    """缓冲写入账本：订单先追加到本地预写文件，满 batch_size 或超过 flush_interval 秒后一次 MERGE 写入
+
+    write_batch(rows) 负责把一批订单写入 BigQuery 并返回是否成功；失败时订单保留在缓冲区和预写文件中，
+    下次 flush（包括进程重启后）重试。同一 id 重复提交只保留最后一次。
+    """
+
+    def __init__(self, write_batch:Callable[[List[Dict[str,Any]]], bool], wal_path:Optional[str]=None,
+                 batch_size:int=LEDGER_BATCH_SIZE, flush_interval:float=5.0):
+        self.write_batch = write_batch
+        self.wal_path = wal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.pending: Dict[str, Dict[str,Any]] = {}
+        self.oldest: Optional[float] = None
+        self.retry_at = 0.0  # 写入失败后的退避时刻，期间不按批量大小触发写入
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if wal_path:
+            os.makedirs(os.path.dirname(os.path.abspath(wal_path)), exist_ok=True)
+            self._replay_wal()
+        if flush_interval and flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="ledger-writer", daemon=True)
+            self._thread.start()
+
+    def _replay_wal(self):
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的最后一行
+                self.pending[row["id"]] = row
+        if self.pending:
+            self.oldest = time.monotonic()
+            print(f"账本预写文件恢复 {len(self.pending)} 条未写入订单")
+
+    def _rewrite_wal(self):
+        if not self.wal_path:
+            return
+        tmp_path = f"{self.wal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self.pending.values():
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.wal_path)
+
+    def add(self, order:Dict[str,Any]):
+        """登记订单；达到批量大小时立即写入"""
+        row = normalize_order(order)
+        with self.lock:
+            if self.wal_path:
+                with open(self.wal_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.pending.pop(row["id"], None)
+            self.pending[row["id"]] = row
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            full = len(self.pending) >= self.batch_size and time.monotonic() >= self.retry_at
+        if full:
+            self.flush()
+
+    def add_many(self, orders:Iterable[Dict[str,Any]]):
+        for order in orders:
+            self.add(order)
+
+    def flush(self)->bool:
+        """写入所有缓冲订单，每 batch_size 条一条 MERGE；返回是否全部写入
+
+        写入作业期间不持有缓冲锁，add() 不会被阻塞
+        """
+        with self._flush_lock:
+            with self.lock:
+                rows = list(self.pending.values())
+            ok = True
+            written = []
+            for batch in _chunks(rows, self.batch_size):
+                try:
+                    ok = bool(self.write_batch(batch))
+                except Exception as e:
+                    print(f"账本批量写入失败: {e}")
+                    ok = False
+                if not ok:
+                    break
+                written.extend(batch)
+            if written:
+                with self.lock:
+                    for row in written:
+                        # 写入期间同一 id 被重新提交时保留新值
+                        if self.pending.get(row["id"]) is row:
+                            del self.pending[row["id"]]
+                    self._rewrite_wal()
+                    self.oldest = time.monotonic() if self.pending else None
+            if not ok:
+                self.retry_at = time.monotonic() + max(self.flush_interval, 1.0)
+            return ok
+
+    def _flush_loop(self):
+        while not self._stop.wait(min(self.flush_interval, 1.0)):
+            with self.lock:
+                now = time.monotonic()
+                due = self.oldest is not None and now - self.oldest >= self.flush_interval and now >= self.retry_at
+            if due:
+                self.flush()
+
+    def close(self)->bool:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_orders(rows:List[Dict[str,Any]], env:Dict[str,str])->bool:
+    """一条 MERGE 写入一批订单行"""
+    proj, ds, loc, tz = env["PROJECT"], env["DS_LAB"], env["BQLOC"], env["TZ"]
+    return _bq(order_merge_sql(proj, ds, tz, orders_array_literal(rows)), loc)
+
+def ledger_writer(env:Dict[str,str], wal_path:Optional[str]=None, **kwargs)->LedgerWriter:
+    return LedgerWriter(lambda rows: write_orders(rows, env), wal_path=wal_path, **kwargs)
+
+def upsert_orders(orders:Iterable[Dict[str,Any]], env:Dict[str,str])->bool:
+    """批量写入订单（每 LEDGER_BATCH_SIZE 条一个作业）"""
+    writer = ledger_writer(env, flush_interval=0)
+    writer.add_many(orders)
+    return writer.close()
+
+def upsert_order(order:Dict[str,Any], env:Dict[str,str]):
+    return upsert_orders([order], env)
 
 # 结算（示例：依托 draws 视图；这里仅给出示意 SQL，实际结果映射需按业务定制）
-def settle_orders(env:Dict[str,str]):
+def settle_orders(env:Dict[str,str], draw_ids:Optional[List[int]]=None):
+    """按 draw_id 与市场胜负规则结算；不指定期号时结算当日所有期，否则每 SETTLE_BATCH_SIZE 期一条 MERGE"""
     proj, ds, dsd, loc, tz = env["PROJECT"], env["DS_LAB"], env["DS_DRAW"], env["BQLOC"], env["TZ"]
-    # 示例：按 draw_id 与市场胜负规则结算
-    sql = f"""
-UPDATE `{proj}.{ds}.score_ledger` L
-SET outcome=CASE
-      WHEN L.market='oe'  THEN IF(MOD(d.sum28,2)=0,'win','lose')
-      WHEN L.market='size' THEN IF(d.sum28>=14,'win','lose')
-      ELSE NULL END,
-    pnl_u = CASE
-      WHEN L.outcome='win'  THEN L.stake_u
-      WHEN L.outcome='lose' THEN -L.stake_u
-      ELSE NULL END
-FROM (
-  SELECT draw_id, sum28
-  FROM `{proj}.{dsd}.draws_14w_dedup_v`
-  WHERE DATE(timestamp,'{tz}')=CURRENT_DATE('{tz}')
-) d
-WHERE L.draw_id=d.draw_id
-  AND L.outcome IS NULL
-"""
-    _bq(sql, loc)
+    draws = f"SELECT draw_id, sum28 FROM `{proj}.{dsd}.draws_14w_dedup_v`"
+    if draw_ids is None:
+        return _bq(settle_merge_sql(proj, ds, f"{draws} WHERE DATE(timestamp,'{tz}')=CURRENT_DATE('{tz}')", "sum28"), loc)
+    ok = True
+    for batch in _chunks(sorted({int(d) for d in draw_ids}), SETTLE_BATCH_SIZE):
+        ids = ", ".join(str(d) for d in batch)
+        ok = _bq(settle_merge_sql(proj, ds, f"{draws} WHERE draw_id IN UNNEST([{ids}])", "sum28"), loc) and ok
+    return ok
@@ -2,72 +2,86 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import os, json, time, datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Optional
+from google.cloud import bigquery
 from python.bigquery_client_adapter import BQClient
+from ledger_io import (
+    ORDER_FIELDS, SETTLE_BATCH_SIZE, LedgerWriter, order_merge_sql, settle_merge_sql, _chunks
+)
+
+_clients: Dict[tuple, BQClient] = {}
+
+def _client(env: Dict[str, str], ds_draw: str) -> BQClient:
+    """按环境复用BigQuery客户端，避免每次写入都重新建立连接"""
+    key = (env["PROJECT"], env["DS_LAB"], ds_draw, env["BQLOC"], env["TZ"])
+    if key not in _clients:
+        _clients[key] = BQClient(*key)
+    return _clients[key]
+
+def _rows_parameter(rows: List[Dict[str, Any]]) -> bigquery.ArrayQueryParameter:
+    """订单行转为 ARRAY<STRUCT> 查询参数 @rows"""
+    structs = []
+    for row in rows:
+        fields = []
+        for name, kind in ORDER_FIELDS:
+            value = row.get(name)
+            if kind == "TIMESTAMP" and isinstance(value, str):
+                value = datetime.datetime.fromisoformat(value)
+            fields.append(bigquery.ScalarQueryParameter(name, kind, value))
+        structs.append(bigquery.StructQueryParameter(None, *fields))
+    return bigquery.ArrayQueryParameter("rows", "STRUCT", structs)
+
+def write_orders(rows: List[Dict[str, Any]], env: Dict[str, str]) -> bool:
+    """一条参数化 MERGE 写入一批订单行"""
+    proj, ds, tz = env["PROJECT"], env["DS_LAB"], env["TZ"]
+    success = _client(env, "draw_dataset").execute_dml(
+        order_merge_sql(proj, ds, tz, "@rows"), [_rows_parameter(rows)]
+    )
+    if success:
+        print(f"订单批量写入成功: {len(rows)} 条")
+    else:
+        print(f"订单批量写入失败: {len(rows)} 条")
+    return success
+
+def ledger_writer(env: Dict[str, str], wal_path: Optional[str] = None, **kwargs) -> LedgerWriter:
+    """带本地预写文件的缓冲写入器，按数量或时间批量写入"""
+    return LedgerWriter(lambda rows: write_orders(rows, env), wal_path=wal_path, **kwargs)
+
+def upsert_orders(orders: Iterable[Dict[str, Any]], env: Dict[str, str]) -> bool:
+    """批量插入订单到BigQuery（按 id 去重）"""
+    writer = ledger_writer(env, flush_interval=0)
+    writer.add_many(orders)
+    return writer.close()
 
 def upsert_order(order: Dict[str, Any], env: Dict[str, str]):
     """插入订单到BigQuery"""
-    proj, ds, loc, tz = env["PROJECT"], env["DS_LAB"], env["BQLOC"], env["TZ"]
-    
-    # 创建BigQuery客户端
-    bq_client = BQClient(proj, ds, "draw_dataset", loc, tz)
-    
-    sql = f"""
-INSERT INTO `{proj}.{ds}.score_ledger` (id,day_id_cst,market,draw_id,created_at,p_win,ev,kelly_frac,stake_u,outcome,pnl_u,tag,note)
-VALUES (
-  '{order["id"]}',
-  CURRENT_DATE('{tz}'),
-  '{order["market"]}',
-  {order["draw_id"]},
-  CURRENT_TIMESTAMP(),
-  {order["p_win"]},
-  {order["ev"]},
-  {order["kelly_frac"]},
-  {order["stake_u"]},
-  NULL,
-  NULL,
-  'prod',
-  '{order.get("note", "")}'
-)
-"""
-    
-    success = bq_client.execute_dml(sql)
+    success = upsert_orders([order], env)
     if success:
         print(f"订单插入成功: {order['id']}")
     else:
         print(f"订单插入失败: {order['id']}")
     return success
 
-def settle_orders(env: Dict[str, str]):
-    """结算订单"""
+def settle_orders(env: Dict[str, str], draw_ids: Optional[List[int]] = None):
+    """结算订单；指定期号时每 SETTLE_BATCH_SIZE 期一条 MERGE"""
     proj, ds, dsd, loc, tz = env["PROJECT"], env["DS_LAB"], env["DS_DRAW"], env["BQLOC"], env["TZ"]
-    
-    # 创建BigQuery客户端
-    bq_client = BQClient(proj, ds, dsd, loc, tz)
-    
-    # 示例：按 draw_id 与市场胜负规则结算
-    sql = f"""
-UPDATE `{proj}.{ds}.score_ledger` L
-SET outcome=CASE
-      WHEN L.market='oe'  THEN IF(MOD(d.result_sum,2)=0,'win','lose')
-      WHEN L.market='size' THEN IF(d.result_sum>=14,'win','lose')
-      ELSE NULL END,
-    pnl_u = CASE
-      WHEN L.outcome='win'  THEN L.stake_u
-      WHEN L.outcome='lose' THEN -L.stake_u
-      ELSE NULL END
-FROM (
-  SELECT issue as draw_id, result_sum
-  FROM `{proj}.{dsd}.draws_14w_dedup_v`
-  WHERE DATE(timestamp,'{tz}')=CURRENT_DATE('{tz}')
-) d
-WHERE L.draw_id=d.draw_id
-  AND L.outcome IS NULL
-"""
-    
-    success = bq_client.execute_dml(sql)
+
+    bq_client = _client(env, dsd)
+    draws = f"SELECT issue as draw_id, result_sum FROM `{proj}.{dsd}.draws_14w_dedup_v`"
+
+    if draw_ids is None:
+        success = bq_client.execute_dml(
+            settle_merge_sql(proj, ds, f"{draws} WHERE DATE(timestamp,'{tz}')=CURRENT_DATE('{tz}')", "result_sum")
+        )
+    else:
+        success = True
+        sql = settle_merge_sql(proj, ds, f"{draws} WHERE SAFE_CAST(issue AS INT64) IN UNNEST(@draw_ids)", "result_sum")
+        for batch in _chunks(sorted({int(d) for d in draw_ids}), SETTLE_BATCH_SIZE):
+            params = [bigquery.ArrayQueryParameter("draw_ids", "INT64", batch)]
+            success = bq_client.execute_dml(sql, params) and success
+
     if success:
         print("订单结算成功")
     else:
         print("订单结算失败")
-    return success
\ No newline at end of file
+    return success
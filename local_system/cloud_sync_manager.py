@@ -11,7 +11,7 @@ import json
 import time
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 from pathlib import Path
 import threading
 from dataclasses import dataclass, asdict
@@ -172,12 +172,13 @@ class CloudSyncManager:
             cloud_table = config['cloud_table']
             
             if incremental:
-                # 获取本地最新时间戳
-                last_sync = self._get_last_sync_time(table_name)
+                # 优先使用已提交数据的高水位，>= 配合 REPLACE 保证断点处同时间戳的行不丢
+                high_water_mark = self._get_high_water_mark(table_name)
+                last_sync = high_water_mark or self._get_last_sync_time(table_name)
                 if last_sync:
                     query = f"""
                         SELECT * FROM `{cloud_table}`
-                        WHERE created_at > TIMESTAMP('{last_sync}')
+                        WHERE created_at {'>=' if high_water_mark else '>'} TIMESTAMP('{last_sync}')
                         ORDER BY created_at
                     """
                 else:
@@ -190,40 +191,40 @@ class CloudSyncManager:
             else:
                 query = f"SELECT * FROM `{cloud_table}` ORDER BY created_at"
             
-            # 执行查询
+            # 执行查询，按页读取结果
+            batch_size = self.sync_config['batch_size']
             query_job = self.bq_client.query(query)
-            results = query_job.result()
-            
-            # 转换为字典列表，处理数据类型转换
-            cloud_data = []
-            for row in results:
-                row_dict = dict(row)
-                # 处理特殊数据类型转换
-                for key, value in row_dict.items():
-                    if value is not None:
-                        # 将datetime对象转换为字符串
-                        if hasattr(value, 'strftime'):
-                            row_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                        # 将date对象转换为字符串
-                        elif hasattr(value, 'isoformat') and hasattr(value, 'year'):
-                            row_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S') if hasattr(value, 'hour') else value.strftime('%Y-%m-%d') + ' 00:00:00'
-                        # 将int转换为float（为了兼容SQLite的REAL类型）
-                        elif isinstance(value, int) and key in ['period']:
-                            row_dict[key] = float(value)
-                        # 将Decimal转换为float
-                        elif hasattr(value, '__float__'):
-                            try:
-                                row_dict[key] = float(value)
-                            except (ValueError, TypeError):
-                                row_dict[key] = str(value)
-                cloud_data.append(row_dict)
-            
-            if not cloud_data:
+            results = query_job.result(page_size=batch_size)
+            
+            # 每批完整提交后推进高水位；某批有写入失败的行则停止推进，下次从该处重试
+            synced = {'rows': 0, 'fetched': 0, 'failed': 0, 'stalled': False}
+            
+            def on_chunk_committed(chunk: List[Dict[str, Any]], inserted: int):
+                synced['rows'] += inserted
+                synced['fetched'] += len(chunk)
+                if inserted < len(chunk):
+                    synced['failed'] += len(chunk) - inserted
+                    synced['stalled'] = True
+                mark = chunk[-1].get('created_at')
+                if mark and not synced['stalled']:
+                    self._set_high_water_mark(table_name, mark, synced['rows'])
+            
+            # 流式写入本地数据库，内存占用只与批大小有关
+            inserted = self.db.bulk_insert_stream(
+                config['local_table'], self._iter_cloud_rows(results), replace=True,
+                chunk_size=batch_size, on_chunk_committed=on_chunk_committed
+            )
+            
+            if not synced['fetched']:
                 logger.info(f"云端表 {table_name} 无新数据")
                 return True
             
-            # 插入本地数据库
-            inserted = self.db.bulk_insert(config['local_table'], cloud_data, replace=True)
+            if synced['failed']:
+                # 有行未写入：高水位停在失败批次之前，记为失败，避免以本次时间作为下次同步起点
+                error_message = f"{synced['failed']}/{synced['fetched']} 行写入本地失败"
+                logger.error(f"从云端同步表不完整 {table_name}: {error_message}")
+                self._update_sync_status(table_name, 'failed', inserted, error_message)
+                return False
             
             # 更新同步状态
             self._update_sync_status(table_name, 'completed', inserted)
@@ -236,6 +237,72 @@ class CloudSyncManager:
             self._update_sync_status(table_name, 'failed', 0, str(e))
             return False
     
+    @staticmethod
+    def _make_cloud_converter(field_name: str, field_type: str):
+        """按BigQuery字段类型生成转换函数，整列只判断一次类型"""
+        field_type = (field_type or '').upper()
+        
+        if field_type in ('TIMESTAMP', 'DATETIME'):
+            return lambda value: value.strftime('%Y-%m-%d %H:%M:%S')
+        if field_type == 'DATE':
+            return lambda value: value.strftime('%Y-%m-%d') + ' 00:00:00'
+        if field_type == 'TIME':
+            return lambda value: value.isoformat()
+        if field_type in ('NUMERIC', 'BIGNUMERIC', 'DECIMAL', 'BIGDECIMAL', 'FLOAT', 'FLOAT64'):
+            return float
+        if field_type in ('INTEGER', 'INT64') and field_name in ['period']:
+            # 为了兼容SQLite的REAL类型
+            return float
+        return None
+    
+    def _iter_cloud_rows(self, results) -> Iterator[Dict[str, Any]]:
+        """逐页读取查询结果并按列预编译的转换函数转换"""
+        names = [field.name for field in results.schema]
+        converters = [
+            (index, convert)
+            for index, convert in enumerate(
+                self._make_cloud_converter(field.name, field.field_type) for field in results.schema
+            )
+            if convert is not None
+        ]
+        
+        for page in results.pages:
+            for row in page:
+                values = list(row.values())
+                for index, convert in converters:
+                    value = values[index]
+                    if value is not None:
+                        try:
+                            values[index] = convert(value)
+                        except (ValueError, TypeError, AttributeError):
+                            values[index] = str(value)
+                yield dict(zip(names, values))
+    
+    def _get_high_water_mark(self, table_name: str) -> Optional[str]:
+        """获取云端下载的高水位（已提交数据的最大created_at）"""
+        try:
+            result = self.db.execute_query(
+                "SELECT high_water_mark FROM cloud_sync_watermarks WHERE table_name = ?",
+                (table_name,)
+            )
+            return result[0]['high_water_mark'] if result else None
+            
+        except Exception as e:
+            logger.error(f"获取高水位失败: {e}")
+            return None
+    
+    def _set_high_water_mark(self, table_name: str, high_water_mark: str, rows_synced: int):
+        """推进云端下载的高水位"""
+        try:
+            self.db.execute_update("""
+                INSERT OR REPLACE INTO cloud_sync_watermarks
+                (table_name, high_water_mark, rows_synced, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (table_name, high_water_mark, rows_synced, datetime.now().isoformat()))
+            
+        except Exception as e:
+            logger.error(f"更新高水位失败: {e}")
+    
     def bidirectional_sync(self, table_name: str) -> bool:
         """双向同步表"""
         try:
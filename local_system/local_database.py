@@ -8,22 +8,63 @@ PC28本地SQLite数据库系统
 import sqlite3
 import json
 import logging
+import re
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Callable
 from pathlib import Path
 import pandas as pd
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 维护行数和最后写入时间的表 -> 日期列（None 表示只统计全表）
+STATS_TABLES = {
+    'cloud_pred_today_norm': 'data_date',
+    'p_map_clean_merged_dedup_v': 'data_date',
+    'p_size_clean_merged_dedup_v': 'data_date',
+    'runtime_params': None,
+    'signal_pool_union_v3': 'day_id_cst',
+    'lab_push_candidates_v2': 'day_id_cst',
+}
+
+# table_stats 中全表统计行的日期键（日期为空的行记在 '' 下）
+STATS_TOTAL_KEY = '*'
+
+# execute_update 中写入统计表的语句，执行期间记录受影响行的统计增量
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT|REPLACE)\b.*?\bINTO\s+(\w+)|^\s*UPDATE\s+(?:OR\s+\w+\s+)?(\w+)|^\s*DELETE\s+FROM\s+(\w+)",
+    re.IGNORECASE | re.DOTALL
+)
+
+_STATS_DELTA_SQL = """
+    INSERT INTO table_stats (table_name, data_date, row_count, last_created_at, last_write_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name, data_date) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        last_created_at = CASE WHEN excluded.last_created_at > COALESCE(last_created_at, '')
+                               THEN excluded.last_created_at ELSE last_created_at END,
+        last_write_at = excluded.last_write_at
+"""
+
 class LocalDatabase:
-    """本地SQLite数据库管理器"""
+    """本地SQLite数据库管理器
+    
+    table_stats 默认在写入路径上维护：bulk_insert 每批按日期聚合一次增量，
+    truncate_table 直接清零，execute_update 执行期间用连接级临时触发器记录受影响行的增量。
+    stats_triggers=True 时改由行级触发器维护，可覆盖绕过本类直接写库的进程，
+    但每行写入多 2-4 次 upsert，批量写入明显变慢
+    """
     
-    def __init__(self, db_path: str = "local_system/pc28_local.db"):
+    def __init__(self, db_path: str = "local_system/pc28_local.db", stats_triggers: bool = False):
         """初始化本地数据库"""
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.conn = None
+        self.stats_triggers = stats_triggers
+        self._column_types: Dict[str, Dict[str, str]] = {}
+        self._unique_keys: Dict[str, List[Tuple[str, ...]]] = {}
         self._init_database()
     
     def _init_database(self):
@@ -35,6 +76,14 @@ class LocalDatabase:
             # 启用外键约束
             self.conn.execute("PRAGMA foreign_keys = ON")
             
+            # 触发器模式下 INSERT OR REPLACE 删除旧行时也要触发 DELETE 触发器，保证统计计数准确
+            if self.stats_triggers:
+                self.conn.execute("PRAGMA recursive_triggers = ON")
+            
+            # WAL模式: 写入不阻塞读者；NORMAL同步在WAL下仍保证一致性
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            
             # 创建所有表结构
             self._create_tables()
             
@@ -193,6 +242,39 @@ class LocalDatabase:
                     records_synced INTEGER DEFAULT 0,
                     error_message TEXT
                 )
+            """,
+            
+            # 增量刷新水位表
+            "refresh_watermarks": """
+                CREATE TABLE IF NOT EXISTS refresh_watermarks (
+                    table_name TEXT PRIMARY KEY,
+                    last_draw_id TEXT,
+                    day_id_cst TEXT,
+                    rows_refreshed INTEGER DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            
+            # 云端下载高水位表（仅在每批提交后推进）
+            "cloud_sync_watermarks": """
+                CREATE TABLE IF NOT EXISTS cloud_sync_watermarks (
+                    table_name TEXT PRIMARY KEY,
+                    high_water_mark TEXT,
+                    rows_synced INTEGER DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            
+            # 表统计（写入路径或触发器维护）：每表一行全表统计（data_date = '*'）加每个日期一行
+            "table_stats": """
+                CREATE TABLE IF NOT EXISTS table_stats (
+                    table_name TEXT NOT NULL,
+                    data_date TEXT NOT NULL,
+                    row_count INTEGER NOT NULL DEFAULT 0,
+                    last_created_at TEXT,
+                    last_write_at TEXT,
+                    PRIMARY KEY (table_name, data_date)
+                ) WITHOUT ROWID
             """
         }
         
@@ -212,6 +294,9 @@ class LocalDatabase:
         
         # 初始化运行时参数
         self._init_runtime_params()
+        
+        # 初始化表统计（缺失时按现有数据重建；按模式安装或移除触发器）
+        self._init_table_stats()
     
     def _create_indexes(self):
         """创建索引优化查询性能"""
@@ -245,6 +330,243 @@ class LocalDatabase:
         
         self.conn.commit()
     
+    @staticmethod
+    def _stats_upsert_sql(table_name: str, date_key: str, delta: int, created_at: str) -> str:
+        return f"""
+            INSERT INTO table_stats (table_name, data_date, row_count, last_created_at, last_write_at)
+            VALUES ('{table_name}', {date_key}, {delta}, {created_at}, CURRENT_TIMESTAMP)
+            ON CONFLICT (table_name, data_date) DO UPDATE SET
+                row_count = row_count + excluded.row_count,
+                last_created_at = CASE WHEN excluded.last_created_at > COALESCE(last_created_at, '')
+                                       THEN excluded.last_created_at ELSE last_created_at END,
+                last_write_at = excluded.last_write_at;
+        """
+    
+    def _init_table_stats(self):
+        """初始化表统计
+        
+        没有全表统计行的表（新库或旧库首次打开）按现有数据重建；
+        stats_triggers=True 时安装行级触发器，否则移除旧版本留下的触发器
+        """
+        installed = {
+            row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_stats_%'"
+            )
+        }
+        tracked = {
+            row[0] for row in self.conn.execute(
+                "SELECT table_name FROM table_stats WHERE data_date = ?", (STATS_TOTAL_KEY,)
+            )
+        }
+        for table_name, date_column in STATS_TABLES.items():
+            has_triggers = f"trg_{table_name}_stats_insert" in installed
+            try:
+                if self.stats_triggers and not has_triggers:
+                    self._install_stats_triggers(table_name, date_column)
+                    logger.info(f"已安装表统计触发器: {table_name}")
+                elif not self.stats_triggers and has_triggers:
+                    for event in ('insert', 'update', 'delete'):
+                        self.conn.execute(f"DROP TRIGGER IF EXISTS trg_{table_name}_stats_{event}")
+                    logger.info(f"已移除表统计触发器，改由写入路径维护: {table_name}")
+                if table_name not in tracked or self.stats_triggers != has_triggers:
+                    self.refresh_table_stats(table_name, commit=False)
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                logger.warning(f"初始化表统计失败 {table_name}: {e}")
+    
+    def _install_stats_triggers(self, table_name: str, date_column: Optional[str]):
+        """在统计表上安装 INSERT/UPDATE/DELETE 触发器（供绕过本类写库的场景使用）"""
+        def bump(ref: str, delta: int) -> str:
+            created_at = f"{ref}.created_at" if delta > 0 else "NULL"
+            statements = self._stats_upsert_sql(table_name, f"'{STATS_TOTAL_KEY}'", delta, created_at)
+            if date_column:
+                statements += self._stats_upsert_sql(
+                    table_name, f"COALESCE({ref}.{date_column}, '')", delta, created_at
+                )
+            return statements
+        
+        bodies = {
+            'insert': bump('NEW', 1),
+            'update': bump('OLD', -1) + bump('NEW', 1),
+            'delete': bump('OLD', -1),
+        }
+        for event, body in bodies.items():
+            self.conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table_name}_stats_{event}
+                AFTER {event.upper()} ON {table_name}
+                BEGIN {body} END
+            """)
+    
+    def refresh_table_stats(self, table_name: Optional[str] = None, commit: bool = True):
+        """按现有数据全量重建统计（首次打开或写入路径无法精确计算增量时调用；绕过本类直接改库后可用来校正）"""
+        tables = [table_name] if table_name else list(STATS_TABLES)
+        for name in tables:
+            date_column = STATS_TABLES[name]
+            self.conn.execute("DELETE FROM table_stats WHERE table_name = ?", (name,))
+            self.conn.execute(f"""
+                INSERT INTO table_stats (table_name, data_date, row_count, last_created_at, last_write_at)
+                SELECT ?, ?, COUNT(*), MAX(created_at), CURRENT_TIMESTAMP FROM {name}
+            """, (name, STATS_TOTAL_KEY))
+            if date_column:
+                self.conn.execute(f"""
+                    INSERT INTO table_stats (table_name, data_date, row_count, last_created_at, last_write_at)
+                    SELECT ?, COALESCE({date_column}, ''), COUNT(*), MAX(created_at), CURRENT_TIMESTAMP
+                    FROM {name} GROUP BY COALESCE({date_column}, '')
+                """, (name,))
+        if commit:
+            self.conn.commit()
+    
+    def _maintains_stats(self, table_name: str) -> bool:
+        return table_name in STATS_TABLES and not self.stats_triggers
+    
+    def _get_unique_keys(self, table_name: str) -> List[Tuple[str, ...]]:
+        """表上所有唯一约束的字段组合（含 INTEGER PRIMARY KEY），REPLACE 按这些字段删除旧行"""
+        if table_name not in self._unique_keys:
+            keys = []
+            pk_columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table_name})") if row[5]]
+            if len(pk_columns) == 1:
+                keys.append((pk_columns[0],))
+            for index in self.conn.execute(f"PRAGMA index_list({table_name})").fetchall():
+                if index[2]:
+                    columns = tuple(row[2] for row in self.conn.execute(f"PRAGMA index_info({index[1]})"))
+                    if columns not in keys:
+                        keys.append(columns)
+            self._unique_keys[table_name] = keys
+        return self._unique_keys[table_name]
+    
+    def _capture_replaced_rows(self, table_name: str, columns: List[str], values: List[Tuple]):
+        """REPLACE 写入前，把本批会被覆盖的旧行（rowid 和日期）记入临时表"""
+        date_column = STATS_TABLES[table_name]
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stats_preimage (rid INTEGER PRIMARY KEY, date_key TEXT)"
+        )
+        self.conn.execute("DELETE FROM temp.stats_preimage")
+        keys = [key for key in self._get_unique_keys(table_name) if set(key) <= set(columns)]
+        if not keys:
+            return
+        positions = [columns.index(column) for key in keys for column in key]
+        where = ' OR '.join('(' + ' AND '.join(f"{column} = ?" for column in key) + ')' for key in keys)
+        date_expr = f"COALESCE({date_column}, '')" if date_column else "''"
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO temp.stats_preimage (rid, date_key) "
+            f"SELECT rowid, {date_expr} FROM {table_name} WHERE {where}",
+            [tuple(row[i] for i in positions) for row in values]
+        )
+    
+    def _apply_chunk_stats(self, table_name: str, since_rowid: int, replace: bool, written: int):
+        """按日期聚合本批增量并一次写入 table_stats
+        
+        新增行为 rowid > since_rowid 的行；REPLACE 时再减去预先记下的被覆盖旧行，
+        加回仍保留原 rowid 的行。聚合结果与实际写入行数对不上时（例如显式指定了较小的 id）
+        退化为按表重建，保证计数精确
+        """
+        date_column = STATS_TABLES[table_name]
+        date_expr = f"COALESCE({date_column}, '')" if date_column else "''"
+        condition = "rowid > ?"
+        if replace:
+            condition += " OR rowid IN (SELECT rid FROM temp.stats_preimage)"
+        added = self.conn.execute(
+            f"SELECT {date_expr}, COUNT(*), MAX(created_at) FROM {table_name} "
+            f"WHERE {condition} GROUP BY 1", (since_rowid,)
+        ).fetchall()
+        removed = self.conn.execute(
+            "SELECT date_key, COUNT(*) FROM temp.stats_preimage GROUP BY 1"
+        ).fetchall() if replace else []
+        
+        if sum(row[1] for row in added) != written:
+            self.refresh_table_stats(table_name, commit=False)
+            return
+        
+        deltas: Dict[str, List[Any]] = {}
+        for date_key, count, created_at in added:
+            deltas[date_key] = [count, created_at]
+        for date_key, count in removed:
+            deltas.setdefault(date_key, [0, None])[0] -= count
+        total = [sum(delta[0] for delta in deltas.values()),
+                 max((delta[1] for delta in deltas.values() if delta[1]), default=None)]
+        
+        rows = [(table_name, STATS_TOTAL_KEY, total[0], total[1])]
+        if date_column:
+            rows += [(table_name, date_key, delta[0], delta[1]) for date_key, delta in deltas.items()]
+        self.conn.executemany(_STATS_DELTA_SQL, rows)
+    
+    def _begin_statement_stats(self, table_name: str):
+        """为单条任意写语句安装连接级临时触发器，把受影响行的日期增量记入 temp.stats_journal
+        
+        临时触发器只对本连接生效、不改动库结构，语句结束后即移除，bulk_insert 不承担逐行开销；
+        期间打开 recursive_triggers，让 REPLACE 删除的旧行也被记录
+        """
+        date_column = STATS_TABLES[table_name]
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stats_journal (date_key TEXT, delta INTEGER, created_at TEXT)"
+        )
+        self.conn.execute("DELETE FROM temp.stats_journal")
+        
+        def record(ref: str, delta: int) -> str:
+            date_expr = f"COALESCE({ref}.{date_column}, '')" if date_column else "''"
+            created_at = f"{ref}.created_at" if delta > 0 else "NULL"
+            return f"INSERT INTO stats_journal VALUES ({date_expr}, {delta}, {created_at}); "
+        
+        bodies = {
+            'insert': record('NEW', 1),
+            'update': record('OLD', -1) + record('NEW', 1),
+            'delete': record('OLD', -1),
+        }
+        for event, body in bodies.items():
+            self.conn.execute(f"""
+                CREATE TEMP TRIGGER IF NOT EXISTS trg_{table_name}_stats_journal_{event}
+                AFTER {event.upper()} ON main.{table_name}
+                BEGIN {body}END
+            """)
+        self.conn.execute("PRAGMA recursive_triggers = ON")
+    
+    def _end_statement_stats(self, table_name: str, apply: bool):
+        """把记录的增量按日期聚合写入 table_stats（apply=False 时丢弃），并移除临时触发器"""
+        try:
+            if apply:
+                deltas = self.conn.execute(
+                    "SELECT date_key, SUM(delta), MAX(created_at) FROM temp.stats_journal GROUP BY 1"
+                ).fetchall()
+                if deltas:
+                    rows = [(table_name, STATS_TOTAL_KEY, sum(row[1] for row in deltas),
+                             max((row[2] for row in deltas if row[2]), default=None))]
+                    if STATS_TABLES[table_name]:
+                        rows += [(table_name, date_key, delta, created_at)
+                                 for date_key, delta, created_at in deltas]
+                    self.conn.executemany(_STATS_DELTA_SQL, rows)
+        finally:
+            for event in ('insert', 'update', 'delete'):
+                self.conn.execute(f"DROP TRIGGER IF EXISTS temp.trg_{table_name}_stats_journal_{event}")
+            self.conn.execute("DELETE FROM temp.stats_journal")
+            if not self.stats_triggers:
+                self.conn.execute("PRAGMA recursive_triggers = OFF")
+    
+    def truncate_table(self, table_name: str, commit: bool = True):
+        """清空表并将其统计清零（无触发器时保留 SQLite 的整表清空优化）"""
+        self.conn.execute(f"DELETE FROM {table_name}")
+        if self._maintains_stats(table_name):
+            self.conn.execute("DELETE FROM table_stats WHERE table_name = ?", (table_name,))
+            self.conn.execute(_STATS_DELTA_SQL, (table_name, STATS_TOTAL_KEY, 0, None))
+        if commit:
+            self.conn.commit()
+    
+    def get_table_stats(self, table_name: str, data_date: Optional[str] = None) -> Dict[str, Any]:
+        """读取维护的表统计（主键查找）：行数、最新 created_at、最后写入时间
+        
+        data_date 为空时返回全表统计；没有数据的日期行数为 0
+        """
+        key = STATS_TOTAL_KEY if data_date is None else data_date
+        row = self.conn.execute("""
+            SELECT row_count, last_created_at, last_write_at FROM table_stats
+            WHERE table_name = ? AND data_date = ?
+        """, (table_name, key)).fetchone()
+        if row is None:
+            return {'table_name': table_name, 'data_date': data_date, 'row_count': 0,
+                    'last_created_at': None, 'last_write_at': None}
+        return {'table_name': table_name, 'data_date': data_date, 'row_count': row[0],
+                'last_created_at': row[1], 'last_write_at': row[2]}
+    
     def _init_runtime_params(self):
         """初始化运行时参数"""
         default_params = [
@@ -253,6 +575,7 @@ class LocalDatabase:
             ('pc28', 0.55, 1.0e-6, 0.05, 0.8, 0.5)
         ]
         
+        changes_before = self.conn.total_changes
         for market, p_min_base, ev_min, max_kelly, target_acc, target_cov in default_params:
             try:
                 self.conn.execute("""
@@ -263,6 +586,8 @@ class LocalDatabase:
             except Exception as e:
                 logger.warning(f"初始化运行时参数失败: {e}")
         
+        if self.conn.total_changes != changes_before and self._maintains_stats('runtime_params'):
+            self.refresh_table_stats('runtime_params', commit=False)
         self.conn.commit()
     
     def execute_query(self, query: str, params: Optional[Tuple] = None) -> List[Dict]:
@@ -286,11 +611,23 @@ class LocalDatabase:
     def execute_update(self, query: str, params: Optional[Tuple] = None) -> int:
         """执行更新操作并返回影响行数"""
         try:
+            match = _WRITE_TARGET.match(query)
+            target = match and next(name for name in match.groups() if name)
+            track = bool(target) and self._maintains_stats(target)
+            
             cursor = self.conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            if track:
+                self._begin_statement_stats(target)
+            applied = False
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                applied = True
+            finally:
+                if track:
+                    self._end_statement_stats(target, applied)
             
             self.conn.commit()
             return cursor.rowcount
@@ -300,61 +637,138 @@ class LocalDatabase:
             self.conn.rollback()
             raise
     
-    def bulk_insert(self, table_name: str, data: List[Dict], replace: bool = False) -> int:
-        """批量插入数据"""
+    def _get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取表字段的声明类型（带缓存）"""
+        if table_name not in self._column_types:
+            cursor = self.conn.execute(f"PRAGMA table_info({table_name})")
+            self._column_types[table_name] = {row[1]: (row[2] or '').upper() for row in cursor.fetchall()}
+        return self._column_types[table_name]
+    
+    @staticmethod
+    def _make_converter(declared_type: str) -> Callable[[Any], Any]:
+        """按SQLite类型亲和性生成字段转换函数，转换失败时保留原值"""
+        def to_integer(value):
+            if isinstance(value, str):
+                try:
+                    return int(value)
+                except ValueError:
+                    return value
+            if isinstance(value, (bool, Decimal)):
+                return int(value)
+            return value
+        
+        def to_real(value):
+            if isinstance(value, (str, Decimal)):
+                try:
+                    return float(value)
+                except ValueError:
+                    return value
+            return value
+        
+        def to_text(value):
+            if isinstance(value, datetime):
+                return value.isoformat()
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, ensure_ascii=False)
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                return str(value)
+            return value
+        
+        def passthrough(value):
+            if isinstance(value, datetime):
+                return value.isoformat()
+            if isinstance(value, Decimal):
+                return float(value)
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, ensure_ascii=False)
+            return value
+        
+        if 'INT' in declared_type:
+            return to_integer
+        if any(t in declared_type for t in ('REAL', 'FLOA', 'DOUB')):
+            return to_real
+        if any(t in declared_type for t in ('CHAR', 'CLOB', 'TEXT')):
+            return to_text
+        return passthrough
+    
+    def _prepare_rows(self, table_name: str, columns: List[str], rows: List[Dict]) -> List[Tuple]:
+        """按字段预先转换整批数据"""
+        column_types = self._get_column_types(table_name)
+        converters = [self._make_converter(column_types.get(col, '')) for col in columns]
+        pairs = list(zip(columns, converters))
+        return [
+            tuple(None if row.get(col) is None else convert(row.get(col)) for col, convert in pairs)
+            for row in rows
+        ]
+    
+    def _insert_chunk(self, table_name: str, columns: List[str], sql: str, values: List[Tuple],
+                      replace: bool) -> int:
+        """写入一批并在同一事务内按日期聚合更新 table_stats"""
+        if not self._maintains_stats(table_name):
+            return self._execute_chunk(sql, values)
+        
+        since_rowid = self.conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name}").fetchone()[0]
+        if replace:
+            self._capture_replaced_rows(table_name, columns, values)
+        changes_before = self.conn.total_changes
+        inserted = self._execute_chunk(sql, values)
+        self._apply_chunk_stats(table_name, since_rowid, replace, self.conn.total_changes - changes_before)
+        return inserted
+    
+    def _execute_chunk(self, sql: str, values: List[Tuple]) -> int:
+        """在保存点内以executemany写入一批，失败时仅对该批逐行回退"""
+        cursor = self.conn.cursor()
+        cursor.execute("SAVEPOINT bulk_chunk")
+        try:
+            cursor.executemany(sql, values)
+            cursor.execute("RELEASE SAVEPOINT bulk_chunk")
+            return len(values)
+        except sqlite3.Error as chunk_error:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_chunk")
+            logger.warning(f"批量写入失败，逐行回退 ({len(values)} 行): {chunk_error}")
+        
+        inserted_count = 0
+        failed_count = 0
+        for row_values in values:
+            try:
+                cursor.execute(sql, row_values)
+                inserted_count += 1
+            except sqlite3.Error as row_error:
+                failed_count += 1
+                logger.debug(f"单行插入失败: {row_error}, 数据: {row_values}")
+        cursor.execute("RELEASE SAVEPOINT bulk_chunk")
+        
+        if failed_count:
+            logger.warning(f"逐行回退完成: 成功 {inserted_count} 行, 失败 {failed_count} 行")
+        return inserted_count
+    
+    def _build_insert_sql(self, table_name: str, columns: List[str], replace: bool) -> str:
+        placeholders = ', '.join(['?' for _ in columns])
+        columns_str = ', '.join(columns)
+        action = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        return f"{action} INTO {table_name} ({columns_str}) VALUES ({placeholders})"
+    
+    def bulk_insert(self, table_name: str, data: List[Dict], replace: bool = False,
+                    chunk_size: int = 5000) -> int:
+        """批量插入数据
+        
+        整批在一个事务内完成（若调用方已开启事务则并入该事务），
+        按 chunk_size 分批 executemany，只有失败的批次才逐行回退
+        """
         if not data:
             return 0
         
+        columns = list(data[0].keys())
+        sql = self._build_insert_sql(table_name, columns, replace)
+        
         try:
-            # 获取字段名
-            columns = list(data[0].keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            # 构建SQL语句
-            action = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
-            sql = f"{action} INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-            
-            # 准备数据，确保数据类型正确
-            values = []
-            for row in data:
-                # 直接使用字典的值，按照columns的顺序
-                row_values = [row.get(col) for col in columns]
-                values.append(row_values)
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
             
-            cursor = self.conn.cursor()
-            
-            # 使用单条插入替代executemany来避免datatype mismatch问题
             inserted_count = 0
-            for row_values in values:
-                try:
-                    # 调试：打印数据类型
-                    if inserted_count == 0:  # 只打印第一行用于调试
-                        logger.debug(f"插入数据类型: {[(type(v), v) for v in row_values]}")
-                    
-                    cursor.execute(sql, row_values)
-                    inserted_count += 1
-                except Exception as row_error:
-                    logger.warning(f"单行插入失败: {row_error}, 数据: {row_values}")
-                    # 尝试转换数据类型后重试
-                    try:
-                        converted_values = []
-                        for i, value in enumerate(row_values):
-                            if columns[i] == 'period' and isinstance(value, str):
-                                # 将period字符串转为整数
-                                converted_values.append(int(value))
-                            elif columns[i] in ['p_win', 'vote_ratio'] and isinstance(value, str):
-                                # 将数值字符串转为浮点数
-                                converted_values.append(float(value))
-                            else:
-                                converted_values.append(value)
-                        
-                        cursor.execute(sql, converted_values)
-                        inserted_count += 1
-                        logger.debug(f"数据类型转换后插入成功")
-                    except Exception as retry_error:
-                        logger.warning(f"重试插入也失败: {retry_error}")
-                        continue
+            for start in range(0, len(data), chunk_size):
+                values = self._prepare_rows(table_name, columns, data[start:start + chunk_size])
+                inserted_count += self._insert_chunk(table_name, columns, sql, values, replace)
             
             self.conn.commit()
             logger.info(f"批量插入 {table_name}: {inserted_count} 行")
@@ -363,13 +777,83 @@ class LocalDatabase:
         except Exception as e:
             logger.error(f"批量插入失败: {e}")
             logger.error(f"SQL: {sql}")
-            logger.error(f"数据示例: {data[0] if data else 'None'}")
+            logger.error(f"数据示例: {data[0]}")
             self.conn.rollback()
             raise
     
+    def bulk_insert_stream(self, table_name: str, rows: Iterable[Dict], replace: bool = False,
+                           chunk_size: int = 5000,
+                           on_chunk_committed: Optional[Callable[[List[Dict], int], None]] = None) -> int:
+        """流式分批插入
+        
+        从迭代器按 chunk_size 取数，每批独立事务提交，内存占用与总行数无关。
+        on_chunk_committed(chunk, inserted) 在每批提交后调用，可用于推进水位
+        """
+        iterator = iter(rows)
+        columns = None
+        sql = None
+        inserted_total = 0
+        
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            
+            if columns is None:
+                columns = list(chunk[0].keys())
+                sql = self._build_insert_sql(table_name, columns, replace)
+            
+            try:
+                if not self.conn.in_transaction:
+                    self.conn.execute("BEGIN")
+                inserted = self._insert_chunk(table_name, columns, sql,
+                                               self._prepare_rows(table_name, columns, chunk), replace)
+                self.conn.commit()
+            except Exception as e:
+                logger.error(f"流式插入 {table_name} 失败: {e}")
+                self.conn.rollback()
+                raise
+            
+            inserted_total += inserted
+            if on_chunk_committed:
+                on_chunk_committed(chunk, inserted)
+        
+        logger.info(f"流式插入 {table_name}: {inserted_total} 行")
+        return inserted_total
+    
+    def get_watermark(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """获取表的增量刷新水位"""
+        result = self.execute_query(
+            "SELECT table_name, last_draw_id, day_id_cst, rows_refreshed, updated_at "
+            "FROM refresh_watermarks WHERE table_name = ?",
+            (table_name,)
+        )
+        return result[0] if result else None
+    
+    def set_watermark(self, table_name: str, last_draw_id: Optional[str], day_id_cst: Optional[str],
+                      rows_refreshed: int = 0, commit: bool = True):
+        """更新表的增量刷新水位
+        
+        commit=False 时不提交，由调用方与数据写入放在同一事务中提交
+        """
+        self.conn.execute("""
+            INSERT INTO refresh_watermarks (table_name, last_draw_id, day_id_cst, rows_refreshed, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(table_name) DO UPDATE SET
+                last_draw_id = excluded.last_draw_id,
+                day_id_cst = excluded.day_id_cst,
+                rows_refreshed = excluded.rows_refreshed,
+                updated_at = excluded.updated_at
+        """, (table_name, last_draw_id, day_id_cst, rows_refreshed))
+        if commit:
+            self.conn.commit()
+    
     def get_table_count(self, table_name: str, where_clause: str = "") -> int:
-        """获取表行数"""
+        """获取表行数（无过滤条件的统计表直接读取 table_stats）"""
         try:
+            if not where_clause and table_name in STATS_TABLES:
+                return self.get_table_stats(table_name)['row_count']
+            
             sql = f"SELECT COUNT(*) as count FROM {table_name}"
             if where_clause:
                 sql += f" WHERE {where_clause}"
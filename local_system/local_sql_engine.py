@@ -253,86 +253,122 @@ class LocalSQLEngine:
         
         return results
     
-    def refresh_signal_pool(self) -> bool:
-        """刷新信号池表"""
+    # 物化表 -> (来源视图, 字段列表)
+    MATERIALIZED_TABLES = {
+        'signal_pool_union_v3': (
+            'signal_pool_union_v3_view',
+            ['draw_id', 'ts_utc', 'period', 'market', 'pick', 'p_win',
+             'source', 'vote_ratio', 'pick_zh', 'day_id_cst']
+        ),
+        'lab_push_candidates_v2': (
+            'lab_push_candidates_v2_view',
+            ['id', 'created_at', 'ts_utc', 'period', 'market', 'pick', 'p_win',
+             'ev', 'kelly_frac', 'source', 'vote_ratio', 'pick_zh', 'day_id_cst', 'draw_id']
+        )
+    }
+    
+    def _current_day_id(self) -> str:
+        """与视图 day_id_cst 相同的当日标识（SQLite date('now')），避免与进程本地日期错位"""
+        return self.db.conn.execute("SELECT strftime('%Y%m%d', date('now'))").fetchone()[0]
+    
+    def _refresh_materialized_table(self, table_name: str, incremental: bool = False) -> Optional[int]:
+        """从视图刷新物化表
+        
+        全量模式: 在同一事务内清空并重建，读者在提交前始终看到旧数据
+        增量模式: 只计算水位(last_draw_id)之后的新draw_id；跨天或无水位时退化为全量
+        
+        Returns:
+            写入行数；视图无数据且为全量刷新时返回 None
+        """
+        view_name, columns = self.MATERIALIZED_TABLES[table_name]
+        today_id = self._current_day_id()
+        columns_str = ', '.join(columns)
+        
+        watermark = self.db.get_watermark(table_name) if incremental else None
+        if incremental and (not watermark or watermark['day_id_cst'] != today_id
+                            or watermark['last_draw_id'] is None):
+            logger.info(f"{table_name} 无当日水位，执行全量刷新")
+            incremental = False
+        
+        if incremental:
+            rows = self.db.execute_query(
+                f"SELECT {columns_str} FROM {view_name} WHERE draw_id > ?",
+                (watermark['last_draw_id'],)
+            )
+            if not rows:
+                logger.info(f"{table_name} 无新增draw_id (水位: {watermark['last_draw_id']})")
+                return 0
+        else:
+            rows = self.db.execute_query(f"SELECT {columns_str} FROM {view_name}")
+        
+        # draw_id 列为 TEXT，水位统一按字符串比较，与 WHERE draw_id > ? 的语义一致
+        last_draw_id = max((str(row['draw_id']) for row in rows if row['draw_id'] is not None), default=None)
+        if incremental:
+            last_draw_id = max(last_draw_id or '', str(watermark['last_draw_id']))
+        
+        # 清空、写入与水位更新在同一事务内完成，由 bulk_insert 统一提交
+        if not incremental:
+            self.db.truncate_table(table_name, commit=False)
+        self.db.set_watermark(table_name, last_draw_id, today_id, len(rows), commit=False)
+        
+        if not rows:
+            self.db.conn.commit()
+            return None
+        
+        return self.db.bulk_insert(table_name, rows, replace=True)
+    
+    def refresh_signal_pool(self, incremental: bool = False) -> bool:
+        """刷新信号池表
+        
+        Args:
+            incremental: 仅刷新水位之后新增的draw_id
+        """
         try:
-            logger.info("开始刷新信号池...")
+            logger.info(f"开始刷新信号池 ({'增量' if incremental else '全量'})...")
             
-            # 清空现有信号池数据
-            self.db.execute_update("DELETE FROM signal_pool_union_v3")
+            inserted = self._refresh_materialized_table('signal_pool_union_v3', incremental)
             
-            # 从视图中获取最新数据
-            signal_data = self.db.execute_query("""
-                SELECT 
-                    draw_id,
-                    ts_utc,
-                    period,
-                    market,
-                    pick,
-                    p_win,
-                    source,
-                    vote_ratio,
-                    pick_zh,
-                    day_id_cst
-                FROM signal_pool_union_v3_view
-            """)
-            
-            if signal_data:
-                # 插入新数据
-                inserted = self.db.bulk_insert('signal_pool_union_v3', signal_data, replace=True)
-                logger.info(f"信号池刷新成功: {inserted} 条记录")
-                return True
-            else:
+            if inserted is None:
                 logger.warning("信号池视图无数据")
                 return False
+            
+            logger.info(f"信号池刷新成功: {inserted} 条记录")
+            return True
                 
         except Exception as e:
             logger.error(f"信号池刷新失败: {e}")
+            self.db.conn.rollback()
             return False
     
-    def refresh_candidates(self) -> bool:
-        """刷新决策候选表"""
+    def refresh_candidates(self, incremental: bool = False) -> bool:
+        """刷新决策候选表
+        
+        Args:
+            incremental: 仅刷新水位之后新增的draw_id
+        """
         try:
-            logger.info("开始刷新决策候选...")
+            logger.info(f"开始刷新决策候选 ({'增量' if incremental else '全量'})...")
             
-            # 清空现有候选数据
-            self.db.execute_update("DELETE FROM lab_push_candidates_v2")
+            inserted = self._refresh_materialized_table('lab_push_candidates_v2', incremental)
             
-            # 从视图中获取最新数据
-            candidate_data = self.db.execute_query("""
-                SELECT 
-                    id,
-                    created_at,
-                    ts_utc,
-                    period,
-                    market,
-                    pick,
-                    p_win,
-                    ev,
-                    kelly_frac,
-                    source,
-                    vote_ratio,
-                    pick_zh,
-                    day_id_cst,
-                    draw_id
-                FROM lab_push_candidates_v2_view
-            """)
-            
-            if candidate_data:
-                # 插入新数据
-                inserted = self.db.bulk_insert('lab_push_candidates_v2', candidate_data, replace=True)
-                logger.info(f"决策候选刷新成功: {inserted} 条记录")
-                return True
-            else:
+            if inserted is None:
                 logger.warning("决策候选视图无数据")
                 return False
+            
+            logger.info(f"决策候选刷新成功: {inserted} 条记录")
+            return True
                 
         except Exception as e:
             logger.error(f"决策候选刷新失败: {e}")
+            self.db.conn.rollback()
             return False
     
-    def run_full_pipeline(self) -> Dict[str, Any]:
-        """运行完整数据管道"""
+    def run_full_pipeline(self, incremental: bool = False) -> Dict[str, Any]:
+        """运行完整数据管道
+        
+        Args:
+            incremental: 信号池和决策候选只刷新新增的draw_id
+        """
         try:
             logger.info("开始运行完整数据管道...")
             
@@ -340,6 +376,7 @@ class LocalSQLEngine:
                 'timestamp': datetime.now().isoformat(),
                 'steps': {},
                 'success': True,
+                'incremental': incremental,
                 'total_time_ms': 0
             }
             
@@ -356,7 +393,7 @@ class LocalSQLEngine:
             
             # 2. 刷新信号池
             logger.info("步骤2: 刷新信号池")
-            signal_success = self.refresh_signal_pool()
+            signal_success = self.refresh_signal_pool(incremental=incremental)
             pipeline_results['steps']['refresh_signal_pool'] = signal_success
             
             if not signal_success:
@@ -364,7 +401,7 @@ class LocalSQLEngine:
             
             # 3. 刷新决策候选
             logger.info("步骤3: 刷新决策候选")
-            candidate_success = self.refresh_candidates()
+            candidate_success = self.refresh_candidates(incremental=incremental)
             pipeline_results['steps']['refresh_candidates'] = candidate_success
             
             if not candidate_success:
@@ -402,32 +439,40 @@ class LocalSQLEngine:
             
             stats = {}
             total_records = 0
+            today = datetime.now().strftime('%Y-%m-%d')
             
+            # 行数读取写入时维护的表统计（主键查找），不随表大小增长
             for table in tables:
-                count = self.db.get_table_count(table)
+                table_stats = self.db.get_table_stats(table)
+                count = table_stats['row_count']
                 # 对于没有data_date字段的表，只获取总数
                 if table in ['signal_pool_union_v3', 'lab_push_candidates_v2']:
                     today_count = count  # 这些表没有data_date字段
                 else:
-                    today_count = self.db.get_table_count(table, f"data_date = '{datetime.now().strftime('%Y-%m-%d')}'")
+                    today_count = self.db.get_table_stats(table, today)['row_count']
                 
                 stats[table] = {
                     'total_count': count,
                     'today_count': today_count,
+                    'last_write_at': table_stats['last_write_at'],
                     'status': 'healthy' if count > 0 else 'empty'
                 }
                 total_records += count
             
-            # 视图统计
+            # 视图统计：不再物化视图，取视图所读源表当日行数（视图行数的上界）
             view_stats = {}
-            views = ['p_cloud_today_v', 'p_map_today_v', 'p_size_today_v']
+            view_sources = {
+                'p_cloud_today_v': 'cloud_pred_today_norm',
+                'p_map_today_v': 'p_map_clean_merged_dedup_v',
+                'p_size_today_v': 'p_size_clean_merged_dedup_v'
+            }
             
-            for view in views:
-                try:
-                    count = len(self.db.execute_query(f"SELECT COUNT(*) as count FROM {view}"))
-                    view_stats[view] = {'count': count}
-                except:
-                    view_stats[view] = {'count': 0, 'error': 'view_not_exists'}
+            for view, source_table in view_sources.items():
+                view_stats[view] = {
+                    'count': stats[source_table]['today_count'],
+                    'source_table': source_table,
+                    'upper_bound': True
+                }
             
             return {
                 'tables': stats,
@@ -501,6 +546,7 @@ def main():
     parser = argparse.ArgumentParser(description='PC28本地SQL引擎')
     parser.add_argument('--action', choices=['create_views', 'refresh_signal', 'refresh_candidates', 'run_pipeline', 'test_views', 'lineage'], 
                        default='run_pipeline', help='执行动作')
+    parser.add_argument('--incremental', action='store_true', help='仅刷新水位之后新增的draw_id')
     
     args = parser.parse_args()
     
@@ -511,15 +557,15 @@ def main():
         print(f"视图创建结果: {json.dumps(results, indent=2, ensure_ascii=False)}")
     
     elif args.action == 'refresh_signal':
-        success = engine.refresh_signal_pool()
+        success = engine.refresh_signal_pool(incremental=args.incremental)
         print(f"信号池刷新: {'成功' if success else '失败'}")
     
     elif args.action == 'refresh_candidates':
-        success = engine.refresh_candidates()
+        success = engine.refresh_candidates(incremental=args.incremental)
         print(f"决策候选刷新: {'成功' if success else '失败'}")
     
     elif args.action == 'run_pipeline':
-        results = engine.run_full_pipeline()
+        results = engine.run_full_pipeline(incremental=args.incremental)
         print(f"数据管道运行结果: {json.dumps(results, indent=2, ensure_ascii=False)}")
     
     elif args.action == 'test_views':
@@ -28,6 +28,12 @@ from local_database import get_local_db
 from auto_repair_system import AutoRepairSystem
 from cloud_sync_manager import CloudSyncManager
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from python.metrics_store import get_shared_metrics_store
+
+# 本系统的指标在共享时序存储中的名称前缀
+METRIC_PREFIX = 'local_system.'
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -69,9 +75,10 @@ class MonitoringAlertingSystem:
         # 告警配置
         self.alert_config = self._get_alert_config()
         
-        # 监控指标
+        # 监控指标（历史数据在共享时序存储中，按批写入并预聚合）
         self.metrics = {}
         self.metric_history = []
+        self.metrics_store = get_shared_metrics_store()
         
         # 告警历史
         self.active_alerts = []
@@ -184,30 +191,25 @@ class MonitoringAlertingSystem:
         try:
             metrics = {}
             
-            # 数据表行数统计
+            # 数据表行数与新鲜度：读取写入时维护的表统计，不再逐表 COUNT(*) / MAX(created_at)
             tables = ['cloud_pred_today_norm', 'signal_pool_union_v3', 'lab_push_candidates_v2', 'runtime_params']
             
             for table in tables:
                 try:
-                    result = self.db.execute_query(f"SELECT COUNT(*) as count FROM {table}")
-                    metrics[f'{table}_row_count'] = result[0]['count'] if result else 0
-                except:
-                    metrics[f'{table}_row_count'] = 0
-            
-            # 数据新鲜度检查
-            for table in tables:
+                    table_stats = self.db.get_table_stats(table)
+                except Exception:
+                    table_stats = {'row_count': 0, 'last_created_at': None}
+                
+                metrics[f'{table}_row_count'] = table_stats['row_count']
+                
                 try:
-                    result = self.db.execute_query(f"""
-                        SELECT MAX(created_at) as latest_time FROM {table}
-                    """)
-                    
-                    if result and result[0]['latest_time']:
-                        latest_time = datetime.fromisoformat(result[0]['latest_time'])
+                    if table_stats['last_created_at']:
+                        latest_time = datetime.fromisoformat(table_stats['last_created_at'])
                         hours_old = (datetime.now() - latest_time).total_seconds() / 3600
                         metrics[f'{table}_data_age_hours'] = hours_old
                     else:
                         metrics[f'{table}_data_age_hours'] = 999  # 表示数据缺失
-                except:
+                except ValueError:
                     metrics[f'{table}_data_age_hours'] = 999
             
             # API健康状态
@@ -236,25 +238,15 @@ class MonitoringAlertingSystem:
             return {}
     
     def store_metrics(self, metrics: Dict[str, float]):
-        """存储监控指标"""
+        """存储监控指标（进入时序存储的写缓冲，过期数据由存储按级别清理）"""
         try:
-            timestamp = datetime.now().isoformat()
-            
-            for metric_name, value in metrics.items():
-                self.db.execute_update("""
-                    INSERT INTO monitoring_metrics (timestamp, metric_name, value, tags)
-                    VALUES (?, ?, ?, ?)
-                """, (timestamp, metric_name, value, json.dumps({})))
-            
-            # 保留最近7天的指标数据
-            cutoff_time = (datetime.now() - timedelta(days=7)).isoformat()
-            self.db.execute_update("""
-                DELETE FROM monitoring_metrics WHERE timestamp < ?
-            """, (cutoff_time,))
-            
+            self.metrics_store.append_many(metrics, datetime.now(), prefix=METRIC_PREFIX)
         except Exception as e:
             logger.error(f"存储监控指标失败: {e}")
     
+    def _metric_summary(self, metric_name: str, hours: int) -> Dict[str, Any]:
+        return self.metrics_store.summary(METRIC_PREFIX + metric_name, datetime.now() - timedelta(hours=hours))
+    
     def check_alert_conditions(self, metrics: Dict[str, float]) -> List[Alert]:
         """检查告警条件"""
         alerts = []
@@ -536,13 +528,12 @@ class MonitoringAlertingSystem:
     def get_monitoring_dashboard(self) -> Dict[str, Any]:
         """获取监控仪表板数据"""
         try:
-            # 获取最新指标
-            latest_metrics = self.db.execute_query("""
-                SELECT metric_name, value, timestamp
-                FROM monitoring_metrics
-                WHERE timestamp >= ?
-                ORDER BY timestamp DESC
-            """, ((datetime.now() - timedelta(hours=1)).isoformat(),))
+            # 获取最新指标（每个指标最近一小时内的最后一个值）
+            latest = self.metrics_store.latest(METRIC_PREFIX, datetime.now() - timedelta(hours=1))
+            latest_metrics = [
+                {'metric_name': name[len(METRIC_PREFIX):], 'value': point['value'], 'timestamp': point['timestamp']}
+                for name, point in sorted(latest.items(), key=lambda item: item[1]['timestamp'], reverse=True)
+            ]
             
             # 获取活跃告警
             active_alerts = self.db.execute_query("""
@@ -611,12 +602,13 @@ class MonitoringAlertingSystem:
         try:
             start_time = (datetime.now() - timedelta(hours=hours)).isoformat()
             
-            # 获取指标历史
-            metrics_history = self.db.execute_query("""
-                SELECT * FROM monitoring_metrics
-                WHERE timestamp >= ?
-                ORDER BY timestamp
-            """, (start_time,))
+            # 指标统计读取预聚合，不再加载原始指标行
+            api_health = self._metric_summary('api_health_status', hours)
+            memory_usage = self._metric_summary('memory_usage_percent', hours)
+            metrics_collected = sum(
+                self._metric_summary(name[len(METRIC_PREFIX):], hours)['count']
+                for name in self.metrics_store.names(METRIC_PREFIX, datetime.now() - timedelta(hours=hours))
+            )
             
             # 获取告警历史
             alerts_history = self.db.execute_query("""
@@ -646,9 +638,9 @@ class MonitoringAlertingSystem:
                     'resolution_rate': resolved_alerts / total_alerts if total_alerts > 0 else 0
                 },
                 'alert_breakdown': alert_by_type,
-                'metrics_collected': len(metrics_history),
-                'system_uptime': self._calculate_uptime(metrics_history),
-                'recommendations': self._generate_recommendations(alerts_history, metrics_history)
+                'metrics_collected': metrics_collected,
+                'system_uptime': self._calculate_uptime(api_health),
+                'recommendations': self._generate_recommendations(alerts_history, memory_usage)
             }
             
         except Exception as e:
@@ -658,27 +650,19 @@ class MonitoringAlertingSystem:
                 'error': str(e)
             }
     
-    def _calculate_uptime(self, metrics: List[Dict]) -> float:
-        """计算系统正常运行时间百分比"""
+    def _calculate_uptime(self, api_health: Dict[str, Any]) -> float:
+        """计算系统正常运行时间百分比（api_health_status 取值 0/1，均值即健康占比）"""
         try:
-            if not metrics:
+            if not api_health.get('count'):
                 return 0.0
             
-            # 统计API健康状态
-            api_metrics = [m for m in metrics if m['metric_name'] == 'api_health_status']
-            if not api_metrics:
-                return 0.0
-            
-            healthy_count = len([m for m in api_metrics if m['value'] == 1.0])
-            uptime_percentage = (healthy_count / len(api_metrics)) * 100
-            
-            return uptime_percentage
+            return api_health['avg'] * 100
             
         except Exception as e:
             logger.error(f"计算正常运行时间失败: {e}")
             return 0.0
     
-    def _generate_recommendations(self, alerts: List[Dict], metrics: List[Dict]) -> List[str]:
+    def _generate_recommendations(self, alerts: List[Dict], memory_usage: Dict[str, Any]) -> List[str]:
         """生成改进建议"""
         recommendations = []
         
@@ -700,10 +684,8 @@ class MonitoringAlertingSystem:
                 recommendations.append("系统健康告警频繁，建议优化资源配置")
             
             # 分析指标趋势
-            memory_metrics = [m for m in metrics if m['metric_name'] == 'memory_usage_percent']
-            if memory_metrics:
-                avg_memory = sum(m['value'] for m in memory_metrics) / len(memory_metrics)
-                if avg_memory > 70:
+            if memory_usage.get('count'):
+                if memory_usage['avg'] > 70:
                     recommendations.append("平均内存使用率较高，建议增加内存或优化程序")
             
             if not recommendations:
@@ -1,7 +1,6 @@
 import functions_framework
 import os
 import sys
-from flask import Flask
 
 # 添加python目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'python'))
@@ -15,10 +14,12 @@ PC28 Cloud Function 入口文件
 import json
 import logging
 import hashlib
-import requests
 import time
 from datetime import datetime, timezone
-from flask import Request
+
+# requests 与 Flask 都按需导入：HTTP 会话由 cloud_runtime 在实例内缓存复用，
+# Flask 应用只在本地运行或被显式访问 main.app 时创建
+from cloud_runtime import PhaseTimer, begin_invocation, http_session
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -31,12 +32,14 @@ def generate_signature(params: dict, wapi_key: str) -> str:
     param_string += wapi_key
     return hashlib.md5(param_string.encode('utf-8')).hexdigest()
 
+API_URL = "https://rijb.api.storeapi.net/api/119/259"
+WAPI_KEY = os.getenv('WAPI_KEY', "ca9edbfee35c22a0d6c4cf6722506af0")
+WAPI_ID = os.getenv('WAPI_ID', "45928")
+
 def fetch_pc28_data():
-    """获取PC28数据"""
+    """获取PC28数据（签名包含当前时间，每次请求重新计算）"""
     try:
-        api_url = "https://rijb.api.storeapi.net/api/119/259"
-        wapi_key = "ca9edbfee35c22a0d6c4cf6722506af0"
-        wapi_id = "45928"
+        api_url, wapi_key, wapi_id = API_URL, WAPI_KEY, WAPI_ID
         
         current_time = str(int(time.time()))
         params = {
@@ -46,7 +49,7 @@ def fetch_pc28_data():
         }
         params['sign'] = generate_signature(params, wapi_key)
         
-        response = requests.get(api_url, params=params, timeout=10)
+        response = http_session().get(api_url, params=params, timeout=10)
         
         if response.status_code == 200:
             return {
@@ -70,6 +73,8 @@ def fetch_pc28_data():
 
 def pc28_main(request=None):
     """Cloud Function 主入口"""
+    cold_start = begin_invocation()
+    timer = PhaseTimer()
     try:
         logger.info("PC28 Cloud Function 启动")
         
@@ -86,7 +91,10 @@ def pc28_main(request=None):
         logger.info(f"执行操作: {action}")
         
         if action == 'fetch_data':
-            result = fetch_pc28_data()
+            with timer.phase('init'):
+                http_session()
+            with timer.phase('fetch'):
+                result = fetch_pc28_data()
         elif action == 'health_check':
             result = {
                 'status': 'healthy',
@@ -100,6 +108,8 @@ def pc28_main(request=None):
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
         
+        result['cold_start'] = cold_start
+        result['timings_ms'] = timer.as_dict()
         return result
         
     except Exception as e:
@@ -123,13 +133,24 @@ if __name__ == "__main__":
     result = pc28_main(MockRequest())
     print(json.dumps(result, ensure_ascii=False, indent=2))
 
-# 创建Flask应用以支持健康检查
-app = Flask(__name__)
+def create_app():
+    """创建Flask应用以支持健康检查"""
+    from flask import Flask
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/')
+    def health_check():
+        """健康检查端点"""
+        return {'status': 'healthy', 'service': 'pc28-e2e-function'}, 200
+
+    return flask_app
 
-@app.route('/')
-def health_check():
-    """健康检查端点"""
-    return {'status': 'healthy', 'service': 'pc28-e2e-function'}, 200
+def __getattr__(name):
+    # 兼容 main:app 形式的引用，第一次访问时才导入Flask
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 @functions_framework.http
 def pc28_trigger(request):
@@ -138,8 +159,8 @@ def pc28_trigger(request):
         # 设置环境变量
         os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'wprojectl')
         
-        # 执行主程序
-        result = pc28_main()
+        # 执行主程序（请求中的 action 生效，默认 fetch_data）
+        result = pc28_main(request)
         return {'status': 'success', 'result': result}, 200
     except Exception as e:
         import traceback
@@ -150,4 +171,4 @@ def pc28_trigger(request):
 if __name__ == "__main__":
     # 本地运行时启动Flask服务器
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    create_app().run(host='0.0.0.0', port=port, debug=False)
@@ -10,17 +10,21 @@ import os
 from datetime import datetime, timezone
 from typing import Any, Dict
 
-# 导入本地模块
-try:
-    from api_auto_fetch import PC28DataFetcher
-except ImportError:
-    # 如果在Cloud Function环境中，可能需要不同的导入方式
-    PC28DataFetcher = None
+from cloud_runtime import PhaseTimer, begin_invocation, warm
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _load_fetcher_class():
+    """按需导入采集模块（requests、BigQuery客户端库），只有 fetch_data 才付出导入开销"""
+    try:
+        from api_auto_fetch import PC28DataFetcher
+    except ImportError:
+        # 如果在Cloud Function环境中，可能需要不同的导入方式
+        return None
+    return PC28DataFetcher
+
 def pc28_main_handler(request) -> Dict[str, Any]:
     """
     Cloud Function 主处理函数
@@ -60,14 +64,22 @@ def pc28_main_handler(request) -> Dict[str, Any]:
 
 def handle_fetch_data() -> Dict[str, Any]:
     """处理数据获取请求"""
+    cold_start = begin_invocation()
+    timer = PhaseTimer()
     try:
-        if PC28DataFetcher:
-            fetcher = PC28DataFetcher()
-            success = fetcher.run_fetch_cycle()
+        with timer.phase('import'):
+            fetcher_class = warm('fetcher_class', _load_fetcher_class)
+        if fetcher_class:
+            # 采集器（含BigQuery客户端和HTTP会话）在实例内只创建一次
+            with timer.phase('init'):
+                fetcher = warm('fetcher', fetcher_class)
+            success = fetcher.run_fetch_cycle(timer.timings)
             
             return {
                 'status': 'success' if success else 'error',
                 'message': '数据获取完成' if success else '数据获取失败',
+                'cold_start': cold_start,
+                'timings_ms': timer.as_dict(),
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
         else:
@@ -82,6 +94,7 @@ def handle_fetch_data() -> Dict[str, Any]:
         return {
             'status': 'error',
             'message': str(e),
+            'timings_ms': timer.as_dict(),
             'timestamp': datetime.now(timezone.utc).isoformat()
         }
 
@@ -4,17 +4,32 @@
 import os
 import json
 import logging
+import importlib
+import importlib.machinery
+import sys
 import traceback
 from datetime import datetime
-from main_pc28_e2e import main
+
+# 只导入轻量模块；main_pc28_e2e（BigQuery、投票、校准等）在 sync_data 时才导入，
+# 导入后留在 sys.modules 中，热调用不再重复加载
+from cloud_runtime import PhaseTimer, begin_invocation, send_alert
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# main_pc28_e2e 运行时追加到 sys.path 的目录及其顶层依赖，浅层健康检查逐一查找
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_MODULE_PATHS = [_BASE_DIR, os.path.join(_BASE_DIR, 'CHANGESETS/python'), os.path.join(_BASE_DIR, 'integration')]
+MAIN_MODULE_DEPENDENCIES = [
+    'main_pc28_e2e', 'yaml', 'bigquery_data_adapter', 'enhanced_voting', 'advanced_calibration',
+    'adaptive_pi_controller', 'risk_management', 'ledger_io', 'state_storage', 'cloud_runtime'
+]
+
 def main_handler(request):
     """Cloud Function入口点 - 增强错误处理和健康检查"""
     start_time = datetime.now()
+    cold_start = begin_invocation()
     
     try:
         # 记录请求信息
@@ -29,16 +44,21 @@ def main_handler(request):
             
             if action == 'sync_data':
                 # 执行主要的数据同步逻辑
+                timer = PhaseTimer()
                 try:
-                    main()
+                    with timer.phase('import'):
+                        import main_pc28_e2e
+                    main_pc28_e2e.run_cycle(timer.timings)
                     execution_time = (datetime.now() - start_time).total_seconds()
                     
-                    logger.info(f"数据同步完成，耗时: {execution_time:.2f}秒")
+                    logger.info(f"数据同步完成，耗时: {execution_time:.2f}秒，阶段耗时: {timer.timings}")
                     
                     return {
                         'status': 'success',
                         'message': 'PC28 E2E processing completed',
                         'execution_time': execution_time,
+                        'cold_start': cold_start,
+                        'timings_ms': timer.as_dict(),
                         'timestamp': datetime.now().isoformat()
                     }
                     
@@ -47,22 +67,20 @@ def main_handler(request):
                     logger.error(traceback.format_exc())
                     
                     # 发送告警通知
-                    try:
-                        if os.path.exists('telegram_notifier.sh'):
-                            os.system(f"bash telegram_notifier.sh 'PC28数据同步失败: {str(sync_error)}'")
-                    except:
-                        pass
+                    send_alert(f"PC28数据同步失败: {sync_error}")
                     
                     return {
                         'status': 'error',
                         'message': f'数据同步失败: {str(sync_error)}',
                         'error_type': 'sync_error',
+                        'cold_start': cold_start,
+                        'timings_ms': timer.as_dict(),
                         'timestamp': datetime.now().isoformat()
                     }, 500
                     
             elif action == 'health_check':
-                # 健康检查
-                health_status = perform_health_check()
+                # 健康检查，deep=true 时实际导入主模块
+                health_status = perform_health_check(deep=bool(data.get('deep')))
                 return health_status
                 
             elif action == 'validate_data':
@@ -100,8 +118,23 @@ def main_handler(request):
             'timestamp': datetime.now().isoformat()
         }, 500
 
-def perform_health_check():
-    """执行系统健康检查"""
+def _find_missing_dependencies():
+    """返回找不到的主模块依赖（只查找不导入）"""
+    search_path = MAIN_MODULE_PATHS + sys.path
+    missing = []
+    for name in MAIN_MODULE_DEPENDENCIES:
+        if name in sys.modules:
+            continue
+        if importlib.machinery.PathFinder.find_spec(name, search_path) is None:
+            missing.append(name)
+    return missing
+
+def perform_health_check(deep=False):
+    """执行系统健康检查
+
+    默认只查找主模块及其依赖是否存在，不触发重量级依赖的加载；
+    deep=True 时实际导入 main_pc28_e2e，能发现依赖模块自身的导入错误。
+    """
     health_status = {
         'status': 'healthy',
         'message': 'PC28 E2E Function is running',
@@ -134,12 +167,19 @@ def perform_health_check():
             health_status['status'] = 'degraded'
         
         # 检查Python模块
-        try:
-            import main_pc28_e2e
-            health_status['checks']['main_module'] = 'ok'
-        except ImportError as e:
-            health_status['checks']['main_module'] = f'import_error: {str(e)}'
+        missing = _find_missing_dependencies()
+        if missing:
+            health_status['checks']['main_module'] = f"import_error: missing {', '.join(missing)}"
             health_status['status'] = 'unhealthy'
+        elif deep:
+            try:
+                importlib.import_module('main_pc28_e2e')
+                health_status['checks']['main_module'] = 'ok'
+            except Exception as e:
+                health_status['checks']['main_module'] = f'import_error: {str(e)}'
+                health_status['status'] = 'unhealthy'
+        else:
+            health_status['checks']['main_module'] = 'ok'
         
         # 检查数据源连接（简单测试）
         try:
@@ -14,12 +14,23 @@ from enhanced_voting import WeightedVoting
 from advanced_calibration import hybrid_calibrate
 from adaptive_pi_controller import PIController
 from risk_management import kelly_fraction, stake_units
-from ledger_io import upsert_order, settle_orders
+from ledger_io import ledger_writer, settle_orders
 from state_storage import load_state, save_state
+from cloud_runtime import send_alert
+
+_config_cache: Dict[str, Any] = {}
+_components: Dict[tuple, Dict[str, Any]] = {}
 
 def load_config(path:str='pc28_enhanced_config.yaml')->Dict[str,Any]:
+    """读取配置；文件未修改时复用上次解析结果（热启动的实例不再重复解析YAML）"""
+    mtime = os.path.getmtime(path)
+    cached = _config_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
     with open(path,'r',encoding='utf-8') as f:
-        return yaml.safe_load(f)
+        cfg = yaml.safe_load(f)
+    _config_cache[path] = (mtime, cfg)
+    return cfg
 
 def load_env_vars():
     """加载环境变量"""
@@ -37,73 +48,103 @@ def load_env_vars():
     except Exception as e:
         print(f"警告: 加载环境变量失败: {e}")
 
-def main():
-    # 加载环境变量
-    load_env_vars()
-    
-    cfg = load_config()
-    # 使用实际环境变量替换配置中的占位符
-    env = {
+def load_env()->Dict[str,str]:
+    return {
         'PROJECT': os.environ.get('PROJECT', 'wprojectl'),
         'DS_LAB': os.environ.get('DS_LAB', 'pc28_lab'),
         'DS_DRAW': os.environ.get('DS_DRAW', 'pc28'),
         'BQLOC': os.environ.get('BQLOC', 'us-central1'),
         'TZ': os.environ.get('TZ', 'Asia/Shanghai')
     }
-    
-    # 初始化组件
-    bq = BQ(
-        project=env.get('PROJECT', 'wprojectl'),
-        ds_lab=env.get('DS_LAB', 'pc28_lab'), 
-        ds_draw=env.get('DS_DRAW', 'pc28'),
-        bqloc=env.get('BQLOC', 'us-central1'),
-        tz=env.get('TZ', 'Asia/Shanghai')
-    )
-    voting = WeightedVoting(cfg)
-    pi_ctrl = PIController(cfg)
-    
-    # 加载状态
+
+def init_components(cfg:Dict[str,Any], env:Dict[str,str])->Dict[str,Any]:
+    """创建查询客户端和账本写入组件；两者不带决策状态，同一进程内按环境缓存，热调用直接复用"""
+    key = tuple(sorted(env.items())) + (id(cfg),)
+    components = _components.get(key)
+    if components is not None:
+        return components
+
     state_dir = cfg['paths'].get('state_dir', '~/.pc28_state')
     state_path = os.path.expanduser(os.path.join(state_dir, 'main_state.json'))
     os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    components = {
+        'bq': BQ(
+            project=env['PROJECT'],
+            ds_lab=env['DS_LAB'],
+            ds_draw=env['DS_DRAW'],
+            bqloc=env['BQLOC'],
+            tz=env['TZ']
+        ),
+        'state_path': state_path,
+        # 订单先写本地预写文件，写入失败的订单在下次运行时补写；由每次运行末尾显式 flush
+        'ledger': ledger_writer(env, wal_path=os.path.join(os.path.dirname(state_path), 'ledger_wal.jsonl'),
+                                flush_interval=0),
+    }
+    _components.clear()
+    _components[key] = components
+    return components
+
+def run_cycle(timings:Dict[str,float]=None)->Dict[str,Any]:
+    """执行一次完整的决策周期，异常直接抛出；timings 记录 init / fetch / write 各阶段毫秒数"""
+    timings = {} if timings is None else timings
+
+    def mark(phase:str, start:float):
+        timings[phase] = round(timings.get(phase, 0.0) + (time.perf_counter() - start) * 1000, 2)
+
+    start = time.perf_counter()
+    load_env_vars()
+    cfg = load_config()
+    env = load_env()
+    components = init_components(cfg, env)
+    bq, ledger = components['bq'], components['ledger']
+    # 投票和PI控制器带有逐次调整的内部状态，每次运行重新创建，热实例与冷启动的决策一致
+    voting = WeightedVoting(cfg)
+    pi_ctrl = PIController(cfg)
+    state_path = components['state_path']
     state = load_state(state_path)
-    
+    mark('init', start)
+
     print(f"[{datetime.datetime.now()}] PC28 E2E 黑盒启动")
-    
+
     try:
         # 1. 获取数据 - 禁止模拟数据，必须使用真实数据源
+        start = time.perf_counter()
+        # 有新开奖时先使查询缓存失效，热实例不沿用上一期的查询结果
+        bq.refresh_on_new_draw()
         print("正在获取KPI数据...")
         kpi_data = bq.kpi_window()
         print(f"KPI数据获取成功: {kpi_data}")
-        
+
         print("正在获取候选数据...")
         candidates = bq.read_candidates()
         print(f"候选数据获取成功: {len(candidates)} 条记录")
-        
+        mark('fetch', start)
+
         # 2. 投票决策
         decision = voting.vote(candidates)
-        
+
         # 3. 校准概率
         if decision and 'p_win' in decision:
             cal_params = cfg.get('calibration', {})
             decision['p_win'] = hybrid_calibrate(decision['p_win'], cal_params)
-        
+
         # 4. PI控制调整
         if kpi_data:
             cov = kpi_data.get('coverage')
             acc = kpi_data.get('accuracy')
             pi_result = pi_ctrl.step(cov, acc)
             print(f"PI控制: {pi_result}")
-        
+
         # 5. 风险管理
+        order = None
         if decision and decision.get('p_win', 0) >= pi_ctrl.state['min_accept']:
             p_win = decision['p_win']
             kelly_cap = cfg['risk']['kelly_cap']
             unit_size = cfg['risk']['unit_size']
-            
+
             kelly_f = kelly_fraction(p_win, kelly_cap)
             stake = stake_units(p_win, unit_size, kelly_cap)
-            
+
             if stake > 0:
                 # 6. 下单记录
                 order = {
@@ -116,26 +157,36 @@ def main():
                     'stake_u': stake,
                     'note': f"auto_e2e_{decision.get('reason','')}"
                 }
-                
-                upsert_order(order, env)
+
+                ledger.add(order)
                 print(f"下单: {order}")
-        
-        # 7. 结算历史订单
+
+        # 7. 写入账本并结算历史订单
+        start = time.perf_counter()
+        ledger.flush()
         settle_orders(env)
-        
+
         # 8. 保存状态
         state['last_run'] = datetime.datetime.now().isoformat()
         state['last_decision'] = decision
         save_state(state_path, state)
-        
+        mark('write', start)
+
         print(f"[{datetime.datetime.now()}] 运行完成")
-        
+        return {'decision': decision, 'order_id': order['id'] if order else None}
+
+    except Exception:
+        ledger.flush()
+        raise
+
+def main():
+    try:
+        run_cycle()
     except Exception as e:
         print(f"错误: {e}")
         traceback.print_exc()
         # 发送告警
-        if os.path.exists('telegram_notifier.sh'):
-            os.system(f"bash telegram_notifier.sh 'PC28 E2E 错误: {str(e)}'")
+        send_alert(f"PC28 E2E 错误: {e}")
 
 
 if __name__ == '__main__':
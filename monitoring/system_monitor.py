@@ -15,8 +15,12 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import sys
 from collections import defaultdict, deque
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from python.metrics_store import get_shared_metrics_store
+
 # 导入合约合规性日志记录器
 try:
     from contract_compliance_logger import (
@@ -179,6 +183,8 @@ class SystemMonitor:
         """初始化监控数据库"""
         self.monitoring_db_path = 'monitoring/monitoring_data.db'
         os.makedirs(os.path.dirname(self.monitoring_db_path), exist_ok=True)
+        # 数值指标写入共享时序存储（批量写入、预聚合），告警和同步事件仍记在本库
+        self.metrics_store = get_shared_metrics_store()
         
         try:
             with sqlite3.connect(self.monitoring_db_path) as conn:
@@ -571,42 +577,31 @@ class SystemMonitor:
             )
     
     def _save_system_metrics(self, metrics: SystemMetrics):
-        """保存系统指标到数据库"""
+        """保存系统指标到时序存储"""
         try:
-            with sqlite3.connect(self.monitoring_db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO system_metrics (
-                        timestamp, cpu_percent, memory_percent, memory_used_gb, memory_total_gb,
-                        disk_percent, disk_used_gb, disk_total_gb, network_sent_mb, network_recv_mb,
-                        active_connections, process_count
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    metrics.timestamp, metrics.cpu_percent, metrics.memory_percent,
-                    metrics.memory_used_gb, metrics.memory_total_gb, metrics.disk_percent,
-                    metrics.disk_used_gb, metrics.disk_total_gb, metrics.network_sent_mb,
-                    metrics.network_recv_mb, metrics.active_connections, metrics.process_count
-                ))
-                conn.commit()
+            self.metrics_store.append_many({
+                'cpu_percent': metrics.cpu_percent,
+                'memory_percent': metrics.memory_percent,
+                'memory_used_gb': metrics.memory_used_gb,
+                'disk_percent': metrics.disk_percent,
+                'disk_used_gb': metrics.disk_used_gb,
+                'network_sent_mb': metrics.network_sent_mb,
+                'network_recv_mb': metrics.network_recv_mb,
+                'active_connections': metrics.active_connections,
+                'process_count': metrics.process_count
+            }, metrics.timestamp, prefix='system.')
         except Exception as e:
             logger.error(f"Failed to save system metrics: {e}")
     
     def _save_database_metrics(self, metrics: DatabaseMetrics):
-        """保存数据库指标到数据库"""
+        """保存数据库指标到时序存储"""
         try:
-            with sqlite3.connect(self.monitoring_db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO database_metrics (
-                        timestamp, database_name, table_count, total_records, database_size_mb,
-                        query_response_time_ms, active_connections, last_sync_time, sync_status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    metrics.timestamp, metrics.database_name, metrics.table_count,
-                    metrics.total_records, metrics.database_size_mb, metrics.query_response_time_ms,
-                    metrics.active_connections, metrics.last_sync_time, metrics.sync_status
-                ))
-                conn.commit()
+            self.metrics_store.append_many({
+                'table_count': metrics.table_count,
+                'total_records': metrics.total_records,
+                'database_size_mb': metrics.database_size_mb,
+                'query_response_time_ms': metrics.query_response_time_ms
+            }, metrics.timestamp, prefix=f'database.{metrics.database_name}.')
         except Exception as e:
             logger.error(f"Failed to save database metrics: {e}")
     
@@ -626,6 +621,12 @@ class SystemMonitor:
                     metrics.sync_status, metrics.error_count, metrics.throughput_records_per_second
                 ))
                 conn.commit()
+            self.metrics_store.append_many({
+                'success': 1.0 if metrics.sync_status == 'success' else 0.0,
+                'duration_seconds': metrics.sync_duration_seconds,
+                'records_synced': metrics.records_synced,
+                'error_count': metrics.error_count
+            }, metrics.timestamp, prefix='sync.')
         except Exception as e:
             logger.error(f"Failed to save sync metrics: {e}")
     
@@ -760,33 +761,25 @@ class SystemMonitor:
             end_time = datetime.now()
             start_time = end_time - timedelta(hours=hours)
             
-            # 查询历史数据
+            # 系统指标与同步统计读取预聚合，不再扫描原始行
+            store = self.metrics_store
+            cpu = store.summary('system.cpu_percent', start_time, end_time)
+            memory = store.summary('system.memory_percent', start_time, end_time)
+            disk = store.summary('system.disk_percent', start_time, end_time)
+            system_stats = (cpu['avg'], memory['avg'], disk['avg'], cpu['max'], memory['max'], disk['max'])
+            
+            # 同步统计：success 为 0/1，计数即同步次数，求和即成功次数
+            sync_success = store.summary('sync.success', start_time, end_time)
+            sync_stats = (
+                sync_success['count'],
+                int(sync_success['sum']),
+                store.summary('sync.duration_seconds', start_time, end_time)['avg'],
+                int(store.summary('sync.records_synced', start_time, end_time)['sum'])
+            )
+            
+            # 告警统计
             with sqlite3.connect(self.monitoring_db_path) as conn:
                 cursor = conn.cursor()
-                
-                # 系统指标统计
-                cursor.execute('''
-                    SELECT AVG(cpu_percent), AVG(memory_percent), AVG(disk_percent),
-                           MAX(cpu_percent), MAX(memory_percent), MAX(disk_percent)
-                    FROM system_metrics 
-                    WHERE timestamp >= ?
-                ''', (start_time.isoformat(),))
-                
-                system_stats = cursor.fetchone()
-                
-                # 同步统计
-                cursor.execute('''
-                    SELECT COUNT(*), 
-                           SUM(CASE WHEN sync_status = 'success' THEN 1 ELSE 0 END),
-                           AVG(sync_duration_seconds),
-                           SUM(records_synced)
-                    FROM sync_metrics 
-                    WHERE timestamp >= ?
-                ''', (start_time.isoformat(),))
-                
-                sync_stats = cursor.fetchone()
-                
-                # 告警统计
                 cursor.execute('''
                     SELECT severity, COUNT(*) 
                     FROM alert_events 
@@ -17,11 +17,14 @@ import logging
 import json
 import time
 import sqlite3
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 import statistics
 
+import numpy as np
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -64,14 +67,72 @@ class AccuracyMetrics:
     evaluation_period: str
     model_performance: Dict[str, float]
 
+@dataclass
+class BacktestResult:
+    """回测结果（按期号排序的逐期序列）"""
+    periods: List[str]
+    total_scores: np.ndarray
+    cumulative_scores: np.ndarray
+    rolling_accuracy: np.ndarray
+    rolling_confidence: np.ndarray
+    rolling_consistency: np.ndarray
+    final_metrics: Dict[str, float]
+
+class RollingAccuracyWindow:
+    """最近N期的准确率、置信度和一致性，增删均为O(1)"""
+    
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.entries = deque()
+        self.correct = 0
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        self.big_count = 0
+        self.small_count = 0
+    
+    def _apply(self, entry: Tuple[bool, float, str], sign: int):
+        is_correct, confidence, predicted_result = entry
+        self.correct += sign * int(is_correct)
+        if confidence > 0:
+            self.confidence_sum += sign * confidence
+            self.confidence_count += sign
+        if predicted_result == "BIG":
+            self.big_count += sign
+        elif predicted_result == "SMALL":
+            self.small_count += sign
+    
+    def add(self, is_correct: bool, confidence: float, predicted_result: str):
+        entry = (bool(is_correct), confidence or 0.0, predicted_result)
+        self.entries.append(entry)
+        self._apply(entry, 1)
+        if len(self.entries) > self.size:
+            self._apply(self.entries.popleft(), -1)
+    
+    def metrics(self) -> Dict[str, float]:
+        """与 calculate_accuracy 口径一致的窗口指标"""
+        total = len(self.entries)
+        if total == 0:
+            return {"准确率": 0.0, "置信度": 0.0, "一致性": 0.0, "BIG预测占比": 0.0, "SMALL预测占比": 0.0}
+        return {
+            "准确率": self.correct / total,
+            "置信度": self.confidence_sum / self.confidence_count if self.confidence_count else 0.0,
+            "一致性": 1.0 - abs(self.big_count - self.small_count) / total,
+            "BIG预测占比": self.big_count / total,
+            "SMALL预测占比": self.small_count / total
+        }
+
 class PredictionAccuracySystem:
     """预测准确率系统"""
     
     def __init__(self, config: PredictionConfig = None):
         self.config = config or PredictionConfig()
         
+        # 已计分期号的滚动窗口状态
+        self.rolling_window = RollingAccuracyWindow(self.config.evaluation_periods)
+        
         # 初始化系统
         self._init_accuracy_system()
+        self._warm_rolling_window()
     
     def _init_accuracy_system(self):
         """初始化准确率系统"""
@@ -142,6 +203,20 @@ class PredictionAccuracySystem:
                 )
             ''')
             
+            # 累计计分状态：cumulative_score 恒等于 simple_scoring 中 total_score 之和，
+            # 按期号顺序追加计分时无需再对历史求和
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scoring_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_period TEXT,
+                    cumulative_score REAL NOT NULL DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_simple_scoring_period ON simple_scoring(period)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_prediction_time ON prediction_records(prediction_time)')
+            
             # 创建数据流转监控表
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS flow_monitoring (
@@ -240,19 +315,27 @@ class PredictionAccuracySystem:
             conn = sqlite3.connect(self.config.database_path)
             cursor = conn.cursor()
             
-            # 获取有预测和实际结果的记录
+            # 在SQL中对最近N期做聚合，不把记录拉回Python
             cursor.execute('''
-                SELECT p.period, p.predicted_result, p.confidence_score, a.actual_result
-                FROM prediction_records p
-                JOIN actual_results a ON p.period = a.period
-                ORDER BY p.prediction_time DESC
-                LIMIT ?
+                SELECT COUNT(*),
+                       COALESCE(SUM(predicted_result = actual_result), 0),
+                       AVG(CASE WHEN confidence_score > 0 THEN confidence_score END),
+                       COALESCE(SUM(predicted_result = 'BIG'), 0),
+                       COALESCE(SUM(predicted_result = 'SMALL'), 0)
+                FROM (
+                    SELECT p.predicted_result, p.confidence_score, a.actual_result
+                    FROM prediction_records p
+                    JOIN actual_results a ON p.period = a.period
+                    ORDER BY p.prediction_time DESC
+                    LIMIT ?
+                )
             ''', (periods,))
             
-            records = cursor.fetchall()
+            total_predictions, correct_predictions, average_confidence, big_count, small_count = cursor.fetchone()
             
-            if not records:
+            if not total_predictions:
                 logger.warning("没有找到匹配的预测和实际结果记录")
+                conn.close()
                 return AccuracyMetrics(
                     total_predictions=0,
                     correct_predictions=0,
@@ -264,20 +347,13 @@ class PredictionAccuracySystem:
                 )
             
             # 计算准确率
-            total_predictions = len(records)
-            correct_predictions = sum(1 for record in records if record[1] == record[3])
-            accuracy_rate = correct_predictions / total_predictions if total_predictions > 0 else 0.0
+            accuracy_rate = correct_predictions / total_predictions
             
-            # 计算平均置信度
-            confidence_scores = [record[2] for record in records if record[2] > 0]
-            average_confidence = statistics.mean(confidence_scores) if confidence_scores else 0.0
+            # 平均置信度（只统计大于0的置信度）
+            average_confidence = average_confidence or 0.0
             
             # 计算一致性分数（预测结果的稳定性）
-            predicted_results = [record[1] for record in records]
-            big_count = predicted_results.count("BIG")
-            small_count = predicted_results.count("SMALL")
-            consistency_score = abs(big_count - small_count) / total_predictions if total_predictions > 0 else 0.0
-            consistency_score = 1.0 - consistency_score  # 转换为一致性分数
+            consistency_score = 1.0 - abs(big_count - small_count) / total_predictions
             
             # 模型性能分析
             model_performance = {
@@ -332,72 +408,239 @@ class PredictionAccuracySystem:
                 model_performance={}
             )
     
-    def simple_scoring(self, period: str) -> float:
-        """简化财务计分"""
+    @staticmethod
+    def _score_values(is_correct: bool, confidence_score: float) -> Tuple[int, float, float]:
+        """返回 (基础分, 置信度奖励, 总分)"""
+        base_score = 1 if is_correct else 0
+        confidence_bonus = (confidence_score or 0.0) * 0.5 if is_correct else 0.0
+        return base_score, confidence_bonus, base_score + confidence_bonus
+    
+    def _load_scoring_state(self, cursor: sqlite3.Cursor) -> Tuple[Optional[str], float]:
+        """读取累计计分状态，不存在时从 simple_scoring 初始化"""
+        row = cursor.execute('SELECT last_period, cumulative_score FROM scoring_state WHERE id = 1').fetchone()
+        if row is None:
+            row = cursor.execute(
+                'SELECT MAX(period), COALESCE(SUM(total_score), 0) FROM simple_scoring'
+            ).fetchone()
+            cursor.execute(
+                'INSERT INTO scoring_state (id, last_period, cumulative_score) VALUES (1, ?, ?)', row
+            )
+        return row[0], row[1]
+    
+    def _warm_rolling_window(self):
+        """用最近已计分的期号预热滚动窗口"""
         try:
             conn = sqlite3.connect(self.config.database_path)
-            cursor = conn.cursor()
-            
-            # 获取预测和实际结果
-            cursor.execute('''
-                SELECT p.predicted_result, p.confidence_score, a.actual_result
+            rows = conn.execute('''
+                SELECT s.prediction_correct, p.confidence_score, p.predicted_result
+                FROM simple_scoring s
+                JOIN prediction_records p ON p.period = s.period
+                ORDER BY s.period DESC
+                LIMIT ?
+            ''', (self.rolling_window.size,)).fetchall()
+            conn.close()
+            for is_correct, confidence_score, predicted_result in reversed(rows):
+                self.rolling_window.add(is_correct, confidence_score, predicted_result)
+        except Exception as e:
+            logger.warning(f"预热滚动窗口失败: {e}")
+    
+    def _fetch_scoring_inputs(self, cursor: sqlite3.Cursor, periods: List[str]) -> List[Tuple]:
+        """批量获取期号的预测和实际结果，按期号排序"""
+        rows = []
+        unique_periods = sorted(set(periods))
+        for start in range(0, len(unique_periods), 900):
+            chunk = unique_periods[start:start + 900]
+            cursor.execute(f'''
+                SELECT p.period, p.predicted_result, p.confidence_score, a.actual_result
                 FROM prediction_records p
                 JOIN actual_results a ON p.period = a.period
-                WHERE p.period = ?
-            ''', (period,))
-            
-            result = cursor.fetchone()
-            
-            if not result:
-                logger.warning(f"期号{period}没有找到匹配的预测和实际结果")
-                return 0.0
-            
-            predicted_result, confidence_score, actual_result = result
-            
-            # 基础计分
-            is_correct = predicted_result == actual_result
-            base_score = 1 if is_correct else 0
-            
-            # 置信度奖励
-            confidence_bonus = confidence_score * 0.5 if is_correct else 0.0
-            
-            # 总分
-            total_score = base_score + confidence_bonus
-            
-            # 获取累计分数
+                WHERE p.period IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            rows.extend(cursor.fetchall())
+        rows.sort(key=lambda row: row[0])
+        return rows
+    
+    def score_periods(self, periods: List[str]) -> Dict[str, float]:
+        """批量计分，在一个事务中完成，返回 {期号: 本期得分}
+
+        按期号顺序追加的期号直接在累计状态上累加（O(1)）；
+        早于已计分最大期号的补录或重复计分才回退到对历史求和，并替换该期旧的计分记录。
+        """
+        conn = sqlite3.connect(self.config.database_path)
+        try:
+            cursor = conn.cursor()
+            rows = self._fetch_scoring_inputs(cursor, periods)
+            last_period, total_sum = self._load_scoring_state(cursor)
+            
+            scores = {}
+            inserts = []
+            window_entries = []
+            for period, predicted_result, confidence_score, actual_result in rows:
+                is_correct = predicted_result == actual_result
+                base_score, confidence_bonus, total_score = self._score_values(is_correct, confidence_score)
+                
+                if last_period is None or period > last_period:
+                    cumulative_score = total_sum + total_score
+                    last_period = period
+                else:
+                    # 补录或重复计分：先写入本批已计分的记录，求和时才能看到
+                    cursor.executemany(self._SCORING_INSERT, inserts)
+                    inserts = []
+                    old_total = cursor.execute(
+                        'SELECT COALESCE(SUM(total_score), 0) FROM simple_scoring WHERE period = ?', (period,)
+                    ).fetchone()[0]
+                    cursor.execute('DELETE FROM simple_scoring WHERE period = ?', (period,))
+                    previous_cumulative = cursor.execute(
+                        'SELECT COALESCE(SUM(total_score), 0) FROM simple_scoring WHERE period < ?', (period,)
+                    ).fetchone()[0]
+                    cumulative_score = previous_cumulative + total_score
+                    total_sum -= old_total
+                
+                total_sum += total_score
+                inserts.append((period, is_correct, base_score, confidence_bonus, total_score, cumulative_score))
+                scores[period] = total_score
+                window_entries.append((is_correct, confidence_score, predicted_result))
+                
+                logger.debug(f"期号{period}计分: {'正确' if is_correct else '错误'}, 得分{total_score:.2f}, 累计{cumulative_score:.2f}")
+            
+            cursor.executemany(self._SCORING_INSERT, inserts)
             cursor.execute('''
-                SELECT COALESCE(SUM(total_score), 0) 
-                FROM simple_scoring 
-                WHERE period < ?
-            ''', (period,))
+                UPDATE scoring_state SET last_period = ?, cumulative_score = ?, updated_at = ?
+                WHERE id = 1
+            ''', (last_period, total_sum, datetime.now().isoformat()))
+            conn.commit()
             
-            previous_cumulative = cursor.fetchone()[0]
-            cumulative_score = previous_cumulative + total_score
+            for entry in window_entries:
+                self.rolling_window.add(*entry)
             
-            # 保存计分结果
-            cursor.execute('''
-                INSERT OR REPLACE INTO simple_scoring 
-                (period, prediction_correct, base_score, confidence_bonus, total_score, cumulative_score)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                period,
-                is_correct,
-                base_score,
-                confidence_bonus,
-                total_score,
-                cumulative_score
-            ))
+            missing = set(periods) - set(scores)
+            if missing:
+                logger.warning(f"{len(missing)}个期号没有找到匹配的预测和实际结果")
+            logger.info(f"批量计分完成: {len(scores)}期, 累计{total_sum:.2f}")
+            return scores
             
-            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             conn.close()
+    
+    _SCORING_INSERT = '''
+        INSERT INTO simple_scoring 
+        (period, prediction_correct, base_score, confidence_bonus, total_score, cumulative_score)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    
+    def simple_scoring(self, period: str) -> float:
+        """简化财务计分"""
+        try:
+            scores = self.score_periods([period])
+            if period not in scores:
+                logger.warning(f"期号{period}没有找到匹配的预测和实际结果")
+                return 0.0
             
-            logger.info(f"期号{period}计分: {'正确' if is_correct else '错误'}, 得分{total_score:.2f}, 累计{cumulative_score:.2f}")
+            total_score = scores[period]
+            logger.info(f"期号{period}计分: {'正确' if total_score > 0 else '错误'}, 得分{total_score:.2f}")
             return total_score
             
         except Exception as e:
             logger.error(f"简化计分失败: {e}")
             return 0.0
     
+    def get_rolling_metrics(self) -> Dict[str, float]:
+        """最近 evaluation_periods 个已计分期号的滚动指标"""
+        return self.rolling_window.metrics()
+    
+    def backtest(self, start_period: str = None, end_period: str = None,
+                 window: int = None, persist: bool = False) -> BacktestResult:
+        """向量化回测：一次查询取出区间内所有期号，用累加和计算逐期得分、累计分和滚动指标
+
+        persist=True 时在一个事务中重写区间内的 simple_scoring 记录并重置累计状态
+        """
+        window = max(1, window or self.config.evaluation_periods)
+        conditions, params = [], []
+        if start_period is not None:
+            conditions.append('p.period >= ?')
+            params.append(start_period)
+        if end_period is not None:
+            conditions.append('p.period <= ?')
+            params.append(end_period)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = sqlite3.connect(self.config.database_path)
+        try:
+            cursor = conn.cursor()
+            rows = cursor.execute(f'''
+                SELECT p.period,
+                       COALESCE(p.predicted_result = a.actual_result, 0),
+                       COALESCE(p.confidence_score, 0),
+                       p.predicted_result = 'BIG',
+                       p.predicted_result = 'SMALL'
+                FROM prediction_records p
+                JOIN actual_results a ON p.period = a.period
+                {where}
+                ORDER BY p.period
+            ''', params).fetchall()
+            
+            periods = [row[0] for row in rows]
+            values = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), 4)
+            correct, confidence, big, small = values.T
+            
+            total_scores = correct * (1.0 + 0.5 * confidence)
+            base = 0.0
+            if periods:
+                base = cursor.execute(
+                    'SELECT COALESCE(SUM(total_score), 0) FROM simple_scoring WHERE period < ?', (periods[0],)
+                ).fetchone()[0]
+            cumulative_scores = base + np.cumsum(total_scores)
+            
+            def rolling_sum(x: np.ndarray) -> np.ndarray:
+                sums = np.cumsum(x)
+                sums[window:] = sums[window:] - sums[:-window]
+                return sums
+            
+            counts = np.minimum(np.arange(1, len(periods) + 1), window)
+            positive = (confidence > 0).astype(float)
+            confidence_counts = rolling_sum(positive)
+            rolling_accuracy = rolling_sum(correct) / counts
+            rolling_confidence = np.divide(rolling_sum(confidence * positive), confidence_counts,
+                                           out=np.zeros(len(periods)), where=confidence_counts > 0)
+            rolling_consistency = 1.0 - np.abs(rolling_sum(big) - rolling_sum(small)) / counts
+            
+            if persist and periods:
+                cursor.execute('DELETE FROM simple_scoring WHERE period >= ? AND period <= ?',
+                               (periods[0], periods[-1]))
+                cursor.executemany(self._SCORING_INSERT, (
+                    (period, bool(c), int(c), float(c * 0.5 * conf), float(total), float(cumulative))
+                    for period, c, conf, total, cumulative
+                    in zip(periods, correct, confidence, total_scores, cumulative_scores)
+                ))
+                cursor.execute('DELETE FROM scoring_state WHERE id = 1')
+                self._load_scoring_state(cursor)
+                conn.commit()
+                logger.info(f"回测结果已写入: {periods[0]} ~ {periods[-1]}, {len(periods)}期")
+        finally:
+            conn.close()
+        
+        final_metrics = {}
+        if periods:
+            final_metrics = {
+                "准确率": float(rolling_accuracy[-1]),
+                "置信度": float(rolling_confidence[-1]),
+                "一致性": float(rolling_consistency[-1]),
+                "累计得分": float(cumulative_scores[-1])
+            }
+        
+        return BacktestResult(
+            periods=periods,
+            total_scores=total_scores,
+            cumulative_scores=cumulative_scores,
+            rolling_accuracy=rolling_accuracy,
+            rolling_confidence=rolling_confidence,
+            rolling_consistency=rolling_consistency,
+            final_metrics=final_metrics
+        )
+    
     def monitor_data_flow(self) -> Dict[str, str]:
         """监控数据流转"""
         try:
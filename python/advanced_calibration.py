@@ -48,3 +48,84 @@ def hybrid_calibrate(p_raw:float, params:Dict[str,Any])->float:
     p1 = apply_platt(p_raw, A,B)
     p2 = apply_temp(p1, T)
     return min(max(p2,1e-6),1-1e-6)
+
+# ---------------------------------------------------------------------------
+# 批量(NumPy)版本：apply/hybrid 与标量函数逐元素一致；
+# 拟合函数是确定性的 Newton 解，与 SGD 版本结果相近但不相同
+# numpy 在函数内导入，标量路径不依赖 numpy
+# ---------------------------------------------------------------------------
+
+def _logit_array(p):
+    import numpy as np
+    p = np.clip(np.asarray(p, dtype=float), 1e-6, 1-1e-6)
+    return np.log(p/(1-p))
+
+def _sigmoid_array(z):
+    import numpy as np
+    return 1.0/(1.0+np.exp(-np.asarray(z, dtype=float)))
+
+# 批量拟合的参数范围：T 与 temp_scale_fit 一致，A 限制在 SGD 实际能到达的量级内
+PLATT_A_RANGE = (-10.0, 10.0)
+TEMP_RANGE = (0.1, 5.0)
+
+def platt_fit_batch(p_raw, y, iters:int=50, tol:float=1e-10, prior:float=1.0)->Tuple[float,float]:
+    """Newton-Raphson 拟合 Platt：以恒等映射 (A=1,B=0) 为高斯先验中心的 MAP 估计
+       p_raw/y 为等长数组，y∈{0,1}；prior 为先验强度（约等于伪样本数）
+       与 platt_fit 不是同一估计量：SGD 结果随样本顺序和步长抖动，本函数是确定解，
+       两者参数通常相差 0.1 量级、标定后的对数损失不高于 SGD 结果；
+       可分数据下先验和 PLATT_A_RANGE 保证 A 不会发散"""
+    import numpy as np
+    x = _logit_array(p_raw)
+    y = np.asarray(y, dtype=float)
+    if x.size == 0:
+        return 1.0, 0.0
+    X = np.column_stack([x, np.ones_like(x)])
+    w0 = np.array([1.0, 0.0])
+    w = w0.copy()
+    for _ in range(iters):
+        q = _sigmoid_array(X @ w)
+        grad = X.T @ (q - y) + prior * (w - w0)
+        h = q * (1 - q)
+        H = (X * h[:, None]).T @ X + max(prior, 1e-9) * np.eye(2)
+        step = np.linalg.solve(H, grad)
+        w -= step
+        w[0] = min(max(w[0], PLATT_A_RANGE[0]), PLATT_A_RANGE[1])
+        if float(np.max(np.abs(step))) < tol:
+            break
+    return float(w[0]), float(w[1])
+
+def temp_scale_fit_batch(p_raw, y, iters:int=50, tol:float=1e-10)->float:
+    """Newton 法拟合温度 T（对 1/T 做一维牛顿）的最大似然解，范围与 temp_scale_fit 一致 TEMP_RANGE
+       与 temp_scale_fit 的 SGD 结果不逐位一致，但对数损失不高于后者"""
+    import numpy as np
+    x = _logit_array(p_raw)
+    y = np.asarray(y, dtype=float)
+    if x.size == 0:
+        return 1.0
+    lo, hi = TEMP_RANGE
+    s = 1.0
+    for _ in range(iters):
+        q = _sigmoid_array(x * s)
+        grad = float(np.sum((q - y) * x))
+        hess = float(np.sum(q * (1 - q) * x * x))
+        if hess <= 1e-12:
+            break
+        step = grad / hess
+        s = min(max(s - step, 1/hi), 1/lo)
+        if abs(step) < tol:
+            break
+    return float(min(max(1.0/s, lo), hi))
+
+def apply_platt_batch(p, A:float, B:float):
+    return _sigmoid_array(A*_logit_array(p) + B)
+
+def apply_temp_batch(p, T:float):
+    return _sigmoid_array(_logit_array(p)/max(1e-6,T))
+
+def hybrid_calibrate_batch(p_raw, params:Dict[str,Any]):
+    """hybrid_calibrate 的数组版本"""
+    import numpy as np
+    A=params.get("A",1.0); B=params.get("B",0.0); T=params.get("T",1.0)
+    p1 = apply_platt_batch(p_raw, A, B)
+    p2 = apply_temp_batch(p1, T)
+    return np.clip(p2, 1e-6, 1-1e-6)
@@ -136,11 +136,13 @@ FROM W
             print(f"插入数据失败: {e}")
             return False
     
-    def execute_dml(self, sql: str) -> bool:
-        """执行DML语句（INSERT, UPDATE, DELETE）"""
+    def execute_dml(self, sql: str, query_parameters: Optional[List[Any]] = None) -> bool:
+        """执行DML语句（INSERT, UPDATE, DELETE, MERGE），可附带查询参数"""
         try:
             job_config = bigquery.QueryJobConfig()
             job_config.use_legacy_sql = False
+            if query_parameters:
+                job_config.query_parameters = query_parameters
             
             query_job = self.client.query(sql, job_config=job_config)
             query_job.result()  # 等待完成
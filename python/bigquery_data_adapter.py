@@ -2,25 +2,281 @@
 # -*- coding: utf-8 -*-
 """
 BigQueryDataAdapter
-- 仅依赖 bq CLI：通过子进程执行 SQL，返回 JSON
+- 进程内复用的查询后端：google-cloud-bigquery 客户端（优先）、bq CLI（无客户端库时兜底）、SQLite 本地替身（离线测试/压测）
+- 查询参数化，结果按 规范化SQL + 参数 缓存（TTL），新开奖到达时整体失效
 - 提供：基本查询、KPI快查、rolling指标、候选读取、账本写入SQL模板拼装（交由 ledger_io 调用）
 """
 from __future__ import annotations
-import os, json, subprocess, shlex, time, datetime
-from typing import Any, Dict, List, Optional
+import os, json, subprocess, shlex, time, datetime, re, sqlite3, threading, logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 查询结果默认缓存秒数（开奖间隔 3 分钟，新开奖时另行失效）
+DEFAULT_CACHE_TTL = 30.0
+DEFAULT_CACHE_SIZE = 256
+
+def normalize_sql(sql:str)->str:
+    return " ".join(sql.split())
+
+def _param_type(value:Any)->str:
+    if isinstance(value, bool): return "BOOL"
+    if isinstance(value, int): return "INT64"
+    if isinstance(value, float): return "FLOAT64"
+    if isinstance(value, datetime.datetime): return "TIMESTAMP"
+    if isinstance(value, datetime.date): return "DATE"
+    return "STRING"
+
+def _plain_value(value:Any)->Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class QueryCache:
+    """按 规范化SQL + 参数 缓存查询结果；generation 变化（新开奖）后旧结果全部作废"""
+
+    def __init__(self, ttl:float=DEFAULT_CACHE_TTL, max_entries:int=DEFAULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Tuple[float, int, List[Dict[str,Any]]]]" = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(sql:str, params:Optional[Dict[str,Any]])->Tuple:
+        return (normalize_sql(sql), tuple(sorted((params or {}).items())))
+
+    def get(self, key:Tuple, ttl:Optional[float]=None)->Optional[List[Dict[str,Any]]]:
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] != self.generation or time.monotonic() - entry[0] > ttl:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return [dict(row) for row in entry[2]]
+
+    def put(self, key:Tuple, rows:List[Dict[str,Any]], generation:int):
+        with self.lock:
+            if generation != self.generation:
+                return  # 查询期间有新开奖，结果可能已过时
+            self.entries[key] = (time.monotonic(), generation, [dict(row) for row in rows])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.stats["invalidations"] += 1
+
+
+class BigQueryBackend:
+    """google-cloud-bigquery 客户端，连接在进程内复用"""
+
+    def __init__(self, project:str, location:str):
+        from google.cloud import bigquery
+        self.bigquery = bigquery
+        self.client = bigquery.Client(project=project, location=location)
+
+    def query(self, sql:str, params:Optional[Dict[str,Any]]=None, timeout:int=120)->List[Dict[str,Any]]:
+        job_config = self.bigquery.QueryJobConfig(use_legacy_sql=False, query_parameters=[
+            self.bigquery.ScalarQueryParameter(name, _param_type(value), value) for name, value in (params or {}).items()
+        ])
+        results = self.client.query(sql, job_config=job_config).result(timeout=timeout)
+        return [{key: _plain_value(value) for key, value in row.items()} for row in results]
+
+
+class BqCliBackend:
+    """bq CLI 子进程（未安装客户端库时使用），参数通过 --parameter 传递，不经过 shell"""
+
+    def __init__(self, project:str, location:str):
+        self.location = location
+
+    def query(self, sql:str, params:Optional[Dict[str,Any]]=None, timeout:int=120)->List[Dict[str,Any]]:
+        cmd = ["bq", f"--location={self.location}", "query", "--use_legacy_sql=false", "--format=json"]
+        for name, value in (params or {}).items():
+            cmd.append(f"--parameter={name}:{_param_type(value)}:{_plain_value(value)}")
+        cmd.append(sql)
+        out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, timeout=timeout)
+        return json.loads(out.decode("utf-8") or "[]")
+
+
+class _CountIf:
+    def __init__(self): self.n = 0
+    def step(self, cond):
+        if cond: self.n += 1
+    def finalize(self): return self.n
+
+
+class SQLiteBackend:
+    """BigQuery 的本地 SQLite 替身，供离线测试和控制循环压测
+
+    表名直接使用 BigQuery 的完整引用（`proj.dataset.table` 在 SQLite 中是一个反引号标识符），
+    时间戳按 UTC 的 'YYYY-MM-DD HH:MM:SS' 文本存储。查询前把本模块用到的 BigQuery 方言
+    （CURRENT_DATE(tz)、DATE(ts, tz)、TIMESTAMP_SUB/INTERVAL、IF、COUNTIF、SAFE_DIVIDE）改写为等价的 SQLite 函数。
+    """
+
+    _REWRITES = [
+        (re.compile(r"INTERVAL\s+(@?\w+)\s+(SECOND|MINUTE|HOUR|DAY)\b", re.I), r"\1, '\2'"),
+        (re.compile(r"\bCURRENT_DATE\s*\(", re.I), "BQ_CURRENT_DATE("),
+        (re.compile(r"\bCURRENT_TIMESTAMP\s*\(\s*\)", re.I), "BQ_CURRENT_TIMESTAMP()"),
+        (re.compile(r"\bDATE\s*\(", re.I), "BQ_DATE("),
+        (re.compile(r"\bIF\s*\(", re.I), "IIF("),
+    ]
+    _UNITS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+    def __init__(self, db_path:str=":memory:", now=None):
+        self.now = now or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function("BQ_CURRENT_DATE", 1, lambda tz: self._local(self.now(), tz).date().isoformat())
+        self.conn.create_function("BQ_CURRENT_TIMESTAMP", 0, lambda: self._format(self.now()))
+        self.conn.create_function("BQ_DATE", 1, lambda ts: ts and self._parse(ts).date().isoformat())
+        self.conn.create_function("BQ_DATE", 2, lambda ts, tz: ts and self._local(self._parse(ts), tz).date().isoformat())
+        self.conn.create_function("TIMESTAMP_SUB", 3, lambda ts, n, unit: ts and self._format(
+            self._parse(ts) - datetime.timedelta(seconds=int(n) * self._UNITS[unit.upper()])))
+        self.conn.create_function("SAFE_DIVIDE", 2, lambda a, b: None if a is None or not b else a / b)
+        self.conn.create_function("MOD", 2, lambda a, b: None if a is None or not b else int(a) % int(b))
+        self.conn.create_aggregate("COUNTIF", 1, _CountIf)
+
+    @staticmethod
+    def _parse(value)->datetime.datetime:
+        moment = value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return moment if moment.tzinfo else moment.replace(tzinfo=datetime.timezone.utc)
+
+    @staticmethod
+    def _format(moment:datetime.datetime)->str:
+        return moment.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def _local(moment:datetime.datetime, tz:str)->datetime.datetime:
+        from zoneinfo import ZoneInfo
+        return moment.astimezone(ZoneInfo(tz))
+
+    def translate(self, sql:str)->str:
+        for pattern, replacement in self._REWRITES:
+            sql = pattern.sub(replacement, sql)
+        return sql
+
+    def query(self, sql:str, params:Optional[Dict[str,Any]]=None, timeout:int=120)->List[Dict[str,Any]]:
+        with self.lock:
+            cursor = self.conn.execute(self.translate(sql), {k: _plain_value(v) for k, v in (params or {}).items()})
+            return [dict(row) for row in cursor.fetchall()]
+
+    def load_table(self, table_ref:str, rows:List[Dict[str,Any]]):
+        """按行字典建表并写入（表名为 BigQuery 完整引用，如 proj.dataset.table）"""
+        if not rows:
+            return
+        columns = list(rows[0].keys())
+        with self.lock, self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS `{table_ref}` ({', '.join(columns)})")
+            self.conn.executemany(
+                f"INSERT INTO `{table_ref}` ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [tuple(_plain_value(row.get(column)) for column in columns) for row in rows]
+            )
+
+
+logger = logging.getLogger(__name__)
+
+_backends: Dict[Tuple, Any] = {}
+_backends_lock = threading.Lock()
+
+def _client_unavailable_errors()->Tuple[type, ...]:
+    """客户端库不可用时回退 bq CLI 的异常：未安装，或没有应用默认凭据（只用 gcloud auth login 登录的开发机）"""
+    try:
+        from google.auth.exceptions import DefaultCredentialsError
+    except ImportError:
+        return (ImportError,)
+    return (ImportError, DefaultCredentialsError)
+
+def get_backend(project:str, location:str, kind:Optional[str]=None):
+    """进程内共享的查询后端；kind 为 bigquery / cli / sqlite，默认读取 PC28_BQ_BACKEND，未设置时优先客户端库，
+    客户端库未安装或没有应用默认凭据时回退 bq CLI（显式指定 bigquery 时直接抛出）"""
+    kind = kind or os.environ.get("PC28_BQ_BACKEND")
+    if kind == "sqlite":
+        key = ("sqlite", os.environ.get("PC28_BQ_SQLITE_PATH", ":memory:"))
+    else:
+        key = (kind, project, location)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if kind == "sqlite":
+                backend = SQLiteBackend(key[1])
+            elif kind == "cli":
+                backend = BqCliBackend(project, location)
+            else:
+                try:
+                    backend = BigQueryBackend(project, location)
+                except _client_unavailable_errors() as e:
+                    if kind == "bigquery":
+                        raise
+                    logger.warning(f"BigQuery 客户端库不可用，回退 bq CLI: {e}")
+                    backend = BqCliBackend(project, location)
+            _backends[key] = backend
+            logger.info(f"BigQuery 查询后端: {type(backend).__name__} ({project}, {location})")
+        return backend
+
 
 class BQ:
-    def __init__(self, project:str, ds_lab:str, ds_draw:str, bqloc:str, tz:str):
+    def __init__(self, project:str, ds_lab:str, ds_draw:str, bqloc:str, tz:str,
+                 backend=None, cache_ttl:float=DEFAULT_CACHE_TTL):
         self.proj, self.ds_lab, self.ds_draw, self.loc, self.tz = project, ds_lab, ds_draw, bqloc, tz
+        self.backend = backend or get_backend(project, bqloc)
+        self.cache = QueryCache(cache_ttl)
+        self.last_draw_id: Optional[str] = None
+        self._draw_lock = threading.Lock()
 
-    def _run_json(self, sql:str, timeout:int=120)->List[Dict[str,Any]]:
-        cmd = f"bq --location={shlex.quote(self.loc)} query --use_legacy_sql=false --format=json {shlex.quote(sql)}"
-        out = subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT, timeout=timeout)
-        return json.loads(out.decode("utf-8") or "[]")
+    def _run_json(self, sql:str, timeout:int=120, params:Optional[Dict[str,Any]]=None,
+                  ttl:Optional[float]=None)->List[Dict[str,Any]]:
+        key = self.cache.key(sql, params)
+        rows = self.cache.get(key, ttl)
+        if rows is not None:
+            return rows
+        generation = self.cache.generation
+        rows = self.backend.query(sql, params, timeout)
+        self.cache.put(key, rows, generation)
+        return rows
+
+    def invalidate_cache(self):
+        self.cache.invalidate()
+
+    @staticmethod
+    def _draw_order(draw_id:str)->Tuple[int, Any]:
+        return (0, int(draw_id)) if draw_id.isdigit() else (1, draw_id)
+
+    def on_new_draw(self, draw_id:Any)->bool:
+        """比上次看到的更新的一期到达时使缓存失效（重复或较旧的通知忽略）"""
+        draw_id = str(draw_id)
+        with self._draw_lock:
+            if self.last_draw_id is not None and self._draw_order(draw_id) <= self._draw_order(self.last_draw_id):
+                return False
+            self.last_draw_id = draw_id
+        self.cache.invalidate()
+        return True
+
+    def latest_draw_id(self)->Optional[str]:
+        """最近一天内最新一期的 draw_id（不走缓存）"""
+        sql = f"""
+SELECT draw_id FROM `{self.proj}.{self.ds_draw}.draws_14w_dedup_v`
+WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 1 DAY)
+ORDER BY timestamp DESC LIMIT 1
+"""
+        rows = self.backend.query(sql, None, 60)
+        return str(rows[0]["draw_id"]) if rows and rows[0].get("draw_id") is not None else None
+
+    def refresh_on_new_draw(self)->bool:
+        """查询最新一期并交给 on_new_draw；每个决策周期开始时调用，返回缓存是否被失效"""
+        draw_id = self.latest_draw_id()
+        return draw_id is not None and self.on_new_draw(draw_id)
 
     def draws_today(self)->int:
-        sql = f"SELECT COUNT(*) AS n FROM `{self.proj}.{self.ds_draw}.draws_14w_dedup_v` WHERE DATE(timestamp,'{self.tz}')=CURRENT_DATE('{self.tz}')"
-        j = self._run_json(sql)
+        sql = f"SELECT COUNT(*) AS n FROM `{self.proj}.{self.ds_draw}.draws_14w_dedup_v` WHERE DATE(timestamp,@tz)=CURRENT_DATE(@tz)"
+        j = self._run_json(sql, params={"tz": self.tz})
         return int(j[0].get("n",0)) if j else 0
 
     def kpi_window(self, window_min:int=60)->Dict[str,Any]:
@@ -29,7 +285,7 @@ WITH L AS (
   SELECT prediction as market, outcome, probability as p_win, timestamp as created_at
   FROM `{self.proj}.{self.ds_lab}.score_ledger`
   WHERE (tag IS NULL OR tag='prod')
-    AND day_id_cst=CURRENT_DATE('{self.tz}')
+    AND day_id_cst=CURRENT_DATE(@tz)
     AND market IN ('oe','size')
 ),
 W AS (
@@ -40,18 +296,18 @@ W AS (
          AVG(p_win) AS pbar_w,
          AVG( (IF(outcome='win',1,0)-p_win)*(IF(outcome='win',1,0)-p_win) ) AS brier_w
   FROM L
-  WHERE created_at >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {window_min} MINUTE)
+  WHERE created_at >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @window_min MINUTE)
   GROUP BY market
 ),
 D AS (
   SELECT COUNT(*) AS n_draw_w
   FROM `{self.proj}.{self.ds_draw}.draws_14w_dedup_v`
-  WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {window_min} MINUTE)
+  WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @window_min MINUTE)
 )
 SELECT market, n_ord_w, n_set_w, acc_w, pbar_w, brier_w, (SELECT n_draw_w FROM D) AS n_draw_w
 FROM W
 """
-        rows = self._run_json(sql)
+        rows = self._run_json(sql, params={"tz": self.tz, "window_min": int(window_min)})
         out = {"_meta":{"window_min":window_min}}
         for r in rows:
             m = r.get("market")
@@ -73,8 +329,8 @@ FROM W
         """读取正EV候选（视图需预先创建）。返回字段至少包含：
            draw_id, market, p_cloud,p_map,p_size, session, tail, p_even (或统一 p)
         """
-        sql = f"SELECT * FROM `{self.proj}.{self.ds_lab}.lab_push_candidates_v2` WHERE day_id_cst=CURRENT_DATE('{self.tz}')"
+        sql = f"SELECT * FROM `{self.proj}.{self.ds_lab}.lab_push_candidates_v2` WHERE day_id_cst=CURRENT_DATE(@tz)"
         try:
-            return self._run_json(sql, timeout=180)
+            return self._run_json(sql, timeout=180, params={"tz": self.tz})
         except Exception:
             return []
@@ -13,7 +13,7 @@ from typing import Dict, List, Any, Optional, Callable, Set
 from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass, asdict
 from enum import Enum
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 import hashlib
 from api_field_optimization import OptimizedLotteryData
@@ -71,142 +71,268 @@ class DistributionTarget:
     last_update: float = 0
     error_count: int = 0
 
+class TimerWheel:
+    """TTL时间轮：按到期刻度分桶，清理时只处理已到期的桶"""
+    
+    def __init__(self, resolution: float = 1.0):
+        self.resolution = resolution
+        self.slots: Dict[int, Set[str]] = defaultdict(set)
+        self.last_tick = int(time.time() / resolution)
+    
+    def _tick(self, expire_at: float) -> int:
+        # 向上取整，保证桶被处理时其中条目均已到期
+        return int(expire_at / self.resolution) + 1
+    
+    def schedule(self, key: str, expire_at: float):
+        self.slots[self._tick(expire_at)].add(key)
+    
+    def unschedule(self, key: str, expire_at: float):
+        slot = self.slots.get(self._tick(expire_at))
+        if slot is not None:
+            slot.discard(key)
+            if not slot:
+                del self.slots[self._tick(expire_at)]
+    
+    def advance(self, now: float) -> List[str]:
+        """推进到当前时刻，返回到期的key"""
+        now_tick = int(now / self.resolution)
+        due: List[str] = []
+        if now_tick - self.last_tick > len(self.slots):
+            # 长时间未推进时直接遍历现有桶，避免逐刻度空转
+            for tick in [t for t in self.slots if t <= now_tick]:
+                due.extend(self.slots.pop(tick))
+        else:
+            for tick in range(self.last_tick + 1, now_tick + 1):
+                slot = self.slots.pop(tick, None)
+                if slot:
+                    due.extend(slot)
+        self.last_tick = max(self.last_tick, now_tick)
+        return due
+
+
+class _CacheShard:
+    """缓存分片：OrderedDict 维护LRU顺序，独立锁；容量由管理器按全局预算控制"""
+    
+    def __init__(self):
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.wheel = TimerWheel()
+        self.size_bytes = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+        self.lock = threading.Lock()
+    
+    def remove(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry.size_bytes
+            self.wheel.unschedule(key, entry.timestamp + entry.ttl)
+        return entry
+    
+    def lru_entry(self) -> Optional[CacheEntry]:
+        """最久未访问的条目（调用方需持有锁）"""
+        return next(iter(self.entries.values()), None)
+    
+    def evict(self, key: str) -> Optional[CacheEntry]:
+        """淘汰指定条目并计数（调用方需持有锁）"""
+        entry = self.remove(key)
+        if entry is not None:
+            self.eviction_count += 1
+        return entry
+
+
+def estimate_size(data: Any) -> int:
+    """估算数据大小（字节），不做序列化"""
+    if data is None or isinstance(data, bool):
+        return 4
+    if isinstance(data, (int, float)):
+        return 8
+    if isinstance(data, str):
+        return len(data) if data.isascii() else len(data.encode('utf-8'))
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, dict):
+        return 2 + sum(estimate_size(k) + estimate_size(v) + 2 for k, v in data.items())
+    if isinstance(data, (list, tuple, set)):
+        return 2 + sum(estimate_size(v) + 1 for v in data)
+    return len(str(data))
+
+
 class DataCacheManager:
-    """数据缓存管理器"""
+    """数据缓存管理器
+    
+    数据按key哈希分布到多个分片，每个分片有独立锁，get之间不再争用同一把锁；
+    分片内用 OrderedDict 维护LRU顺序，用时间轮做TTL清理。
+    内存上限是所有分片共享的总预算：超出时比较各分片最久未访问的条目，淘汰其中最旧的（近似全局LRU），
+    因此单个大条目只要不超过总预算就能缓存，不会因分片容量清空整个分片。
+    """
     
-    def __init__(self, max_memory_mb: int = 100, default_ttl: int = 300):
+    def __init__(self, max_memory_mb: int = 100, default_ttl: int = 300, num_shards: int = 16,
+                 size_hook: Optional[Callable[[Any], int]] = None):
         self.max_memory_bytes = max_memory_mb * 1024 * 1024
         self.default_ttl = default_ttl
+        self.size_hook = size_hook or estimate_size
         
-        # 多级缓存存储
-        self.l1_cache: Dict[str, CacheEntry] = {}  # 内存缓存
+        # 分片存储
+        self.shards = [_CacheShard() for _ in range(num_shards)]
         self.cache_index: Dict[DataType, Set[str]] = defaultdict(set)  # 类型索引
+        self.index_lock = threading.Lock()
         self.access_history: deque = deque(maxlen=1000)  # 访问历史
         
-        # 缓存统计
-        self.stats = CacheStats(
-            total_entries=0,
-            total_size_bytes=0,
-            hit_count=0,
-            miss_count=0,
-            eviction_count=0,
-            hit_rate=0.0,
-            memory_usage_mb=0.0,
-            avg_access_time_ms=0.0
-        )
-        
-        # 线程锁
-        self.cache_lock = threading.RLock()
-        
         # 后台清理线程
         self.cleanup_thread = threading.Thread(target=self._background_cleanup, daemon=True)
         self.cleanup_thread.start()
         
-        logger.info(f"数据缓存管理器初始化完成，最大内存: {max_memory_mb}MB")
+        logger.info(f"数据缓存管理器初始化完成，最大内存: {max_memory_mb}MB，分片数: {num_shards}")
+    
+    def _shard(self, key: str) -> _CacheShard:
+        return self.shards[hash(key) % len(self.shards)]
+    
+    @property
+    def l1_cache(self) -> Dict[str, CacheEntry]:
+        """所有分片条目的快照"""
+        snapshot = {}
+        for shard in self.shards:
+            with shard.lock:
+                snapshot.update(shard.entries)
+        return snapshot
     
-    def put(self, key: str, data: Any, data_type: DataType, ttl: Optional[int] = None) -> bool:
-        """存储数据到缓存"""
+    def _unindex(self, entries: List[CacheEntry]):
+        if entries:
+            with self.index_lock:
+                for entry in entries:
+                    self.cache_index[entry.data_type].discard(entry.key)
+    
+    def put(self, key: str, data: Any, data_type: DataType, ttl: Optional[int] = None,
+            size_bytes: Optional[int] = None) -> bool:
+        """存储数据到缓存
+        
+        Args:
+            size_bytes: 调用方已知的数据大小；未提供时使用 size_hook 估算
+        """
         if ttl is None:
             ttl = self.default_ttl
         
         try:
-            with self.cache_lock:
-                # 计算数据大小
-                data_json = json.dumps(data, ensure_ascii=False) if not isinstance(data, str) else data
-                size_bytes = len(data_json.encode('utf-8'))
-                
-                # 检查内存限制
-                if self.stats.total_size_bytes + size_bytes > self.max_memory_bytes:
-                    self._evict_lru_entries(size_bytes)
-                
-                # 创建缓存条目
-                current_time = time.time()
-                entry = CacheEntry(
-                    key=key,
-                    data=data,
-                    data_type=data_type,
-                    timestamp=current_time,
-                    ttl=ttl,
-                    access_count=0,
-                    last_access=current_time,
-                    size_bytes=size_bytes
-                )
-                
+            if size_bytes is None:
+                size_bytes = self.size_hook(data)
+            if size_bytes > self.max_memory_bytes:
+                logger.warning(f"条目超过缓存总容量，不缓存: {key} ({size_bytes} bytes)")
+                return False
+            
+            shard = self._shard(key)
+            current_time = time.time()
+            entry = CacheEntry(
+                key=key,
+                data=data,
+                data_type=data_type,
+                timestamp=current_time,
+                ttl=ttl,
+                access_count=0,
+                last_access=current_time,
+                size_bytes=size_bytes
+            )
+            
+            with shard.lock:
                 # 如果key已存在，先移除旧条目
-                if key in self.l1_cache:
-                    old_entry = self.l1_cache[key]
-                    self.stats.total_size_bytes -= old_entry.size_bytes
-                    self.cache_index[old_entry.data_type].discard(key)
-                else:
-                    self.stats.total_entries += 1
-                
-                # 存储新条目
-                self.l1_cache[key] = entry
+                old_entry = shard.remove(key)
+                shard.entries[key] = entry
+                shard.size_bytes += size_bytes
+                shard.wheel.schedule(key, current_time + ttl)
+            
+            # 检查总内存限制
+            evicted = self._evict_over_budget(key)
+            if evicted:
+                logger.info(f"LRU淘汰: {len(evicted)} 条记录，释放 {sum(e.size_bytes for e in evicted)} 字节")
+            if old_entry is not None and old_entry.data_type != data_type:
+                evicted.append(old_entry)
+            self._unindex(evicted)
+            with self.index_lock:
                 self.cache_index[data_type].add(key)
-                self.stats.total_size_bytes += size_bytes
-                self.stats.memory_usage_mb = self.stats.total_size_bytes / (1024 * 1024)
-                
-                logger.debug(f"缓存存储成功: {key} ({size_bytes} bytes)")
-                return True
+            
+            logger.debug(f"缓存存储成功: {key} ({size_bytes} bytes)")
+            return True
                 
         except Exception as e:
             logger.error(f"缓存存储失败: {key}, 错误: {e}")
             return False
     
+    def _evict_over_budget(self, keep_key: str) -> List[CacheEntry]:
+        """总大小超出预算时逐个淘汰全局最久未访问的条目（不淘汰刚写入的 keep_key），每次只持有一个分片锁"""
+        evicted: List[CacheEntry] = []
+        while sum(shard.size_bytes for shard in self.shards) > self.max_memory_bytes:
+            victim_shard, victim = None, None
+            for shard in self.shards:
+                with shard.lock:
+                    entry = shard.lru_entry()
+                if entry is None or entry.key == keep_key:
+                    continue
+                if victim is None or entry.last_access < victim.last_access:
+                    victim_shard, victim = shard, entry
+            if victim is None:
+                break
+            with victim_shard.lock:
+                # 选取后可能已被访问或移除，只淘汰仍在原位置的同一条目
+                if victim_shard.lru_entry() is victim:
+                    victim_shard.evict(victim.key)
+                    evicted.append(victim)
+        return evicted
+    
     def get(self, key: str) -> Optional[Any]:
         """从缓存获取数据"""
         start_time = time.time()
+        shard = self._shard(key)
         
         try:
-            with self.cache_lock:
-                if key not in self.l1_cache:
-                    self.stats.miss_count += 1
-                    self._update_hit_rate()
+            with shard.lock:
+                entry = shard.entries.get(key)
+                if entry is None:
+                    shard.miss_count += 1
                     return None
                 
-                entry = self.l1_cache[key]
                 current_time = time.time()
                 
                 # 检查TTL
                 if current_time - entry.timestamp > entry.ttl:
-                    self._remove_entry(key)
-                    self.stats.miss_count += 1
-                    self._update_hit_rate()
-                    return None
-                
-                # 更新访问统计
-                entry.access_count += 1
-                entry.last_access = current_time
-                self.stats.hit_count += 1
-                self._update_hit_rate()
-                
-                # 记录访问历史
-                access_time_ms = (time.time() - start_time) * 1000
-                self.access_history.append(access_time_ms)
-                self._update_avg_access_time()
-                
-                logger.debug(f"缓存命中: {key}")
-                return entry.data
+                    shard.remove(key)
+                    shard.miss_count += 1
+                    expired = entry
+                else:
+                    expired = None
+                    # 更新访问统计和LRU顺序
+                    entry.access_count += 1
+                    entry.last_access = current_time
+                    shard.entries.move_to_end(key)
+                    shard.hit_count += 1
+            
+            if expired is not None:
+                self._unindex([expired])
+                return None
+            
+            # 记录访问历史
+            self.access_history.append((time.time() - start_time) * 1000)
+            
+            logger.debug(f"缓存命中: {key}")
+            return entry.data
                 
         except Exception as e:
             logger.error(f"缓存获取失败: {key}, 错误: {e}")
-            self.stats.miss_count += 1
-            self._update_hit_rate()
+            shard.miss_count += 1
             return None
     
     def get_by_type(self, data_type: DataType, limit: int = 100) -> List[Any]:
         """按类型获取数据"""
         try:
-            with self.cache_lock:
+            with self.index_lock:
                 keys = list(self.cache_index[data_type])[:limit]
-                results = []
-                
-                for key in keys:
-                    data = self.get(key)
-                    if data is not None:
-                        results.append(data)
-                
-                return results
+            
+            results = []
+            for key in keys:
+                data = self.get(key)
+                if data is not None:
+                    results.append(data)
+            
+            return results
                 
         except Exception as e:
             logger.error(f"按类型获取缓存失败: {data_type}, 错误: {e}")
@@ -215,8 +341,7 @@ class DataCacheManager:
     def remove(self, key: str) -> bool:
         """移除缓存条目"""
         try:
-            with self.cache_lock:
-                return self._remove_entry(key)
+            return self._remove_entry(key)
         except Exception as e:
             logger.error(f"移除缓存失败: {key}, 错误: {e}")
             return False
@@ -224,16 +349,16 @@ class DataCacheManager:
     def clear_by_type(self, data_type: DataType) -> int:
         """按类型清空缓存"""
         try:
-            with self.cache_lock:
+            with self.index_lock:
                 keys_to_remove = list(self.cache_index[data_type])
-                removed_count = 0
-                
-                for key in keys_to_remove:
-                    if self._remove_entry(key):
-                        removed_count += 1
-                
-                logger.info(f"清空缓存类型 {data_type}: {removed_count} 条记录")
-                return removed_count
+            
+            removed_count = 0
+            for key in keys_to_remove:
+                if self._remove_entry(key):
+                    removed_count += 1
+            
+            logger.info(f"清空缓存类型 {data_type}: {removed_count} 条记录")
+            return removed_count
                 
         except Exception as e:
             logger.error(f"按类型清空缓存失败: {data_type}, 错误: {e}")
@@ -241,37 +366,28 @@ class DataCacheManager:
     
     def _remove_entry(self, key: str) -> bool:
         """内部移除条目方法"""
-        if key in self.l1_cache:
-            entry = self.l1_cache[key]
-            del self.l1_cache[key]
-            self.cache_index[entry.data_type].discard(key)
-            self.stats.total_entries -= 1
-            self.stats.total_size_bytes -= entry.size_bytes
-            self.stats.memory_usage_mb = self.stats.total_size_bytes / (1024 * 1024)
-            return True
-        return False
-    
-    def _evict_lru_entries(self, required_bytes: int):
-        """LRU淘汰策略"""
-        # 按最后访问时间排序
-        entries_by_access = sorted(
-            self.l1_cache.items(),
-            key=lambda x: x[1].last_access
-        )
-        
-        freed_bytes = 0
-        evicted_count = 0
-        
-        for key, entry in entries_by_access:
-            if freed_bytes >= required_bytes:
-                break
-            
-            freed_bytes += entry.size_bytes
-            self._remove_entry(key)
-            evicted_count += 1
-        
-        self.stats.eviction_count += evicted_count
-        logger.info(f"LRU淘汰: {evicted_count} 条记录，释放 {freed_bytes} 字节")
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.remove(key)
+        if entry is None:
+            return False
+        self._unindex([entry])
+        return True
+    
+    def cleanup_expired(self) -> int:
+        """清理已到期条目，只处理时间轮中到期的桶"""
+        current_time = time.time()
+        removed = []
+        for shard in self.shards:
+            with shard.lock:
+                for key in shard.wheel.advance(current_time):
+                    entry = shard.entries.get(key)
+                    if entry is not None and current_time - entry.timestamp > entry.ttl:
+                        shard.entries.pop(key)
+                        shard.size_bytes -= entry.size_bytes
+                        removed.append(entry)
+        self._unindex(removed)
+        return len(removed)
     
     def _background_cleanup(self):
         """后台清理过期条目"""
@@ -279,47 +395,36 @@ class DataCacheManager:
             try:
                 time.sleep(60)  # 每分钟清理一次
                 
-                with self.cache_lock:
-                    current_time = time.time()
-                    expired_keys = []
-                    
-                    for key, entry in self.l1_cache.items():
-                        if current_time - entry.timestamp > entry.ttl:
-                            expired_keys.append(key)
-                    
-                    for key in expired_keys:
-                        self._remove_entry(key)
-                    
-                    if expired_keys:
-                        logger.info(f"后台清理过期条目: {len(expired_keys)} 条")
+                expired_count = self.cleanup_expired()
+                if expired_count:
+                    logger.info(f"后台清理过期条目: {expired_count} 条")
                         
             except Exception as e:
                 logger.error(f"后台清理异常: {e}")
     
-    def _update_hit_rate(self):
-        """更新命中率"""
-        total_requests = self.stats.hit_count + self.stats.miss_count
-        if total_requests > 0:
-            self.stats.hit_rate = (self.stats.hit_count / total_requests) * 100
-    
-    def _update_avg_access_time(self):
-        """更新平均访问时间"""
-        if self.access_history:
-            self.stats.avg_access_time_ms = sum(self.access_history) / len(self.access_history)
-    
     def get_stats(self) -> CacheStats:
         """获取缓存统计"""
-        with self.cache_lock:
-            return CacheStats(
-                total_entries=self.stats.total_entries,
-                total_size_bytes=self.stats.total_size_bytes,
-                hit_count=self.stats.hit_count,
-                miss_count=self.stats.miss_count,
-                eviction_count=self.stats.eviction_count,
-                hit_rate=self.stats.hit_rate,
-                memory_usage_mb=self.stats.memory_usage_mb,
-                avg_access_time_ms=self.stats.avg_access_time_ms
-            )
+        total_entries = total_size = hits = misses = evictions = 0
+        for shard in self.shards:
+            with shard.lock:
+                total_entries += len(shard.entries)
+                total_size += shard.size_bytes
+                hits += shard.hit_count
+                misses += shard.miss_count
+                evictions += shard.eviction_count
+        
+        history = list(self.access_history)
+        total_requests = hits + misses
+        return CacheStats(
+            total_entries=total_entries,
+            total_size_bytes=total_size,
+            hit_count=hits,
+            miss_count=misses,
+            eviction_count=evictions,
+            hit_rate=(hits / total_requests) * 100 if total_requests else 0.0,
+            memory_usage_mb=total_size / (1024 * 1024),
+            avg_access_time_ms=sum(history) / len(history) if history else 0.0
+        )
 
 class DataDistributor:
     """数据分发器"""
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PC28开奖历史列式存储
+每列一个只追加的内存映射文件（draw_id、时间戳、三个号码、和值、大小、单双），
+附带 日期 -> 行区间 索引；统计分析直接对 NumPy 切片计算，不再逐行查询SQLite
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 列名 -> dtype
+COLUMNS = {
+    'draw_id': 'S32',
+    'timestamp': 'int64',  # 开奖时间（本地墙钟时间，按UTC换算的秒数）
+    'digit1': 'uint8',
+    'digit2': 'uint8',
+    'digit3': 'uint8',
+    'sum': 'uint8',
+    'big': 'bool',         # 和值 >= 14
+    'odd': 'bool'
+}
+
+_SECONDS_PER_DAY = 86400
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _parse_timestamp(value: Any) -> Optional[int]:
+    """把开奖时间转为秒数；带时区的时间保留墙钟时间，使日期索引与开奖日期一致"""
+    if isinstance(value, datetime):
+        moment = value
+    elif value:
+        try:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    else:
+        return None
+    return int((moment.replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+def _day_key(seconds: int) -> str:
+    return str(np.datetime64(seconds // _SECONDS_PER_DAY, 'D'))
+
+
+class DrawColumnStore:
+    """只追加的列式开奖存储
+
+    写入由单个进程完成：先写列数据，再原子替换 meta.json 中的行数，
+    因此其他进程的只读实例调用 refresh() 后总能看到完整的行。
+    回填可能乱序追加，同一天的数据在索引中记为多个行区间；compact() 按时间重排后每天只剩一个区间。
+    重排结果写入新一代列文件，全部落盘后才替换 meta.json 切换代数，
+    读者要么看到旧一代、要么看到新一代的完整数据，重排中途崩溃也不会损坏已有存储。
+    """
+
+    def __init__(self, path: str = "draw_store", readonly: bool = False, initial_capacity: int = 4096):
+        self.path = path
+        self.readonly = readonly
+        self.lock = threading.RLock()
+        self._maps: Dict[str, np.memmap] = {}
+        self._capacity = 0
+        self.count = 0
+        self.generation = 0
+        self.day_runs: Dict[str, List[List[int]]] = {}
+        self._draw_ids: set = set()
+
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        self._load_meta()
+        if not readonly:
+            self._remove_stale_generations()
+            self._ensure_capacity(max(self.count, initial_capacity))
+        self._map_columns()
+        self._draw_ids = set(self.column('draw_id').tolist())
+
+    # ---- 元数据 ----
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def _column_path(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        suffix = f'.{generation}' if generation else ''
+        return os.path.join(self.path, f'{name}{suffix}.bin')
+
+    def _remove_stale_generations(self):
+        """删除非当前代的列文件（已完成重排的旧代，或重排中途崩溃留下的新代）"""
+        pattern = re.compile(r'^(%s)(?:\.(\d+))?\.bin$' % '|'.join(COLUMNS))
+        for file_name in os.listdir(self.path):
+            match = pattern.match(file_name)
+            if match and int(match.group(2) or 0) != self.generation:
+                os.remove(os.path.join(self.path, file_name))
+
+    def _load_meta(self):
+        meta_path = self._meta_path()
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.count = meta['count']
+        self.generation = meta.get('generation', 0)
+        self.day_runs = meta['day_runs']
+
+    def _save_meta(self):
+        temp_path = f'{self._meta_path()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'count': self.count, 'generation': self.generation, 'day_runs': self.day_runs}, f)
+        os.replace(temp_path, self._meta_path())
+
+    # ---- 文件映射 ----
+
+    def _ensure_capacity(self, rows: int):
+        """按倍增扩展列文件"""
+        if rows <= self._capacity:
+            return
+        capacity = max(self._capacity, 1024)
+        while capacity < rows:
+            capacity *= 2
+        for name, dtype in COLUMNS.items():
+            size = capacity * np.dtype(dtype).itemsize
+            with open(self._column_path(name), 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self._capacity = capacity
+        self._map_columns()
+
+    def _map_columns(self):
+        self._maps = {}
+        for name, dtype in COLUMNS.items():
+            column_path = self._column_path(name)
+            if not os.path.exists(column_path) or os.path.getsize(column_path) == 0:
+                self._maps[name] = np.zeros(0, dtype=dtype)
+                continue
+            length = os.path.getsize(column_path) // np.dtype(dtype).itemsize
+            self._maps[name] = np.memmap(column_path, dtype=dtype, mode='r' if self.readonly else 'r+',
+                                         shape=(length,))
+            if not self.readonly:
+                self._capacity = length
+
+    def refresh(self):
+        """重新读取行数和索引（只读实例用来看到其他进程的追加和重排）"""
+        with self.lock:
+            for _ in range(3):
+                generation = self.generation
+                self._load_meta()
+                if generation == self.generation and self._mapped_complete():
+                    return
+                try:
+                    self._map_columns()
+                except FileNotFoundError:
+                    pass
+                if self._mapped_complete():
+                    return
+                # 读取 meta 与映射之间写者又完成了一次重排，旧一代文件已删除，重新读取 meta
+            raise RuntimeError(f"列式存储 {self.path} 在刷新期间持续变更")
+
+    def _mapped_complete(self) -> bool:
+        return all(len(array) >= self.count for array in self._maps.values())
+
+    # ---- 追加 ----
+
+    @staticmethod
+    def _record_values(record: Dict[str, Any]) -> Optional[Tuple[bytes, int, int, int, int]]:
+        draw_id = record.get('draw_id') or record.get('issue')
+        digits = record.get('result_digits') or record.get('result_numbers') or record.get('numbers')
+        if isinstance(digits, str):
+            digits = json.loads(digits) if digits.startswith('[') else digits.split(',')
+        timestamp = _parse_timestamp(record.get('timestamp') or record.get('draw_time'))
+        try:
+            d1, d2, d3 = (int(digit) for digit in list(digits)[:3])
+        except (TypeError, ValueError):
+            return None
+        if not draw_id or timestamp is None:
+            return None
+        return str(draw_id).encode('ascii')[:32], timestamp, d1, d2, d3
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        """追加开奖记录（已存在的 draw_id 跳过），返回新增行数
+
+        记录需要 draw_id、timestamp 和三个号码（result_digits / result_numbers / numbers），
+        和值、大小、单双由号码计算
+        """
+        if self.readonly:
+            raise RuntimeError("只读实例不能追加数据")
+
+        with self.lock:
+            rows = []
+            batch_ids = set()
+            for record in records:
+                values = self._record_values(record)
+                if values is None:
+                    logger.warning(f"跳过无效开奖记录: {record.get('draw_id')}")
+                    continue
+                if values[0] in self._draw_ids or values[0] in batch_ids:
+                    continue
+                batch_ids.add(values[0])
+                rows.append(values)
+
+            if not rows:
+                return 0
+
+            start = self.count
+            end = start + len(rows)
+            self._ensure_capacity(end)
+
+            draw_ids, timestamps, d1, d2, d3 = zip(*rows)
+            digits = np.array([d1, d2, d3], dtype=np.uint8)
+            sums = digits.sum(axis=0, dtype=np.uint8)
+            self._maps['draw_id'][start:end] = draw_ids
+            self._maps['timestamp'][start:end] = timestamps
+            self._maps['digit1'][start:end] = digits[0]
+            self._maps['digit2'][start:end] = digits[1]
+            self._maps['digit3'][start:end] = digits[2]
+            self._maps['sum'][start:end] = sums
+            self._maps['big'][start:end] = sums >= 14
+            self._maps['odd'][start:end] = sums % 2 == 1
+            for array in self._maps.values():
+                array.flush()
+
+            for offset, timestamp in enumerate(timestamps, start):
+                runs = self.day_runs.setdefault(_day_key(timestamp), [])
+                if runs and runs[-1][1] == offset:
+                    runs[-1][1] = offset + 1
+                else:
+                    runs.append([offset, offset + 1])
+
+            self.count = end
+            self._draw_ids.update(batch_ids)
+            self._save_meta()
+            return len(rows)
+
+    def compact(self):
+        """按时间重排所有行，使每一天只占一个连续区间
+
+        重排结果写入下一代列文件并落盘，再原子替换 meta.json 切换到新一代，最后删除旧一代文件
+        （其他进程已有的映射仍指向旧文件，refresh() 时切换）
+        """
+        if self.readonly:
+            raise RuntimeError("只读实例不能重排数据")
+
+        with self.lock:
+            if not self.count:
+                return
+            order = np.argsort(self.column('timestamp'), kind='stable')
+            generation = self.generation + 1
+            for name, dtype in COLUMNS.items():
+                target = np.memmap(self._column_path(name, generation), dtype=dtype, mode='w+',
+                                   shape=(self._capacity,))
+                target[:self.count] = self._maps[name][:self.count][order]
+                target.flush()
+                del target
+
+            timestamps = self._maps['timestamp'][:self.count][order]
+            days = timestamps // _SECONDS_PER_DAY
+            boundaries = np.flatnonzero(np.diff(days)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [self.count]))
+            day_runs = {
+                _day_key(int(timestamps[start])): [[start, end]]
+                for start, end in zip(starts.tolist(), ends.tolist())
+            }
+
+            previous = (self.generation, self.day_runs)
+            self.generation, self.day_runs = generation, day_runs
+            try:
+                self._save_meta()
+            except Exception:
+                self.generation, self.day_runs = previous
+                raise
+            self._map_columns()
+            self._remove_stale_generations()
+
+    # ---- 读取 ----
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, draw_id: str) -> bool:
+        return str(draw_id).encode('ascii') in self._draw_ids
+
+    def column(self, name: str) -> np.ndarray:
+        """整列的只读零拷贝视图"""
+        view = self._maps[name][:self.count].view(np.ndarray)
+        view.flags.writeable = False
+        return view
+
+    def date_slices(self, start_date: str, end_date: Optional[str] = None) -> List[slice]:
+        """日期范围（含首尾，'YYYY-MM-DD'）对应的行区间，相邻区间已合并"""
+        end_date = end_date or start_date
+        runs = sorted(
+            run for day, day_runs in self.day_runs.items() if start_date <= day <= end_date for run in day_runs
+        )
+        merged: List[List[int]] = []
+        for start, end in runs:
+            if merged and merged[-1][1] == start:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        return [slice(start, end) for start, end in merged]
+
+    def columns_for_dates(self, start_date: str, end_date: Optional[str] = None,
+                          names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """日期范围内的列数据；范围连续时为零拷贝视图，否则拼接"""
+        slices = self.date_slices(start_date, end_date)
+        result = {}
+        for name in names or COLUMNS:
+            column = self.column(name)
+            if len(slices) == 1:
+                result[name] = column[slices[0]]
+            elif slices:
+                result[name] = np.concatenate([column[item] for item in slices])
+            else:
+                result[name] = column[:0]
+        return result
+
+    def sum_distribution(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> np.ndarray:
+        """和值 0-27 的出现次数"""
+        if start_date is None:
+            sums = self.column('sum')
+        else:
+            sums = self.columns_for_dates(start_date, end_date, names=['sum'])['sum']
+        return np.bincount(sums, minlength=28)
+
+
+_shared_stores: Dict[str, DrawColumnStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_column_store(path: str) -> DrawColumnStore:
+    """按路径获取进程内共享的可写实例，实时服务与回填服务追加到同一份存储"""
+    path = os.path.abspath(path)
+    with _shared_lock:
+        store = _shared_stores.get(path)
+        if store is None:
+            store = DrawColumnStore(path)
+            _shared_stores[path] = store
+            logger.info(f"打开开奖列式存储: {path}, 已有 {len(store)} 期")
+        return store
+
+
+def open_configured_column_store(settings: Optional[Dict[str, Any]]) -> Optional[DrawColumnStore]:
+    """按服务配置 column_store_settings 打开共享实例
+
+    默认关闭；开启时 path 必须是绝对路径，
+    否则不同工作目录启动的服务会各自写出一份存储
+    """
+    settings = settings or {}
+    if not settings.get('enabled', False):
+        return None
+    path = settings.get('path')
+    if not path or not os.path.isabs(path):
+        raise ValueError(f"column_store_settings.path 必须配置为绝对路径: {path!r}")
+    return get_shared_column_store(path)
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PC28开奖接入与进程内事件总线
+由单个接入组件轮询上游实时接口（按 next_time/award_time 自适应间隔），按 draw_id 去重后
+发布到 new_draw / data_update / system_alert 主题；每个订阅者有独立的有界队列，
+慢订阅者只会丢弃或溢出自己的积压，不影响其他订阅者，也不会阻塞轮询
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHINA_TZ = timezone(timedelta(hours=8))
+# 缺少 next_time 时按开奖时间加一个开奖间隔估算下一期
+DRAW_INTERVAL_SECONDS = 180
+# 订阅者投递延迟直方图的桶上界（毫秒）
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Topic(str, Enum):
+    """事件主题（取值与通知系统的 event_type 一致）"""
+    NEW_DRAW = "new_draw"
+    DATA_UPDATE = "data_update"
+    SYSTEM_ALERT = "system_alert"
+
+
+@dataclass
+class DrawEvent:
+    """总线事件"""
+    topic: Topic
+    timestamp: str
+    draw: Optional[Dict[str, Any]] = None  # 解析后的开奖记录，含 award_time / next_issue / next_time
+    raw: Optional[Dict[str, Any]] = None   # 上游原始响应，订阅者可用自己的解析器处理
+    message: str = ""
+    priority: str = "normal"
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class Subscription:
+    """订阅者的有界信箱
+
+    队列满时按 overflow 策略处理：drop_oldest 丢最旧的事件，drop_new 丢新事件，
+    spill 把溢出事件按顺序写入 spill_path，内存队列取空后再读回（需提供 encode/decode）。
+    coalesce(event) 返回非 None 的键时，队列中同键的未投递事件被新事件取代（如被更新的 data_update）。
+    lossless(event) 为真的事件从不被丢弃：队列满时仍入队（不受 maxsize 限制），drop_oldest 只淘汰最旧的可丢弃事件。
+    传入 callback 时由独立线程消费；否则由调用方 get() 拉取。close() 丢弃未投递事件，之后可再 start()。
+    """
+
+    def __init__(self, name: str, topics: Iterable[Any], callback: Optional[Callable[[Any], None]] = None,
+                 maxsize: int = 100, overflow: str = "drop_oldest",
+                 coalesce: Optional[Callable[[Any], Optional[Hashable]]] = None, spill_path: Optional[str] = None,
+                 encode: Optional[Callable[[Any], Any]] = None, decode: Optional[Callable[[Any], Any]] = None,
+                 lossless: Optional[Callable[[Any], bool]] = None):
+        if overflow not in ("drop_oldest", "drop_new", "spill"):
+            raise ValueError(f"不支持的溢出策略: {overflow}")
+        if overflow == "spill" and not (spill_path and encode and decode):
+            raise ValueError("spill 策略需要 spill_path、encode 和 decode")
+        self.name = name
+        self.topics = {topic.value if isinstance(topic, Topic) else str(topic) for topic in topics}
+        self.callback = callback
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.coalesce = coalesce
+        self.lossless = lossless
+        self.spill_path = spill_path
+        self.encode = encode
+        self.decode = decode
+
+        # 队列元素为 [事件, 入队时间, 合并键]，合并时原地替换事件
+        self.queue: deque = deque()
+        self.pending_keys: Dict[Hashable, list] = {}
+        self.spilled = 0
+        self._spill_offset = 0
+        self.cond = threading.Condition()
+        self.active = True
+        self._thread: Optional[threading.Thread] = None
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.stats = {'received': 0, 'delivered': 0, 'dropped': 0, 'coalesced': 0, 'spilled': 0,
+                      'failed': 0, 'max_depth': 0, 'total_latency': 0.0}
+
+        if spill_path and os.path.exists(spill_path):
+            os.remove(spill_path)  # 溢出文件只在进程内有效
+
+    def offer(self, event: Any) -> bool:
+        """非阻塞入队，返回事件是否被接收"""
+        with self.cond:
+            if not self.active:
+                return False
+            self.stats['received'] += 1
+            now = time.monotonic()
+
+            key = self.coalesce(event) if self.coalesce else None
+            if key is not None and key in self.pending_keys:
+                entry = self.pending_keys[key]
+                entry[0], entry[1] = event, now
+                self.stats['coalesced'] += 1
+                return True
+
+            entry = [event, now, key]
+            if self.spilled or len(self.queue) >= self.maxsize:
+                if self.overflow == "spill":
+                    self._spill(entry)
+                    self.cond.notify()
+                    return True
+                victim = self._oldest_droppable() if self.overflow == "drop_oldest" else None
+                if victim is not None:
+                    self._forget(self.queue[victim])
+                    del self.queue[victim]
+                    self.stats['dropped'] += 1
+                elif not self._is_lossless(event):
+                    self.stats['dropped'] += 1
+                    return False
+
+            self.queue.append(entry)
+            if key is not None:
+                self.pending_keys[key] = entry
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self.queue))
+            self.cond.notify()
+            return True
+
+    def _is_lossless(self, event: Any) -> bool:
+        return self.lossless is not None and self.lossless(event)
+
+    def _oldest_droppable(self) -> Optional[int]:
+        """最旧的可丢弃事件在队列中的位置，没有返回 None"""
+        for index, entry in enumerate(self.queue):
+            if not self._is_lossless(entry[0]):
+                return index
+        return None
+
+    def _forget(self, entry: list):
+        if entry[2] is not None and self.pending_keys.get(entry[2]) is entry:
+            del self.pending_keys[entry[2]]
+
+    def _spill(self, entry: list):
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps([entry[1], self.encode(entry[0])], ensure_ascii=False, default=str) + "\n")
+        self.spilled += 1
+        self.stats['spilled'] += 1
+
+    def _unspill(self) -> list:
+        with open(self.spill_path, 'r', encoding='utf-8') as f:
+            f.seek(self._spill_offset)
+            line = f.readline()
+            self._spill_offset = f.tell()
+        self.spilled -= 1
+        if not self.spilled:
+            os.remove(self.spill_path)
+            self._spill_offset = 0
+        enqueued_at, payload = json.loads(line)
+        return [self.decode(payload), enqueued_at, None]
+
+    def _take(self, timeout: Optional[float]) -> Optional[list]:
+        with self.cond:
+            if not self.queue and not self.spilled and self.active:
+                self.cond.wait(timeout)
+            if self.queue:
+                entry = self.queue.popleft()
+                self._forget(entry)
+            elif self.spilled:
+                entry = self._unspill()
+            else:
+                return None
+            self.stats['delivered'] += 1
+            return entry
+
+    def _record_latency(self, enqueued_at: float):
+        latency = time.monotonic() - enqueued_at
+        with self.cond:
+            self.stats['total_latency'] += latency
+            self.latency_buckets[bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """取出下一个事件，超时返回 None"""
+        entry = self._take(timeout)
+        if entry is None:
+            return None
+        self._record_latency(entry[1])
+        return entry[0]
+
+    def start(self):
+        with self.cond:
+            self.active = True
+        if self.callback is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"bus-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while self.active:
+            entry = self._take(timeout=1)
+            if entry is None:
+                continue
+            try:
+                self.callback(entry[0])
+            except Exception as e:
+                with self.cond:
+                    self.stats['failed'] += 1
+                logger.error(f"订阅者 {self.name} 处理事件失败: {e}")
+            # 回调模式下记录入队到处理完成的延迟
+            self._record_latency(entry[1])
+
+    def close(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+            if not self._thread.is_alive():
+                self._thread = None
+        with self.cond:
+            self.queue.clear()
+            self.pending_keys.clear()
+            self.spilled = 0
+            self._spill_offset = 0
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    def _latency_percentile(self, fraction: float) -> Optional[float]:
+        """按直方图估计分位数（返回所在桶的上界，超出最大桶返回 None）"""
+        total = sum(self.latency_buckets)
+        if not total:
+            return 0.0
+        threshold = fraction * total
+        seen = 0
+        for index, count in enumerate(self.latency_buckets):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.cond:
+            delivered = self.stats['delivered']
+            histogram = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_buckets)}
+            histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self.latency_buckets[-1]
+            return {
+                'topics': sorted(self.topics),
+                'overflow': self.overflow,
+                'depth': len(self.queue) + self.spilled,
+                'maxsize': self.maxsize,
+                'spilled_pending': self.spilled,
+                'received': self.stats['received'],
+                'delivered': delivered,
+                'dropped': self.stats['dropped'],
+                'coalesced': self.stats['coalesced'],
+                'spilled': self.stats['spilled'],
+                'failed': self.stats['failed'],
+                'max_depth': self.stats['max_depth'],
+                'avg_latency_ms': round(self.stats['total_latency'] / delivered * 1000, 3) if delivered else 0.0,
+                'p50_latency_ms': self._latency_percentile(0.5),
+                'p99_latency_ms': self._latency_percentile(0.99),
+                'latency_histogram': histogram
+            }
+
+
+class DrawEventBus:
+    """进程内发布/订阅总线；publish 只做非阻塞入队"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.published = {topic.value: 0 for topic in Topic}
+
+    def subscribe(self, name: str, callback: Optional[Callable[[DrawEvent], None]] = None,
+                  topics: Optional[Iterable[Topic]] = None, maxsize: int = 100,
+                  overflow: str = "drop_oldest", **options) -> Subscription:
+        """注册订阅者（同名订阅会被替换），options 传给 Subscription（coalesce、spill_path 等）"""
+        subscription = Subscription(name, topics or list(Topic), callback, maxsize, overflow, **options)
+        with self.lock:
+            previous = self.subscriptions.pop(name, None)
+            self.subscriptions[name] = subscription
+        if previous is not None:
+            previous.close()
+        subscription.start()
+        logger.info(f"订阅者 {name} 已订阅: {sorted(subscription.topics)}")
+        return subscription
+
+    def unsubscribe(self, name: str) -> bool:
+        with self.lock:
+            subscription = self.subscriptions.pop(name, None)
+        if subscription is None:
+            return False
+        subscription.close()
+        return True
+
+    def publish(self, event: DrawEvent) -> int:
+        """发布事件，返回入队的订阅者数"""
+        with self.lock:
+            self.published[event.topic.value] += 1
+            targets = [sub for sub in self.subscriptions.values() if event.topic.value in sub.topics]
+        return sum(1 for sub in targets if sub.offer(event))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            subscriptions = list(self.subscriptions.values())
+            published = dict(self.published)
+        return {'published': published, 'subscribers': {sub.name: sub.metrics() for sub in subscriptions}}
+
+
+def parse_china_time(value: Any) -> Optional[datetime]:
+    """解析上游时间字符串为带时区的时间，不带时区的按北京时间"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=CHINA_TZ)
+
+
+class DrawIngest:
+    """唯一的上游实时轮询者
+
+    client 需提供 get_realtime_lottery() 与 parse_lottery_data()（UpstreamClient）。
+    下一期开奖时间已知时睡到开奖后 grace_seconds 再取；开奖时间已过但还没拿到新期号时按 min_interval 追取。
+    连续失败或开奖时间已过仍无新期号（上游故障、数据停更）时，追取间隔从 min_interval 起指数退避到 max_interval，
+    拿到新期号后恢复。
+    """
+
+    def __init__(self, client, bus: Optional[DrawEventBus] = None, min_interval: float = 2.0,
+                 max_interval: float = 60.0, default_interval: float = 30.0, grace_seconds: float = 3.0,
+                 dedupe_window: int = 1000, now: Optional[Callable[[], datetime]] = None):
+        self.client = client
+        self.bus = bus or DrawEventBus()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.grace_seconds = grace_seconds
+        self.dedupe_window = dedupe_window
+        self.now = now or (lambda: datetime.now(CHINA_TZ))
+
+        self.seen_draws: "OrderedDict[str, None]" = OrderedDict()
+        self.latest_draw: Optional[Dict[str, Any]] = None
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._users = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'polls': 0, 'new_draws': 0, 'duplicates': 0, 'errors': 0,
+                      'last_poll_time': None, 'last_interval': None}
+
+    def _publish(self, topic: Topic, **kwargs) -> int:
+        return self.bus.publish(DrawEvent(topic=topic, timestamp=self.now().isoformat(), **kwargs))
+
+    def _parse(self, raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        parsed = self.client.parse_lottery_data(raw)
+        if not parsed:
+            return None
+        draw = dict(parsed[0])
+        retdata = raw.get('retdata') or {}
+        current = (retdata.get('curent') or {}) if isinstance(retdata, dict) else {}
+        next_data = (retdata.get('next') or {}) if isinstance(retdata, dict) else {}
+        draw['award_time'] = current.get('award_time') or current.get('kjtime')
+        draw['next_issue'] = next_data.get('next_issue')
+        draw['next_time'] = next_data.get('next_time')
+        return draw
+
+    def poll_once(self) -> Optional[Dict[str, Any]]:
+        """取一次上游数据并发布事件，返回最新开奖（失败返回 None）"""
+        start = time.monotonic()
+        self.stats['polls'] += 1
+        self.stats['last_poll_time'] = self.now().isoformat()
+        try:
+            raw = self.client.get_realtime_lottery()
+            if not raw or raw.get('codeid') != 10000:
+                raise ValueError(f"API返回错误: {raw.get('message') if raw else raw}")
+            draw = self._parse(raw)
+            if draw is None:
+                raise ValueError("无当前开奖数据")
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.misses += 1
+            logger.warning(f"实时数据获取失败: {e}")
+            self._publish(Topic.SYSTEM_ALERT, message=f"获取实时数据失败: {e}", priority='high')
+            return None
+
+        metadata = {'response_time': time.monotonic() - start}
+        with self.lock:
+            draw_id = str(draw['draw_id'])
+            is_new = draw_id not in self.seen_draws
+            if is_new:
+                self.seen_draws[draw_id] = None
+                while len(self.seen_draws) > self.dedupe_window:
+                    self.seen_draws.popitem(last=False)
+                self.stats['new_draws'] += 1
+                self.misses = 0
+            else:
+                self.stats['duplicates'] += 1
+                next_time = self._next_draw_time(draw)
+                self.misses = self.misses + 1 if next_time is not None and self.now() >= next_time else 0
+            self.latest_draw = draw
+
+        if is_new:
+            logger.info(f"发现新开奖: {draw_id}")
+            self._publish(Topic.NEW_DRAW, draw=draw, raw=raw, priority='high', metadata=metadata,
+                          message=f"新开奖: 期号 {draw_id}, 号码 {draw.get('result_numbers')}, 和值 {draw.get('result_sum')}")
+        self._publish(Topic.DATA_UPDATE, draw=draw, raw=raw, metadata=metadata, message=f"数据已更新: 期号 {draw_id}")
+        return draw
+
+    @staticmethod
+    def _next_draw_time(draw: Dict[str, Any]) -> Optional[datetime]:
+        next_time = parse_china_time(draw.get('next_time'))
+        if next_time is None:
+            award_time = parse_china_time(draw.get('award_time') or draw.get('timestamp'))
+            if award_time is not None:
+                next_time = award_time + timedelta(seconds=DRAW_INTERVAL_SECONDS)
+        return next_time
+
+    def next_interval(self) -> float:
+        """距下一次轮询的秒数"""
+        draw = self.latest_draw
+        next_time = self._next_draw_time(draw) if draw is not None else None
+        if next_time is None:
+            interval = self.default_interval
+        else:
+            remaining = (next_time - self.now()).total_seconds() + self.grace_seconds
+            interval = max(self.min_interval, remaining)
+        if self.misses > 1:
+            interval = max(interval, self.min_interval * 2 ** min(self.misses - 1, 16))
+        return min(self.max_interval, interval)
+
+    def _run(self):
+        logger.info("开奖接入轮询启动")
+        while not self._stop.is_set():
+            self.poll_once()
+            interval = self.next_interval()
+            self.stats['last_interval'] = round(interval, 3)
+            self._stop.wait(interval)
+        logger.info("开奖接入轮询停止")
+
+    def start(self):
+        """启动轮询（多个服务共用时按引用计数，最后一个 stop() 才真正停止）"""
+        with self.lock:
+            self._users += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="draw-ingest", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self.lock:
+            self._users = max(0, self._users - 1)
+            if self._users:
+                return
+            self._stop.set()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'users': self._users,
+            'latest_draw_id': self.latest_draw.get('draw_id') if self.latest_draw else None,
+            'consecutive_misses': self.misses,
+            'stats': dict(self.stats),
+            'bus': self.bus.get_metrics()
+        }
+
+
+_shared_ingests: Dict[Hashable, DrawIngest] = {}
+_shared_lock = threading.Lock()
+
+
+def _ingest_key(client) -> Hashable:
+    """按上游账号（appid）区分共享接入，同一账号的不同客户端对象共用一个轮询者"""
+    appid = getattr(getattr(client, 'async_client', client), 'appid', None)
+    return ('appid', appid) if appid is not None else ('client', id(client))
+
+
+def get_shared_draw_ingest(client, **kwargs) -> DrawIngest:
+    """按上游账号获取进程内共享的接入组件，首次创建时的参数生效"""
+    key = _ingest_key(client)
+    with _shared_lock:
+        ingest = _shared_ingests.get(key)
+        if ingest is None:
+            ingest = DrawIngest(client, **kwargs)
+            _shared_ingests[key] = ingest
+            logger.info(f"创建共享开奖接入组件: {key}")
+        return ingest
+
+
+def get_default_draw_ingest(config: Optional[Dict[str, Any]] = None, **kwargs) -> DrawIngest:
+    """按配置的上游账号获取共享接入组件，供未显式传入接入组件的消费方默认使用"""
+    from config_loader import load_config
+    from upstream_client import get_shared_upstream_client
+
+    config = config or load_config()
+    upstream_settings = config.get('upstream_settings', {})
+    client = get_shared_upstream_client(
+        config['appid'], config['secret_key'],
+        history_url=upstream_settings.get('history_url'),
+        rate_per_second=upstream_settings.get('rate_per_second', 2.0),
+        burst=upstream_settings.get('burst')
+    )
+    return get_shared_draw_ingest(client, **kwargs)
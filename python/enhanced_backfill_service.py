@@ -17,6 +17,8 @@ from enum import Enum
 import sqlite3
 import os
 
+from upstream_client import get_shared_upstream_client
+from draw_column_store import open_configured_column_store
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -76,13 +78,22 @@ class EnhancedBackfillService:
             config: 配置字典
         """
         self.config = config or {}
-        self.api_client = PC28UpstreamAPI(appid, secret_key)
+        # 与实时服务共享连接池和限流额度，请求节奏由令牌桶控制
+        upstream_settings = self.config.get('upstream_settings', {})
+        self.api_client = get_shared_upstream_client(
+            appid, secret_key,
+            history_url=upstream_settings.get('history_url'),
+            rate_per_second=upstream_settings.get('rate_per_second', 2.0),
+            burst=upstream_settings.get('burst')
+        )
         self.db_path = "backfill_tracking.db"
         
+        # 列式开奖存储（默认关闭），开启时与另一服务共享配置的绝对路径上的同一实例
+        self.column_store = open_configured_column_store(self.config.get('column_store_settings'))
+        
         # 从配置中获取参数
         backfill_settings = self.config.get('backfill_settings', {})
         self.max_workers = backfill_settings.get('max_concurrent_tasks', 5)
-        self.request_delay = 1.0  # 请求间隔（秒）
         self.retry_attempts = backfill_settings.get('retry_attempts', 3)
         self.batch_size = backfill_settings.get('batch_size', 100)
         
@@ -415,6 +426,56 @@ class EnhancedBackfillService:
             
             self._update_task(task)
     
+    def _backfill_dates(self, task_id: str, dates: List[str], total_days: int, processed_offset: int = 0) -> int:
+        """
+        并发回填一组日期，并发度为 max_workers，请求速率由共享客户端限流
+        
+        Args:
+            task_id: 任务ID
+            dates: 日期列表
+            total_days: 任务总天数（用于计算进度）
+            processed_offset: 之前已处理的天数
+            
+        Returns:
+            已处理天数（含 processed_offset）
+        """
+        task = self.active_tasks[task_id]
+        processed_days = processed_offset
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for date_str in dates:
+                if task.status != BackfillStatus.RUNNING:
+                    break
+                futures[executor.submit(self._backfill_single_date, task_id, date_str)] = date_str
+            
+            for future in as_completed(futures):
+                success = future.result()
+                
+                with self.lock:
+                    if success:
+                        task.processed_records += 1
+                    else:
+                        task.failed_records += 1
+                    
+                    processed_days += 1
+                    task.progress = (processed_days / total_days) * 100
+                
+                # 定期更新任务进度
+                if processed_days % 10 == 0:
+                    self._update_task(task)
+        
+        return processed_days
+    
+    @staticmethod
+    def _date_list(start_date: str, end_date: str) -> List[str]:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        return [
+            (start_dt + timedelta(days=i)).strftime("%Y-%m-%d")
+            for i in range((end_dt - start_dt).days + 1)
+        ]
+    
     def _backfill_gaps(self, task_id: str, gaps: List[DataGap]):
         """
         回填数据缺失区间
@@ -435,28 +496,9 @@ class EnhancedBackfillService:
             
             logger.info(f"回填区间: {gap.start_date} 到 {gap.end_date} ({gap.missing_count} 天)")
             
-            # 回填该区间
-            start_dt = datetime.strptime(gap.start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(gap.end_date, "%Y-%m-%d")
-            
-            current_dt = start_dt
-            while current_dt <= end_dt:
-                if task.status != BackfillStatus.RUNNING:
-                    break
-                
-                date_str = current_dt.strftime("%Y-%m-%d")
-                success = self._backfill_single_date(task_id, date_str)
-                
-                if success:
-                    task.processed_records += 1
-                else:
-                    task.failed_records += 1
-                
-                processed_days += 1
-                task.progress = (processed_days / total_days) * 100
-                
-                current_dt += timedelta(days=1)
-                time.sleep(self.request_delay)
+            processed_days = self._backfill_dates(
+                task_id, self._date_list(gap.start_date, gap.end_date), total_days, processed_days
+            )
             
             # 更新任务进度
             self._update_task(task)
@@ -470,38 +512,12 @@ class EnhancedBackfillService:
             start_date: 开始日期
             end_date: 结束日期
         """
-        task = self.active_tasks[task_id]
-        
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-        
-        total_days = (end_dt - start_dt).days + 1
-        processed_days = 0
+        dates = self._date_list(start_date, end_date)
+        total_days = len(dates)
         
         logger.info(f"任务 {task_id}: 开始回填日期范围 {start_date} 到 {end_date} ({total_days} 天)")
         
-        current_dt = start_dt
-        while current_dt <= end_dt:
-            if task.status != BackfillStatus.RUNNING:
-                break
-            
-            date_str = current_dt.strftime("%Y-%m-%d")
-            success = self._backfill_single_date(task_id, date_str)
-            
-            if success:
-                task.processed_records += 1
-            else:
-                task.failed_records += 1
-            
-            processed_days += 1
-            task.progress = (processed_days / total_days) * 100
-            
-            current_dt += timedelta(days=1)
-            time.sleep(self.request_delay)
-            
-            # 定期更新任务进度
-            if processed_days % 10 == 0:
-                self._update_task(task)
+        self._backfill_dates(task_id, dates, total_days)
     
     def _backfill_single_date(self, task_id: str, date: str) -> bool:
         """
@@ -535,6 +551,12 @@ class EnhancedBackfillService:
                             task_id, data.get('draw_id'), data.get('timestamp'), date, 'success'
                         )
                     
+                    if self.column_store is not None:
+                        try:
+                            self.column_store.append(parsed_data)
+                        except Exception as e:
+                            logger.error(f"追加列式存储失败: {e}")
+                    
                     logger.debug(f"成功回填 {date}: {len(parsed_data)} 条记录")
                     return True
                 else:
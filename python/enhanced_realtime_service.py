@@ -19,6 +19,9 @@ import hashlib
 from concurrent.futures import ThreadPoolExecutor
 import queue
 
+from upstream_client import get_shared_upstream_client
+from draw_column_store import open_configured_column_store
+from draw_event_bus import Topic, get_shared_draw_ingest
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -132,12 +135,29 @@ class EnhancedRealtimeService:
             config: 配置字典
         """
         self.config = config or {}
-        self.api_client = PC28UpstreamAPI(appid, secret_key)
+        # 与回填服务共享连接池和限流额度
+        upstream_settings = self.config.get('upstream_settings', {})
+        self.api_client = get_shared_upstream_client(
+            appid, secret_key,
+            history_url=upstream_settings.get('history_url'),
+            rate_per_second=upstream_settings.get('rate_per_second', 2.0),
+            burst=upstream_settings.get('burst')
+        )
         self.db_path = "realtime_cache.db"
         
+        # 列式开奖存储（默认关闭），开启时与另一服务共享配置的绝对路径上的同一实例
+        self.column_store = open_configured_column_store(self.config.get('column_store_settings'))
+        
         # 从配置中获取参数
         realtime_settings = self.config.get('realtime_settings', {})
         self.fetch_interval = self.config.get('realtime_fetch_interval', 30)
+        
+        # 共享开奖接入：进程内只有一个轮询者，本服务订阅其事件
+        ingest_settings = dict(self.config.get('ingest_settings', {}))
+        ingest_settings.setdefault('default_interval', self.fetch_interval)
+        ingest_enabled = ingest_settings.pop('enabled', True)
+        self.ingest = get_shared_draw_ingest(self.api_client, **ingest_settings) if ingest_enabled else None
+        self.subscription = None
         self.cache_ttl = 300  # 缓存TTL（秒）
         self.max_cache_size = realtime_settings.get('cache_size', 1000)
         self.notification_queue_size = 100
@@ -248,6 +268,13 @@ class EnhancedRealtimeService:
         
         logger.info("启动实时开奖监控服务")
         
+        # 先订阅再启动接入，避免错过首个事件
+        if self.ingest is not None:
+            self.subscription = self.ingest.bus.subscribe(
+                'enhanced_realtime_service', topics=[Topic.NEW_DRAW, Topic.DATA_UPDATE, Topic.SYSTEM_ALERT]
+            )
+            self.ingest.start()
+        
         # 启动主监控线程
         threading.Thread(target=self._monitoring_loop, daemon=True).start()
         
@@ -265,6 +292,9 @@ class EnhancedRealtimeService:
         停止实时监控
         """
         self.is_running = False
+        if self.ingest is not None:
+            self.ingest.stop()
+            self.ingest.bus.unsubscribe('enhanced_realtime_service')
         logger.info("停止实时开奖监控服务")
     
     def _monitoring_loop(self):
@@ -273,6 +303,10 @@ class EnhancedRealtimeService:
         """
         logger.info("实时监控循环启动")
         
+        if self.ingest is not None:
+            self._consume_ingest_events()
+            return
+        
         while self.is_running:
             try:
                 start_time = time.time()
@@ -283,32 +317,10 @@ class EnhancedRealtimeService:
                 if draw_data:
                     # 检查是否为新数据
                     if self._is_new_draw(draw_data):
-                        logger.info(f"发现新开奖: {draw_data.draw_id}")
-                        
-                        # 缓存数据
-                        self._cache_draw_data(draw_data)
-                        
-                        # 发送通知
-                        self._send_notification(NotificationType.NEW_DRAW, draw_data)
-                        
-                        # 更新最后已知开奖
-                        self.last_known_draw = draw_data
+                        self._handle_new_draw(draw_data)
                     
                     # 更新指标
-                    with self.metrics_lock:
-                        self.metrics.successful_fetches += 1
-                        self.metrics.total_draws_fetched += 1
-                        
-                        # 更新平均响应时间
-                        response_time = time.time() - start_time
-                        if self.metrics.average_response_time == 0:
-                            self.metrics.average_response_time = response_time
-                        else:
-                            self.metrics.average_response_time = (
-                                self.metrics.average_response_time * 0.9 + response_time * 0.1
-                            )
-                        
-                        self.metrics.last_fetch_time = datetime.now(timezone.utc).isoformat()
+                    self._record_fetch_success(time.time() - start_time)
                 
                 else:
                     # 获取失败
@@ -327,6 +339,62 @@ class EnhancedRealtimeService:
                 
                 time.sleep(self.fetch_interval)
     
+    def _consume_ingest_events(self):
+        """
+        订阅共享接入组件的事件，代替独立轮询
+        """
+        while self.is_running:
+            event = self.subscription.get(timeout=1)
+            if event is None:
+                continue
+            
+            try:
+                if event.topic == Topic.NEW_DRAW:
+                    draw_data = self._build_enhanced_data(event.raw)
+                    if draw_data and self._is_new_draw(draw_data):
+                        self._handle_new_draw(draw_data)
+                elif event.topic == Topic.DATA_UPDATE:
+                    self._record_fetch_success(event.metadata.get('response_time', 0.0))
+                else:
+                    with self.metrics_lock:
+                        self.metrics.failed_fetches += 1
+                        self.metrics.total_draws_fetched += 1
+            except Exception as e:
+                logger.error(f"处理接入事件异常: {e}")
+    
+    def _handle_new_draw(self, draw_data: EnhancedDrawData):
+        """
+        处理新开奖：缓存、通知并更新最后已知开奖
+        """
+        logger.info(f"发现新开奖: {draw_data.draw_id}")
+        
+        # 缓存数据
+        self._cache_draw_data(draw_data)
+        
+        # 发送通知
+        self._send_notification(NotificationType.NEW_DRAW, draw_data)
+        
+        # 更新最后已知开奖
+        self.last_known_draw = draw_data
+    
+    def _record_fetch_success(self, response_time: float):
+        """
+        更新成功获取的指标
+        """
+        with self.metrics_lock:
+            self.metrics.successful_fetches += 1
+            self.metrics.total_draws_fetched += 1
+            
+            # 更新平均响应时间
+            if self.metrics.average_response_time == 0:
+                self.metrics.average_response_time = response_time
+            else:
+                self.metrics.average_response_time = (
+                    self.metrics.average_response_time * 0.9 + response_time * 0.1
+                )
+            
+            self.metrics.last_fetch_time = datetime.now(timezone.utc).isoformat()
+    
     def _fetch_enhanced_realtime_data(self) -> Optional[EnhancedDrawData]:
         """
         获取增强版实时数据，最大化利用API字段
@@ -337,7 +405,23 @@ class EnhancedRealtimeService:
         try:
             # 获取原始数据
             raw_data = self.api_client.get_realtime_lottery()
+            return self._build_enhanced_data(raw_data)
+            
+        except Exception as e:
+            logger.error(f"获取增强实时数据失败: {e}")
+            return None
+    
+    def _build_enhanced_data(self, raw_data: Dict[str, Any]) -> Optional[EnhancedDrawData]:
+        """
+        由上游原始响应构建增强版开奖数据
+        
+        Args:
+            raw_data: 上游原始响应
             
+        Returns:
+            增强版开奖数据
+        """
+        try:
             if raw_data.get('codeid') != 10000:
                 logger.warning(f"API返回错误: {raw_data.get('message')}")
                 return None
@@ -382,7 +466,7 @@ class EnhancedRealtimeService:
             return enhanced_data
             
         except Exception as e:
-            logger.error(f"获取增强实时数据失败: {e}")
+            logger.error(f"解析增强实时数据失败: {e}")
             return None
     
     def _validate_draw_data(self, draw_data: EnhancedDrawData) -> str:
@@ -478,9 +562,19 @@ class EnhancedRealtimeService:
         
         # 持久化缓存
         self._save_to_persistent_cache(draw_data)
+        self._append_to_column_store(draw_data)
         
         logger.debug(f"缓存开奖数据: {draw_data.draw_id}")
     
+    def _append_to_column_store(self, draw_data: EnhancedDrawData):
+        """追加到列式开奖存储"""
+        if self.column_store is None:
+            return
+        try:
+            self.column_store.append([asdict(draw_data)])
+        except Exception as e:
+            logger.error(f"追加列式存储失败: {e}")
+    
     def _save_to_persistent_cache(self, draw_data: EnhancedDrawData):
         """
         保存到持久化缓存
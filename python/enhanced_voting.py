@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import math
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 
 def _clip(x:float, lo:float, hi:float)->float:
     return max(lo, min(hi, x))
@@ -62,6 +62,44 @@ def decide(p_cloud, p_map, p_size, cfg, perf):
         "weights": w
     }
 
+def combine_probs_batch(p_cloud, p_map, p_size, w:Dict[str,float]):
+    """combine_probs 的数组版本：一次合成整批候选的概率"""
+    import numpy as np
+    def logit(p):
+        p = np.clip(np.asarray(p, dtype=float), 1e-6, 1-1e-6)
+        return np.log(p/(1-p))
+    s = w["cloud"]+w["map"]+w["size"]
+    z = (w["cloud"]*logit(p_cloud) + w["map"]*logit(p_map) + w["size"]*logit(p_size)) / max(1e-9,s)
+    return 1/(1+np.exp(-z))
+
+def decide_batch(p_cloud, p_map, p_size, cfg, perf):
+    """decide 的数组版本：权重只计算一次，整批打分
+
+    返回字典中 p_star/bucket/accept 为与输入等长的数组，weights 为共享权重
+    """
+    import numpy as np
+    w = dict(cfg["voting"].get("weights_init", {"cloud":0.5,"map":0.3,"size":0.2}))
+    wf = float(cfg["voting"].get("weight_floor",0.10))
+    wc = float(cfg["voting"].get("weight_ceiling",0.70))
+    eta= float(cfg["voting"].get("weight_eta",0.02))
+    w = adapt_weights(w, perf or {}, eta, wf, wc)
+    p_star = combine_probs_batch(p_cloud, p_map, p_size, w)
+
+    if cfg["voting"]["extreme_gate"]["enable"]:
+        hi, lo = float(cfg["voting"]["extreme_gate"]["hi"]), float(cfg["voting"]["extreme_gate"]["lo"])
+        p_star = np.where(p_star>=hi, np.minimum(0.999, p_star + 0.02), p_star)
+        p_star = np.where(p_star<=lo, np.maximum(0.001, p_star - 0.02), p_star)
+
+    accept_floor = float(cfg["voting"].get("accept_floor",0.50))
+    bucket = np.where(p_star>=1.00, "1.00", np.where(p_star>=0.67, "0.67", "0.50"))
+    accept = p_star >= max(accept_floor, 0.33)
+    return {
+        "p_star": p_star,
+        "bucket": bucket,
+        "accept": accept,
+        "weights": w
+    }
+
 class WeightedVoting:
     """加权投票类，包装投票决策逻辑"""
     
@@ -98,3 +136,39 @@ class WeightedVoting:
             result['p_win'] = result['p_star']
         
         return result
+
+    def vote_batch(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """对一整天的候选（如 lab_push_candidates_v2）按 (draw_id, market) 分组后一次性打分
+
+        每组内按 source 取 cloud/map/size 概率，缺失时按 vote() 的约定取 0.5
+        """
+        groups: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for candidate in candidates:
+            key = (candidate.get('draw_id', 'unknown'), candidate.get('market', 'oe'))
+            probs = groups.setdefault(key, {'cloud': 0.5, 'map': 0.5, 'size': 0.5})
+            source = candidate.get('source')
+            if source in probs:
+                probs[source] = candidate.get('p_win', 0.5)
+        if not groups:
+            return []
+
+        keys = list(groups)
+        scored = decide_batch(
+            [groups[k]['cloud'] for k in keys],
+            [groups[k]['map'] for k in keys],
+            [groups[k]['size'] for k in keys],
+            self.cfg, {}
+        )
+        results = []
+        for i, (draw_id, market) in enumerate(keys):
+            p_star = float(scored['p_star'][i])
+            results.append({
+                "p_star": p_star,
+                "bucket": str(scored['bucket'][i]),
+                "accept": bool(scored['accept'][i]),
+                "weights": scored['weights'],
+                "draw_id": draw_id,
+                "market": market,
+                "p_win": p_star
+            })
+        return results
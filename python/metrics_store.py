@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控指标时序存储
+各监控子系统共用的嵌入式时序库：指标先在内存缓冲，按批量或时间一次事务写入；
+写入时同步累加 1m/1h/1d 三级预聚合，各级按自己的保留期清理。
+区间查询优先读预聚合，30 天的看板只需读几百行。
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 预聚合级别 -> 桶宽（秒），由粗到细；桶按UTC纪元对齐
+TIERS = [('1d', 86400), ('1h', 3600), ('1m', 60)]
+
+# 各级保留期（秒）；raw 为原始点
+DEFAULT_RETENTION = {
+    'raw': 2 * 86400,
+    '1m': 7 * 86400,
+    '1h': 90 * 86400,
+    '1d': 730 * 86400,
+}
+
+TimeLike = Union[float, int, str, datetime]
+
+
+def _to_epoch(value: Optional[TimeLike], default: float) -> float:
+    """时间戳统一为纪元秒；无时区的 datetime / ISO 字符串按本地时间解释"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.timestamp()
+
+
+class MetricsStore:
+    """带预聚合和分级保留的指标存储
+
+    write: append() 只进内存缓冲，满 batch_size 或超过 flush_interval 秒后 flush()
+    在一个事务里写入原始点并合并各级桶（同一批次内同一个桶先在内存里合并，只写一行）。
+    read: 查询前先 flush，缓冲中的点也能查到。
+    """
+
+    def __init__(self, db_path: str = 'metrics_store.db', batch_size: int = 500,
+                 flush_interval: float = 5.0, retention: Optional[Dict[str, float]] = None,
+                 retention_interval: float = 300.0, now=time.time):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.retention_interval = retention_interval
+        self.now = now
+        self.lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.buffer: List[Tuple[str, float, float]] = []
+        self.oldest: Optional[float] = None
+        self._last_retention = 0.0
+        self.stats = {'points': 0, 'flushes': 0, 'rollup_rows': 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+
+        if flush_interval and flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name='metrics-store', daemon=True)
+            self._thread.start()
+
+    def _init_schema(self):
+        with self._db_lock:
+            if self.db_path != ':memory:':
+                self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS metric_points (
+                    series TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    value REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_metric_points_series_ts ON metric_points(series, ts)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS metric_rollups (
+                    tier TEXT NOT NULL,
+                    series TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    n INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    vmin REAL NOT NULL,
+                    vmax REAL NOT NULL,
+                    last REAL NOT NULL,
+                    last_ts REAL NOT NULL,
+                    PRIMARY KEY (tier, series, bucket)
+                ) WITHOUT ROWID
+            ''')
+            self.conn.commit()
+
+    # ---- 写入 ----
+
+    def append(self, name: str, value: float, timestamp: Optional[TimeLike] = None):
+        """登记一个指标点；非数值和 NaN 忽略"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if not math.isfinite(value):
+            return
+        ts = _to_epoch(timestamp, self.now())
+        with self.lock:
+            self.buffer.append((name, ts, value))
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def append_many(self, metrics: Dict[str, Any], timestamp: Optional[TimeLike] = None, prefix: str = ''):
+        """同一时刻的一组指标，名称前加 prefix"""
+        ts = _to_epoch(timestamp, self.now())
+        for name, value in metrics.items():
+            self.append(f'{prefix}{name}', value, ts)
+
+    @staticmethod
+    def _aggregate(points: Iterable[Tuple[str, float, float]]) -> Dict[Tuple[str, str, int], List[float]]:
+        rollups: Dict[Tuple[str, str, int], List[float]] = {}
+        for name, ts, value in points:
+            for tier, width in TIERS:
+                key = (tier, name, int(ts // width))
+                agg = rollups.get(key)
+                if agg is None:
+                    rollups[key] = [1, value, value, value, value, ts]
+                    continue
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = min(agg[2], value)
+                agg[3] = max(agg[3], value)
+                if ts >= agg[5]:
+                    agg[4], agg[5] = value, ts
+        return rollups
+
+    def flush(self) -> int:
+        """写入缓冲中的所有点，返回写入点数"""
+        with self.lock:
+            points, self.buffer = self.buffer, []
+            self.oldest = None
+        if not points:
+            self._maybe_apply_retention()
+            return 0
+
+        rollups = self._aggregate(points)
+        with self._db_lock:
+            try:
+                with self.conn:
+                    if self.retention.get('raw', 0) > 0:
+                        self.conn.executemany(
+                            'INSERT INTO metric_points (series, ts, value) VALUES (?, ?, ?)', points
+                        )
+                    self.conn.executemany('''
+                        INSERT INTO metric_rollups (tier, series, bucket, n, total, vmin, vmax, last, last_ts)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (tier, series, bucket) DO UPDATE SET
+                            n = n + excluded.n,
+                            total = total + excluded.total,
+                            vmin = MIN(vmin, excluded.vmin),
+                            vmax = MAX(vmax, excluded.vmax),
+                            last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+                            last_ts = MAX(last_ts, excluded.last_ts)
+                    ''', [key + tuple(agg) for key, agg in rollups.items()])
+            except sqlite3.Error as e:
+                logger.error(f"指标批量写入失败: {e}")
+                with self.lock:
+                    self.buffer[:0] = points
+                    if self.oldest is None:
+                        self.oldest = time.monotonic()
+                return 0
+
+        self.stats['points'] += len(points)
+        self.stats['flushes'] += 1
+        self.stats['rollup_rows'] += len(rollups)
+        self._maybe_apply_retention()
+        return len(points)
+
+    def apply_retention(self):
+        """按各级保留期删除过期数据"""
+        now = self.now()
+        with self._db_lock:
+            with self.conn:
+                self.conn.execute('DELETE FROM metric_points WHERE ts < ?', (now - self.retention['raw'],))
+                for tier, width in TIERS:
+                    cutoff_bucket = int((now - self.retention[tier]) // width)
+                    self.conn.execute('DELETE FROM metric_rollups WHERE tier = ? AND bucket < ?', (tier, cutoff_bucket))
+        self._last_retention = now
+
+    def _maybe_apply_retention(self):
+        if self.now() - self._last_retention >= self.retention_interval:
+            try:
+                self.apply_retention()
+            except sqlite3.Error as e:
+                logger.error(f"指标过期清理失败: {e}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(min(self.flush_interval, 1.0)):
+            with self.lock:
+                due = self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self.conn.close()
+
+    # ---- 查询 ----
+
+    def _cover(self, start: float, end: float) -> List[Tuple[str, float, float]]:
+        """把 [start, end) 拆成尽量粗的对齐桶区间，边角落到更细的级别，最后是原始点
+
+        更细的级别已过保留期时，边角改用当前级别向外取整的整桶
+        """
+        segments: List[Tuple[str, float, float]] = []
+        now = self.now()
+
+        def cover(lo: float, hi: float, level: int):
+            if lo >= hi:
+                return
+            if level == len(TIERS):
+                segments.append(('raw', lo, hi))
+                return
+            tier, width = TIERS[level]
+            finer = TIERS[level + 1][0] if level + 1 < len(TIERS) else 'raw'
+            if lo < now - self.retention[finer]:
+                segments.append((tier, math.floor(lo / width), math.ceil(hi / width)))
+                return
+            first = math.ceil(lo / width)
+            last = math.floor(hi / width)
+            if first < last:
+                segments.append((tier, first, last))
+                cover(lo, first * width, level + 1)
+                cover(last * width, hi, level + 1)
+            else:
+                cover(lo, hi, level + 1)
+
+        cover(start, end, 0)
+        return segments
+
+    def summary(self, name: str, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None) -> Dict[str, Any]:
+        """区间 [start, end) 内的 count / avg / min / max / last
+
+        整桶部分读预聚合，只有不足一分钟的边角读原始点；细粒度数据已过期的边角按所在整桶统计
+        """
+        self.flush()
+        end_ts = _to_epoch(end, self.now())
+        start_ts = _to_epoch(start, end_ts - 86400)
+        n, total, vmin, vmax, last, last_ts = 0, 0.0, None, None, None, None
+
+        with self._db_lock:
+            for tier, lo, hi in self._cover(start_ts, end_ts):
+                if tier == 'raw':
+                    row = self.conn.execute('''
+                        SELECT COUNT(*), SUM(value), MIN(value), MAX(value) FROM metric_points
+                        WHERE series = ? AND ts >= ? AND ts < ?
+                    ''', (name, lo, hi)).fetchone()
+                    tail = self.conn.execute('''
+                        SELECT value, ts FROM metric_points WHERE series = ? AND ts >= ? AND ts < ?
+                        ORDER BY ts DESC LIMIT 1
+                    ''', (name, lo, hi)).fetchone()
+                else:
+                    row = self.conn.execute('''
+                        SELECT SUM(n), SUM(total), MIN(vmin), MAX(vmax) FROM metric_rollups
+                        WHERE tier = ? AND series = ? AND bucket >= ? AND bucket < ?
+                    ''', (tier, name, lo, hi)).fetchone()
+                    tail = self.conn.execute('''
+                        SELECT last, last_ts FROM metric_rollups
+                        WHERE tier = ? AND series = ? AND bucket >= ? AND bucket < ?
+                        ORDER BY bucket DESC LIMIT 1
+                    ''', (tier, name, lo, hi)).fetchone()
+                if not row or not row[0]:
+                    continue
+                n += row[0]
+                total += row[1]
+                vmin = row[2] if vmin is None else min(vmin, row[2])
+                vmax = row[3] if vmax is None else max(vmax, row[3])
+                if tail and (last_ts is None or tail[1] >= last_ts):
+                    last, last_ts = tail
+
+        return {
+            'count': n,
+            'avg': total / n if n else None,
+            'sum': total,
+            'min': vmin,
+            'max': vmax,
+            'last': last,
+            'last_timestamp': datetime.fromtimestamp(last_ts).isoformat() if last_ts is not None else None,
+        }
+
+    def series(self, name: str, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None,
+               step: Optional[float] = None, max_points: int = 500) -> List[Dict[str, Any]]:
+        """按 step 秒分桶的时间序列；未指定 step 时按 max_points 推算，从能整除 step 的最粗级别读取"""
+        self.flush()
+        end_ts = _to_epoch(end, self.now())
+        start_ts = _to_epoch(start, end_ts - 86400)
+        if step is None:
+            step = max((end_ts - start_ts) / max(max_points, 1), 1.0)
+
+        source = None
+        for tier, width in TIERS:
+            if width <= step:
+                step = math.ceil(step / width) * width
+                source = (tier, width)
+                break
+
+        with self._db_lock:
+            if source:
+                tier, width = source
+                factor = int(step // width)
+                rows = self.conn.execute('''
+                    SELECT bucket / ? AS b, SUM(n), SUM(total), MIN(vmin), MAX(vmax)
+                    FROM metric_rollups
+                    WHERE tier = ? AND series = ? AND bucket >= ? AND bucket < ?
+                    GROUP BY b ORDER BY b
+                ''', (factor, tier, name, int(start_ts // width), math.ceil(end_ts / width))).fetchall()
+            else:
+                rows = self.conn.execute('''
+                    SELECT CAST(ts / ? AS INTEGER) AS b, COUNT(*), SUM(value), MIN(value), MAX(value)
+                    FROM metric_points
+                    WHERE series = ? AND ts >= ? AND ts < ?
+                    GROUP BY b ORDER BY b
+                ''', (step, name, start_ts, end_ts)).fetchall()
+
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(bucket * step).isoformat(),
+                'count': n,
+                'avg': total / n,
+                'min': vmin,
+                'max': vmax,
+            }
+            for bucket, n, total, vmin, vmax in rows
+        ]
+
+    def latest(self, prefix: str = '', since: Optional[TimeLike] = None) -> Dict[str, Dict[str, Any]]:
+        """各指标最近一次的值（默认最近一小时内），按名称前缀过滤"""
+        self.flush()
+        since_ts = _to_epoch(since, self.now() - 3600)
+        with self._db_lock:
+            rows = self.conn.execute('''
+                SELECT series, last, MAX(last_ts) FROM metric_rollups
+                WHERE tier = '1m' AND series >= ? AND series < ? AND bucket >= ?
+                GROUP BY series
+            ''', (prefix, prefix + '\uffff', int(since_ts // 60))).fetchall()
+        return {
+            series: {'value': value, 'timestamp': datetime.fromtimestamp(ts).isoformat()}
+            for series, value, ts in rows if ts >= since_ts
+        }
+
+    def names(self, prefix: str = '', since: Optional[TimeLike] = None) -> List[str]:
+        """since 之后有数据的指标名（读日级预聚合），按名称前缀过滤"""
+        self.flush()
+        since_ts = _to_epoch(since, self.now() - 86400)
+        with self._db_lock:
+            rows = self.conn.execute('''
+                SELECT DISTINCT series FROM metric_rollups
+                WHERE tier = '1d' AND series >= ? AND series < ? AND bucket >= ?
+                ORDER BY series
+            ''', (prefix, prefix + '\uffff', int(since_ts // 86400))).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            buffered = len(self.buffer)
+        return {**self.stats, 'buffered': buffered, 'db_path': self.db_path}
+
+
+_shared_stores: Dict[str, MetricsStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_metrics_store(path: Optional[str] = None) -> MetricsStore:
+    """按路径获取进程内共享的指标存储，默认读取 PC28_METRICS_DB"""
+    path = os.path.abspath(path or os.environ.get('PC28_METRICS_DB', 'metrics_store.db'))
+    with _shared_lock:
+        store = _shared_stores.get(path)
+        if store is None:
+            store = MetricsStore(path)
+            _shared_stores[path] = store
+            logger.info(f"打开监控指标时序存储: {path}")
+        return store
@@ -15,6 +15,10 @@ from collections import defaultdict
 from python.api_monitor import APIMonitor, APIHealthStatus
 from python.data_quality_monitor import DataQualityMonitor, DataQualityMetrics
 from python.error_handler import ErrorHandler
+from python.metrics_store import get_shared_metrics_store
+
+# 仪表板指标在共享时序存储中的名称前缀
+METRIC_PREFIX = 'dashboard.'
 
 @dataclass
 class SystemHealthStatus:
@@ -40,9 +44,10 @@ class MonitoringDashboard:
         self.data_quality_monitor = DataQualityMonitor(config)
         self.error_handler = ErrorHandler(config)
         
-        # 系统状态历史
+        # 系统状态历史（内存中只保留最近的状态对象，数值趋势从时序存储的预聚合读取）
         self.health_history = []
         self.max_history = 1000
+        self.metrics_store = get_shared_metrics_store(config.get('metrics_store_path'))
         
         # 性能指标
         self.performance_metrics = {
@@ -138,24 +143,12 @@ class MonitoringDashboard:
         return health_status
     
     def _calculate_uptime_percentage(self) -> float:
-        """计算运行时间百分比"""
-        if not self.health_history:
-            return 100.0
-        
-        # 计算最近24小时的运行时间
-        now = datetime.now()
-        cutoff_time = now - timedelta(hours=24)
-        
-        recent_checks = [
-            check for check in self.health_history 
-            if check.timestamp >= cutoff_time
-        ]
-        
-        if not recent_checks:
+        """计算最近24小时的运行时间百分比（healthy 取值 0/1，均值即健康占比）"""
+        healthy = self.metrics_store.summary(f'{METRIC_PREFIX}healthy', datetime.now() - timedelta(hours=24))
+        if not healthy['count']:
             return 100.0
         
-        healthy_checks = sum(1 for check in recent_checks if check.overall_status == 'healthy')
-        return (healthy_checks / len(recent_checks)) * 100
+        return healthy['avg'] * 100
     
     def start_monitoring(self):
         """启动监控服务"""
@@ -190,6 +183,14 @@ class MonitoringDashboard:
         if len(self.health_history) > self.max_history:
             self.health_history = self.health_history[-self.max_history:]
         
+        self.metrics_store.append_many({
+            'healthy': 1.0 if health_status.overall_status == 'healthy' else 0.0,
+            'error_rate': health_status.error_rate,
+            'uptime_percentage': health_status.uptime_percentage,
+            'active_alerts': len(health_status.active_alerts),
+            **{f'performance.{name}': value for name, value in health_status.performance_metrics.items()}
+        }, health_status.timestamp, prefix=METRIC_PREFIX)
+        
         # 记录日志
         self.logger.info(f"系统健康检查完成 - 状态: {health_status.overall_status}, "
                         f"错误率: {health_status.error_rate:.1%}, "
@@ -211,10 +212,14 @@ class MonitoringDashboard:
             self.performance_metrics['success_counts'][api_type] += 1
         else:
             self.performance_metrics['error_counts'][api_type] += 1
+        
+        self.metrics_store.append(f'{METRIC_PREFIX}api.{api_type}.response_time_ms', response_time_ms)
+        self.metrics_store.append(f'{METRIC_PREFIX}api.{api_type}.success', 1.0 if success else 0.0)
     
     def record_data_processing_time(self, processing_time_ms: float):
         """记录数据处理时间"""
         self.performance_metrics['data_processing_times'].append(processing_time_ms)
+        self.metrics_store.append(f'{METRIC_PREFIX}data_processing_time_ms', processing_time_ms)
         
         # 保持最近的记录
         if len(self.performance_metrics['data_processing_times']) > 100:
@@ -229,24 +234,22 @@ class MonitoringDashboard:
         cutoff_time = datetime.now() - timedelta(hours=hours)
         recent_history = [h for h in self.health_history if h.timestamp >= cutoff_time]
         
-        # 计算趋势数据
-        status_trend = []
-        error_rate_trend = []
-        uptime_trend = []
-        
-        for h in recent_history[-24:]:  # 最近24个数据点
-            status_trend.append({
-                'timestamp': h.timestamp.isoformat(),
-                'status': h.overall_status
-            })
-            error_rate_trend.append({
-                'timestamp': h.timestamp.isoformat(),
-                'error_rate': h.error_rate
-            })
-            uptime_trend.append({
-                'timestamp': h.timestamp.isoformat(),
-                'uptime': h.uptime_percentage
-            })
+        # 计算趋势数据：状态取内存中的最近记录，数值趋势读取预聚合（最多24个数据点）
+        status_trend = [
+            {'timestamp': h.timestamp.isoformat(), 'status': h.overall_status}
+            for h in recent_history[-24:]
+        ]
+        error_rate_trend = [
+            {'timestamp': point['timestamp'], 'error_rate': point['avg']}
+            for point in self.metrics_store.series(f'{METRIC_PREFIX}error_rate', cutoff_time, max_points=24)
+        ]
+        uptime_trend = [
+            {'timestamp': point['timestamp'], 'uptime': point['avg']}
+            for point in self.metrics_store.series(f'{METRIC_PREFIX}uptime_percentage', cutoff_time, max_points=24)
+        ]
+        uptime_summary = self.metrics_store.summary(f'{METRIC_PREFIX}uptime_percentage', cutoff_time)
+        error_rate_summary = self.metrics_store.summary(f'{METRIC_PREFIX}error_rate', cutoff_time)
+        alerts_summary = self.metrics_store.summary(f'{METRIC_PREFIX}active_alerts', cutoff_time)
         
         # API状态统计
         api_stats = {}
@@ -274,9 +277,9 @@ class MonitoringDashboard:
             'error_summary': self.error_handler.get_error_summary(hours),
             'system_metrics': {
                 'total_health_checks': len(self.health_history),
-                'avg_uptime_24h': sum(h.uptime_percentage for h in recent_history) / len(recent_history) if recent_history else 100,
-                'total_alerts_24h': sum(len(h.active_alerts) for h in recent_history),
-                'avg_error_rate_24h': sum(h.error_rate for h in recent_history) / len(recent_history) if recent_history else 0
+                'avg_uptime_24h': uptime_summary['avg'] if uptime_summary['count'] else 100,
+                'total_alerts_24h': int(alerts_summary['sum']),
+                'avg_error_rate_24h': error_rate_summary['avg'] if error_rate_summary['count'] else 0
             }
         }
     
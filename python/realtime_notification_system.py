@@ -5,6 +5,7 @@ PC28实时数据推送和通知系统
 负责实时开奖数据的推送、通知和分发
 """
 
+import os
 import json
 import time
 import asyncio
@@ -14,8 +15,8 @@ from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass, asdict
 from queue import Queue, Empty
-from concurrent.futures import ThreadPoolExecutor
 from api_field_optimization import OptimizedPC28DataProcessor, OptimizedLotteryData
+from draw_event_bus import Subscription, get_default_draw_ingest
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +31,14 @@ class NotificationEvent:
     priority: str = "normal"  # 'low', 'normal', 'high', 'critical'
     metadata: Dict[str, Any] = None
 
+def _coalesce_key(event: NotificationEvent):
+    """信箱合并键：data_update 只保留最新一条，system_alert 按内容合并重复告警"""
+    if event.event_type == 'data_update':
+        return 'data_update'
+    if event.event_type == 'system_alert':
+        return ('system_alert', event.priority, event.message)
+    return None
+
 @dataclass
 class SubscriberInfo:
     """订阅者信息"""
@@ -38,12 +47,27 @@ class SubscriberInfo:
     event_types: List[str]
     active: bool = True
     last_notification: Optional[str] = None
+    mailbox: Optional[Subscription] = None  # 独立信箱和投递线程
+
+def _encode_event(event: NotificationEvent) -> Dict[str, Any]:
+    """溢出到文件时的事件序列化"""
+    return asdict(event)
+
+def _decode_event(payload: Dict[str, Any]) -> NotificationEvent:
+    draw_data = payload.get('draw_data')
+    if draw_data is not None:
+        payload['draw_data'] = OptimizedLotteryData(**draw_data)
+    return NotificationEvent(**payload)
 
 class RealtimeNotificationSystem:
     """实时通知系统"""
     
-    def __init__(self, polling_interval: int = 30):
-        self.api_client = PC28UpstreamAPI()
+    def __init__(self, polling_interval: int = 30, ingest=None, legacy_polling: bool = False):
+        # 订阅共享开奖接入组件（draw_event_bus.DrawIngest）的事件，未传入时启动时按配置的上游账号获取；
+        # 只有显式 legacy_polling=True 才自行轮询上游
+        self.ingest = ingest
+        self.legacy_polling = legacy_polling and ingest is None
+        self.api_client = PC28UpstreamAPI() if self.legacy_polling else None
         self.data_processor = OptimizedPC28DataProcessor()
         self.polling_interval = polling_interval
         
@@ -59,7 +83,7 @@ class RealtimeNotificationSystem:
         self.is_running = False
         self.polling_thread: Optional[threading.Thread] = None
         self.notification_thread: Optional[threading.Thread] = None
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        self.stats_lock = threading.Lock()
         
         # 统计信息
         self.stats = {
@@ -75,18 +99,40 @@ class RealtimeNotificationSystem:
         self.china_tz = timezone(timedelta(hours=8))
     
     def subscribe(self, subscriber_id: str, callback: Callable[[NotificationEvent], None], 
-                 event_types: List[str] = None) -> bool:
-        """订阅通知"""
+                 event_types: List[str] = None, mailbox_size: int = 100, overflow: str = 'drop_oldest',
+                 spill_dir: Optional[str] = None) -> bool:
+        """订阅通知
+        
+        每个订阅者有独立的信箱和投递线程，慢订阅者不会拖慢其他订阅者；
+        信箱中未投递的 data_update 会被更新的 data_update 取代，内容相同的 system_alert 只保留最新一条
+        （上游故障时接入组件每次轮询都会告警）。
+        overflow 为 drop_oldest / drop_new / spill（溢出写入 spill_dir 下的文件，稍后按顺序投递）；
+        drop 策略不丢弃 new_draw，信箱满时仍入队；data_update 和 system_alert 受 mailbox_size 限制
+        """
         if event_types is None:
             event_types = ['new_draw', 'data_update', 'system_alert']
         
         try:
-            self.subscribers[subscriber_id] = SubscriberInfo(
+            subscriber = SubscriberInfo(
                 subscriber_id=subscriber_id,
                 callback=callback,
                 event_types=event_types,
                 active=True
             )
+            subscriber.mailbox = Subscription(
+                subscriber_id, event_types, lambda event: self._deliver(subscriber, event),
+                maxsize=mailbox_size, overflow=overflow,
+                coalesce=_coalesce_key,
+                lossless=lambda event: event.event_type == 'new_draw',
+                spill_path=os.path.join(spill_dir, f"{subscriber_id}.spill.jsonl") if spill_dir else None,
+                encode=_encode_event, decode=_decode_event
+            )
+            
+            previous = self.subscribers.get(subscriber_id)
+            self.subscribers[subscriber_id] = subscriber
+            if previous and previous.mailbox:
+                previous.mailbox.close()
+            subscriber.mailbox.start()
             
             self.stats['active_subscribers'] = len([s for s in self.subscribers.values() if s.active])
             logger.info(f"订阅者 {subscriber_id} 已订阅事件: {event_types}")
@@ -100,8 +146,10 @@ class RealtimeNotificationSystem:
         """取消订阅"""
         try:
             if subscriber_id in self.subscribers:
-                self.subscribers[subscriber_id].active = False
-                del self.subscribers[subscriber_id]
+                subscriber = self.subscribers.pop(subscriber_id)
+                subscriber.active = False
+                if subscriber.mailbox:
+                    subscriber.mailbox.close()
                 
                 self.stats['active_subscribers'] = len([s for s in self.subscribers.values() if s.active])
                 logger.info(f"订阅者 {subscriber_id} 已取消订阅")
@@ -122,9 +170,20 @@ class RealtimeNotificationSystem:
             self.is_running = True
             self.stats['system_start_time'] = datetime.now(self.china_tz).isoformat()
             
-            # 启动数据轮询线程
-            self.polling_thread = threading.Thread(target=self._polling_worker, daemon=True)
-            self.polling_thread.start()
+            # 重新打开上次停止时关闭的订阅者信箱
+            for subscriber in list(self.subscribers.values()):
+                if subscriber.mailbox:
+                    subscriber.mailbox.start()
+            
+            # 订阅共享接入的总线事件（legacy_polling 时才启动自有轮询线程）
+            if self.ingest is None and not self.legacy_polling:
+                self.ingest = get_default_draw_ingest(default_interval=self.polling_interval)
+            if self.ingest is not None:
+                self.ingest.bus.subscribe('realtime_notification_system', self._on_ingest_event)
+                self.ingest.start()
+            else:
+                self.polling_thread = threading.Thread(target=self._polling_worker, daemon=True)
+                self.polling_thread.start()
             
             # 启动通知处理线程
             self.notification_thread = threading.Thread(target=self._notification_worker, daemon=True)
@@ -160,6 +219,10 @@ class RealtimeNotificationSystem:
                 priority='normal'
             ))
             
+            if self.ingest is not None:
+                self.ingest.stop()
+                self.ingest.bus.unsubscribe('realtime_notification_system')
+            
             # 等待线程结束
             if self.polling_thread and self.polling_thread.is_alive():
                 self.polling_thread.join(timeout=5)
@@ -167,6 +230,11 @@ class RealtimeNotificationSystem:
             if self.notification_thread and self.notification_thread.is_alive():
                 self.notification_thread.join(timeout=5)
             
+            # 关闭订阅者信箱并等待各投递线程结束
+            for subscriber in list(self.subscribers.values()):
+                if subscriber.mailbox:
+                    subscriber.mailbox.close()
+            
             logger.info("实时监控系统已停止")
             return True
             
@@ -244,6 +312,41 @@ class RealtimeNotificationSystem:
         
         logger.info("数据轮询线程已停止")
     
+    def _on_ingest_event(self, event):
+        """把共享接入组件的事件转换为通知（去重已由接入组件完成）"""
+        self.stats['last_poll_time'] = event.timestamp
+        
+        if event.topic == 'system_alert':
+            self._queue_notification(NotificationEvent(
+                event_type='system_alert',
+                timestamp=datetime.now(self.china_tz).isoformat(),
+                message=event.message,
+                priority=event.priority
+            ))
+            return
+        
+        latest_draw = self.data_processor.process_realtime_data(event.raw)
+        
+        if event.topic == 'new_draw':
+            logger.info(f"检测到新开奖: 期号 {latest_draw.draw_id}")
+            self.last_draw_data = latest_draw
+            self._update_data_cache(latest_draw)
+            self._queue_notification(NotificationEvent(
+                event_type='new_draw',
+                timestamp=datetime.now(self.china_tz).isoformat(),
+                draw_data=latest_draw,
+                message=f"新开奖: 期号 {latest_draw.draw_id}, 号码 {latest_draw.numbers}, 和值 {latest_draw.result_sum}",
+                priority='high'
+            ))
+        else:
+            self._queue_notification(NotificationEvent(
+                event_type='data_update',
+                timestamp=datetime.now(self.china_tz).isoformat(),
+                draw_data=latest_draw,
+                message=f"数据已更新: 期号 {latest_draw.draw_id}",
+                priority='normal'
+            ))
+    
     def _notification_worker(self):
         """通知处理工作线程"""
         logger.info("通知处理线程已启动")
@@ -294,26 +397,21 @@ class RealtimeNotificationSystem:
             logger.error(f"通知入队失败: {e}")
     
     def _distribute_notification(self, event: NotificationEvent):
-        """分发通知给订阅者"""
-        active_subscribers = [s for s in self.subscribers.values() if s.active and event.event_type in s.event_types]
-        
-        if not active_subscribers:
-            return
-        
-        # 并发发送通知
-        futures = []
-        for subscriber in active_subscribers:
-            future = self.executor.submit(self._send_notification_to_subscriber, subscriber, event)
-            futures.append(future)
-        
-        # 等待所有通知发送完成
-        for future in futures:
-            try:
-                future.result(timeout=5)  # 5秒超时
-                self.stats['successful_deliveries'] += 1
-            except Exception as e:
-                logger.error(f"通知发送失败: {e}")
+        """分发通知给订阅者：只做非阻塞投入信箱，由各订阅者的投递线程执行回调"""
+        for subscriber in list(self.subscribers.values()):
+            if subscriber.active and event.event_type in subscriber.event_types:
+                subscriber.mailbox.offer(event)
+    
+    def _deliver(self, subscriber: SubscriberInfo, event: NotificationEvent):
+        """在订阅者的投递线程中执行回调；异常继续抛给信箱线程，计入该订阅者的 failed"""
+        try:
+            self._send_notification_to_subscriber(subscriber, event)
+        except Exception:
+            with self.stats_lock:
                 self.stats['failed_deliveries'] += 1
+            raise
+        with self.stats_lock:
+            self.stats['successful_deliveries'] += 1
     
     def _send_notification_to_subscriber(self, subscriber: SubscriberInfo, event: NotificationEvent):
         """向单个订阅者发送通知"""
@@ -330,12 +428,16 @@ class RealtimeNotificationSystem:
         return {
             'is_running': self.is_running,
             'polling_interval': self.polling_interval,
+            'ingest': self.ingest.get_status() if self.ingest is not None else None,
             'active_subscribers': len([s for s in self.subscribers.values() if s.active]),
             'total_subscribers': len(self.subscribers),
             'queue_size': self.notification_queue.qsize(),
             'last_draw_data': asdict(self.last_draw_data) if self.last_draw_data else None,
             'data_cache': self.data_cache,
-            'statistics': self.stats
+            'statistics': self.stats,
+            'subscribers': {
+                sub.subscriber_id: sub.mailbox.metrics() for sub in list(self.subscribers.values()) if sub.mailbox
+            }
         }
     
     def get_subscriber_list(self) -> List[Dict[str, Any]]:
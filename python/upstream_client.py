@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PC28上游API共享客户端
+异步请求 + 连接池复用 + 令牌桶限流 + 相同请求合并，
+实时服务与回填服务共用同一份限流额度
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://rijb.api.storeapi.net/api/119/259"
+# 实时接口只返回当期开奖，按日期查询历史须走历史接口
+DEFAULT_HISTORY_URL = "https://rijb.api.storeapi.net/api/119/260"
+
+# 参与签名但不参与请求合并判断的参数
+_VOLATILE_PARAMS = ('time', 'sign')
+
+
+def generate_signature(params: Dict[str, Any], wapi_key: str) -> str:
+    """生成API签名（与 main.generate_signature 一致）"""
+    sorted_params = sorted(params.items())
+    param_string = ''.join([f"{k}{v}" for k, v in sorted_params])
+    param_string += wapi_key
+    return hashlib.md5(param_string.encode('utf-8')).hexdigest()
+
+
+class TokenBucket:
+    """异步令牌桶限流器"""
+
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_second))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """获取令牌，不足时等待补充"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class AsyncUpstreamClient:
+    """异步上游API客户端
+
+    HTTP请求通过带连接池的 requests.Session 在线程池中执行，保持长连接；
+    同一时刻参数相同的请求只发一次，其余调用方共享结果。
+    history_url 未指定时取环境变量 PC28_HISTORY_API_URL，再退回 DEFAULT_HISTORY_URL。
+    """
+
+    def __init__(self, appid: str, secret_key: str, api_url: str = DEFAULT_API_URL,
+                 history_url: Optional[str] = None, rate_per_second: float = 2.0,
+                 burst: Optional[float] = None, pool_size: int = 10, timeout: float = 10.0):
+        self.appid = appid
+        self.secret_key = secret_key
+        self.api_url = api_url
+        self.history_url = history_url or os.getenv('PC28_HISTORY_API_URL') or DEFAULT_HISTORY_URL
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_per_second, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'User-Agent': 'PC28-UpstreamClient/1.0'})
+
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._waiters: Dict[Tuple, int] = {}
+        self.stats = {'requests': 0, 'coalesced': 0, 'errors': 0}
+
+    def _signed_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        signed = {'appid': self.appid, 'format': 'json', 'time': str(int(time.time()))}
+        signed.update(params)
+        signed['sign'] = generate_signature(signed, self.secret_key)
+        return signed
+
+    def _http_get(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def _do_request(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        await self.rate_limiter.acquire()
+        self.stats['requests'] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._http_get, url, self._signed_params(params))
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def request(self, params: Dict[str, Any], url: Optional[str] = None) -> Dict[str, Any]:
+        """发送请求，相同的在途请求会被合并；所有等待方都取消时取消底层请求"""
+        url = url or self.api_url
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items() if k not in _VOLATILE_PARAMS)))
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+        else:
+            future = asyncio.ensure_future(self._do_request(url, params))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                future.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def get_realtime_lottery(self) -> Dict[str, Any]:
+        """获取实时开奖数据"""
+        return await self.request({})
+
+    async def get_history_lottery(self, date: str, limit: int = 100) -> Dict[str, Any]:
+        """获取指定日期的历史开奖数据"""
+        return await self.request({'date': date, 'limit': limit}, url=self.history_url)
+
+    @staticmethod
+    def parse_lottery_data(raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将API响应解析为统一的开奖记录列表"""
+        ret_data = raw_data.get('retdata') or {}
+        if isinstance(ret_data, dict):
+            items = [ret_data['curent']] if isinstance(ret_data.get('curent'), dict) else []
+        else:
+            items = list(ret_data)
+
+        parsed = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+
+            draw_id = item.get('long_issue') or item.get('issue')
+            numbers = item.get('number') or []
+            try:
+                digits = [int(n) for n in numbers[:3]]
+            except (TypeError, ValueError):
+                digits = []
+            if not draw_id or len(digits) < 3:
+                continue
+
+            kj_time = item.get('kjtime') or item.get('award_time') or ''
+            parsed.append({
+                'draw_id': str(draw_id),
+                'timestamp': str(kj_time),
+                'date': str(kj_time)[:10] if kj_time else datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'result_numbers': digits,
+                'result_digits': digits,
+                'result_sum': sum(digits)
+            })
+        return parsed
+
+    def close(self):
+        self.session.close()
+
+
+class UpstreamClient:
+    """供线程代码调用的同步门面
+
+    在后台线程中运行一个事件循环，所有调用提交到该循环执行，
+    因此多个线程/服务共享同一个连接池、限流器和请求合并表。
+    timeout 为调用方等待结果的上限（含限流排队），默认取客户端HTTP超时的两倍，
+    事件循环卡住时调用方不会被永久阻塞。
+    """
+
+    def __init__(self, async_client: AsyncUpstreamClient, timeout: Optional[float] = None):
+        self.async_client = async_client
+        self.timeout = timeout if timeout is not None else async_client.timeout * 2
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='upstream-client', daemon=True)
+        self._thread.start()
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout if timeout is not None else self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def get_realtime_lottery(self) -> Dict[str, Any]:
+        return self._run(self.async_client.get_realtime_lottery())
+
+    def get_history_lottery(self, date: str, limit: int = 100) -> Dict[str, Any]:
+        return self._run(self.async_client.get_history_lottery(date=date, limit=limit))
+
+    def parse_lottery_data(self, raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self.async_client.parse_lottery_data(raw_data)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.async_client.stats)
+
+    async def _cancel_pending(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """取消事件循环中未完成的请求后停止并关闭循环"""
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_pending(), self.loop).result(5)
+        except (concurrent.futures.TimeoutError, RuntimeError) as e:
+            logger.warning(f"取消未完成的上游请求失败: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self.loop.close()
+        self.async_client.close()
+
+
+_shared_clients: Dict[str, UpstreamClient] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_upstream_client(appid: str, secret_key: str, **kwargs) -> UpstreamClient:
+    """按 appid 获取进程内共享客户端，首次创建时的限流参数生效"""
+    with _shared_lock:
+        client = _shared_clients.get(appid)
+        if client is None:
+            client = UpstreamClient(AsyncUpstreamClient(appid, secret_key, **kwargs))
+            _shared_clients[appid] = client
+            logger.info(f"创建共享上游客户端: appid={appid}")
+        return client
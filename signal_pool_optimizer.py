@@ -7,8 +7,11 @@ PC28信号池优化系统
 
 import json
 import time
+import heapq
 import sqlite3
 import threading
+from bisect import bisect_left, insort
+from itertools import count, islice
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple, Union
 from dataclasses import dataclass, asdict
@@ -84,9 +87,16 @@ class SignalPoolMetrics:
             self.signal_type_distribution = {}
 
 class SignalPoolOptimizer:
-    """信号池优化器"""
+    """信号池优化器
     
-    def __init__(self, db_path: str = "signal_pool.db"):
+    未过期的信号按类型、按Agent建立二级索引，并按类型维护置信度有序表；
+    过期时间放在最小堆中，读取时只弹出已到期的信号（O(到期数 log n)），
+    到期信号移出索引但保留在池中，直到 cleanup_expired_signals 删除。
+    信号写库采用 write-behind，按批次或定时落盘。
+    """
+    
+    def __init__(self, db_path: str = "signal_pool.db", write_batch_size: int = 200,
+                 flush_interval: float = 1.0):
         self.db_path = db_path
         self.agents: Dict[str, AgentConfig] = {}
         self.signal_pool: Dict[str, Signal] = {}
@@ -94,11 +104,34 @@ class SignalPoolOptimizer:
         self.lock = threading.RLock()
         self.executor = ThreadPoolExecutor(max_workers=10)
         
+        # 活跃信号索引
+        self._by_type: Dict[SignalType, Dict[str, Signal]] = {}
+        self._by_agent: Dict[str, Dict[str, Signal]] = {}
+        self._ranked: Dict[SignalType, List[Tuple[float, int, str]]] = {}
+        self._rank_keys: Dict[str, Tuple[float, int, str]] = {}
+        self._seq: Dict[str, int] = {}
+        self._seq_counter = count()
+        self._expiry_heap: List[Tuple[datetime, int, str]] = []
+        self._expired_ids: set = set()
+        
+        # 活跃信号的增量统计
+        self._confidence_sum = 0.0
+        self._model_counts: Dict[str, int] = {}
+        self._type_counts: Dict[str, int] = {}
+        
+        # write-behind 缓冲（按 signal_id 合并）
+        self.write_batch_size = write_batch_size
+        self.flush_interval = flush_interval
+        self._pending_writes: Dict[str, tuple] = {}
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        
         # 初始化数据库
         self._init_database()
         
         # 启动清理任务
         self._start_cleanup_task()
+        self._start_flush_task()
         
     def _init_database(self):
         """初始化数据库"""
@@ -179,69 +212,158 @@ class SignalPoolOptimizer:
             
         logger.info(f"Agent {config.agent_id} 配置已添加")
     
+    @staticmethod
+    def _signal_row(signal: Signal) -> tuple:
+        return (
+            signal.signal_id,
+            signal.signal_type.value,
+            signal.confidence,
+            json.dumps(signal.value) if isinstance(signal.value, (dict, list)) else str(signal.value),
+            signal.timestamp.isoformat(),
+            signal.source_model.value,
+            signal.agent_id,
+            json.dumps(signal.metadata) if signal.metadata else None,
+            signal.expiry_time.isoformat() if signal.expiry_time else None
+        )
+    
+    def _index_signal(self, signal: Signal):
+        """把活跃信号加入各索引和统计"""
+        signal_id = signal.signal_id
+        self._by_type.setdefault(signal.signal_type, {})[signal_id] = signal
+        self._by_agent.setdefault(signal.agent_id, {})[signal_id] = signal
+        
+        rank_key = (-signal.confidence, self._seq[signal_id], signal_id)
+        insort(self._ranked.setdefault(signal.signal_type, []), rank_key)
+        self._rank_keys[signal_id] = rank_key
+        
+        self._confidence_sum += signal.confidence
+        model = signal.source_model.value
+        self._model_counts[model] = self._model_counts.get(model, 0) + 1
+        signal_type = signal.signal_type.value
+        self._type_counts[signal_type] = self._type_counts.get(signal_type, 0) + 1
+    
+    def _unindex_signal(self, signal: Signal):
+        """把信号移出各索引和统计"""
+        signal_id = signal.signal_id
+        rank_key = self._rank_keys.pop(signal_id, None)
+        if rank_key is None:
+            return
+        
+        ranked = self._ranked[signal.signal_type]
+        del ranked[bisect_left(ranked, rank_key)]
+        
+        del self._by_type[signal.signal_type][signal_id]
+        by_agent = self._by_agent[signal.agent_id]
+        del by_agent[signal_id]
+        if not by_agent:
+            del self._by_agent[signal.agent_id]
+        
+        self._confidence_sum -= signal.confidence
+        for counts, key in ((self._model_counts, signal.source_model.value),
+                            (self._type_counts, signal.signal_type.value)):
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+    
+    def _expire_due(self, now: Optional[datetime] = None):
+        """弹出已到期的信号并移出索引（堆中被替换的旧条目直接丢弃）"""
+        now = now or datetime.now()
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            expiry_time, _, signal_id = heapq.heappop(heap)
+            signal = self.signal_pool.get(signal_id)
+            if signal is None or signal.expiry_time != expiry_time or signal_id in self._expired_ids:
+                continue
+            self._unindex_signal(signal)
+            self._expired_ids.add(signal_id)
+    
     def add_signal(self, signal: Signal):
         """添加信号到池中"""
         with self.lock:
-            self.signal_pool[signal.signal_id] = signal
+            signal_id = signal.signal_id
+            previous = self.signal_pool.get(signal_id)
+            if previous is not None:
+                self._unindex_signal(previous)
+                self._expired_ids.discard(signal_id)
+            else:
+                self._seq[signal_id] = next(self._seq_counter)
             
-            # 保存到数据库
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO signals 
-                (signal_id, signal_type, confidence, value, timestamp, source_model, agent_id, metadata, expiry_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                signal.signal_id,
-                signal.signal_type.value,
-                signal.confidence,
-                json.dumps(signal.value) if isinstance(signal.value, (dict, list)) else str(signal.value),
-                signal.timestamp.isoformat(),
-                signal.source_model.value,
-                signal.agent_id,
-                json.dumps(signal.metadata) if signal.metadata else None,
-                signal.expiry_time.isoformat() if signal.expiry_time else None
-            ))
-            conn.commit()
-            conn.close()
+            self.signal_pool[signal_id] = signal
+            self._index_signal(signal)
+            if signal.expiry_time is not None:
+                heapq.heappush(self._expiry_heap, (signal.expiry_time, self._seq[signal_id], signal_id))
+            
+        # 保存到数据库（write-behind）
+        with self._write_lock:
+            self._pending_writes[signal.signal_id] = self._signal_row(signal)
+            should_flush = len(self._pending_writes) >= self.write_batch_size
+        if should_flush:
+            self.flush()
             
         self._update_metrics()
         logger.info(f"信号 {signal.signal_id} 已添加到池中")
     
+    def flush(self):
+        """把缓冲中的信号批量写入数据库"""
+        with self._write_lock:
+            if not self._pending_writes:
+                return
+            rows = list(self._pending_writes.values())
+            self._pending_writes.clear()
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO signals 
+                    (signal_id, signal_type, confidence, value, timestamp, source_model, agent_id, metadata, expiry_time)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                conn.commit()
+            except Exception:
+                # 写入失败时放回缓冲，等待下次重试（不覆盖期间的新写入）
+                for row in rows:
+                    self._pending_writes.setdefault(row[0], row)
+                raise
+            finally:
+                conn.close()
+    
+    def close(self):
+        """停止后台任务并写入剩余信号"""
+        self._stop_event.set()
+        self.flush()
+    
+    def _in_pool_order(self, signals: List[Signal]) -> List[Signal]:
+        """按首次加入顺序排列，与遍历 signal_pool 的顺序一致（索引基本有序，排序接近线性）"""
+        seq = self._seq
+        signals.sort(key=lambda signal: seq[signal.signal_id])
+        return signals
+    
     def get_signals_by_type(self, signal_type: SignalType, min_confidence: float = 0.0) -> List[Signal]:
         """根据类型获取信号"""
         with self.lock:
-            return [
-                signal for signal in self.signal_pool.values()
-                if signal.signal_type == signal_type 
-                and signal.confidence >= min_confidence
-                and not signal.is_expired()
-            ]
+            self._expire_due()
+            return self._in_pool_order([
+                signal for signal in self._by_type.get(signal_type, {}).values()
+                if signal.confidence >= min_confidence
+            ])
     
     def get_signals_by_agent(self, agent_id: str) -> List[Signal]:
         """根据Agent获取信号"""
         with self.lock:
-            return [
-                signal for signal in self.signal_pool.values()
-                if signal.agent_id == agent_id and not signal.is_expired()
-            ]
+            self._expire_due()
+            return self._in_pool_order(list(self._by_agent.get(agent_id, {}).values()))
     
     def get_top_signals(self, limit: int = 10, signal_type: Optional[SignalType] = None) -> List[Signal]:
-        """获取置信度最高的信号"""
+        """获取置信度最高的信号（同置信度按加入顺序）"""
         with self.lock:
-            signals = list(self.signal_pool.values())
+            self._expire_due()
             
-            # 过滤条件
             if signal_type:
-                signals = [s for s in signals if s.signal_type == signal_type]
-            
-            # 过滤未过期的信号
-            signals = [s for s in signals if not s.is_expired()]
-            
-            # 按置信度排序
-            signals.sort(key=lambda x: x.confidence, reverse=True)
+                keys = islice(self._ranked.get(signal_type, []), limit)
+            else:
+                keys = islice(heapq.merge(*self._ranked.values()), limit)
             
-            return signals[:limit]
+            return [self.signal_pool[signal_id] for _, _, signal_id in keys]
     
     def aggregate_signals(self, signal_type: SignalType, aggregation_method: str = "weighted_avg") -> Optional[Dict]:
         """聚合同类型信号"""
@@ -276,56 +398,41 @@ class SignalPoolOptimizer:
     def cleanup_expired_signals(self):
         """清理过期信号"""
         with self.lock:
-            expired_count = 0
-            expired_ids = []
+            self._expire_due()
+            expired_ids = list(self._expired_ids)
             
-            for signal_id, signal in list(self.signal_pool.items()):
-                if signal.is_expired():
-                    expired_ids.append(signal_id)
-                    del self.signal_pool[signal_id]
-                    expired_count += 1
+            for signal_id in expired_ids:
+                del self.signal_pool[signal_id]
+                del self._seq[signal_id]
+            self._expired_ids.clear()
             
-            # 从数据库删除
+            # 从数据库删除，并丢弃尚未落盘的写入
             if expired_ids:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.executemany("DELETE FROM signals WHERE signal_id = ?", [(sid,) for sid in expired_ids])
-                conn.commit()
-                conn.close()
+                with self._write_lock:
+                    for signal_id in expired_ids:
+                        self._pending_writes.pop(signal_id, None)
+                    conn = sqlite3.connect(self.db_path)
+                    cursor = conn.cursor()
+                    cursor.executemany("DELETE FROM signals WHERE signal_id = ?", [(sid,) for sid in expired_ids])
+                    conn.commit()
+                    conn.close()
             
-            if expired_count > 0:
-                logger.info(f"清理了 {expired_count} 个过期信号")
+            if expired_ids:
+                logger.info(f"清理了 {len(expired_ids)} 个过期信号")
                 self._update_metrics()
     
     def _update_metrics(self):
-        """更新指标"""
+        """更新指标（基于增量维护的活跃信号统计）"""
         with self.lock:
-            active_signals = [s for s in self.signal_pool.values() if not s.is_expired()]
-            expired_signals = [s for s in self.signal_pool.values() if s.is_expired()]
+            self._expire_due()
+            active_count = len(self._rank_keys)
             
             self.metrics.total_signals = len(self.signal_pool)
-            self.metrics.active_signals = len(active_signals)
-            self.metrics.expired_signals = len(expired_signals)
-            
-            if active_signals:
-                self.metrics.confidence_avg = sum(s.confidence for s in active_signals) / len(active_signals)
-            else:
-                self.metrics.confidence_avg = 0.0
-            
-            # 模型分布
-            model_dist = {}
-            for signal in active_signals:
-                model = signal.source_model.value
-                model_dist[model] = model_dist.get(model, 0) + 1
-            self.metrics.model_distribution = model_dist
-            
-            # 信号类型分布
-            type_dist = {}
-            for signal in active_signals:
-                signal_type = signal.signal_type.value
-                type_dist[signal_type] = type_dist.get(signal_type, 0) + 1
-            self.metrics.signal_type_distribution = type_dist
-            
+            self.metrics.active_signals = active_count
+            self.metrics.expired_signals = len(self._expired_ids)
+            self.metrics.confidence_avg = self._confidence_sum / active_count if active_count else 0.0
+            self.metrics.model_distribution = dict(self._model_counts)
+            self.metrics.signal_type_distribution = dict(self._type_counts)
             self.metrics.last_update = datetime.now().isoformat()
     
     def _start_cleanup_task(self):
@@ -342,6 +449,18 @@ class SignalPoolOptimizer:
         cleanup_thread.start()
         logger.info("定期清理任务已启动")
     
+    def _start_flush_task(self):
+        """启动定期落盘任务"""
+        def flush_worker():
+            while not self._stop_event.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"信号落盘出错: {e}")
+        
+        flush_thread = threading.Thread(target=flush_worker, daemon=True)
+        flush_thread.start()
+    
     def get_system_status(self) -> Dict[str, Any]:
         """获取系统状态"""
         self._update_metrics()
@@ -484,6 +603,8 @@ def main():
     # 获取top信号
     top_signals = optimizer.get_top_signals(5)
     logger.info(f"Top 5 信号: {[s.signal_id for s in top_signals]}")
+    
+    optimizer.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,6 +6,8 @@ PC28智能实时开奖优化器
 符合PROJECT_RULES.md性能监控要求
 """
 
+import os
+import sys
 import json
 import time
 import threading
@@ -16,6 +18,10 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'python'))
+from draw_event_bus import get_default_draw_ingest
 
 # 配置日志
 logging.basicConfig(
@@ -94,9 +100,13 @@ class PerformanceAlert:
 class SmartRealtimeOptimizer:
     """智能实时优化器 - 符合PROJECT_RULES.md要求"""
     
-    def __init__(self, api_system, config: PollingConfig = None):
+    def __init__(self, api_system, config: PollingConfig = None, ingest=None, legacy_polling: bool = False):
         self.api_system = api_system
         self.config = config or PollingConfig()
+        # 共享开奖接入组件（draw_event_bus.DrawIngest），未传入时启动时按配置的上游账号获取；
+        # 只有显式 legacy_polling=True 才用 api_system 自行轮询
+        self.ingest = ingest
+        self.legacy_polling = legacy_polling and ingest is None
         
         # 状态管理
         self.is_running = False
@@ -140,14 +150,21 @@ class SmartRealtimeOptimizer:
             self.is_running = True
             self.start_time = datetime.now()
             
-            # 启动各个监控线程
-            self.optimization_thread = threading.Thread(target=self._optimization_loop, daemon=True)
+            # 启动各个监控线程（订阅共享接入的事件代替轮询线程，legacy_polling 时才自行轮询）
+            if self.ingest is None and not self.legacy_polling:
+                self.ingest = get_default_draw_ingest()
+            if self.ingest is not None:
+                self.ingest.bus.subscribe('smart_realtime_optimizer', self._on_ingest_event)
+                self.ingest.start()
+            else:
+                self.optimization_thread = threading.Thread(target=self._optimization_loop, daemon=True)
             # 暂时注释掉不存在的方法
             # self.prediction_thread = threading.Thread(target=self._prediction_loop, daemon=True)
             # self.cache_cleanup_thread = threading.Thread(target=self._cache_cleanup_loop, daemon=True)
             self.performance_monitor_thread = threading.Thread(target=self._performance_monitor_loop, daemon=True)
             
-            self.optimization_thread.start()
+            if self.optimization_thread:
+                self.optimization_thread.start()
             # 暂时注释掉不存在的方法
             # self.prediction_thread.start()
             # self.cache_cleanup_thread.start()
@@ -165,6 +182,9 @@ class SmartRealtimeOptimizer:
         """停止优化器"""
         logger.info("正在停止智能实时优化器...")
         self.is_running = False
+        if self.ingest is not None:
+            self.ingest.stop()
+            self.ingest.bus.unsubscribe('smart_realtime_optimizer')
         
         # 等待线程结束
         for thread in [self.optimization_thread, self.prediction_thread, 
@@ -203,6 +223,31 @@ class SmartRealtimeOptimizer:
                 self.metrics.error_rate += 1
                 time.sleep(self.config.normal_interval)
 
+    def _on_ingest_event(self, event):
+        """处理共享接入组件的事件：新开奖时验证预测，每次数据更新时刷新预测与轮询模式"""
+        try:
+            if event.topic == 'system_alert':
+                self.metrics.error_rate += 1
+                return
+            
+            if event.topic == 'new_draw':
+                logger.info(f"发现新开奖: {event.draw['draw_id']}")
+                self.last_draw_time = datetime.now()
+                if self.last_prediction:
+                    self._validate_prediction(event.draw)
+                return
+            
+            self._update_prediction([SimpleNamespace(
+                next_draw_id=event.draw.get('next_issue'),
+                next_draw_time=event.draw.get('next_time')
+            )])
+            self.current_prediction = self.last_prediction
+            self._adjust_polling_mode()
+            self._update_metrics(event.metadata.get('response_time', 0.0))
+            
+        except Exception as e:
+            logger.error(f"处理接入事件失败: {e}")
+
     def _performance_monitor_loop(self):
         """性能监控循环"""
         logger.info("开始性能监控循环")
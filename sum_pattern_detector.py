@@ -11,7 +11,7 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
 import json
 import hashlib
 import math
@@ -44,12 +44,216 @@ class HistoricalSumData:
     mean: float
     std_dev: float
     distribution: Dict[str, float]
+    count: int = 0  # 统计窗口内的样本数，0 表示取 len(sums)
+
+class StreamingSumStatistics:
+    """增量和值统计引擎
+    
+    维护最近 window_size 期的滑动窗口 Welford 矩、和值直方图和最近 recent_size 期的环形缓冲，
+    每期开奖 O(1) 更新，评分时无需读库。
+    任何实现 update / snapshot / recent_sums 的对象都可以作为检测器的统计引擎。
+    """
+    
+    SUM_RANGE = 28
+    
+    def __init__(self, window_size: int = 1000, recent_size: int = 50):
+        self.window_size = window_size
+        self.window: deque = deque()
+        self.recent: deque = deque(maxlen=recent_size)
+        self.histogram = [0] * self.SUM_RANGE
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._removals = 0
+    
+    def update(self, sum_value: int):
+        """加入一期和值，窗口满时移出最旧一期"""
+        if len(self.window) >= self.window_size:
+            self._remove(self.window.popleft())
+        
+        self.window.append(sum_value)
+        self.recent.append(sum_value)
+        self.histogram[sum_value % self.SUM_RANGE] += 1
+        
+        # Welford 增量更新
+        self.count += 1
+        delta = sum_value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (sum_value - self.mean)
+    
+    def _remove(self, sum_value: int):
+        """Welford 逆向更新，移出窗口中的一期"""
+        self.histogram[sum_value % self.SUM_RANGE] -= 1
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        
+        mean_new = (self.count * self.mean - sum_value) / (self.count - 1)
+        self.m2 -= (sum_value - self.mean) * (sum_value - mean_new)
+        self.mean = mean_new
+        self.count -= 1
+        
+        # 每滑过一个完整窗口按窗口重算一次，消除浮点累积误差
+        self._removals += 1
+        if self._removals >= self.window_size:
+            self._removals = 0
+            values = self.window
+            self.mean = sum(values) / len(values)
+            self.m2 = sum((v - self.mean) ** 2 for v in values)
+    
+    def load(self, sums: List[int]):
+        """按时间正序批量加载历史和值"""
+        for sum_value in sums:
+            self.update(sum_value)
+    
+    @property
+    def std_dev(self) -> float:
+        """样本标准差（与 statistics.stdev 一致）"""
+        if self.count < 2:
+            return 0
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+    
+    def recent_sums(self) -> List[int]:
+        """最近 recent_size 期和值（时间正序）"""
+        return list(self.recent)
+    
+    def snapshot(self) -> HistoricalSumData:
+        """生成当前窗口的统计快照"""
+        if self.count == 0:
+            # 如果没有历史数据，使用理论分布
+            return HistoricalSumData(
+                sums=[],
+                frequencies={k: 10 for k in range(self.SUM_RANGE)},
+                mean=13.5,
+                std_dev=statistics.stdev(list(range(self.SUM_RANGE)) * 10),
+                distribution={str(k): 1 / self.SUM_RANGE for k in range(self.SUM_RANGE)},
+                count=self.SUM_RANGE * 10
+            )
+        
+        frequencies = {k: v for k, v in enumerate(self.histogram) if v}
+        return HistoricalSumData(
+            sums=self.recent_sums(),
+            frequencies=frequencies,
+            mean=self.mean,
+            std_dev=self.std_dev,
+            distribution={str(k): v / self.count for k, v in frequencies.items()},
+            count=self.count
+        )
+
+def scan_sum_history(sums: List[int], window_size: int = 1000, recent_size: int = 50,
+                     thresholds: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """批量向量化扫描和值序列
+    
+    对每一期计算与逐期检测相同口径的指标：以前 window_size 期为基准的 Z 分数和频率比，
+    以及包含当期的最近 recent_size + 1 期窗口上的连续、等差、聚集和周期指标。
+    适合一次扫描数月历史。
+    """
+    thresholds = thresholds or {}
+    z_threshold = thresholds.get('deviation_z_score', 3.0)
+    consecutive = thresholds.get('consecutive_pattern', 5)
+    clustering = thresholds.get('sum_clustering', 0.8)
+    periodicity = thresholds.get('periodicity_strength', 0.7)
+    
+    s = np.asarray(sums, dtype=np.int64)
+    n = len(s)
+    idx = np.arange(n)
+    if n == 0:
+        empty = np.zeros(0)
+        return {key: empty for key in ('z_score', 'frequency_ratio', 'run_length', 'arithmetic',
+                                       'clustering_ratio', 'periodicity_strength',
+                                       'periodicity_period', 'suspicious')}
+    
+    # 前 window_size 期的均值和样本标准差
+    cs = np.concatenate(([0.0], np.cumsum(s, dtype=np.float64)))
+    cs2 = np.concatenate(([0.0], np.cumsum(s.astype(np.float64) ** 2)))
+    lo = np.maximum(0, idx - window_size)
+    cnt = idx - lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (cs[idx] - cs[lo]) / cnt
+        var = ((cs2[idx] - cs2[lo]) - cnt * mean ** 2) / (cnt - 1)
+        std = np.sqrt(np.maximum(var, 0.0))
+        z_score = np.where((cnt > 1) & (std > 0), np.abs(s - mean) / std, 0.0)
+    
+    # 前 window_size 期内当期和值的出现频率
+    onehot = np.zeros((n + 1, StreamingSumStatistics.SUM_RANGE), dtype=np.int64)
+    onehot[idx + 1, s % StreamingSumStatistics.SUM_RANGE] = 1
+    cum = np.cumsum(onehot, axis=0)
+    column = s % StreamingSumStatistics.SUM_RANGE
+    actual = cum[idx, column] - cum[lo, column]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency_ratio = np.where(cnt > 0, actual / (cnt / StreamingSumStatistics.SUM_RANGE), 1.0)
+    
+    # 以当期结尾的相同和值连续长度
+    starts = np.where(np.concatenate(([True], s[1:] != s[:-1])), idx, 0)
+    run_length = idx - np.maximum.accumulate(starts) + 1
+    
+    # 以当期结尾的三期等差（公差非零）
+    arithmetic = np.zeros(n, dtype=bool)
+    if n >= 3:
+        d1 = s[1:-1] - s[:-2]
+        d2 = s[2:] - s[1:-1]
+        arithmetic[2:] = (d1 == d2) & (d2 != 0)
+    
+    # 最近20期唯一和值比例
+    cluster_window = 20
+    clustering_ratio = np.ones(n)
+    if n >= cluster_window:
+        tail = np.arange(cluster_window - 1, n)
+        present = (cum[tail + 1] - cum[tail + 1 - cluster_window]) > 0
+        clustering_ratio[tail] = present.sum(axis=1) / cluster_window
+    
+    # 最近 recent_size + 1 期窗口内的周期重复强度，取首个超过阈值的周期
+    span = recent_size + 1
+    periodicity_strength = np.zeros(n)
+    periodicity_period = np.zeros(n, dtype=np.int64)
+    if n >= span:
+        tail = np.arange(span - 1, n)
+        for period in range(2, min(10, span // 3)):
+            eq = np.zeros(n + 1, dtype=np.int64)
+            eq[period + 1:] = np.cumsum(s[period:] == s[:-period])
+            # 窗口 [i-span+1, i] 内满足 j-period 也在窗口中的位置
+            matches = eq[tail + 1] - eq[tail - span + 1 + period]
+            strength = matches / (span - period)
+            first = (periodicity_period[tail] == 0) & (strength > periodicity)
+            periodicity_period[tail[first]] = period
+            periodicity_strength[tail[first]] = strength[first]
+    
+    high = (
+        (z_score > z_threshold).astype(int)
+        + ((frequency_ratio > 5) | (frequency_ratio < 0.2)).astype(int)
+        + arithmetic.astype(int)
+        + (clustering_ratio < 0.5).astype(int)
+        + (periodicity_strength > 0.9).astype(int)
+    )
+    suspicious = (run_length >= consecutive) | (high >= 2) | (z_score > z_threshold)
+    
+    return {
+        'z_score': z_score,
+        'frequency_ratio': frequency_ratio,
+        'run_length': run_length,
+        'arithmetic': arithmetic,
+        'clustering_ratio': clustering_ratio,
+        'periodicity_strength': periodicity_strength,
+        'periodicity_period': periodicity_period,
+        'suspicious': suspicious
+    }
 
 class SumPatternDetector:
-    """和值模式检测器"""
+    """和值模式检测器
     
-    def __init__(self, db_path: str = "sum_pattern_analysis.db"):
+    评分使用增量统计引擎（默认 StreamingSumStatistics，首次使用时从库中预热一次），
+    之后由 add_historical_sum 逐期更新。传入的 stats_engine 视为已预热。
+    传入 column_store（python/draw_column_store.DrawColumnStore）时，预热和批量扫描直接读取列式存储的和值列，
+    不再逐行查询历史和值表；可写实例同时接收 add_historical_sum 的新开奖。
+    """
+    
+    def __init__(self, db_path: str = "sum_pattern_analysis.db", stats_engine: Optional[Any] = None,
+                 history_limit: int = 1000, column_store: Optional[Any] = None):
         self.db_path = db_path
+        self.history_limit = history_limit
+        self.column_store = column_store
+        self.stats_engine = stats_engine
+        self._stats_warmed = stats_engine is not None
         self.init_database()
         
         # PC28游戏的理论和值范围（通常是0-27）
@@ -149,9 +353,53 @@ class SumPatternDetector:
             frequencies=frequencies,
             mean=mean_val,
             std_dev=std_dev,
-            distribution=distribution
+            distribution=distribution,
+            count=total
         )
     
+    def get_stats_engine(self):
+        """获取统计引擎，首次调用时从历史和值表预热"""
+        if not self._stats_warmed:
+            if self.stats_engine is None:
+                self.stats_engine = StreamingSumStatistics(window_size=self.history_limit)
+            self.stats_engine.load(self._load_sums(self.history_limit))
+            self._stats_warmed = True
+        return self.stats_engine
+    
+    def _store_sums(self, limit: Optional[int] = None) -> np.ndarray:
+        """从列式存储按开奖时间正序取和值列（向量化，不经过SQLite）"""
+        store = self.column_store
+        if store.readonly:
+            store.refresh()
+        order = np.argsort(store.column('timestamp'), kind='stable')
+        if limit:
+            order = order[-limit:]
+        return store.column('sum')[order].astype(np.int64)
+    
+    def _load_sums(self, limit: Optional[int] = None) -> List[int]:
+        """按时间正序读取历史和值"""
+        if self.column_store is not None:
+            return self._store_sums(limit).tolist()
+        with sqlite3.connect(self.db_path) as conn:
+            if limit:
+                rows = conn.execute("""
+                    SELECT sum_value FROM (
+                        SELECT sum_value, created_at, id FROM historical_sums
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    ) ORDER BY created_at, id
+                """, (limit,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT sum_value FROM historical_sums ORDER BY created_at, id"
+                ).fetchall()
+        return [row[0] for row in rows]
+    
+    def scan_history(self, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """批量扫描历史和值（向量化），limit 为空时扫描全部"""
+        sums = self._store_sums(limit) if self.column_store is not None else self._load_sums(limit)
+        return scan_sum_history(sums, window_size=self.history_limit,
+                                thresholds=self.suspicious_thresholds)
+    
     def detect_deviation_pattern(self, sum_value: int, historical_data: HistoricalSumData) -> Optional[SumPattern]:
         """检测偏差模式"""
         if historical_data.std_dev == 0:
@@ -176,7 +424,7 @@ class SumPatternDetector:
     
     def detect_frequency_anomaly(self, sum_value: int, historical_data: HistoricalSumData) -> Optional[SumPattern]:
         """检测频率异常"""
-        expected_freq = len(historical_data.sums) / 28  # 理论频率
+        expected_freq = (historical_data.count or len(historical_data.sums)) / 28  # 理论频率
         actual_freq = historical_data.frequencies.get(sum_value, 0)
         
         # 计算频率偏差
@@ -241,26 +489,22 @@ class SumPatternDetector:
         if len(recent_sums) < self.suspicious_thresholds['arithmetic_sequence']:
             return None
         
-        # 检查等差数列
+        # 检查等差数列：任何更长的等差段都以等差三元组开头，线性扫描首个三元组即可
         for start in range(len(recent_sums) - 2):
-            for length in range(3, min(8, len(recent_sums) - start + 1)):
-                sequence = recent_sums[start:start + length]
-                
-                # 检查是否为等差数列
-                if len(sequence) >= 3:
-                    differences = [sequence[i+1] - sequence[i] for i in range(len(sequence)-1)]
-                    if len(set(differences)) == 1 and differences[0] != 0:
-                        return SumPattern(
-                            pattern_type="arithmetic_sequence",
-                            description=f"检测到等差数列: {sequence}, 公差: {differences[0]}",
-                            confidence=min(1.0, length / 8),
-                            evidence={
-                                "sequence": sequence,
-                                "common_difference": differences[0],
-                                "length": length
-                            },
-                            risk_level="high"
-                        )
+            sequence = recent_sums[start:start + 3]
+            difference = sequence[1] - sequence[0]
+            if difference != 0 and sequence[2] - sequence[1] == difference:
+                return SumPattern(
+                    pattern_type="arithmetic_sequence",
+                    description=f"检测到等差数列: {sequence}, 公差: {difference}",
+                    confidence=3 / 8,
+                    evidence={
+                        "sequence": sequence,
+                        "common_difference": difference,
+                        "length": 3
+                    },
+                    risk_level="high"
+                )
         return None
     
     def detect_sum_clustering(self, recent_sums: List[int], window_size: int = 20) -> Optional[SumPattern]:
@@ -328,11 +572,12 @@ class SumPatternDetector:
                            recent_history: Optional[List[int]] = None) -> SumAnalysis:
         """分析和值模式"""
         sum_value = self.calculate_sum(numbers)
-        historical_data = self.get_historical_sum_data()
+        stats_engine = self.get_stats_engine()
+        historical_data = stats_engine.snapshot()
         
-        # 如果提供了最近历史，使用它；否则从数据库获取
+        # 如果提供了最近历史，使用它；否则取引擎环形缓冲中的最近50期
         if recent_history is None:
-            recent_history = historical_data.sums[-50:]  # 最近50期
+            recent_history = stats_engine.recent_sums()
         
         patterns = []
         
@@ -449,6 +694,9 @@ class SumPatternDetector:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
+            cursor.execute("SELECT 1 FROM historical_sums WHERE draw_id = ?", (draw_id,))
+            is_new = cursor.fetchone() is None
+            
             cursor.execute("""
                 INSERT OR REPLACE INTO historical_sums 
                 (draw_id, sum_value, numbers, timestamp, source, created_at)
@@ -463,6 +711,13 @@ class SumPatternDetector:
             ))
             
             conn.commit()
+        
+        if self.column_store is not None and not self.column_store.readonly:
+            self.column_store.append([{'draw_id': draw_id, 'timestamp': timestamp, 'result_digits': numbers}])
+        
+        # 已预热的引擎逐期更新；重复写入的期号不再计入
+        if self._stats_warmed and is_new:
+            self.stats_engine.update(sum_value)
     
     def get_detection_statistics(self) -> Dict[str, Any]:
         """获取检测统计信息"""
@@ -0,0 +1,90 @@
+-- 同步完整性校验：按主键范围在服务端计算行摘要
+-- SupabaseSyncManager.validate_sync_integrity 只比较各范围的 (行数, 摘要)，
+-- 摘要不同且足够小的叶子范围才拉取行；规范化规则与 Python 端 _canonical_value 保持一致
+
+-- 单列规范化表达式：时间统一为 UTC 'YYYY-MM-DD HH24:MI:SS'，数值去掉多余的小数位，布尔为 1/0
+CREATE OR REPLACE FUNCTION sync_canonical_expr(p_column TEXT, p_type TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT format(
+        CASE
+            WHEN p_type = 'timestamp with time zone' THEN
+                'to_char(%1$I AT TIME ZONE ''UTC'', ''YYYY-MM-DD HH24:MI:SS'')'
+            WHEN p_type = 'timestamp without time zone' THEN
+                'to_char(%1$I, ''YYYY-MM-DD HH24:MI:SS'')'
+            WHEN p_type = 'date' THEN
+                'to_char(%1$I, ''YYYY-MM-DD'')'
+            WHEN p_type = 'boolean' THEN
+                'CASE WHEN %1$I THEN ''1'' ELSE ''0'' END'
+            WHEN p_type IN ('numeric', 'real', 'double precision') THEN
+                'trim_scale(round(%1$I::text::numeric, 9))::text'
+            ELSE
+                '%1$I::text'
+        END,
+        p_column
+    )
+$$;
+
+-- 主键范围 [p_lo, p_hi) 内的行数和摘要；边界为 NULL 表示不限
+-- 摘要 = md5(按 (主键, 行文本) 排序、以换行连接的 "主键|列1|列2..." 行文本)，文本主键按 "C" 排序规则比较
+CREATE OR REPLACE FUNCTION sync_range_digest(
+    p_table TEXT,
+    p_key TEXT,
+    p_columns TEXT[] DEFAULT '{}',
+    p_lo TEXT DEFAULT NULL,
+    p_hi TEXT DEFAULT NULL
+)
+RETURNS TABLE (row_count BIGINT, digest TEXT)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    v_key_type TEXT;
+    v_col_type TEXT;
+    v_col TEXT;
+    v_key_cmp TEXT;
+    v_bound_cast TEXT := '';
+    v_row_expr TEXT;
+    v_where TEXT := 'TRUE';
+BEGIN
+    SELECT data_type INTO v_key_type
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = p_table AND column_name = p_key;
+    IF v_key_type IS NULL THEN
+        RAISE EXCEPTION 'sync_range_digest: unknown column %.%', p_table, p_key;
+    END IF;
+
+    IF v_key_type IN ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision') THEN
+        v_key_cmp := format('%I', p_key);
+        v_bound_cast := '::numeric';
+    ELSE
+        v_key_cmp := format('%I::text COLLATE "C"', p_key);
+    END IF;
+
+    v_row_expr := format('coalesce(%s, ''\N'')', sync_canonical_expr(p_key, v_key_type));
+    FOREACH v_col IN ARRAY p_columns LOOP
+        SELECT data_type INTO v_col_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = p_table AND column_name = v_col;
+        IF v_col_type IS NULL THEN
+            RAISE EXCEPTION 'sync_range_digest: unknown column %.%', p_table, v_col;
+        END IF;
+        v_row_expr := v_row_expr || format(' || ''|'' || coalesce(%s, ''\N'')', sync_canonical_expr(v_col, v_col_type));
+    END LOOP;
+
+    IF p_lo IS NOT NULL THEN
+        v_where := v_where || format(' AND %s >= %L%s', v_key_cmp, p_lo, v_bound_cast);
+    END IF;
+    IF p_hi IS NOT NULL THEN
+        v_where := v_where || format(' AND %s < %L%s', v_key_cmp, p_hi, v_bound_cast);
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT count(*)::bigint, coalesce(md5(string_agg(r, E''\n'' ORDER BY k, r COLLATE "C")), md5(''''))
+         FROM (SELECT %s AS k, %s AS r FROM public.%I WHERE %s) s',
+        v_key_cmp, v_row_expr, p_table, v_where
+    );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION sync_range_digest(TEXT, TEXT, TEXT[], TEXT, TEXT) TO service_role;
@@ -7,12 +7,16 @@ import os
 import logging
 import sqlite3
 import pandas as pd
-from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Callable
+from datetime import datetime, timedelta, date, timezone
+from datetime import time as dt_time
 import json
 import time
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import hashlib
+import math
+from decimal import Decimal
 
 from supabase_config import get_supabase_client, supabase_manager
 from data_type_mapper import data_type_mapper
@@ -21,6 +25,9 @@ from data_type_mapper import data_type_mapper
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 有失败记录的批次在完成表中的标记，检查点不越过它
+_FAILED_BATCH = object()
+
 class SupabaseSyncManager:
     """Supabase 数据同步管理器"""
     
@@ -79,6 +86,9 @@ class SupabaseSyncManager:
         self.max_workers = int(os.getenv('SYNC_MAX_WORKERS', '4'))
         self.sync_timeout = int(os.getenv('SYNC_TIMEOUT_SECONDS', '300'))
         self.retry_attempts = int(os.getenv('SYNC_RETRY_ATTEMPTS', '3'))
+        # 单表内并发 upsert 的批次数，以及允许排队等待的最大批次数（背压）
+        self.upsert_workers = int(os.getenv('SYNC_UPSERT_WORKERS', '4'))
+        self.max_pending_batches = int(os.getenv('SYNC_MAX_PENDING_BATCHES', str(self.upsert_workers * 2)))
         
     def get_sqlite_connection(self) -> sqlite3.Connection:
         """获取 SQLite 数据库连接"""
@@ -122,6 +132,8 @@ class SupabaseSyncManager:
         """
         获取表的最后同步时间戳
         
+        未推进最后同步时间的状态记录（有失败记录或同步异常）该列为空，跳过
+        
         Args:
             table_name: 表名
             
@@ -132,6 +144,7 @@ class SupabaseSyncManager:
             response = self.supabase_client.table('sync_status') \
                 .select('last_sync_timestamp') \
                 .eq('table_name', table_name) \
+                .not_.is_('last_sync_timestamp', 'null') \
                 .order('created_at', desc=True) \
                 .limit(1) \
                 .execute()
@@ -149,7 +162,8 @@ class SupabaseSyncManager:
     
     def update_sync_status(self, table_name: str, status: str, 
                           records_synced: int = 0, error_message: str = None,
-                          sync_duration: float = 0.0, sync_mode: str = 'incremental'):
+                          sync_duration: float = 0.0, sync_mode: str = 'incremental',
+                          advance_last_sync: bool = True):
         """
         更新同步状态
         
@@ -160,11 +174,12 @@ class SupabaseSyncManager:
             error_message: 错误消息
             sync_duration: 同步持续时间（秒）
             sync_mode: 同步模式
+            advance_last_sync: 是否把最后同步时间推进到现在；否则留空，下次仍从上次的最后同步时间或检查点继续
         """
         try:
             sync_data = {
                 'table_name': table_name,
-                'last_sync_timestamp': datetime.now().isoformat(),
+                'last_sync_timestamp': datetime.now().isoformat() if advance_last_sync else None,
                 'sync_mode': sync_mode,
                 'records_synced': records_synced,
                 'sync_duration_seconds': sync_duration,
@@ -195,10 +210,228 @@ class SupabaseSyncManager:
         data_str = json.dumps(filtered_data, sort_keys=True, default=str)
         return hashlib.md5(data_str.encode()).hexdigest()
     
+    @staticmethod
+    def _parse_timestamp(value: Any) -> Optional[datetime]:
+        """
+        把 SQLite 列值或 ISO 字符串统一解析为不带时区的 UTC 时间
+        
+        SQLite 的 CURRENT_TIMESTAMP 是不带时区的 UTC（'2025-09-29 13:00:00'），
+        Supabase 返回带偏移的 ISO 字符串；两种格式不能直接按字符串比较。
+        
+        Args:
+            value: 时间戳字符串或 datetime
+            
+        Returns:
+            解析后的时间，无法解析时返回 None
+        """
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            parsed = value
+        else:
+            try:
+                parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+            except ValueError:
+                return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    
+    def _ensure_checkpoint_table(self, conn: sqlite3.Connection):
+        """创建本地批次检查点表"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS supabase_sync_checkpoints (
+                table_name TEXT PRIMARY KEY,
+                checkpoint_value TEXT,
+                batches_committed INTEGER DEFAULT 0,
+                updated_at TEXT
+            )
+        """)
+    
+    def get_checkpoint(self, table_name: str) -> Optional[str]:
+        """
+        获取表的批次检查点（已确认写入的最大时间戳列值）
+        
+        Args:
+            table_name: 表名
+            
+        Returns:
+            检查点值
+        """
+        try:
+            with self.get_sqlite_connection() as conn:
+                self._ensure_checkpoint_table(conn)
+                row = conn.execute(
+                    "SELECT checkpoint_value FROM supabase_sync_checkpoints WHERE table_name = ?",
+                    (table_name,)
+                ).fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Failed to get checkpoint for {table_name}: {e}")
+            return None
+    
+    def save_checkpoint(self, table_name: str, checkpoint_value: Any, batches_committed: int,
+                        conn: Optional[sqlite3.Connection] = None):
+        """
+        保存表的批次检查点
+        
+        Args:
+            table_name: 表名
+            checkpoint_value: 已连续确认的最后一批的最大时间戳列值
+            batches_committed: 已确认的批次数
+            conn: 复用的 SQLite 连接（同步读取中的连接，避免与读锁冲突）
+        """
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = self.get_sqlite_connection()
+            self._ensure_checkpoint_table(conn)
+            conn.execute("""
+                INSERT OR REPLACE INTO supabase_sync_checkpoints
+                (table_name, checkpoint_value, batches_committed, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (table_name, str(checkpoint_value), batches_committed, datetime.now().isoformat()))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to save checkpoint for {table_name}: {e}")
+        finally:
+            if own_conn and conn is not None:
+                conn.close()
+    
+    def clear_checkpoint(self, table_name: str):
+        """
+        同步全部成功后清除表的批次检查点，之后由最后同步时间接续
+        
+        Args:
+            table_name: 表名
+        """
+        try:
+            with self.get_sqlite_connection() as conn:
+                self._ensure_checkpoint_table(conn)
+                conn.execute("DELETE FROM supabase_sync_checkpoints WHERE table_name = ?", (table_name,))
+        except Exception as e:
+            logger.error(f"Failed to clear checkpoint for {table_name}: {e}")
+    
+    @staticmethod
+    def _json_safe(value: Any) -> Any:
+        """将日期时间值转为 ISO 字符串，保证批次可以 JSON 序列化"""
+        if isinstance(value, (datetime, date, dt_time)):
+            return value.isoformat()
+        return value
+    
+    def _build_row_converter(self, table_name: str, schema: Dict[str, str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """
+        按表结构预编译行转换函数：列类型映射只做一次，不再逐单元格查表
+        
+        Args:
+            table_name: 表名
+            schema: 列名到 SQLite 类型的映射
+            
+        Returns:
+            行转换函数
+        """
+        convert_row = data_type_mapper.compile_sqlite_row_converter(schema)
+        json_safe = self._json_safe
+        
+        # 只为支持同步元数据的表添加这些字段
+        add_source = 'sync_source' in schema or table_name in ['sync_status', 'system_logs']
+        add_timestamp = 'sync_timestamp' in schema or table_name in ['sync_status', 'system_logs']
+        
+        def convert(row: sqlite3.Row) -> Dict[str, Any]:
+            converted_row = {k: json_safe(v) for k, v in convert_row(dict(row)).items()}
+            if add_source:
+                converted_row['sync_source'] = 'sqlite'
+            if add_timestamp:
+                converted_row['sync_timestamp'] = datetime.now().isoformat()
+            return converted_row
+        
+        return convert
+    
+    def _iter_batches(self, cursor: sqlite3.Cursor, convert: Callable, batch_size: int,
+                      checkpoint_column: Optional[str] = None) -> Iterator[Tuple[List[Dict[str, Any]], Any]]:
+        """
+        从游标按批读取并转换数据
+        
+        Yields:
+            (转换后的批次, 批次最后一行检查点列的 SQLite 原始值)
+        """
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            last_value = rows[-1][checkpoint_column] if checkpoint_column else None
+            yield [convert(row) for row in rows], last_value
+    
+    def _upsert_pipeline(self, table_name: str, batches: Iterator[Tuple[List[Dict[str, Any]], Any]],
+                         on_checkpoint: Optional[Callable[[Any, int], None]] = None) -> Tuple[int, int]:
+        """
+        有界并发的批量 upsert 管道
+        
+        最多 max_pending_batches 个批次在途，读取端在额度用尽时阻塞（背压）。
+        每当前缀批次全部确认后推进检查点，并在读取线程中回调 on_checkpoint，
+        中断后下次同步可从检查点继续。检查点停在第一个有失败记录的批次之前，
+        下次同步从该批次起重新写入。
+        
+        Args:
+            table_name: 表名
+            batches: (批次, 检查点值) 迭代器
+            on_checkpoint: 检查点回调 (检查点值, 已确认批次数)
+            
+        Returns:
+            (成功记录数, 失败记录数)
+        """
+        slots = threading.BoundedSemaphore(self.max_pending_batches)
+        lock = threading.Lock()
+        done: Dict[int, Any] = {}
+        state = {'next_commit': 0, 'synced': 0, 'failed': 0, 'checkpoint': None, 'halted': False}
+        saved = {'batches': 0}
+        
+        def run(index: int, batch: List[Dict[str, Any]], checkpoint_value: Any):
+            try:
+                synced, failed = self._upsert_with_bisection(table_name, batch)
+                with lock:
+                    state['synced'] += synced
+                    state['failed'] += failed
+                    done[index] = _FAILED_BATCH if failed else checkpoint_value
+                    
+                    # 推进连续完成的批次前缀，遇到失败批次后不再推进
+                    while not state['halted'] and state['next_commit'] in done:
+                        value = done.pop(state['next_commit'])
+                        if value is _FAILED_BATCH:
+                            state['halted'] = True
+                            break
+                        state['next_commit'] += 1
+                        if value is not None:
+                            state['checkpoint'] = value
+            finally:
+                slots.release()
+        
+        def flush_checkpoint():
+            with lock:
+                checkpoint, committed = state['checkpoint'], state['next_commit']
+            if on_checkpoint and checkpoint is not None and committed > saved['batches']:
+                on_checkpoint(checkpoint, committed)
+                saved['batches'] = committed
+        
+        with ThreadPoolExecutor(max_workers=self.upsert_workers) as executor:
+            futures = []
+            for index, (batch, checkpoint_value) in enumerate(batches):
+                slots.acquire()
+                futures.append(executor.submit(run, index, batch, checkpoint_value))
+                flush_checkpoint()
+            for future in futures:
+                future.result()
+        flush_checkpoint()
+        
+        return state['synced'], state['failed']
+    
     def sync_table_incremental(self, table_name: str) -> Tuple[bool, int, str]:
         """
         增量同步表数据
         
+        从 max(最后同步时间, 本地检查点) 继续，批次并发 upsert；
+        有失败记录时保留检查点且不推进最后同步时间，失败的行在下次同步中重试
+        
         Args:
             table_name: 表名
             
@@ -212,12 +445,24 @@ class SupabaseSyncManager:
             batch_size = table_config.get('batch_size', 1000)
             timestamp_column = table_config.get('timestamp_column', 'created_at')
             
-            # 获取最后同步时间戳
+            # 获取最后同步时间戳和批次检查点
             last_sync = self.get_last_sync_timestamp(table_name)
+            checkpoint = self.get_checkpoint(table_name)
+            
+            checkpoint_time = self._parse_timestamp(checkpoint)
+            last_sync_time = self._parse_timestamp(last_sync)
             
-            # 构建查询条件
             with self.get_sqlite_connection() as conn:
-                if last_sync:
+                if checkpoint_time and (not last_sync_time or checkpoint_time > last_sync_time):
+                    # 从检查点恢复；upsert 幂等，边界时间戳重复写入无害
+                    query = f"""
+                    SELECT * FROM {table_name} 
+                    WHERE {timestamp_column} >= ? 
+                    ORDER BY {timestamp_column}
+                    """
+                    cursor = conn.execute(query, (checkpoint,))
+                    logger.info(f"Resuming {table_name} from checkpoint {checkpoint}")
+                elif last_sync:
                     query = f"""
                     SELECT * FROM {table_name} 
                     WHERE {timestamp_column} > ? 
@@ -228,58 +473,28 @@ class SupabaseSyncManager:
                     query = f"SELECT * FROM {table_name} ORDER BY {timestamp_column}"
                     cursor = conn.execute(query)
                 
-                # 获取表结构
+                # 获取表结构并预编译转换函数
                 schema = self.get_table_schema(table_name, conn)
+                convert = self._build_row_converter(table_name, schema)
                 
-                # 批量处理数据
-                records_synced = 0
-                batch_data = []
-                
-                for row in cursor:
-                    # 转换为字典
-                    row_dict = dict(row)
-                    
-                    # 数据类型转换
-                    converted_row = {}
-                    for column, value in row_dict.items():
-                        if column in schema:
-                            postgres_type = data_type_mapper.map_sqlite_type(schema[column])
-                            converted_row[column] = data_type_mapper.convert_value(value, postgres_type)
-                        else:
-                            # 处理 datetime 对象的 JSON 序列化
-                            if isinstance(value, datetime):
-                                converted_row[column] = value.isoformat()
-                            else:
-                                converted_row[column] = value
-                    
-                    # 只为支持同步元数据的表添加这些字段
-                    # 检查表是否有这些列
-                    if 'sync_source' in schema or table_name in ['sync_status', 'system_logs']:
-                        converted_row['sync_source'] = 'sqlite'
-                    if 'sync_timestamp' in schema or table_name in ['sync_status', 'system_logs']:
-                        converted_row['sync_timestamp'] = datetime.now().isoformat()
-                    
-                    batch_data.append(converted_row)
-                    
-                    # 批量插入
-                    if len(batch_data) >= batch_size:
-                        self._insert_batch(table_name, batch_data)
-                        records_synced += len(batch_data)
-                        batch_data = []
-                        logger.info(f"Synced {records_synced} records for {table_name}")
-                
-                # 处理剩余数据
-                if batch_data:
-                    self._insert_batch(table_name, batch_data)
-                    records_synced += len(batch_data)
+                records_synced, records_failed = self._upsert_pipeline(
+                    table_name, self._iter_batches(cursor, convert, batch_size, timestamp_column),
+                    on_checkpoint=lambda value, batches: self.save_checkpoint(table_name, value, batches, conn)
+                )
             
-            # 更新同步状态
+            # 更新同步状态；全部成功时检查点已被最后同步时间取代。
+            # 有失败记录时不推进最后同步时间，下次从检查点（第一个失败批次之前）重试
             sync_duration = time.time() - start_time
-            self.update_sync_status(table_name, 'completed', records_synced, 
-                                  sync_duration=sync_duration, sync_mode='incremental')
+            error_msg = f"{records_failed} records failed" if records_failed else None
+            self.update_sync_status(table_name, 'completed', records_synced, error_msg,
+                                  sync_duration=sync_duration, sync_mode='incremental',
+                                  advance_last_sync=not records_failed)
+            if not records_failed:
+                self.clear_checkpoint(table_name)
             
-            logger.info(f"Incremental sync completed for {table_name}: {records_synced} records in {sync_duration:.2f}s")
-            return True, records_synced, None
+            logger.info(f"Incremental sync completed for {table_name}: {records_synced} records "
+                       f"({records_failed} failed) in {sync_duration:.2f}s")
+            return True, records_synced, error_msg
             
         except Exception as e:
             error_msg = f"Incremental sync failed for {table_name}: {str(e)}"
@@ -287,7 +502,8 @@ class SupabaseSyncManager:
             
             sync_duration = time.time() - start_time
             self.update_sync_status(table_name, 'failed', 0, error_msg, 
-                                  sync_duration=sync_duration, sync_mode='incremental')
+                                  sync_duration=sync_duration, sync_mode='incremental',
+                                  advance_last_sync=False)
             
             return False, 0, error_msg
     
@@ -295,6 +511,8 @@ class SupabaseSyncManager:
         """
         全量同步表数据
         
+        全量同步会先清空目标表，因此不使用检查点，中断后需整体重跑
+        
         Args:
             table_name: 表名
             
@@ -322,58 +540,23 @@ class SupabaseSyncManager:
                 query = f"SELECT * FROM {table_name}"
                 cursor = conn.execute(query)
                 
-                # 获取表结构
+                # 获取表结构并预编译转换函数
                 schema = self.get_table_schema(table_name, conn)
+                convert = self._build_row_converter(table_name, schema)
                 
-                # 批量处理数据
-                records_synced = 0
-                batch_data = []
-                
-                for row in cursor:
-                    # 转换为字典
-                    row_dict = dict(row)
-                    
-                    # 数据类型转换
-                    converted_row = {}
-                    for column, value in row_dict.items():
-                        if column in schema:
-                            postgres_type = data_type_mapper.map_sqlite_type(schema[column])
-                            converted_row[column] = data_type_mapper.convert_value(value, postgres_type)
-                        else:
-                            # 处理 datetime 对象的 JSON 序列化
-                            if isinstance(value, datetime):
-                                converted_row[column] = value.isoformat()
-                            else:
-                                converted_row[column] = value
-                    
-                    # 只为支持同步元数据的表添加这些字段
-                    # 检查表是否有这些列
-                    if 'sync_source' in schema or table_name in ['sync_status', 'system_logs']:
-                        converted_row['sync_source'] = 'sqlite'
-                    if 'sync_timestamp' in schema or table_name in ['sync_status', 'system_logs']:
-                        converted_row['sync_timestamp'] = datetime.now().isoformat()
-                    
-                    batch_data.append(converted_row)
-                    
-                    # 批量插入
-                    if len(batch_data) >= batch_size:
-                        self._insert_batch(table_name, batch_data)
-                        records_synced += len(batch_data)
-                        batch_data = []
-                        logger.info(f"Synced {records_synced} records for {table_name}")
-                
-                # 处理剩余数据
-                if batch_data:
-                    self._insert_batch(table_name, batch_data)
-                    records_synced += len(batch_data)
+                records_synced, records_failed = self._upsert_pipeline(
+                    table_name, self._iter_batches(cursor, convert, batch_size)
+                )
             
             # 更新同步状态
             sync_duration = time.time() - start_time
-            self.update_sync_status(table_name, 'completed', records_synced, 
+            error_msg = f"{records_failed} records failed" if records_failed else None
+            self.update_sync_status(table_name, 'completed', records_synced, error_msg,
                                   sync_duration=sync_duration, sync_mode='full')
             
-            logger.info(f"Full sync completed for {table_name}: {records_synced} records in {sync_duration:.2f}s")
-            return True, records_synced, None
+            logger.info(f"Full sync completed for {table_name}: {records_synced} records "
+                       f"({records_failed} failed) in {sync_duration:.2f}s")
+            return True, records_synced, error_msg
             
         except Exception as e:
             error_msg = f"Full sync failed for {table_name}: {str(e)}"
@@ -393,47 +576,38 @@ class SupabaseSyncManager:
             table_name: 表名
             batch_data: 批量数据
         """
-        try:
-            # 使用 upsert 来处理重复数据
-            response = self.supabase_client.table(table_name).upsert(batch_data).execute()
-            
-            if not response.data:
-                logger.warning(f"No data returned from upsert for {table_name}")
-            
-        except Exception as e:
-            logger.error(f"Failed to insert batch for {table_name}: {e}")
-            # 尝试逐条插入以识别问题记录
-            self._insert_records_individually(table_name, batch_data)
+        self._upsert_with_bisection(table_name, batch_data)
     
-    def _insert_records_individually(self, table_name: str, records: List[Dict[str, Any]]):
+    def _upsert_with_bisection(self, table_name: str, records: List[Dict[str, Any]]) -> Tuple[int, int]:
         """
-        逐条插入记录，用于错误恢复
+        upsert 一个批次；失败时二分拆分重试，定位坏记录只需 O(k·log n) 次请求
         
         Args:
             table_name: 表名
             records: 记录列表
+            
+        Returns:
+            (成功记录数, 失败记录数)
         """
-        successful_inserts = 0
-        failed_inserts = 0
-        
-        for record in records:
-            try:
-                # 处理 datetime 对象的 JSON 序列化
-                processed_record = {}
-                for key, value in record.items():
-                    if isinstance(value, datetime):
-                        processed_record[key] = value.isoformat()
-                    else:
-                        processed_record[key] = value
-                
-                self.supabase_client.table(table_name).upsert([processed_record]).execute()
-                successful_inserts += 1
-            except Exception as e:
-                failed_inserts += 1
-                logger.error(f"Failed to insert individual record in {table_name}: {e}")
-                logger.debug(f"Problematic record: {record}")
-        
-        logger.info(f"Individual insert results for {table_name}: {successful_inserts} successful, {failed_inserts} failed")
+        try:
+            # 使用 upsert 来处理重复数据
+            response = self.supabase_client.table(table_name).upsert(records).execute()
+            
+            if not response.data:
+                logger.warning(f"No data returned from upsert for {table_name}")
+            return len(records), 0
+            
+        except Exception as e:
+            if len(records) == 1:
+                logger.error(f"Failed to insert record in {table_name}: {e}")
+                logger.debug(f"Problematic record: {records[0]}")
+                return 0, 1
+            
+            logger.warning(f"Batch of {len(records)} failed for {table_name}, bisecting: {e}")
+            middle = len(records) // 2
+            left_ok, left_failed = self._upsert_with_bisection(table_name, records[:middle])
+            right_ok, right_failed = self._upsert_with_bisection(table_name, records[middle:])
+            return left_ok + right_ok, left_failed + right_failed
     
     def sync_all_tables(self, sync_mode: str = 'auto') -> Dict[str, Any]:
         """
@@ -533,41 +707,257 @@ class SupabaseSyncManager:
         """获取同步统计信息"""
         return self.sync_stats.copy()
     
-    def validate_sync_integrity(self, table_name: str) -> Dict[str, Any]:
+    @classmethod
+    def _canonical_value(cls, value: Any) -> str:
+        """
+        单个值的规范化文本，与服务端 sync_canonical_expr 的规则一致
+        
+        时间统一为 UTC 'YYYY-MM-DD HH:MM:SS'，数值保留至多 9 位小数并去掉末尾的 0，
+        布尔为 1/0，NULL 为 \\N
+        """
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, (float, Decimal)):
+            if isinstance(value, float):
+                if not math.isfinite(value):
+                    return str(value)
+                value = Decimal(repr(round(value, 9)))
+            elif value.is_finite():
+                value = round(value, 9)
+            text = format(value, 'f')
+            if '.' in text:
+                text = text.rstrip('0').rstrip('.')
+            return '0' if text in ('-0', '') else text
+        if isinstance(value, datetime):
+            return cls._parse_timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, str) and len(value) >= 19 and value[4] == '-' and value[10] in 'T ':
+            parsed = cls._parse_timestamp(value)
+            if parsed is not None:
+                return parsed.strftime('%Y-%m-%d %H:%M:%S')
+        return str(value)
+    
+    @classmethod
+    def _canonical_row(cls, row: Dict[str, Any], primary_key: str, columns: List[str]) -> str:
+        """行的规范化文本："主键|列1|列2..." """
+        return '|'.join(cls._canonical_value(row.get(column)) for column in [primary_key] + columns)
+    
+    @staticmethod
+    def _range_digest(rows: List[Tuple[Any, str]]) -> Tuple[int, str]:
+        """范围内 (主键, 行文本) 列表的行数和摘要，排序与服务端 ORDER BY k, r 一致"""
+        texts = [text for _, text in sorted(rows)]
+        return len(texts), hashlib.md5('\n'.join(texts).encode()).hexdigest()
+    
+    def _remote_range_digest(self, table_name: str, primary_key: str, columns: List[str],
+                             lo: Any, hi: Any) -> Tuple[int, str]:
+        """
+        通过 sync_range_digest RPC 在服务端计算主键范围 [lo, hi) 的行数和摘要，不传输行数据
+        
+        RPC 由 supabase/migrations/002_sync_range_digest.sql 创建
+        """
+        response = self.supabase_client.rpc('sync_range_digest', {
+            'p_table': table_name,
+            'p_key': primary_key,
+            'p_columns': columns,
+            'p_lo': None if lo is None else str(lo),
+            'p_hi': None if hi is None else str(hi)
+        }).execute()
+        data = response.data or []
+        row = data[0] if isinstance(data, list) and data else data
+        if not row:
+            return 0, hashlib.md5(b'').hexdigest()
+        return int(row['row_count']), row['digest']
+    
+    def _fetch_supabase_range(self, table_name: str, select: str, primary_key: str,
+                              lo: Any, hi: Any, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        按主键游标分页读取范围 [lo, hi) 内的 Supabase 行（pk > 上一页最后的主键），
+        不用偏移分页，表在读取期间有写入也不会跳行或重复；
+        页尾主键单独按等值补读，重复主键不会被游标跳过
+        """
+        last = None
+        while True:
+            query = self.supabase_client.table(table_name).select(select)
+            if last is not None:
+                query = query.gt(primary_key, last)
+            elif lo is not None:
+                query = query.gte(primary_key, lo)
+            if hi is not None:
+                query = query.lt(primary_key, hi)
+            rows = query.order(primary_key).limit(page_size).execute().data or []
+            
+            if len(rows) < page_size:
+                yield from rows
+                return
+            
+            last = rows[-1][primary_key]
+            yield from (row for row in rows if row[primary_key] != last)
+            yield from self.supabase_client.table(table_name).select(select) \
+                .eq(primary_key, last).execute().data or []
+    
+    def _local_ranges(self, cursor: sqlite3.Cursor, convert: Callable, primary_key: str,
+                      columns: List[str], chunk_size: int) -> Iterator[Tuple[Any, Any, List[Tuple[Any, str]]]]:
+        """
+        按主键顺序流式读取 SQLite 行，切成约 chunk_size 行的范围 (lo, hi, [(主键, 行文本)])
+        
+        同一主键不会跨范围；首个范围下界和最后一个范围上界为 None（不限），
+        Supabase 端超出本地主键区间的多余行也会被覆盖
+        """
+        lo = None
+        chunk: List[Tuple[Any, str]] = []
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            for row in rows:
+                converted = convert(row)
+                key = converted[primary_key]
+                if len(chunk) >= chunk_size and key != chunk[-1][0]:
+                    yield lo, key, chunk
+                    lo, chunk = key, []
+                chunk.append((key, self._canonical_row(converted, primary_key, columns)))
+        yield lo, None, chunk
+    
+    def _diff_range(self, table_name: str, primary_key: str, columns: List[str], lo: Any, hi: Any,
+                    local_rows: List[Tuple[Any, str]], remote_digest: Tuple[int, str], leaf_size: int,
+                    divergent: List[Dict[str, Any]], stats: Dict[str, int]):
+        """
+        比较一个主键范围：摘要相同直接返回；不同时按本地主键中位数二分，
+        子范围的服务端摘要再通过 RPC 计算；到叶子范围才拉取该范围的行逐键比较
+        """
+        stats['chunks_compared'] += 1
+        if self._range_digest(local_rows) == remote_digest:
+            return
+        
+        if len(local_rows) > leaf_size:
+            middle_key = local_rows[len(local_rows) // 2][0]
+            left = [row for row in local_rows if row[0] < middle_key]
+            right = [row for row in local_rows if row[0] >= middle_key]
+            if left and right:
+                for sub_lo, sub_hi, sub_rows in ((lo, middle_key, left), (middle_key, hi, right)):
+                    sub_digest = self._remote_range_digest(table_name, primary_key, columns, sub_lo, sub_hi)
+                    self._diff_range(table_name, primary_key, columns, sub_lo, sub_hi, sub_rows,
+                                     sub_digest, leaf_size, divergent, stats)
+                return
+        
+        # 按规范化主键对齐两端，报告时使用原始主键值
+        keys: Dict[str, Any] = {}
+        local: Dict[str, List[str]] = {}
+        for key, text in local_rows:
+            canonical_key = self._canonical_value(key)
+            keys.setdefault(canonical_key, key)
+            local.setdefault(canonical_key, []).append(text)
+        remote: Dict[str, List[str]] = {}
+        for row in self._fetch_supabase_range(table_name, ','.join([primary_key] + columns), primary_key, lo, hi):
+            canonical_key = self._canonical_value(row.get(primary_key))
+            keys.setdefault(canonical_key, row.get(primary_key))
+            remote.setdefault(canonical_key, []).append(self._canonical_row(row, primary_key, columns))
+            stats['rows_fetched'] += 1
+        
+        missing_in_supabase, missing_in_sqlite, duplicates, changed = [], [], [], []
+        for canonical_key in sorted(keys):
+            key = keys[canonical_key]
+            local_rows_for_key = sorted(local.get(canonical_key, []))
+            remote_rows_for_key = sorted(remote.get(canonical_key, []))
+            if not remote_rows_for_key:
+                missing_in_supabase.append(key)
+            elif not local_rows_for_key:
+                missing_in_sqlite.append(key)
+            elif len(remote_rows_for_key) > 1 or len(local_rows_for_key) > 1:
+                if local_rows_for_key != remote_rows_for_key:
+                    duplicates.append(key)
+            elif local_rows_for_key != remote_rows_for_key:
+                changed.append(key)
+        
+        if missing_in_supabase or missing_in_sqlite or duplicates or changed:
+            divergent.append({
+                'start_key': lo,
+                'end_key': hi,
+                'missing_in_supabase': missing_in_supabase,
+                'missing_in_sqlite': missing_in_sqlite,
+                'duplicates': duplicates,
+                'changed': changed
+            })
+    
+    def validate_sync_integrity(self, table_name: str, deep: bool = False,
+                                chunk_size: int = 1024, leaf_size: int = 32) -> Dict[str, Any]:
         """
         验证同步数据完整性
         
+        SQLite 端按主键顺序流式切成范围并在本地计算摘要；Supabase 端同一范围的
+        行数和摘要由 sync_range_digest RPC 在服务端计算，只传回两个值。
+        摘要不同的范围按主键二分下探，只有叶子范围才按主键游标拉取行，
+        报告缺失、多余、重复、内容变化的主键，可据此定向重同步。
+        默认只比较主键和时间戳列（轻量）；deep=True 时比较全部业务列。
+        
         Args:
             table_name: 表名
+            deep: 是否比较全部业务列
+            chunk_size: 顶层范围的行数
+            leaf_size: 停止下探、改为拉取行比较的范围行数
             
         Returns:
             验证结果
         """
         try:
-            # 获取 SQLite 记录数
-            with self.get_sqlite_connection() as conn:
-                cursor = conn.execute(f"SELECT COUNT(*) FROM {table_name}")
-                sqlite_count = cursor.fetchone()[0]
+            table_config = self.CORE_TABLES.get(table_name, {})
+            primary_key = table_config.get('primary_key', 'id')
+            timestamp_column = table_config.get('timestamp_column', 'created_at')
+            excluded = {primary_key, 'id', 'created_at', 'updated_at', 'sync_source', 'sync_timestamp'}
+            
+            divergent: List[Dict[str, Any]] = []
+            stats = {'chunks_compared': 0, 'rows_fetched': 0}
+            sqlite_count = supabase_count = top_chunks = 0
             
-            # 获取 Supabase 记录数
-            response = self.supabase_client.table(table_name).select('id', count='exact').execute()
-            supabase_count = response.count
+            with self.get_sqlite_connection() as conn:
+                schema = self.get_table_schema(table_name, conn)
+                if deep:
+                    columns = [column for column in schema if column not in excluded]
+                else:
+                    columns = [timestamp_column] if timestamp_column in schema else []
+                select_columns = [primary_key] + columns
+                convert = self._build_row_converter(table_name, {c: schema[c] for c in select_columns if c in schema})
+                
+                cursor = conn.execute(
+                    f"SELECT {', '.join(select_columns)} FROM {table_name} ORDER BY {primary_key}"
+                )
+                for lo, hi, local_rows in self._local_ranges(cursor, convert, primary_key, columns, chunk_size):
+                    top_chunks += 1
+                    sqlite_count += len(local_rows)
+                    remote_digest = self._remote_range_digest(table_name, primary_key, columns, lo, hi)
+                    supabase_count += remote_digest[0]
+                    self._diff_range(table_name, primary_key, columns, lo, hi, local_rows,
+                                     remote_digest, leaf_size, divergent, stats)
             
-            # 计算差异
-            difference = abs(sqlite_count - supabase_count)
-            integrity_score = 1.0 - (difference / max(sqlite_count, 1))
+            divergent_keys = sum(
+                len(r['missing_in_supabase']) + len(r['missing_in_sqlite']) + len(r['duplicates']) + len(r['changed'])
+                for r in divergent
+            )
+            integrity_score = 1.0 - (divergent_keys / max(sqlite_count, 1))
             
             result = {
                 'table_name': table_name,
                 'sqlite_count': sqlite_count,
                 'supabase_count': supabase_count,
-                'difference': difference,
+                'difference': abs(sqlite_count - supabase_count),
+                'divergent_keys': divergent_keys,
+                'divergent_ranges': divergent,
+                'chunks_total': top_chunks,
+                'chunks_compared': stats['chunks_compared'],
+                'rows_fetched': stats['rows_fetched'],
+                'mode': 'deep' if deep else 'light',
                 'integrity_score': integrity_score,
                 'status': 'passed' if integrity_score >= 0.95 else 'failed',
                 'timestamp': datetime.now().isoformat()
             }
             
-            logger.info(f"Integrity check for {table_name}: {result['status']} (score: {integrity_score:.3f})")
+            logger.info(f"Integrity check for {table_name}: {result['status']} (score: {integrity_score:.3f}, "
+                       f"{len(divergent)} divergent ranges, {stats['rows_fetched']} rows fetched)")
             return result
             
         except Exception as e:
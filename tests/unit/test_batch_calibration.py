@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量标定与投票测试
+验证 NumPy 批量接口与标量函数结果一致，批量拟合与默认参数的 SGD 拟合相近且对数损失不更差
+"""
+
+import os
+import sys
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+from advanced_calibration import (
+    platt_fit, temp_scale_fit, hybrid_calibrate,
+    platt_fit_batch, temp_scale_fit_batch, hybrid_calibrate_batch,
+    apply_platt_batch, apply_temp_batch, PLATT_A_RANGE, TEMP_RANGE
+)
+from enhanced_voting import decide, decide_batch, WeightedVoting
+
+CFG = {
+    "voting": {
+        "weights_init": {"cloud": 0.5, "map": 0.3, "size": 0.2},
+        "extreme_gate": {"enable": True, "hi": 0.7, "lo": 0.3},
+        "buckets": [0.5, 0.67, 1.0],
+        "accept_floor": 0.5
+    }
+}
+
+
+def _samples(n=400, seed=7):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        p = rng.uniform(0.05, 0.95)
+        y = 1 if rng.random() < p ** 1.3 else 0
+        samples.append((p, y))
+    return samples
+
+
+def _log_loss(probs, ys):
+    probs = np.clip(np.asarray(probs), 1e-9, 1 - 1e-9)
+    ys = np.asarray(ys)
+    return float(-np.mean(ys * np.log(probs) + (1 - ys) * np.log(1 - probs)))
+
+
+def _separable_samples():
+    return [(0.2, 0), (0.3, 0), (0.4, 0), (0.6, 1), (0.7, 1), (0.8, 1)] * 10
+
+
+@pytest.mark.parametrize("seed", [7, 11])
+def test_platt_fit_batch_close_to_scalar_defaults(seed):
+    """批量 Platt 拟合与默认参数的 platt_fit 标定结果相近，对数损失不更差"""
+    samples = _samples(seed=seed)
+    p_raw, ys = zip(*samples)
+    A_s, B_s = platt_fit(samples)
+    A_b, B_b = platt_fit_batch(p_raw, ys)
+    assert A_b == pytest.approx(A_s, abs=0.15)
+    assert B_b == pytest.approx(B_s, abs=0.15)
+    q_s = apply_platt_batch(p_raw, A_s, B_s)
+    q_b = apply_platt_batch(p_raw, A_b, B_b)
+    assert float(np.max(np.abs(q_s - q_b))) < 0.05
+    assert _log_loss(q_b, ys) <= _log_loss(q_s, ys) + 1e-9
+
+
+@pytest.mark.parametrize("seed", [7, 11])
+def test_temp_scale_fit_batch_close_to_scalar_defaults(seed):
+    """批量温度标定与默认参数的 temp_scale_fit 相近，对数损失不更差"""
+    samples = _samples(seed=seed)
+    p_raw, ys = zip(*samples)
+    T_s = temp_scale_fit(samples)
+    T_b = temp_scale_fit_batch(p_raw, ys)
+    assert T_b == pytest.approx(T_s, abs=0.2)
+    assert TEMP_RANGE[0] <= T_b <= TEMP_RANGE[1]
+    assert _log_loss(apply_temp_batch(p_raw, T_b), ys) <= _log_loss(apply_temp_batch(p_raw, T_s), ys) + 1e-9
+
+
+def test_batch_fits_stay_bounded_on_separable_data():
+    """可分数据下先验与范围限制使 A 有界，T 与标量版本同样落在下限"""
+    samples = _separable_samples()
+    p_raw, ys = zip(*samples)
+    A_s, B_s = platt_fit(samples)
+    A_b, B_b = platt_fit_batch(p_raw, ys)
+    assert 1.0 < A_b < A_s
+    assert B_b == pytest.approx(0.0, abs=1e-6)
+    assert platt_fit_batch(p_raw, ys, prior=0.0)[0] == PLATT_A_RANGE[1]
+    assert temp_scale_fit_batch(p_raw, ys) == pytest.approx(temp_scale_fit(samples)) == TEMP_RANGE[0]
+
+
+def test_hybrid_calibrate_batch_elementwise():
+    """数组标定逐元素等于标量标定"""
+    params = {"A": 1.2, "B": -0.1, "T": 1.4}
+    p_raw = [0.1, 0.35, 0.5, 0.62, 0.9]
+    batch = hybrid_calibrate_batch(p_raw, params)
+    for p, q in zip(p_raw, batch):
+        assert q == pytest.approx(hybrid_calibrate(p, params), abs=1e-12)
+
+
+def test_decide_batch_matches_decide():
+    """批量决策与逐条 decide 结果一致"""
+    rng = random.Random(3)
+    rows = [(rng.random(), rng.random(), rng.random()) for _ in range(200)]
+    scored = decide_batch(*zip(*rows), CFG, {})
+    for i, (pc, pm, ps) in enumerate(rows):
+        single = decide(pc, pm, ps, CFG, {})
+        assert scored["p_star"][i] == pytest.approx(single["p_star"], abs=1e-12)
+        assert scored["bucket"][i] == single["bucket"]
+        assert bool(scored["accept"][i]) == single["accept"]
+
+
+def test_vote_batch_groups_by_draw():
+    """vote_batch 按 draw_id/market 分组，与 vote 结果一致"""
+    voting = WeightedVoting(CFG)
+    day = [
+        {"draw_id": "1001", "market": "oe", "source": "cloud", "p_win": 0.72},
+        {"draw_id": "1001", "market": "oe", "source": "map", "p_win": 0.61},
+        {"draw_id": "1002", "market": "size", "source": "size", "p_win": 0.41},
+    ]
+    results = voting.vote_batch(day)
+    assert [(r["draw_id"], r["market"]) for r in results] == [("1001", "oe"), ("1002", "size")]
+    assert results[0]["p_star"] == pytest.approx(voting.vote(day[:2])["p_star"], abs=1e-12)
+    assert results[1]["p_star"] == pytest.approx(voting.vote(day[2:])["p_star"], abs=1e-12)
+    assert voting.vote_batch([]) == []
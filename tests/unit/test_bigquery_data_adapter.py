@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BigQuery 数据适配器测试
+使用 SQLite 本地替身验证参数化查询、结果缓存和新开奖失效（含每周期按最新一期刷新），以及无默认凭据时回退 bq CLI
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    import bigquery_data_adapter
+    from bigquery_data_adapter import BQ, BqCliBackend, SQLiteBackend, get_backend
+except ImportError as e:
+    pytest.skip(f"BigQuery 适配器导入失败: {e}", allow_module_level=True)
+
+
+NOW = datetime(2026, 1, 1, 4, 0, 0, tzinfo=timezone.utc)  # 北京时间 12:00
+TODAY = '2026-01-01'
+
+
+class CountingBackend(SQLiteBackend):
+    def __init__(self):
+        super().__init__(now=lambda: NOW)
+        self.calls = 0
+
+    def query(self, sql, params=None, timeout=120):
+        self.calls += 1
+        return super().query(sql, params, timeout)
+
+
+@pytest.fixture
+def bq():
+    backend = CountingBackend()
+    backend.load_table('proj.pc28.draws_14w_dedup_v', [
+        {'draw_id': 3300000 + i, 'timestamp': (NOW - timedelta(minutes=3 * i)).strftime('%Y-%m-%d %H:%M:%S')}
+        for i in range(300)  # 最早的几十期为前一天（北京时间）
+    ])
+    backend.load_table('proj.pc28_lab.score_ledger', [
+        {'id': f'ord_{i}', 'day_id_cst': TODAY, 'market': 'oe' if i % 2 else 'size',
+         'prediction': 'oe' if i % 2 else 'size', 'probability': 0.6, 'tag': 'prod',
+         'outcome': 'win' if i % 3 else 'lose',
+         'timestamp': (NOW - timedelta(minutes=5 * i)).strftime('%Y-%m-%d %H:%M:%S')}
+        for i in range(20)
+    ])
+    backend.load_table('proj.pc28_lab.lab_push_candidates_v2', [
+        {'draw_id': 3300100, 'market': 'oe', 'p_win': 0.61, 'day_id_cst': TODAY},
+        {'draw_id': 3300099, 'market': 'oe', 'p_win': 0.58, 'day_id_cst': '2025-12-31'},
+    ])
+    return BQ('proj', 'pc28_lab', 'pc28', 'us-central1', 'Asia/Shanghai', backend=backend)
+
+
+def test_queries_run_on_sqlite_stand_in(bq):
+    """BigQuery 方言在本地替身上得到正确结果"""
+    assert bq.draws_today() == 241  # 北京时间 00:00-12:00 共 241 期
+    assert [row['draw_id'] for row in bq.read_candidates()] == [3300100]
+
+    kpi = bq.kpi_window(window_min=60)
+    n_oe = sum(1 for i in range(20) if i % 2 and 5 * i <= 60)
+    assert kpi['oe']['n_ord'] == n_oe
+    assert kpi['oe']['n_draw'] == 21
+    assert kpi['oe']['acc'] == pytest.approx(
+        sum(1 for i in range(20) if i % 2 and 5 * i <= 60 and i % 3) / n_oe)
+
+
+def test_results_cached_until_new_draw(bq):
+    """相同查询命中缓存；新开奖使缓存失效，同一期重复通知不重复失效"""
+    bq.draws_today(); bq.kpi_window(); bq.read_candidates()
+    bq.draws_today(); bq.kpi_window(); bq.read_candidates()
+    assert bq.backend.calls == 3
+    assert bq.kpi_window(window_min=30) != bq.kpi_window(window_min=60)
+    assert bq.backend.calls == 4
+
+    candidates = bq.read_candidates()
+    candidates[0]['p_win'] = 0
+    assert bq.read_candidates()[0]['p_win'] == 0.61
+
+    assert bq.on_new_draw(3300100)
+    assert not bq.on_new_draw('3300100')
+    assert not bq.on_new_draw(3300099)  # 迟到的旧一期通知
+    bq.draws_today()
+    assert bq.backend.calls == 5
+
+
+def test_cached_draws_today_refreshes_after_new_draw(bq):
+    """周期开始时查到更新的一期才失效缓存，缓存的 draws_today 随之更新"""
+    assert bq.refresh_on_new_draw()
+    assert bq.draws_today() == 241
+    assert not bq.refresh_on_new_draw()
+    assert bq.draws_today() == 241
+    calls = bq.backend.calls
+
+    bq.backend.load_table('proj.pc28.draws_14w_dedup_v', [
+        {'draw_id': 3300500, 'timestamp': (NOW + timedelta(seconds=30)).strftime('%Y-%m-%d %H:%M:%S')}
+    ])
+    assert bq.draws_today() == 241  # 未刷新前仍命中缓存
+    assert bq.refresh_on_new_draw()
+    assert bq.last_draw_id == '3300500'
+    assert bq.draws_today() == 242
+    assert bq.backend.calls == calls + 2
+
+
+def test_backend_falls_back_to_cli_without_default_credentials(monkeypatch):
+    """没有应用默认凭据时回退 bq CLI；显式指定 bigquery 时抛出"""
+    exceptions = pytest.importorskip("google.auth.exceptions")
+
+    def no_credentials(project, location):
+        raise exceptions.DefaultCredentialsError('no ADC')
+
+    monkeypatch.delenv('PC28_BQ_BACKEND', raising=False)
+    monkeypatch.setattr(bigquery_data_adapter, 'BigQueryBackend', no_credentials)
+    monkeypatch.setattr(bigquery_data_adapter, '_backends', {})
+
+    assert isinstance(get_backend('proj-no-adc', 'US'), BqCliBackend)
+    with pytest.raises(exceptions.DefaultCredentialsError):
+        get_backend('proj-no-adc', 'US', kind='bigquery')
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cloud Function 入口测试
+验证重量级模块按需导入、健康检查发现缺失依赖、热调用复用缓存对象、响应中的阶段耗时和进程内告警
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import cloud_runtime
+    import main_handler
+except ImportError as e:
+    pytest.skip(f"入口模块导入失败: {e}", allow_module_level=True)
+
+
+class _Request:
+    method = 'POST'
+    url = 'http://localhost/'
+
+    def __init__(self, action):
+        self.action = action
+
+    def get_json(self, silent=True):
+        return {'action': self.action}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_runtime():
+    cloud_runtime.reset_warm_state()
+    yield
+    cloud_runtime.reset_warm_state()
+
+
+def test_health_check_does_not_load_pipeline(monkeypatch):
+    """健康检查只查找主模块，不导入BigQuery等依赖"""
+    monkeypatch.delitem(sys.modules, 'main_pc28_e2e', raising=False)
+    result = main_handler.main_handler(_Request('health_check'))
+    assert 'main_module' in result['checks']
+    assert 'main_pc28_e2e' not in sys.modules
+
+
+def test_health_check_reports_missing_dependency(monkeypatch):
+    """主模块的依赖找不到时报告 unhealthy，而不是只看主模块文件是否存在"""
+    monkeypatch.setattr(main_handler, 'MAIN_MODULE_DEPENDENCIES', ['main_pc28_e2e', 'no_such_module_xyz'])
+    result = main_handler.perform_health_check()
+    assert result['status'] == 'unhealthy'
+    assert 'no_such_module_xyz' in result['checks']['main_module']
+
+
+def test_deep_health_check_imports_main_module(monkeypatch):
+    """deep 健康检查实际导入主模块，导入失败时报告 unhealthy"""
+    monkeypatch.setattr(main_handler, 'MAIN_MODULE_DEPENDENCIES', [])
+    monkeypatch.delitem(sys.modules, 'main_pc28_e2e', raising=False)
+
+    def broken_import(name):
+        raise ImportError(f'cannot import {name}')
+
+    monkeypatch.setattr(main_handler.importlib, 'import_module', broken_import)
+    shallow = main_handler.perform_health_check()
+    deep = main_handler.perform_health_check(deep=True)
+    assert shallow['checks']['main_module'] == 'ok'
+    assert deep['status'] == 'unhealthy'
+    assert 'cannot import main_pc28_e2e' in deep['checks']['main_module']
+
+
+def test_sync_data_reports_phase_timings_and_cold_start(monkeypatch):
+    """sync_data 响应包含各阶段耗时，第二次调用标记为热启动"""
+    calls = []
+
+    def run_cycle(timings):
+        calls.append(timings)
+        timings['init'] = 1.0
+        timings['fetch'] = 2.0
+        timings['write'] = 3.0
+        return {'decision': None, 'order_id': None}
+
+    monkeypatch.setitem(sys.modules, 'main_pc28_e2e', types.SimpleNamespace(run_cycle=run_cycle))
+
+    first = main_handler.main_handler(_Request('sync_data'))
+    second = main_handler.main_handler(_Request('sync_data'))
+
+    assert first['status'] == 'success'
+    assert first['cold_start'] is True and second['cold_start'] is False
+    assert {'import', 'init', 'fetch', 'write', 'total'} <= set(first['timings_ms'])
+    assert len(calls) == 2
+
+
+def test_sync_failure_alerts_through_shared_session(monkeypatch):
+    """同步失败时通过缓存的HTTP会话发送告警，不再启动shell"""
+    posts = []
+
+    class _Session:
+        def post(self, url, json=None, timeout=None):
+            posts.append((url, json))
+            return types.SimpleNamespace(status_code=200)
+
+    def run_cycle(timings):
+        raise RuntimeError('bq down')
+
+    monkeypatch.setenv('BOT_TOKEN', 'token')
+    monkeypatch.setenv('CHAT_ID', '42')
+    monkeypatch.setattr(os, 'system', lambda *a: pytest.fail('不应调用 os.system'))
+    monkeypatch.setitem(sys.modules, 'main_pc28_e2e', types.SimpleNamespace(run_cycle=run_cycle))
+    session = cloud_runtime.warm('http_session', _Session)
+
+    body, status = main_handler.main_handler(_Request('sync_data'))
+
+    assert status == 500 and body['error_type'] == 'sync_error'
+    assert cloud_runtime.http_session() is session
+    assert len(posts) == 1
+    assert posts[0][0].endswith('/bottoken/sendMessage')
+    assert 'bq down' in posts[0][1]['text'] and posts[0][1]['chat_id'] == '42'
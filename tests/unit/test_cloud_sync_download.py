@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+云端下载同步测试
+验证查询结果分批流式写入本地、高水位在第一个不完整批次处停止推进，以及写入失败不被报告为成功
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'local_system'))
+
+try:
+    import cloud_sync_manager
+    from cloud_sync_manager import CloudSyncManager
+    from local_database import LocalDatabase
+except ImportError as e:
+    pytest.skip(f"云端同步模块导入失败: {e}", allow_module_level=True)
+
+FIELDS = [('draw_id', 'STRING'), ('timestamp', 'STRING'), ('market', 'STRING'), ('pick', 'STRING'),
+          ('p_win', 'FLOAT'), ('period', 'STRING'), ('created_at', 'STRING')]
+
+
+class FakeResults:
+    """按页返回行的 BigQuery 查询结果"""
+
+    def __init__(self, rows, page_size):
+        self.schema = [types.SimpleNamespace(name=name, field_type=field_type) for name, field_type in FIELDS]
+        self.pages = [rows[i:i + page_size] for i in range(0, len(rows), page_size)]
+
+
+class FakeBigQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query(self, sql):
+        self.queries.append(sql)
+        return types.SimpleNamespace(result=lambda page_size: FakeResults(self.rows, page_size))
+
+
+def _row(i, period=None):
+    return {'draw_id': str(i), 'timestamp': '2026-10-16 10:00:00', 'market': 'pc28', 'pick': 'odd',
+            'p_win': 0.6, 'period': period, 'created_at': f'2026-10-16 10:{i:02d}:00'}
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    db = LocalDatabase(str(tmp_path / 'local.db'))
+    monkeypatch.setattr(cloud_sync_manager, 'get_local_db', lambda: db)
+    monkeypatch.setattr(CloudSyncManager, '_init_bigquery_client', lambda self: None)
+    sync = CloudSyncManager()
+    sync.sync_config['batch_size'] = 3
+    yield sync
+    db.close()
+
+
+def _status(sync):
+    rows = sync.db.execute_query("SELECT sync_status, records_synced, error_message FROM sync_status "
+                                 "WHERE table_name = 'cloud_pred_today_norm'")
+    return rows[0] if rows else None
+
+
+def test_rows_stream_in_chunks_and_advance_high_water_mark(manager):
+    """分批写入全部行，高水位推进到最后一行，下次查询从高水位继续"""
+    manager.bq_client = FakeBigQuery([_row(i) for i in range(7)])
+
+    assert manager.sync_table_from_cloud('cloud_pred_today_norm') is True
+    assert manager.db.get_table_count('cloud_pred_today_norm') == 7
+    assert manager._get_high_water_mark('cloud_pred_today_norm') == '2026-10-16 10:06:00'
+    assert _status(manager)['sync_status'] == 'completed'
+
+    manager.bq_client = FakeBigQuery([])
+    assert manager.sync_table_from_cloud('cloud_pred_today_norm') is True
+    assert ">= TIMESTAMP('2026-10-16 10:06:00')" in manager.bq_client.queries[0]
+
+
+def test_high_water_mark_stalls_at_first_short_chunk(manager):
+    """第二批有一行写入失败：高水位停在第一批末尾，后续完整批次也不再推进，同步记为失败"""
+    rows = [_row(i) for i in range(9)]
+    rows[4]['period'] = object()
+    manager.bq_client = FakeBigQuery(rows)
+
+    assert manager.sync_table_from_cloud('cloud_pred_today_norm') is False
+    assert manager.db.get_table_count('cloud_pred_today_norm') == 8
+    assert manager._get_high_water_mark('cloud_pred_today_norm') == '2026-10-16 10:02:00'
+    status = _status(manager)
+    assert status['sync_status'] == 'failed' and status['records_synced'] == 8
+    assert '1/9' in status['error_message']
+
+
+def test_rows_fetched_but_none_written_is_a_failure(manager):
+    """取到了行但一行都没写入时返回失败，不当作“无新数据”"""
+    manager.bq_client = FakeBigQuery([_row(i, period=object()) for i in range(4)])
+
+    assert manager.sync_table_from_cloud('cloud_pred_today_norm') is False
+    assert manager._get_high_water_mark('cloud_pred_today_norm') is None
+    assert _status(manager)['sync_status'] == 'failed'
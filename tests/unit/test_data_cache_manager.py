@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据缓存管理器测试
+验证全局预算下的分片LRU淘汰、时间轮TTL清理和类型索引
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    from data_cache_distributor import DataCacheManager, DataType, TimerWheel
+except ImportError as e:
+    pytest.skip(f"缓存模块导入失败: {e}", allow_module_level=True)
+
+
+def test_lru_eviction_respects_memory_cap():
+    """超出容量时淘汰最久未访问的条目"""
+    cache = DataCacheManager(max_memory_mb=1, num_shards=1)
+    cache.put("hot", "h", DataType.REALTIME, size_bytes=300 * 1024)
+    cache.put("cold", "c", DataType.REALTIME, size_bytes=300 * 1024)
+    cache.put("warm", "w", DataType.REALTIME, size_bytes=300 * 1024)
+    assert cache.get("hot") == "h"  # hot 变为最近访问
+
+    cache.put("new", "n", DataType.REALTIME, size_bytes=300 * 1024)
+
+    assert cache.get("cold") is None
+    assert cache.get("hot") == "h"
+    stats = cache.get_stats()
+    assert stats.eviction_count == 1
+    assert stats.total_size_bytes <= cache.max_memory_bytes
+
+
+
+def test_large_entries_share_global_budget():
+    """大于单个分片份额的条目按总预算缓存，不清空所在分片；超过总预算的条目不缓存"""
+    cache = DataCacheManager(max_memory_mb=1, num_shards=16)
+    for i in range(4):
+        assert cache.put(f"big{i}", i, DataType.HISTORICAL, size_bytes=200 * 1024)
+    for i in range(32):
+        cache.put(f"small{i}", i, DataType.REALTIME, size_bytes=1024)
+
+    assert all(cache.get(f"big{i}") == i for i in range(4))
+    assert all(cache.get(f"small{i}") == i for i in range(32))
+    assert cache.get_stats().eviction_count == 0
+
+    cache.put("big4", 4, DataType.HISTORICAL, size_bytes=200 * 1024)
+    assert cache.get("small0") is not None and cache.get("big0") is None
+    assert cache.get_stats().total_size_bytes <= cache.max_memory_bytes
+
+    assert not cache.put("huge", 0, DataType.HISTORICAL, size_bytes=2 * 1024 * 1024)
+    assert cache.get("huge") is None
+
+def test_ttl_cleanup_only_touches_expired_entries():
+    """时间轮清理只移除到期条目，并同步类型索引"""
+    cache = DataCacheManager(max_memory_mb=1)
+    cache.put("short", {"a": 1}, DataType.METADATA, ttl=0)
+    cache.put("long", {"b": 2}, DataType.METADATA, ttl=300)
+    time.sleep(1.1)
+
+    assert cache.cleanup_expired() == 1
+    assert cache.get_by_type(DataType.METADATA) == [{"b": 2}]
+    assert cache.get_stats().total_entries == 1
+
+
+def test_overwrite_updates_size_and_index():
+    """覆盖写入时替换大小统计和类型索引"""
+    cache = DataCacheManager(max_memory_mb=1)
+    cache.put("k", "x" * 10, DataType.REALTIME)
+    cache.put("k", "y" * 20, DataType.HISTORICAL)
+
+    assert cache.get_stats().total_size_bytes == 20
+    assert cache.get_by_type(DataType.REALTIME) == []
+    assert cache.get_by_type(DataType.HISTORICAL) == ["y" * 20]
+    assert cache.clear_by_type(DataType.HISTORICAL) == 1
+    assert cache.get_stats().total_entries == 0
+
+
+def test_timer_wheel_advance():
+    """时间轮只返回已到期的key"""
+    wheel = TimerWheel()
+    now = time.time()
+    wheel.schedule("a", now + 0.5)
+    wheel.schedule("b", now + 30)
+    assert wheel.advance(now) == []
+    assert wheel.advance(now + 5) == ["a"]
+    wheel.unschedule("b", now + 30)
+    assert wheel.advance(now + 60) == []
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据去重系统测试
+验证批量去重与逐条去重一致、布隆过滤器按容量扩容并补入其他实例的写入，
+以及写入失败时不更新内存状态
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from data_deduplication_system import DataDeduplicationSystem, WindowedBloomFilter
+except ImportError as e:
+    pytest.skip(f"去重模块导入失败: {e}", allow_module_level=True)
+
+
+def _records(n):
+    records = []
+    for i in range(n):
+        draw = i % (n // 2)  # 后半段与前半段 draw_id 重复
+        records.append(({
+            'draw_id': f'PC28_{draw:05d}',
+            'issue': str(draw),
+            'numbers': [draw % 10, (draw // 10) % 10, (draw // 100) % 10],
+            'timestamp': f'2026-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}.{i}'
+        }, f'rec_{i}'))
+    return records
+
+
+def test_batch_matches_sequential(tmp_path):
+    """批量处理与逐条处理结果一致，批内重复也被拦截"""
+    records = _records(400)
+    sequential = DataDeduplicationSystem(str(tmp_path / "seq.db"))
+    batched = DataDeduplicationSystem(str(tmp_path / "batch.db"))
+
+    expected = [record_id for record, record_id in records if sequential.process_record(record, record_id)]
+    actual = [record_id for _, record_id in batched.batch_process(records, batch_size=150)]
+
+    assert actual == expected
+    assert batched.get_statistics().duplicates_blocked == sequential.get_statistics().duplicates_blocked
+
+
+def test_restart_detects_duplicates_from_database(tmp_path):
+    """重启后布隆过滤器从库中预热，窗口内的重复仍能识别"""
+    db_path = str(tmp_path / "dedup.db")
+    records = _records(100)[:50]
+    DataDeduplicationSystem(db_path).batch_process(records)
+
+    restarted = DataDeduplicationSystem(db_path, max_cache_size=5)
+    assert restarted.batch_process(records) == []
+    assert len(restarted.memory_cache) <= 5
+
+
+
+def test_other_process_writes_are_seen_by_bloom(tmp_path):
+    """另一实例在预热之后写入的哈希在下一批判定前补入，重复不会被漏掉"""
+    db_path = str(tmp_path / "dedup.db")
+    records = _records(100)[:50]
+    reader = DataDeduplicationSystem(db_path)
+    writer = DataDeduplicationSystem(db_path)
+    unique = writer.batch_process(records)
+    assert unique
+
+    assert reader.batch_process(unique) == []
+    assert not reader.process_record(*unique[0])
+
+def test_windowed_bloom_rotation():
+    """键在时间窗口内可查到，两代之后过期"""
+    bloom = WindowedBloomFilter(window=10, capacity=256)
+    key = 'a' * 32
+    bloom.add(key, now=0)
+    assert bloom.might_contain(key, now=9)
+    assert bloom.might_contain(key, now=15)
+    assert not bloom.might_contain(key, now=25)
+    assert not bloom.might_contain('b' * 32, now=25)
+
+
+def test_windowed_bloom_scales_past_capacity():
+    """窗口内键数远超预期容量时追加过滤器，已写入的键仍可查到，误判率仍在目标附近"""
+    bloom = WindowedBloomFilter(window=3600, capacity=100, error_rate=0.01)
+    keys = [hashlib.md5(f'key{i}'.encode()).hexdigest() for i in range(2000)]
+    for key in keys:
+        bloom.add(key, now=0)
+
+    filters = bloom.generations[-1][1]
+    assert len(filters) > 1 and all(f.count <= f.capacity for f in filters)
+    assert all(bloom.might_contain(key, now=1) for key in keys)
+    probes = [hashlib.md5(f'other{i}'.encode()).hexdigest() for i in range(10000)]
+    assert sum(bloom.might_contain(key, now=1) for key in probes) / len(probes) < 0.02
+
+
+def test_failed_commit_leaves_cache_and_bloom_untouched(tmp_path):
+    """批量写入失败时回滚，LRU 和布隆过滤器不记下未落库的哈希，重试时照常写入"""
+    system = DataDeduplicationSystem(str(tmp_path / "dedup.db"))
+    records = _records(20)[:10]
+
+    class FailingCommit:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def commit(self):
+            raise sqlite3.OperationalError('disk I/O error')
+
+    real_conn = system._get_connection()
+    system._conn = FailingCommit(real_conn)
+    assert len(system.batch_process(records)) == 10  # 出错时放行
+    assert len(system.memory_cache) == 0
+    draw_rule = system.rules[0]
+    bloom = system.bloom_filters[draw_rule.rule_name]
+    assert not any(bloom.might_contain(system.generate_record_hash(record, draw_rule)) for record, _ in records)
+    assert real_conn.execute('SELECT COUNT(*) FROM record_hashes').fetchone()[0] == 0
+
+    system._conn = real_conn
+    assert len(system.batch_process(records)) == 10
+    assert len(system.memory_cache) > 0
+    assert system.batch_process(records) == []
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据流转系统新开奖事件测试
+验证下期开奖倒计时按北京时间计算，上游不带时区和带时区的时间都能处理
+"""
+
+import os
+import sys
+import threading
+import types
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import enhanced_data_flow_system
+    from enhanced_data_flow_system import EnhancedDataFlowSystem, DataFlowMetrics
+except ImportError as e:
+    pytest.skip(f"数据流转模块导入失败: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def flow_system():
+    # 不初始化数据库和调度器，只覆盖事件处理
+    system = EnhancedDataFlowSystem.__new__(EnhancedDataFlowSystem)
+    system.lock = threading.Lock()
+    system.metrics = DataFlowMetrics()
+    system.saved = []
+    system._batch_save_optimized_records = lambda records: system.saved.extend(records) or len(records)
+    system._calculate_speed_improvement = lambda elapsed: 0.0
+    return system
+
+
+@pytest.mark.parametrize("fmt", ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S+08:00"])
+def test_countdown_uses_china_time(flow_system, fmt):
+    """不带时区的下期时间按北京时间解析，倒计时与本机时区无关"""
+    next_time = (datetime.now(enhanced_data_flow_system.CHINA_TZ) + timedelta(seconds=120)).strftime(fmt)
+    draw = {'draw_id': '3300001', 'result_numbers': [1, 5, 9], 'timestamp': '2026-01-01 12:00:00',
+            'next_issue': '3300002', 'next_time': next_time}
+
+    flow_system._on_new_draw_event(types.SimpleNamespace(draw=draw))
+
+    assert len(flow_system.saved) == 1
+    assert 115 <= flow_system.saved[0].countdown_seconds <= 120
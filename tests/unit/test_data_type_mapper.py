@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据类型映射器测试
+验证预编译行转换函数与逐值 convert_value 结果一致
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from data_type_mapper import DataTypeMapper
+except ImportError as e:
+    pytest.skip(f"类型映射模块导入失败: {e}", allow_module_level=True)
+
+
+SCHEMA = {
+    'draw_id': 'TEXT',
+    'result_sum': 'INTEGER',
+    'p_win': 'REAL',
+    'is_active': 'BOOLEAN',
+    'created_at': 'TIMESTAMP',
+    'meta': 'JSON',
+}
+
+
+def test_row_converter_matches_convert_value():
+    """预编译转换与逐值转换结果一致"""
+    mapper = DataTypeMapper()
+    convert = mapper.compile_sqlite_row_converter(SCHEMA)
+    row = {
+        'draw_id': 3001,
+        'result_sum': '14',
+        'p_win': '0.62',
+        'is_active': 1,
+        'created_at': '2026-01-01 08:00:00',
+        'meta': '{"a": 1}',
+    }
+
+    converted = convert(row)
+
+    for column, sqlite_type in SCHEMA.items():
+        pg_type = mapper.map_sqlite_type(sqlite_type)
+        assert converted[column] == mapper.convert_value(row[column], pg_type)
+
+
+def test_row_converter_handles_none_and_unknown_columns():
+    """None 保持为 None，schema 外的日期时间列转为 ISO 字符串"""
+    convert = DataTypeMapper().compile_sqlite_row_converter(SCHEMA)
+    stamp = datetime(2026, 1, 1, 8, 0, 0)
+
+    converted = convert({'result_sum': None, 'extra_ts': stamp, 'extra': 'x'})
+
+    assert converted == {'result_sum': None, 'extra_ts': stamp.isoformat(), 'extra': 'x'}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开奖列式存储测试
+验证追加去重、日期索引、跨进程可见性、按时间重排（新一代文件原子切换）和服务配置开关
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    from draw_column_store import DrawColumnStore, open_configured_column_store
+except ImportError as e:
+    pytest.skip(f"列式存储模块导入失败: {e}", allow_module_level=True)
+
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def _draws(start, count):
+    return [{
+        'draw_id': str(3300000 + i),
+        'timestamp': (BASE_TIME + timedelta(minutes=3 * i)).strftime('%Y-%m-%d %H:%M:%S'),
+        'result_digits': [i % 10, (i // 10) % 10, (i // 100) % 10]
+    } for i in range(start, start + count)]
+
+
+def test_append_dedup_and_columns(tmp_path):
+    """重复期号被跳过，和值/大小/单双由号码计算，整列为只读视图"""
+    store = DrawColumnStore(str(tmp_path / "store"), initial_capacity=16)
+    assert store.append(_draws(0, 1000)) == 1000
+    assert store.append(_draws(990, 20)) == 10
+
+    sums = store.column('sum')
+    expected = np.array([sum(d['result_digits']) for d in _draws(0, 1010)])
+    assert len(store) == 1010
+    assert np.array_equal(sums, expected)
+    assert np.array_equal(store.column('big'), expected >= 14)
+    assert np.array_equal(store.column('odd'), expected % 2 == 1)
+    assert not sums.flags.writeable
+    assert store.sum_distribution().sum() == 1010
+    assert '3300005' in store
+
+
+def test_date_index_and_reader_refresh(tmp_path):
+    """日期索引返回连续切片，只读实例 refresh 后看到新增数据"""
+    path = str(tmp_path / "store")
+    writer = DrawColumnStore(path)
+    writer.append(_draws(480, 480))  # 第二天
+    reader = DrawColumnStore(path, readonly=True)
+    assert len(reader) == 480
+
+    writer.append(_draws(0, 480))  # 回填第一天
+    reader.refresh()
+    assert len(reader) == 960
+    assert reader.date_slices('2026-01-01') == [slice(480, 960)]
+    assert reader.date_slices('2026-01-01', '2026-01-02') == [slice(0, 960)]
+    day = reader.columns_for_dates('2026-01-02', names=['draw_id'])['draw_id']
+    assert day[0] == b'3300480' and len(day) == 480
+
+
+def test_compact_orders_rows_by_time(tmp_path):
+    """乱序回填后重排，每天只剩一个区间且数据保持对应"""
+    store = DrawColumnStore(str(tmp_path / "store"))
+    store.append(_draws(500, 100))
+    store.append(_draws(0, 500))
+    store.compact()
+
+    assert np.all(np.diff(store.column('timestamp')) > 0)
+    assert store.date_slices('2026-01-01') == [slice(0, 480)]
+    assert store.date_slices('2026-01-02') == [slice(480, 600)]
+    reopened = DrawColumnStore(str(tmp_path / "store"))
+    assert reopened.column('draw_id')[0] == b'3300000'
+    assert np.array_equal(reopened.column('sum'), store.column('sum'))
+
+
+def test_compact_switches_generation_atomically_for_readers(tmp_path):
+    """重排不改写读者正在映射的文件，读者 refresh 后整体切换到新一代"""
+    path = str(tmp_path / "store")
+    writer = DrawColumnStore(path)
+    writer.append(_draws(480, 480))
+    writer.append(_draws(0, 480))
+    reader = DrawColumnStore(path, readonly=True)
+    before = reader.columns_for_dates('2026-01-01', names=['draw_id', 'sum'])
+
+    writer.compact()
+
+    still = reader.columns_for_dates('2026-01-01', names=['draw_id', 'sum'])
+    assert np.array_equal(still['draw_id'], before['draw_id'])
+    assert np.array_equal(still['sum'], before['sum'])
+    reader.refresh()
+    assert reader.generation == writer.generation == 1
+    assert reader.date_slices('2026-01-01') == [slice(0, 480)]
+    assert reader.column('draw_id')[0] == b'3300000'
+    assert sorted(os.listdir(path)) == sorted(['meta.json'] + [f'{name}.1.bin' for name in writer._maps])
+
+
+def test_crash_during_compact_leaves_store_intact(tmp_path, monkeypatch):
+    """meta.json 替换前失败时仍使用旧一代数据，重新打开时清理半成品文件"""
+    path = str(tmp_path / "store")
+    store = DrawColumnStore(path)
+    store.append(_draws(480, 100))
+    store.append(_draws(0, 100))
+    expected = store.column('draw_id').copy()
+
+    def crash():
+        raise OSError('disk full')
+
+    monkeypatch.setattr(store, '_save_meta', crash)
+    with pytest.raises(OSError):
+        store.compact()
+
+    reopened = DrawColumnStore(path)
+    assert reopened.generation == 0
+    assert np.array_equal(reopened.column('draw_id'), expected)
+    assert not any('.1.bin' in name for name in os.listdir(path))
+
+
+def test_configured_store_is_opt_in_with_absolute_path(tmp_path):
+    """服务配置默认不打开存储；开启时必须给绝对路径，同一路径共享一个实例"""
+    assert open_configured_column_store(None) is None
+    assert open_configured_column_store({'path': str(tmp_path / "store")}) is None
+    with pytest.raises(ValueError):
+        open_configured_column_store({'enabled': True})
+    with pytest.raises(ValueError):
+        open_configured_column_store({'enabled': True, 'path': 'draw_store'})
+
+    settings = {'enabled': True, 'path': str(tmp_path / "store")}
+    store = open_configured_column_store(settings)
+    assert store is open_configured_column_store(dict(settings))
+    assert store.path == str(tmp_path / "store")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开奖接入与事件总线测试
+验证单点轮询去重、有界队列背压、自适应轮询间隔、数据停更时的退避和按上游账号共享接入
+"""
+
+import os
+import sys
+import threading
+import types
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    import draw_event_bus
+    from draw_event_bus import CHINA_TZ, DrawEvent, DrawEventBus, DrawIngest, Topic, get_shared_draw_ingest
+    from upstream_client import AsyncUpstreamClient
+except ImportError as e:
+    pytest.skip(f"事件总线模块导入失败: {e}", allow_module_level=True)
+
+
+NOW = datetime(2026, 1, 1, 12, 0, 0, tzinfo=CHINA_TZ)
+
+
+class FakeClient:
+    """按顺序返回预设响应的上游客户端"""
+
+    parse_lottery_data = staticmethod(AsyncUpstreamClient.parse_lottery_data)
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def get_realtime_lottery(self):
+        self.requests += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _response(issue, next_time='2026-01-01 12:01:40'):
+    return {'codeid': 10000, 'retdata': {
+        'curent': {'long_issue': str(issue), 'kjtime': '2026-01-01 11:58:10', 'number': ['1', '5', '9']},
+        'next': {'next_issue': str(issue + 1), 'next_time': next_time}
+    }}
+
+
+def test_single_poller_dedupes_and_fans_out():
+    """同一期只发布一次 new_draw，每次成功轮询发布 data_update，失败发布告警"""
+    client = FakeClient([_response(3300001), _response(3300001), RuntimeError("timeout"), _response(3300002)])
+    ingest = DrawIngest(client, now=lambda: NOW)
+    consumers = [ingest.bus.subscribe(name) for name in ('realtime', 'notify', 'optimizer', 'flow')]
+
+    for _ in range(4):
+        ingest.poll_once()
+
+    assert client.requests == 4
+    for consumer in consumers:
+        topics = [consumer.get(timeout=0).topic for _ in range(6)]
+        assert topics == [Topic.NEW_DRAW, Topic.DATA_UPDATE, Topic.DATA_UPDATE, Topic.SYSTEM_ALERT,
+                          Topic.NEW_DRAW, Topic.DATA_UPDATE]
+        assert consumer.get(timeout=0) is None
+    assert ingest.stats['new_draws'] == 2 and ingest.stats['duplicates'] == 1
+    assert ingest.latest_draw['next_issue'] == '3300003'
+
+
+
+def test_list_retdata_is_parsed_without_alert():
+    """retdata 为列表（历史接口格式）时正常解析，不当作轮询失败"""
+    response = {'codeid': 10000, 'retdata': [
+        {'long_issue': '3300001', 'kjtime': '2026-01-01 11:58:10', 'number': ['1', '5', '9']}
+    ]}
+    ingest = DrawIngest(FakeClient([response]), now=lambda: NOW)
+
+    draw = ingest.poll_once()
+    assert draw['draw_id'] == '3300001' and draw['next_time'] is None
+    assert ingest.stats['new_draws'] == 1 and ingest.misses == 0
+
+def test_slow_subscriber_only_drops_its_own_backlog():
+    """慢订阅者队列满后丢弃最旧事件，其他订阅者照常收到全部事件"""
+    bus = DrawEventBus()
+    release = threading.Event()
+    received = []
+    done = threading.Event()
+
+    def slow(event):
+        release.wait(5)
+
+    def fast(event):
+        received.append(event.draw['draw_id'])
+        if len(received) == 20:
+            done.set()
+
+    slow_sub = bus.subscribe('telegram', slow, topics=[Topic.NEW_DRAW], maxsize=5)
+    bus.subscribe('decision', fast, topics=['new_draw'])
+    for i in range(20):
+        bus.publish(DrawEvent(Topic.NEW_DRAW, NOW.isoformat(), draw={'draw_id': i}))
+
+    assert done.wait(5)
+    assert received == list(range(20))
+    metrics = bus.get_metrics()
+    assert metrics['published']['new_draw'] == 20
+    assert metrics['subscribers']['telegram']['dropped'] >= 14
+    assert metrics['subscribers']['telegram']['max_depth'] == 5
+    release.set()
+    slow_sub.close()
+
+
+def test_poll_interval_follows_next_draw_time():
+    """按下期开奖时间睡眠，开奖时间已过按最短间隔追取，未知时用默认间隔"""
+    now = [NOW]
+    ingest = DrawIngest(FakeClient([_response(3300001), _response(3300001, next_time=None)]),
+                        min_interval=2, max_interval=300, default_interval=30, grace_seconds=3,
+                        now=lambda: now[0])
+    assert ingest.next_interval() == 30
+
+    ingest.poll_once()
+    assert ingest.next_interval() == pytest.approx(103)
+
+    now[0] = NOW.replace(minute=2)
+    assert ingest.next_interval() == 2
+
+    ingest.poll_once()  # 无 next_time 时按开奖时间 + 180 秒估算
+    now[0] = NOW
+    assert ingest.next_interval() == pytest.approx(70 + 3)
+
+
+def test_poll_interval_backs_off_while_feed_is_stale():
+    """开奖时间已过仍无新期号或连续失败时间隔指数增长到上限，拿到新期号后恢复"""
+    responses = [_response(3300001)] * 7 + [RuntimeError('upstream down')] * 2 + [_response(3300002)]
+    ingest = DrawIngest(FakeClient(responses), min_interval=2, max_interval=60, grace_seconds=3,
+                        now=lambda: NOW.replace(minute=5))
+    intervals = []
+    for _ in range(9):
+        ingest.poll_once()
+        intervals.append(ingest.next_interval())
+
+    assert intervals == [2, 2, 4, 8, 16, 32, 60, 60, 60]
+    assert ingest.get_status()['consecutive_misses'] == 8
+
+    ingest.poll_once()
+    assert ingest.misses == 0
+    assert ingest.next_interval() == 2
+
+
+def test_shared_ingest_keyed_by_upstream_account(monkeypatch):
+    """同一 appid 的不同客户端对象共用一个接入组件，不同 appid 各自独立"""
+    monkeypatch.setattr(draw_event_bus, '_shared_ingests', {})
+    realtime = types.SimpleNamespace(async_client=types.SimpleNamespace(appid='45928'))
+    backfill = types.SimpleNamespace(appid='45928')
+    other = types.SimpleNamespace(appid='10001')
+
+    ingest = get_shared_draw_ingest(realtime)
+    assert get_shared_draw_ingest(backfill) is ingest
+    assert get_shared_draw_ingest(other) is not ingest
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史数据备份测试
+验证分块流式备份、分块校验、按写入顺序的增量备份、批量恢复（含旧格式 SQL 转储）和 Merkle 哈希索引
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from historical_data_protection import BackupInfo, HistoricalDataProtection
+except ImportError as e:
+    pytest.skip(f"历史数据保护模块导入失败: {e}", allow_module_level=True)
+
+
+BASE_TIME = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _insert_draws(db_path, start, count):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lottery_records (
+                draw_id TEXT PRIMARY KEY, issue TEXT NOT NULL, numbers TEXT NOT NULL,
+                sum_value INTEGER NOT NULL, big_small TEXT NOT NULL, odd_even TEXT NOT NULL,
+                dragon_tiger TEXT NOT NULL, timestamp DATETIME NOT NULL
+            )
+        """)
+        conn.executemany("INSERT INTO lottery_records VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (f"PC28_{i:06d}", str(i), json.dumps([i % 10, i % 7, i % 3]), i % 28,
+             '大' if i % 28 >= 14 else '小', '单' if i % 2 else '双', '龙',
+             (BASE_TIME + timedelta(minutes=i)).isoformat())
+            for i in range(start, start + count)
+        ])
+
+
+@pytest.fixture
+def protection(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / "lottery.db")
+    _insert_draws(db_path, 0, 1050)
+    return HistoricalDataProtection(db_path=db_path, backup_dir=str(tmp_path / "backups"),
+                                    backup_workers=2)
+
+
+def _table_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT * FROM lottery_records ORDER BY draw_id").fetchall()
+
+
+def test_chunked_backup_restores_identical_rows(protection):
+    """分块备份恢复后与原表逐行一致"""
+    original = _table_rows(protection.db_path)
+    backup = protection.create_backup("full", chunk_rows=100)
+    manifest = protection._load_manifest(backup)
+
+    assert backup.status == "completed" and backup.record_count == 1050
+    assert [chunk['rows'] for chunk in manifest['chunks']] == [100] * 10 + [50]
+    assert protection.verify_backup(backup.backup_id)['valid']
+
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DELETE FROM lottery_records WHERE sum_value < 10")
+        conn.execute("UPDATE lottery_records SET big_small = 'x'")
+
+    assert protection.restore_from_backup(backup.backup_id, batch_size=64)
+    assert _table_rows(protection.db_path) == original
+
+
+def test_corrupted_chunk_is_detected_and_restore_aborts(protection):
+    """损坏的分块被定位，恢复失败时原数据保持不变"""
+    backup = protection.create_backup("full", chunk_rows=200)
+    manifest = protection._load_manifest(backup)
+    target = manifest['chunks'][2]
+    with open(backup.file_path, 'r+b') as f:
+        f.seek(target['offset'] + target['length'] // 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    result = protection.verify_backup(backup.backup_id)
+    assert result['corrupted_chunks'] == [2]
+    assert protection.verify_backup(backup.backup_id, chunk_index=1)['valid']
+
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DELETE FROM lottery_records WHERE draw_id = 'PC28_000010'")
+    assert not protection.restore_from_backup(backup.backup_id)
+    assert len(_table_rows(protection.db_path)) == 1049
+
+    assert protection.restore_chunk(backup.backup_id, 0) == 200
+    assert len(_table_rows(protection.db_path)) == 1050
+
+
+
+def test_legacy_sql_dump_backup_is_restored(protection, tmp_path):
+    """没有清单的旧格式 gzip SQL 转储仍可恢复"""
+    original = _table_rows(protection.db_path)
+    lines = ["-- PC28历史数据备份", "", "CREATE TABLE IF NOT EXISTS lottery_records (",
+             "    draw_id TEXT PRIMARY KEY,", "    issue TEXT NOT NULL,", "    numbers TEXT NOT NULL,",
+             "    sum_value INTEGER NOT NULL,", "    big_small TEXT NOT NULL,", "    odd_even TEXT NOT NULL,",
+             "    dragon_tiger TEXT NOT NULL,", "    timestamp DATETIME NOT NULL", ");", "",
+             "-- 插入数据", "BEGIN TRANSACTION;"]
+    lines += [
+        "INSERT OR REPLACE INTO lottery_records VALUES ("
+        + ", ".join(str(v) if isinstance(v, int) else f"'{v}'" for v in row) + ");"
+        for row in original
+    ]
+    lines += ["COMMIT;", "", "-- 备份完成"]
+    backup_file = tmp_path / "backups" / "backup_full_1700000000.gz"
+    with gzip.open(backup_file, 'wt', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    protection._save_backup_record(BackupInfo(
+        backup_id="backup_full_1700000000", backup_time=datetime.now(), backup_type="full",
+        file_path=str(backup_file), file_size=backup_file.stat().st_size, record_count=len(original),
+        checksum=protection._calculate_file_checksum(backup_file), compression=True, status="completed"
+    ))
+
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DELETE FROM lottery_records WHERE sum_value < 10")
+        conn.execute("UPDATE lottery_records SET big_small = 'x'")
+        conn.execute("INSERT INTO lottery_records SELECT 'EXTRA', issue, numbers, sum_value, big_small, "
+                     "odd_even, dragon_tiger, timestamp FROM lottery_records LIMIT 1")
+
+    assert protection.restore_from_backup("backup_full_1700000000")
+    assert _table_rows(protection.db_path) == original
+
+def test_incremental_backup_starts_from_last_manifest(protection):
+    """增量备份只包含上次清单高水位之后的记录"""
+    full = protection.create_backup("full", chunk_rows=500)
+    _insert_draws(protection.db_path, 1050, 30)
+
+    incremental = protection.create_backup("incremental", chunk_rows=500)
+    manifest = protection._load_manifest(incremental)
+
+    assert incremental.record_count == 30
+    assert manifest['since_rowid'] == protection._load_manifest(full)['high_water_rowid']
+    assert manifest['chunks'][0]['first_key'] == "PC28_001050"
+    assert protection.create_backup("incremental").record_count == 0
+
+
+def test_incremental_backup_includes_late_arriving_old_draws(protection):
+    """开奖时间早于上次备份的补录记录和重写记录按写入顺序进入下一次增量备份"""
+    protection.create_backup("full")
+    _insert_draws(protection.db_path, 5000, 1)
+    protection.create_backup("incremental")
+
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DELETE FROM lottery_records WHERE draw_id = 'PC28_000200'")
+        conn.execute("UPDATE lottery_records SET timestamp = ? WHERE draw_id = 'PC28_005000'",
+                     ((BASE_TIME - timedelta(days=1)).isoformat(),))
+        conn.execute("INSERT OR REPLACE INTO lottery_records SELECT * FROM lottery_records WHERE draw_id = 'PC28_000300'")
+    _insert_draws(protection.db_path, 200, 1)  # 补录一期开奖时间很早的记录
+
+    incremental = protection.create_backup("incremental")
+    manifest = protection._load_manifest(incremental)
+    keys = sorted(key for chunk in manifest['chunks'] for key in (chunk['first_key'], chunk['last_key']))
+    assert incremental.record_count == 2
+    assert keys == ["PC28_000200", "PC28_000300"]
+
+
+def test_merkle_index_only_rehashes_dirty_days(protection):
+    """无变化时不重新扫描；修改的记录被定位并持续报告，新记录补写叶子哈希"""
+    with sqlite3.connect(protection.db_path) as conn:
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+        root = protection.get_merkle_root()
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+        assert protection.get_merkle_root() == root
+
+        conn.execute("UPDATE lottery_records SET sum_value = 99 WHERE draw_id = 'PC28_000005'")
+        conn.commit()
+        assert protection._check_hash_integrity(conn, "lottery_records") == 1
+        assert protection._check_hash_integrity(conn, "lottery_records") == 1
+
+        conn.execute("UPDATE lottery_records SET sum_value = 5 WHERE draw_id = 'PC28_000005'")
+        conn.commit()
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+        assert protection.get_merkle_root() == root
+
+    _insert_draws(protection.db_path, 1050, 10)
+    with sqlite3.connect(protection.db_path) as conn:
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+        assert protection.get_merkle_root() != root
+        with sqlite3.connect(protection.protection_db) as pconn:
+            assert pconn.execute("SELECT COUNT(*) FROM data_hashes").fetchone()[0] == 1060
+
+        # 绕过触发器的修改只有全量校验能发现
+        conn.execute("DROP TRIGGER trg_lottery_records_merkle_update")
+        conn.execute("UPDATE lottery_records SET numbers = '[]' WHERE draw_id = 'PC28_000100'")
+        conn.commit()
+        assert protection._check_hash_integrity(conn, "lottery_records", full_scan=True) == 1
+
+
+def test_change_tracking_installed_at_init_and_root_recomputed(protection):
+    """触发器在初始化时安装；无脏桶时由天摘要重算根节点，索引被改写时全表重建"""
+    with sqlite3.connect(protection.db_path) as conn:
+        assert protection._change_tracking_installed(conn, "lottery_records")
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+    root = protection.get_merkle_root()
+
+    with sqlite3.connect(protection.protection_db) as pconn:
+        day, digest = pconn.execute(
+            "SELECT node_key, digest FROM merkle_nodes WHERE level = 0 ORDER BY node_key LIMIT 1").fetchone()
+        pconn.execute("UPDATE merkle_nodes SET digest = 'tampered' WHERE level = 0 AND node_key = ?", (day,))
+
+    with sqlite3.connect(protection.db_path) as conn:
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+    with sqlite3.connect(protection.protection_db) as pconn:
+        assert pconn.execute("SELECT digest FROM merkle_nodes WHERE level = 0 AND node_key = ?",
+                             (day,)).fetchone()[0] == digest
+    assert protection.get_merkle_root() == root
+
+    # 校验不负责安装触发器：缺失时退回全表校验
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DROP TRIGGER trg_lottery_records_merkle_insert")
+        conn.execute("UPDATE lottery_records SET sum_value = 99 WHERE draw_id = 'PC28_000007'")
+        conn.commit()
+        conn.execute("DELETE FROM merkle_dirty_buckets")
+        conn.commit()
+        assert protection._check_hash_integrity(conn, "lottery_records") == 1
+        assert not protection._change_tracking_installed(conn, "lottery_records")
+
+
+def test_unchanged_check_uses_trigger_row_count(protection):
+    """无变化时核对触发器维护的行数，不执行 COUNT(*)；覆盖写入已有行时行数不变"""
+    with sqlite3.connect(protection.db_path) as conn:
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+
+        statements = []
+        conn.set_trace_callback(statements.append)
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+        conn.set_trace_callback(None)
+        assert not [sql for sql in statements if "COUNT(*)" in sql]
+
+        conn.execute("INSERT OR REPLACE INTO lottery_records SELECT * FROM lottery_records WHERE draw_id = 'PC28_000003'")
+        conn.execute("INSERT OR IGNORE INTO lottery_records SELECT * FROM lottery_records WHERE draw_id = 'PC28_000004'")
+        conn.execute("DELETE FROM lottery_records WHERE draw_id = 'PC28_000005'")
+        conn.commit()
+        assert conn.execute("SELECT row_count FROM merkle_row_counts").fetchone()[0] == 1049
+        assert protection._check_hash_integrity(conn, "lottery_records") == 0
+
+    # 旧版本触发器没有行数维护：重新安装时重建触发器并按现有数据初始化
+    with sqlite3.connect(protection.db_path) as conn:
+        conn.execute("DELETE FROM merkle_row_counts")
+        protection.install_change_tracking(conn, "lottery_records")
+        conn.commit()
+        assert conn.execute("SELECT row_count FROM merkle_row_counts").fetchone()[0] == 1049
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史数据API测试
+验证分片规划、按分片补洞合并、有界提交窗口、数据源并发限制、分块写入和逐行的写入/失败计数
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import historical_data_api
+    from historical_data_api import HistoricalDataAPI
+except ImportError as e:
+    pytest.skip(f"历史数据API模块导入失败: {e}", allow_module_level=True)
+
+
+START = datetime(2026, 1, 1)
+END = START + timedelta(days=1) - timedelta(seconds=1)
+DRAWS = [{'issue': str(i), 'timestamp': (START + timedelta(minutes=3 * i)).isoformat()} for i in range(480)]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(historical_data_api, 'default', lambda: (None, None))
+    monkeypatch.setattr(historical_data_api.bigquery, 'Client', lambda **kwargs: None)
+    monkeypatch.setattr(historical_data_api.storage, 'Client', lambda **kwargs: None)
+    return HistoricalDataAPI(source_concurrency={'bigquery': 3, 'gcs': 2})
+
+
+def _source(keep, active, peak, key, lock):
+    def fetch(start_time, end_time):
+        with lock:
+            active[key] += 1
+            peak[key] = max(peak[key], active[key])
+        time.sleep(0.005)
+        with lock:
+            active[key] -= 1
+        return [d for d in DRAWS
+                if start_time <= datetime.fromisoformat(d['timestamp']) <= end_time and keep(d)]
+    return fetch
+
+
+def test_plan_shards_cover_range_without_overlap():
+    """分片首尾相接不重叠，短范围按小时、长范围按天"""
+    hourly = HistoricalDataAPI.plan_shards(START, END)
+    assert len(hourly) == 24
+    assert hourly[0] == (START, START + timedelta(hours=1) - timedelta(microseconds=1))
+    assert hourly[-1][1] == END
+
+    daily = HistoricalDataAPI.plan_shards(START, START + timedelta(days=10))
+    assert len(daily) == 11
+    assert all(later[0] - earlier[1] == timedelta(microseconds=1) for earlier, later in zip(daily, daily[1:]))
+
+
+def test_shards_fill_holes_from_next_source(api):
+    """BigQuery只覆盖部分期号时由GCS补齐，各源并发不超过限制"""
+    active, peak, lock = {'bigquery': 0, 'gcs': 0}, {'bigquery': 0, 'gcs': 0}, threading.Lock()
+    api.fetch_from_bigquery_history = _source(lambda d: int(d['issue']) % 20 < 12, active, peak, 'bigquery', lock)
+    api.fetch_from_external_api = lambda start_time, end_time: []
+    api.fetch_from_gcs_backup = _source(lambda d: True, active, peak, 'gcs', lock)
+
+    data = api.get_historical_data(START, END)
+
+    assert [d['issue'] for d in data] == [d['issue'] for d in DRAWS]
+    assert peak['bigquery'] <= 3 and peak['gcs'] <= 2
+
+
+def test_shards_are_submitted_through_a_bounded_window(api):
+    """在途分片数不超过窗口，提前退出时不会继续获取剩余分片"""
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch(start_time, end_time):
+        with lock:
+            fetched.append(start_time)
+        time.sleep(0.002)
+        return [d for d in DRAWS if start_time <= datetime.fromisoformat(d['timestamp']) <= end_time]
+
+    api.fetch_from_bigquery_history = fetch
+    window = sum(api.source_concurrency.values())
+    shards = api.iter_historical_shards(START, START + timedelta(days=10), shard_size=timedelta(hours=1))
+    first = next(shards)
+    with lock:
+        assert len(fetched) <= window + 1
+    shards.close()
+
+    assert first.records
+    assert len(fetched) <= 2 * window < 240
+
+
+def test_backfill_streams_chunked_inserts(api):
+    """回填按分块写入，并报告不完整的分片"""
+    api.fetch_from_bigquery_history = lambda start_time, end_time: [
+        d for d in DRAWS if start_time <= datetime.fromisoformat(d['timestamp']) <= end_time and int(d['issue']) < 400
+    ]
+    api.fetch_from_external_api = lambda start_time, end_time: []
+    api.fetch_from_gcs_backup = lambda start_time, end_time: []
+    chunks = []
+    api.insert_historical_data = lambda rows, chunk_size=500: chunks.append(len(rows)) or (len(rows), 0)
+
+    summary = api.backfill_range(START, END, chunk_size=100)
+
+    assert summary['inserted'] == sum(chunks) == 400
+    assert max(chunks) == 100
+    assert len(summary['incomplete_shards']) == 4
+
+
+class _PartialClient:
+    """第 2 个分块有两行被拒绝，第 3 个分块请求异常"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_table(self, table_id):
+        return table_id
+
+    def insert_rows_json(self, table, rows):
+        self.calls += 1
+        if self.calls == 2:
+            return [{'index': 3, 'errors': [{'reason': 'invalid'}]},
+                    {'index': 3, 'errors': [{'reason': 'invalid'}]},
+                    {'index': 7, 'errors': [{'reason': 'invalid'}]}]
+        if self.calls == 3:
+            raise ConnectionError('insertAll timed out')
+        return []
+
+
+def test_backfill_records_exact_inserted_and_failed_rows(api):
+    """行级错误按行计入失败，异常分块整体失败，其余分块照常写入"""
+    api.fetch_from_bigquery_history = lambda start_time, end_time: [
+        d for d in DRAWS if start_time <= datetime.fromisoformat(d['timestamp']) <= end_time
+    ]
+    api.fetch_from_external_api = lambda start_time, end_time: []
+    api.fetch_from_gcs_backup = lambda start_time, end_time: []
+    api.bq_client = _PartialClient()
+
+    summary = api.backfill_range(START, END, chunk_size=100)
+
+    assert api.bq_client.calls == 5
+    assert summary['fetched'] == 480
+    assert (summary['inserted'], summary['failed_rows']) == (480 - 2 - 100, 2 + 100)
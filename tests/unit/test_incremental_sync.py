@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步测试
+验证按水位的变更扫描、与 sync_metadata 的校验和比对，以及失败记录的重试与水位保护
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from incremental_sync_system import IncrementalSyncSystem, SyncConfig
+except ImportError as e:
+    pytest.skip(f"增量同步模块导入失败: {e}", allow_module_level=True)
+
+TABLE = 'realtime_draws'
+
+
+@pytest.fixture
+def env(tmp_path):
+    source = str(tmp_path / 'source.db')
+    conn = sqlite3.connect(source)
+    conn.execute(f'CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, value TEXT, created_at TEXT, updated_at TEXT)')
+    conn.commit()
+    config = SyncConfig(source_database=source, target_database=str(tmp_path / 'target.db'))
+    yield IncrementalSyncSystem(config), conn
+    conn.close()
+
+
+def _put(conn, record_id, value, updated_at):
+    conn.execute(f'INSERT OR REPLACE INTO {TABLE} (id, value, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                 (record_id, value, '2026-10-16T00:00:00', updated_at))
+    conn.commit()
+
+
+def test_watermark_scan_and_checksum_join(env):
+    """水位之后只检出新增或内容变化的记录；全量校验能发现水位之前的静默修改"""
+    system, conn = env
+    for i in range(1, 4):
+        _put(conn, i, f'v{i}', f'2026-10-16T10:0{i}:00')
+    metrics = system.run_incremental_sync([TABLE])
+    assert metrics.synced_records == 3
+    assert system.get_watermark(TABLE) == '2026-10-16T10:03:00'
+
+    _put(conn, 4, 'v4', '2026-10-16T10:04:00')
+    _put(conn, 3, 'v3-changed', '2026-10-16T10:03:00')
+    changes = system.detect_changes(TABLE)
+    assert sorted(c.record_id for c in changes) == ['3', '4']
+
+    _put(conn, 1, 'v1-changed', '2026-10-16T10:01:00')
+    assert '1' not in {c.record_id for c in system.detect_changes(TABLE)}
+    assert '1' in {c.record_id for c in system.detect_changes(TABLE, full_scan=True)}
+
+
+def test_recorded_failure_is_retried_after_watermark_advances(env):
+    """登记为 FAILED 的记录在水位越过它之后仍由重试查询补回"""
+    system, conn = env
+    target = sqlite3.connect(system.config.target_database)
+    target.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, value TEXT CHECK (value != 'bad'), "
+                   "created_at TEXT, updated_at TEXT)")
+    target.commit()
+
+    _put(conn, 1, 'bad', '2026-10-16T10:01:00')
+    _put(conn, 2, 'ok', '2026-10-16T10:02:00')
+    metrics = system.run_incremental_sync([TABLE])
+    assert (metrics.synced_records, metrics.failed_records) == (1, 1)
+    assert system.get_watermark(TABLE) == '2026-10-16T10:02:00'
+    status = target.execute("SELECT sync_status FROM sync_metadata WHERE record_id = '1'").fetchone()[0]
+    assert status == 'FAILED'
+
+    target.execute(f'DROP TABLE {TABLE}')
+    target.commit()
+    target.close()
+    metrics = system.run_incremental_sync([TABLE])
+    assert metrics.synced_records == 1 and metrics.failed_records == 0
+
+
+def test_unrecorded_failure_holds_watermark(env, monkeypatch):
+    """失败状态未能写入 sync_metadata 时，水位停在该记录处，下次扫描重新检出"""
+    system, conn = env
+    for i in range(1, 4):
+        _put(conn, i, f'v{i}', f'2026-10-16T10:0{i}:00')
+
+    real_sync = system.sync_record
+
+    def flaky_sync(record):
+        if record.record_id == '2':
+            return False  # 模拟同步失败且失败状态也未能登记
+        return real_sync(record)
+
+    monkeypatch.setattr(system, 'sync_record', flaky_sync)
+    metrics = system.run_incremental_sync([TABLE])
+    assert metrics.failed_records == 1
+    assert system.get_watermark(TABLE) == '2026-10-16T10:02:00'
+
+    monkeypatch.setattr(system, 'sync_record', real_sync)
+    assert [c.record_id for c in system.detect_changes(TABLE)] == ['2']
+    system.run_incremental_sync([TABLE])
+    assert system.get_watermark(TABLE) == '2026-10-16T10:03:00'
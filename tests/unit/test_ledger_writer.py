@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+账本批量写入测试
+验证按批量合并写入、按 id 去重、预写文件恢复和 SQL 字面量转义
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from ledger_io import LedgerWriter, order_merge_sql, orders_array_literal
+except ImportError as e:
+    pytest.skip(f"账本模块导入失败: {e}", allow_module_level=True)
+
+
+def _order(i, **extra):
+    order = {'id': f'ord_{i}', 'market': 'oe' if i % 2 else 'size', 'draw_id': 3300000 + i,
+             'p_win': 0.55, 'ev': 0.1, 'kelly_frac': 0.02, 'stake_u': 1, 'note': 'auto'}
+    order.update(extra)
+    return order
+
+
+def test_orders_written_in_batches_with_dedup():
+    """满批量即写入一批，同一 id 只保留最后一次提交"""
+    batches = []
+    writer = LedgerWriter(lambda rows: batches.append(rows) or True, batch_size=100, flush_interval=0)
+
+    writer.add_many(_order(i) for i in range(250))
+    writer.add(_order(249, stake_u=3))
+    writer.add(_order(249, stake_u=5))
+    assert writer.close()
+
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    last = batches[-1][-1]
+    assert last['id'] == 'ord_249' and last['stake_u'] == 5
+
+
+def test_failed_batch_is_recovered_from_wal(tmp_path):
+    """写入失败的订单保留在预写文件中，重启后补写，成功后预写文件清空"""
+    wal_path = str(tmp_path / "ledger_wal.jsonl")
+    writer = LedgerWriter(lambda rows: False, wal_path=wal_path, batch_size=10, flush_interval=0)
+    writer.add_many(_order(i) for i in range(15))
+    assert not writer.close()
+
+    written = []
+    restarted = LedgerWriter(lambda rows: written.extend(rows) or True, wal_path=wal_path, flush_interval=0)
+    assert len(restarted.pending) == 15
+    assert restarted.close()
+    assert sorted(row['id'] for row in written) == sorted(f'ord_{i}' for i in range(15))
+    assert open(wal_path, encoding='utf-8').read() == ''
+
+
+def test_merge_sql_escapes_literals():
+    """字符串字段被转义，整批订单只生成一条 MERGE"""
+    sql = order_merge_sql('proj', 'lab', 'Asia/Shanghai', orders_array_literal([
+        {**_order(1), 'created_at': '2026-01-01T00:00:00+00:00', 'note': 'x"); DROP TABLE t; --'},
+        {**_order(2), 'created_at': '2026-01-01T00:00:00+00:00'},
+    ]))
+
+    assert sql.count('MERGE') == 1
+    assert '"x\\"); DROP TABLE t; --"' in sql
+    assert "ARRAY<STRUCT<id STRING" in sql
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地数据库批量写入测试
+验证按字段类型的预转换、只对失败批次逐行回退、流式分批写入和覆盖写入
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'local_system'))
+
+try:
+    from local_database import LocalDatabase
+except ImportError as e:
+    pytest.skip(f"本地数据库模块导入失败: {e}", allow_module_level=True)
+
+
+def _row(draw_id, p_win=0.6, pick='odd'):
+    return {'draw_id': str(draw_id), 'timestamp': '2026-10-16T10:00:00', 'market': 'pc28',
+            'pick': pick, 'p_win': p_win, 'data_date': '2026-10-16'}
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = LocalDatabase(str(tmp_path / 'local.db'))
+    yield database
+    database.close()
+
+
+def test_mixed_types_are_coerced_by_column_affinity(db):
+    """字符串/Decimal 数值、整数 draw_id、datetime 按列类型转换后写入"""
+    rows = [
+        {'draw_id': 1001, 'timestamp': datetime(2026, 10, 16, 10, 0), 'market': 'pc28',
+         'pick': 'odd', 'p_win': '0.61', 'data_date': '2026-10-16'},
+        {'draw_id': '1002', 'timestamp': '2026-10-16T10:05:00', 'market': 'pc28',
+         'pick': 'even', 'p_win': Decimal('0.55'), 'data_date': '2026-10-16'},
+        {'draw_id': '1003', 'timestamp': '2026-10-16T10:10:00', 'market': 'pc28',
+         'pick': 'odd', 'p_win': None, 'data_date': '2026-10-16'},
+    ]
+    assert db.bulk_insert('cloud_pred_today_norm', rows) == 3
+
+    stored = db.conn.execute('''
+        SELECT draw_id, typeof(draw_id), timestamp, p_win, typeof(p_win)
+        FROM cloud_pred_today_norm ORDER BY draw_id
+    ''').fetchall()
+    assert [tuple(r) for r in stored] == [
+        ('1001', 'text', '2026-10-16T10:00:00', 0.61, 'real'),
+        ('1002', 'text', '2026-10-16T10:05:00', 0.55, 'real'),
+        ('1003', 'text', '2026-10-16T10:10:00', None, 'null'),
+    ]
+
+
+def test_bad_row_only_falls_back_for_its_chunk(db, caplog):
+    """一行无法绑定的数据只让所在批次逐行回退，其余批次仍走 executemany"""
+    rows = [_row(i) for i in range(6)]
+    rows[3]['period'] = object()
+    for row in rows:
+        row.setdefault('period', None)
+
+    with caplog.at_level(logging.WARNING, logger='local_database'):
+        inserted = db.bulk_insert('cloud_pred_today_norm', rows, chunk_size=2)
+
+    assert inserted == 5
+    fallbacks = [r.getMessage() for r in caplog.records if '逐行回退 (' in r.getMessage()]
+    assert len(fallbacks) == 1 and '(2 行)' in fallbacks[0]
+    stored = {r[0] for r in db.conn.execute('SELECT draw_id FROM cloud_pred_today_norm')}
+    assert stored == {'0', '1', '2', '4', '5'}
+
+
+def test_stream_and_replace(db):
+    """迭代器按批提交并回调；replace=True 覆盖同一唯一键的旧行"""
+    committed = []
+    total = db.bulk_insert_stream(
+        'cloud_pred_today_norm', (_row(i) for i in range(7)), chunk_size=3,
+        on_chunk_committed=lambda chunk, inserted: committed.append((len(chunk), inserted))
+    )
+    assert total == 7
+    assert committed == [(3, 3), (3, 3), (1, 1)]
+
+    db.bulk_insert('cloud_pred_today_norm', [_row(0, p_win=0.9)])
+    assert db.conn.execute("SELECT p_win FROM cloud_pred_today_norm WHERE draw_id = '0'").fetchone()[0] == 0.6
+
+    db.bulk_insert('cloud_pred_today_norm', [_row(0, p_win=0.9)], replace=True)
+    assert db.conn.execute("SELECT p_win FROM cloud_pred_today_norm WHERE draw_id = '0'").fetchone()[0] == 0.9
+    assert db.conn.execute('SELECT COUNT(*) FROM cloud_pred_today_norm').fetchone()[0] == 7
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+物化表增量刷新测试
+验证水位之后的增量写入、跨天退化为全量，以及全量刷新期间读者始终看到旧数据
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime as real_datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'local_system'))
+
+try:
+    import local_sql_engine
+    from local_database import LocalDatabase
+except ImportError as e:
+    pytest.skip(f"本地SQL引擎模块导入失败: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    db = LocalDatabase(str(tmp_path / 'local.db'))
+    monkeypatch.setattr(local_sql_engine, 'get_local_db', lambda: db)
+    sql_engine = local_sql_engine.LocalSQLEngine()
+    sql_engine.create_all_views()
+    yield sql_engine
+    db.close()
+
+
+def _add_draws(db, draw_ids):
+    today = db.conn.execute("SELECT date('now')").fetchone()[0]
+    db.bulk_insert('cloud_pred_today_norm', [
+        {'draw_id': d, 'timestamp': today, 'market': 'pc28', 'pick': 'odd', 'p_win': 0.7, 'data_date': today}
+        for d in draw_ids
+    ])
+    db.bulk_insert('p_map_clean_merged_dedup_v', [
+        {'draw_id': d, 'timestamp': today, 'market': 'oe', 'pick': 'odd', 'p_win': 0.7, 'data_date': today}
+        for d in draw_ids
+    ])
+
+
+def test_incremental_refresh_only_adds_new_draws(engine):
+    """增量刷新只写入水位之后的 draw_id，水位随之推进"""
+    _add_draws(engine.db, ['1001', '1002'])
+    assert engine._refresh_materialized_table('signal_pool_union_v3') == 2
+
+    _add_draws(engine.db, ['1003'])
+    assert engine._refresh_materialized_table('signal_pool_union_v3', incremental=True) == 1
+    assert engine._refresh_materialized_table('signal_pool_union_v3', incremental=True) == 0
+
+    watermark = engine.db.get_watermark('signal_pool_union_v3')
+    assert watermark['last_draw_id'] == '1003'
+    assert engine.db.get_table_count('signal_pool_union_v3') == 3
+
+
+def test_day_rollover_uses_view_day_and_rebuilds(engine, monkeypatch):
+    """当日标识取自 SQLite date('now')；水位属于前一天时退化为全量刷新"""
+    class _OtherDay(real_datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return real_datetime(1999, 12, 31, 23, 59)
+
+    monkeypatch.setattr(local_sql_engine, 'datetime', _OtherDay)
+    _add_draws(engine.db, ['2001', '2002'])
+    engine._refresh_materialized_table('signal_pool_union_v3')
+
+    view_day = engine.db.conn.execute("SELECT strftime('%Y%m%d', date('now'))").fetchone()[0]
+    assert engine.db.get_watermark('signal_pool_union_v3')['day_id_cst'] == view_day
+    assert engine._refresh_materialized_table('signal_pool_union_v3', incremental=True) == 0
+
+    engine.db.set_watermark('signal_pool_union_v3', '2002', '19991231', 2)
+    assert engine._refresh_materialized_table('signal_pool_union_v3', incremental=True) == 2
+
+
+def test_readers_never_see_empty_table_during_full_refresh(engine, monkeypatch):
+    """全量刷新在同一事务内清空和重建，另一个连接在提交前读到的是旧数据"""
+    _add_draws(engine.db, ['3001', '3002', '3003'])
+    engine._refresh_materialized_table('signal_pool_union_v3')
+
+    seen = []
+    original = engine.db.bulk_insert
+
+    def observing_insert(table_name, data, **kwargs):
+        reader = sqlite3.connect(str(engine.db.db_path))
+        try:
+            seen.append(reader.execute('SELECT COUNT(*) FROM signal_pool_union_v3').fetchone()[0])
+        finally:
+            reader.close()
+        return original(table_name, data, **kwargs)
+
+    monkeypatch.setattr(engine.db, 'bulk_insert', observing_insert)
+    assert engine.refresh_signal_pool() is True
+    assert seen == [3]
+    assert engine.db.get_table_count('signal_pool_union_v3') == 3
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地数据库表统计测试
+验证写入路径（含 execute_update 的增量）维护的行数/日期计数、可选触发器模式、
+旧库首次打开时的回填，以及管道统计改读表统计
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'local_system'))
+
+try:
+    import local_sql_engine
+    from local_database import LocalDatabase, STATS_TOTAL_KEY
+except ImportError as e:
+    pytest.skip(f"本地数据库模块导入失败: {e}", allow_module_level=True)
+
+
+def _rows(start, count, data_date):
+    return [
+        {'draw_id': str(i), 'timestamp': '2026-10-16T10:00:00', 'market': 'pc28', 'pick': 'big',
+         'p_win': 0.6, 'data_date': data_date}
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = LocalDatabase(str(tmp_path / 'local.db'))
+    yield database
+    database.close()
+
+
+def test_counts_follow_insert_replace_and_delete(db):
+    """插入、覆盖写入（REPLACE）、删除都同步更新全表和按日期的计数"""
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 6, '2026-10-15') + _rows(6, 4, '2026-10-16'))
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 6, '2026-10-15'))  # 重复行被忽略
+    assert db.get_table_count('cloud_pred_today_norm') == 10
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-16')['row_count'] == 4
+
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 2, '2026-10-16'), replace=True)
+    assert db.get_table_stats('cloud_pred_today_norm')['row_count'] == 10
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-15')['row_count'] == 4
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-16')['row_count'] == 6
+
+    db.execute_update("DELETE FROM cloud_pred_today_norm WHERE data_date = '2026-10-15'")
+    stats = db.get_table_stats('cloud_pred_today_norm')
+    actual = db.execute_query("SELECT COUNT(*) AS count FROM cloud_pred_today_norm")[0]['count']
+    assert stats['row_count'] == actual == 6
+    assert stats['last_created_at'] is not None and stats['last_write_at'] is not None
+    assert db.get_table_stats('cloud_pred_today_norm', '2030-01-01')['row_count'] == 0
+
+
+def test_existing_rows_are_backfilled_and_old_triggers_dropped(tmp_path):
+    """旧库首次打开时按现有数据重建统计，旧版本安装的触发器被移除"""
+    path = str(tmp_path / 'legacy.db')
+    database = LocalDatabase(path, stats_triggers=True)
+    database.conn.execute("DELETE FROM table_stats")
+    database.conn.commit()
+    database.close()
+
+    reopened = LocalDatabase(path)
+    try:
+        reopened.conn.execute(
+            "INSERT INTO p_map_clean_merged_dedup_v (draw_id, timestamp, data_date) VALUES ('x', 't', '2026-10-16')"
+        )
+        reopened.conn.commit()
+        triggers = reopened.conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_stats_%'"
+        ).fetchone()[0]
+        assert triggers == 0
+        reopened.refresh_table_stats('p_map_clean_merged_dedup_v')
+        reopened.bulk_insert('p_map_clean_merged_dedup_v', _rows(0, 7, '2026-10-16'))
+        assert reopened.get_table_count('p_map_clean_merged_dedup_v') == 8
+        assert reopened.get_table_stats('p_map_clean_merged_dedup_v', '2026-10-16')['row_count'] == 8
+    finally:
+        reopened.close()
+
+
+def test_bulk_insert_updates_stats_once_per_chunk(db):
+    """bulk_insert 每批只写一次聚合增量，不再逐行 upsert"""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 50, '2026-10-15') + _rows(50, 50, '2026-10-16'),
+                   chunk_size=40)
+    db.conn.set_trace_callback(None)
+
+    # 3 批各一条全表增量，加上每批涉及的日期：2026-10-15 / 2026-10-15,16 / 2026-10-16
+    assert sum('INSERT INTO table_stats' in sql for sql in statements) == 3 + 4
+    assert db.get_table_count('cloud_pred_today_norm') == 100
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-15')['row_count'] == 50
+
+
+def test_write_path_matches_triggers_and_recount(tmp_path):
+    """写入路径与触发器模式、全量重建得到相同统计，包括 REPLACE 改日期、批内重复键和全量刷新清空"""
+    def exercise(database):
+        database.bulk_insert('cloud_pred_today_norm', _rows(0, 6, '2026-10-15') + _rows(6, 4, '2026-10-16'))
+        database.bulk_insert('cloud_pred_today_norm', _rows(0, 3, '2026-10-17') + _rows(1, 1, '2026-10-18'),
+                             replace=True)
+        # 显式写入已被 REPLACE 腾出的较小 id，rowid 区间聚合对不上时按表重建
+        database.bulk_insert('cloud_pred_today_norm', [dict(_rows(20, 1, '2026-10-19')[0], id=1)])
+        database.truncate_table('signal_pool_union_v3')
+        database.bulk_insert('signal_pool_union_v3', [
+            {'id': str(i), 'draw_id': str(i), 'ts_utc': 't', 'market': 'oe', 'pick': 'odd',
+             'source': 'cloud', 'day_id_cst': '20261016'} for i in range(5)
+        ], replace=True)
+        database.truncate_table('signal_pool_union_v3')
+        database.execute_update("UPDATE cloud_pred_today_norm SET data_date = '2026-10-20' WHERE draw_id = '7'")
+        database.execute_update(
+            "INSERT OR REPLACE INTO cloud_pred_today_norm (draw_id, timestamp, market, pick, p_win, data_date) "
+            "VALUES ('8', '2026-10-16T10:00:00', 'pc28', 'big', 0.6, '2026-10-21')"
+        )
+        database.execute_update("DELETE FROM cloud_pred_today_norm WHERE draw_id = ?", ('9',))
+        return {
+            (row['table_name'], row['data_date']): row['row_count']
+            for row in database.execute_query("SELECT * FROM table_stats WHERE row_count != 0")
+        }
+
+    write_path = LocalDatabase(str(tmp_path / 'write_path.db'))
+    triggers = LocalDatabase(str(tmp_path / 'triggers.db'), stats_triggers=True)
+    try:
+        maintained = exercise(write_path)
+        assert maintained == exercise(triggers)
+        write_path.refresh_table_stats()
+        assert maintained == {
+            (row['table_name'], row['data_date']): row['row_count']
+            for row in write_path.execute_query("SELECT * FROM table_stats WHERE row_count != 0")
+        }
+        assert maintained[('cloud_pred_today_norm', '2026-10-18')] == 1
+        assert maintained[('cloud_pred_today_norm', '2026-10-20')] == 1
+        assert maintained[('cloud_pred_today_norm', '2026-10-21')] == 1
+        assert maintained[('cloud_pred_today_norm', STATS_TOTAL_KEY)] == 10
+        assert write_path.get_table_count('signal_pool_union_v3') == 0
+    finally:
+        write_path.close()
+        triggers.close()
+
+
+def test_execute_update_applies_deltas_without_recount(db):
+    """单行 UPDATE/DELETE 只按受影响行更新统计，不重扫全表，也不在库中留下触发器"""
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 6, '2026-10-15'))
+
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    db.execute_update("UPDATE cloud_pred_today_norm SET data_date = '2026-10-16' WHERE draw_id = '2'")
+    db.execute_update("DELETE FROM cloud_pred_today_norm WHERE draw_id = '3'")
+    db.conn.set_trace_callback(None)
+
+    assert not any('COUNT(' in sql.upper() or 'DELETE FROM TABLE_STATS' in sql.upper() for sql in statements)
+    assert db.get_table_stats('cloud_pred_today_norm')['row_count'] == 5
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-15')['row_count'] == 4
+    assert db.get_table_stats('cloud_pred_today_norm', '2026-10-16')['row_count'] == 1
+    assert db.conn.execute(
+        "SELECT COUNT(*) FROM sqlite_temp_master WHERE type = 'trigger'"
+    ).fetchone()[0] == 0
+
+
+def test_pipeline_stats_read_table_stats(db, monkeypatch):
+    """管道统计不再执行 COUNT(*) 或物化视图"""
+    db.bulk_insert('cloud_pred_today_norm', _rows(0, 3, local_sql_engine.datetime.now().strftime('%Y-%m-%d')))
+    monkeypatch.setattr(local_sql_engine, 'get_local_db', lambda: db)
+    engine = local_sql_engine.LocalSQLEngine()
+
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    stats = engine._get_pipeline_stats()
+    db.conn.set_trace_callback(None)
+
+    table = stats['tables']['cloud_pred_today_norm']
+    assert table['total_count'] == 3 and table['today_count'] == 3
+    assert table['status'] == 'healthy' and table['last_write_at'] is not None
+    assert stats['views']['p_cloud_today_v']['count'] == 3
+    assert not any('COUNT(' in sql.upper() for sql in statements)
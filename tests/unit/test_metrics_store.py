@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控指标时序存储测试
+验证批量写入与预聚合、分级保留、区间查询读取预聚合的结果
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    from metrics_store import MetricsStore
+except ImportError as e:
+    pytest.skip(f"指标存储模块导入失败: {e}", allow_module_level=True)
+
+NOW = 1_700_000_000.0
+
+
+def _store(**kwargs):
+    clock = {'now': NOW}
+    store = MetricsStore(':memory:', flush_interval=0, now=lambda: clock['now'], **kwargs)
+    return store, clock
+
+
+def test_batched_writes_fold_into_rollups():
+    """满批量才写库，同一分钟的点合并为一行预聚合，汇总与原始数据一致"""
+    store, _ = _store(batch_size=100)
+    values = [float(i % 17) for i in range(250)]
+    for i, value in enumerate(values):
+        store.append('cpu', value, NOW - 250 + i)
+
+    assert store.get_stats()['flushes'] == 2
+    assert store.get_stats()['buffered'] == 50
+
+    summary = store.summary('cpu', NOW - 250, NOW)
+    assert summary['count'] == 250
+    assert summary['avg'] == pytest.approx(sum(values) / len(values))
+    assert summary['min'] == 0 and summary['max'] == 16
+    assert summary['last'] == values[-1]
+
+    minute_rows = store.conn.execute("SELECT COUNT(*) FROM metric_rollups WHERE tier = '1m'").fetchone()[0]
+    assert minute_rows <= 6
+
+
+def test_retention_keeps_coarse_tiers_and_summary_falls_back():
+    """原始点与分钟级过期后，30 天区间仍能从小时/日级预聚合得到完整统计"""
+    store, _ = _store(retention={'raw': 3600, '1m': 86400})
+    start = NOW - 30 * 86400
+    for i in range(30 * 24):
+        store.append('memory', 50.0 + (i % 2), start + i * 3600 + 60)
+    store.flush()
+    store.apply_retention()
+
+    assert store.conn.execute('SELECT COUNT(*) FROM metric_points').fetchone()[0] == 1
+    oldest_minute = store.conn.execute("SELECT MIN(bucket) FROM metric_rollups WHERE tier = '1m'").fetchone()[0]
+    assert oldest_minute >= (NOW - 86400) // 60
+
+    summary = store.summary('memory', start, NOW)
+    assert summary['count'] == 30 * 24
+    assert summary['avg'] == pytest.approx(50.5)
+    assert summary['max'] == 51.0
+
+
+def test_series_reads_coarsest_matching_tier():
+    """按 max_points 选取步长，30 天序列从小时级读取并重新分桶；latest/names 按前缀过滤"""
+    store, _ = _store()
+    start = NOW - 30 * 86400
+    for i in range(30 * 24 * 6):
+        store.append('system.cpu_percent', 10.0, start + i * 600)
+    store.append('system.memory_percent', 42.0, NOW - 30)
+    store.append('other.value', 1.0, NOW - 30)
+
+    points = store.series('system.cpu_percent', start, NOW, max_points=100)
+    assert 0 < len(points) <= 100
+    assert sum(point['count'] for point in points) == 30 * 24 * 6
+    assert all(point['avg'] == 10.0 for point in points)
+
+    latest = store.latest('system.')
+    assert set(latest) == {'system.cpu_percent', 'system.memory_percent'}
+    assert latest['system.memory_percent']['value'] == 42.0
+    assert store.names('system.', start) == ['system.cpu_percent', 'system.memory_percent']
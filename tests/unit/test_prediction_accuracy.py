@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预测准确率系统测试
+验证增量累计计分、批量计分、滚动窗口指标和向量化回测
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from prediction_accuracy_system import PredictionAccuracySystem, PredictionConfig
+except ImportError as e:
+    pytest.skip(f"预测准确率模块导入失败: {e}", allow_module_level=True)
+
+
+PERIODS = [f"P{i:04d}" for i in range(120)]
+
+
+@pytest.fixture
+def system(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    accuracy_system = PredictionAccuracySystem(
+        PredictionConfig(database_path=str(tmp_path / "accuracy.db"), evaluation_periods=30)
+    )
+    for i, period in enumerate(PERIODS):
+        accuracy_system.record_prediction(period, 0.8 if i % 3 else 0.2, [0.0, 0.4, 0.9][i % 3])
+        accuracy_system.record_actual_result(period, "1,2,3", 20 if i % 2 else 5)
+    return accuracy_system
+
+
+def _cumulative(system):
+    with sqlite3.connect(system.config.database_path) as conn:
+        return conn.execute(
+            "SELECT period, total_score, cumulative_score FROM simple_scoring ORDER BY period"
+        ).fetchall()
+
+
+def _expected_cumulative(system):
+    """逐期按 SUM(period < ?) 口径的参考值"""
+    with sqlite3.connect(system.config.database_path) as conn:
+        scores = dict(conn.execute("SELECT period, total_score FROM simple_scoring"))
+    running, expected = 0.0, []
+    for period in sorted(scores):
+        running += scores[period]
+        expected.append(pytest.approx(running))
+    return expected
+
+
+def test_batch_scoring_keeps_running_total(system):
+    """批量计分、补录期号和重复计分都保持累计分正确"""
+    system.score_periods(PERIODS[:50])
+    system.score_periods(PERIODS[60:])
+    system.score_periods(PERIODS[50:60])  # 补录
+    assert system.simple_scoring(PERIODS[55]) == system.simple_scoring(PERIODS[55])  # 重复计分
+
+    rows = _cumulative(system)
+    assert [row[0] for row in rows] == PERIODS
+    assert [row[2] for row in rows[:60]] == _expected_cumulative(system)[:60]
+
+    with sqlite3.connect(system.config.database_path) as conn:
+        state = conn.execute("SELECT last_period, cumulative_score FROM scoring_state").fetchone()
+    assert state[0] == PERIODS[-1]
+    assert state[1] == pytest.approx(sum(row[1] for row in rows))
+
+
+def test_rolling_window_matches_sql_accuracy(system):
+    """滚动窗口与 calculate_accuracy 的最近N期口径一致"""
+    system.score_periods(PERIODS)
+    metrics = system.calculate_accuracy(30)
+    rolling = system.get_rolling_metrics()
+
+    assert rolling["准确率"] == pytest.approx(metrics.accuracy_rate)
+    assert rolling["置信度"] == pytest.approx(metrics.average_confidence)
+    assert rolling["一致性"] == pytest.approx(metrics.consistency_score)
+
+    restarted = PredictionAccuracySystem(system.config)
+    assert restarted.get_rolling_metrics() == pytest.approx(rolling)
+
+
+def test_backtest_matches_incremental_scoring(system):
+    """回测的累计分与逐期计分一致，persist 后重写区间并重置状态"""
+    system.score_periods(PERIODS)
+    expected = [row[2] for row in _cumulative(system)]
+
+    result = system.backtest(window=30)
+    assert list(result.cumulative_scores) == pytest.approx(expected)
+    assert result.final_metrics["准确率"] == pytest.approx(system.get_rolling_metrics()["准确率"])
+
+    partial = system.backtest(start_period=PERIODS[40], persist=True)
+    assert partial.periods == PERIODS[40:]
+    assert [row[2] for row in _cumulative(system)] == pytest.approx(expected)
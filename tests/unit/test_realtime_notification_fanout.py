@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时通知分发测试
+验证默认订阅共享接入、慢订阅者不阻塞其他订阅者、data_update 与重复告警合并、只有 new_draw 不丢弃、溢出落盘、投递失败计数和停止时关闭信箱
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    import api_field_optimization
+    import realtime_notification_system
+    from draw_event_bus import DrawEventBus
+    from realtime_notification_system import NotificationEvent, RealtimeNotificationSystem
+except ImportError as e:
+    pytest.skip(f"实时通知模块导入失败: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def system(monkeypatch):
+    # 上游API类不在本仓库中，测试只覆盖分发逻辑
+    monkeypatch.setattr(api_field_optimization, 'PC28UpstreamAPI', object, raising=False)
+    monkeypatch.setattr(realtime_notification_system, 'PC28UpstreamAPI', object, raising=False)
+    system = RealtimeNotificationSystem()
+    yield system
+    for subscriber_id in list(system.subscribers):
+        system.unsubscribe(subscriber_id)
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _event(event_type, message=''):
+    return NotificationEvent(event_type=event_type, timestamp='2026-01-01T12:00:00+08:00', message=message)
+
+
+class FakeIngest:
+    def __init__(self):
+        self.bus = DrawEventBus()
+        self.users = 0
+
+    def start(self):
+        self.users += 1
+
+    def stop(self):
+        self.users -= 1
+
+
+def test_default_subscribes_shared_ingest(system, monkeypatch):
+    """未传入接入组件时启动即订阅共享接入，不创建自有轮询"""
+    ingest = FakeIngest()
+    monkeypatch.setattr(realtime_notification_system, 'get_default_draw_ingest', lambda **kwargs: ingest)
+    assert system.api_client is None
+
+    assert system.start_realtime_monitoring()
+    assert system.ingest is ingest and ingest.users == 1
+    assert system.polling_thread is None
+    assert 'realtime_notification_system' in ingest.bus.subscriptions
+
+    system.stop_realtime_monitoring()
+    assert ingest.users == 0 and not ingest.bus.subscriptions
+
+
+def test_slow_subscriber_does_not_delay_new_draw(system):
+    """慢订阅者阻塞时，决策订阅者仍立即收到 new_draw"""
+    release = threading.Event()
+    received = threading.Event()
+    system.subscribe('telegram', lambda event: release.wait(5))
+    system.subscribe('decision', lambda event: received.set(), ['new_draw'])
+
+    system._distribute_notification(_event('data_update'))
+    system._distribute_notification(_event('new_draw'))
+
+    assert received.wait(1)
+    release.set()
+
+
+def test_superseded_data_updates_are_coalesced(system):
+    """信箱中未投递的 data_update 只保留最新一条，new_draw 不合并"""
+    release = threading.Event()
+    started = threading.Event()
+    delivered = []
+    done = threading.Event()
+
+    def handler(event):
+        started.set()
+        release.wait(5)
+        delivered.append(event.message)
+        if event.message == 'draw-9':
+            done.set()
+
+    system.subscribe('file', handler)
+    system._distribute_notification(_event('data_update', 'first'))
+    assert started.wait(1)
+    for i in range(10):
+        system._distribute_notification(_event('data_update', f'update-{i}'))
+        system._distribute_notification(_event('new_draw', f'draw-{i}'))
+    system._distribute_notification(_event('data_update', 'last'))
+    release.set()
+
+    assert done.wait(5)
+    # 被取代的更新沿用原排队位置，最新一条先于后续开奖送达
+    assert delivered == ['first', 'last'] + [f'draw-{i}' for i in range(10)]
+
+    # 延迟在回调返回后记录
+    assert _wait_for(lambda: system.stats['successful_deliveries'] == 12)
+    status = system.get_system_status()['subscribers']['file']
+    assert status['coalesced'] == 10
+    assert _wait_for(lambda: sum(system.subscribers['file'].mailbox.metrics()['latency_histogram'].values()) == 12)
+
+
+def test_spill_policy_keeps_order(system, tmp_path):
+    """信箱满后溢出到文件，之后按原顺序投递"""
+    release = threading.Event()
+    delivered = []
+    done = threading.Event()
+
+    def handler(event):
+        release.wait(5)
+        delivered.append(event.message)
+        if len(delivered) == 30:
+            done.set()
+
+    system.subscribe('archive', handler, ['new_draw'], mailbox_size=5, overflow='spill', spill_dir=str(tmp_path))
+    for i in range(30):
+        system._distribute_notification(_event('new_draw', f'draw-{i}'))
+    assert system.get_system_status()['subscribers']['archive']['spilled_pending'] > 0
+    release.set()
+
+    assert done.wait(5)
+    assert delivered == [f'draw-{i}' for i in range(30)]
+    assert not os.listdir(tmp_path)
+
+
+def test_full_mailbox_drops_only_data_updates(system):
+    """drop_oldest 信箱满时只淘汰 data_update，new_draw 全部送达"""
+    release = threading.Event()
+    started = threading.Event()
+    delivered = []
+
+    def handler(event):
+        started.set()
+        release.wait(5)
+        delivered.append(event.message)
+
+    system.subscribe('decision', handler, mailbox_size=3)
+    system._distribute_notification(_event('system_alert', 'boot'))
+    assert started.wait(1)
+    for i in range(6):
+        system._distribute_notification(_event('data_update', f'update-{i}'))
+        system._distribute_notification(_event('new_draw', f'draw-{i}'))
+    release.set()
+
+    assert _wait_for(lambda: len(delivered) == 7)
+    assert delivered == ['boot'] + [f'draw-{i}' for i in range(6)]
+    assert system.get_system_status()['subscribers']['decision']['dropped'] == 4
+
+
+def test_stuck_subscriber_bounds_system_alerts(system):
+    """订阅者卡住时重复告警被合并、不同告警受信箱上限约束，new_draw 仍全部入队"""
+    release = threading.Event()
+    started = threading.Event()
+    delivered = []
+
+    def handler(event):
+        started.set()
+        release.wait(5)
+        delivered.append(event.message)
+
+    system.subscribe('decision', handler, mailbox_size=3)
+    system._distribute_notification(_event('new_draw', 'draw-0'))
+    assert started.wait(1)
+    for _ in range(500):
+        system._distribute_notification(_event('system_alert', 'upstream down'))
+    for i in range(10):
+        system._distribute_notification(_event('system_alert', f'alert-{i}'))
+    system._distribute_notification(_event('new_draw', 'draw-1'))
+
+    mailbox = system.subscribers['decision'].mailbox
+    assert len(mailbox.queue) <= 4
+    release.set()
+
+    assert _wait_for(lambda: 'draw-1' in delivered)
+    assert delivered[0] == 'draw-0'
+    assert delivered.count('upstream down') <= 1
+    assert mailbox.stats['coalesced'] >= 499
+
+
+def test_callback_failure_counted_per_subscriber(system):
+    """回调异常计入该订阅者信箱的 failed 和系统的 failed_deliveries"""
+    def broken(event):
+        raise RuntimeError('webhook down')
+
+    system.subscribe('webhook', broken)
+    system._distribute_notification(_event('new_draw'))
+
+    assert _wait_for(lambda: system.stats['failed_deliveries'] == 1)
+    assert _wait_for(lambda: system.get_system_status()['subscribers']['webhook']['failed'] == 1)
+    assert system.stats['successful_deliveries'] == 0
+
+
+def test_stop_closes_mailboxes_and_joins_workers(system, monkeypatch):
+    """停止监控时关闭信箱并结束投递线程，重新启动后恢复投递"""
+    monkeypatch.setattr(realtime_notification_system, 'get_default_draw_ingest', lambda **kwargs: FakeIngest())
+    received = []
+    system.subscribe('decision', lambda event: received.append(event.message), ['new_draw'])
+    worker = system.subscribers['decision'].mailbox._thread
+
+    system.start_realtime_monitoring()
+    system.stop_realtime_monitoring()
+    assert not worker.is_alive()
+    assert not system.subscribers['decision'].mailbox.offer(_event('new_draw', 'late'))
+
+    system.start_realtime_monitoring()
+    system._distribute_notification(_event('new_draw', 'draw-1'))
+    assert _wait_for(lambda: received == ['draw-1'])
+    system.stop_realtime_monitoring()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号池优化器测试
+验证二级索引、置信度排序、过期堆清理和批量落盘
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from signal_pool_optimizer import ModelProvider, Signal, SignalPoolOptimizer, SignalType
+except ImportError as e:
+    pytest.skip(f"信号池模块导入失败: {e}", allow_module_level=True)
+
+
+def _signal(signal_id, signal_type, confidence, agent_id="agent_a", expiry=timedelta(hours=1)):
+    now = datetime.now()
+    return Signal(
+        signal_id=signal_id,
+        signal_type=signal_type,
+        confidence=confidence,
+        value=confidence * 10,
+        timestamp=now,
+        source_model=ModelProvider.OPENAI,
+        agent_id=agent_id,
+        expiry_time=now + expiry if expiry is not None else None
+    )
+
+
+@pytest.fixture
+def optimizer(tmp_path):
+    pool = SignalPoolOptimizer(str(tmp_path / "signals.db"), write_batch_size=3, flush_interval=60)
+    yield pool
+    pool.close()
+
+
+def test_indexes_follow_replacement_and_expiry(optimizer):
+    """替换信号时索引同步更新，过期信号不再返回但在清理前仍计入池中"""
+    optimizer.add_signal(_signal("t1", SignalType.TREND, 0.9))
+    optimizer.add_signal(_signal("t2", SignalType.TREND, 0.4, agent_id="agent_b"))
+    optimizer.add_signal(_signal("p1", SignalType.PATTERN, 0.7))
+    optimizer.add_signal(_signal("old", SignalType.TREND, 0.99, expiry=timedelta(seconds=-1)))
+    optimizer.add_signal(_signal("t1", SignalType.PATTERN, 0.6, agent_id="agent_b"))
+
+    assert [s.signal_id for s in optimizer.get_signals_by_type(SignalType.TREND)] == ["t2"]
+    assert [s.signal_id for s in optimizer.get_signals_by_type(SignalType.PATTERN)] == ["t1", "p1"]
+    assert [s.signal_id for s in optimizer.get_signals_by_agent("agent_b")] == ["t1", "t2"]
+
+    status = optimizer.get_system_status()["metrics"]
+    assert (status["total_signals"], status["active_signals"], status["expired_signals"]) == (4, 3, 1)
+    assert status["signal_type_distribution"] == {"trend": 1, "pattern": 2}
+
+    optimizer.cleanup_expired_signals()
+    assert "old" not in optimizer.signal_pool
+
+
+def test_top_signals_ordered_by_confidence_then_insertion(optimizer):
+    """top-k 按置信度降序，同置信度保持加入顺序，跨类型合并"""
+    for i, (signal_type, confidence) in enumerate([
+        (SignalType.TREND, 0.5), (SignalType.RISK, 0.8), (SignalType.TREND, 0.8), (SignalType.RISK, 0.2)
+    ]):
+        optimizer.add_signal(_signal(f"s{i}", signal_type, confidence))
+
+    assert [s.signal_id for s in optimizer.get_top_signals(3)] == ["s1", "s2", "s0"]
+    assert [s.signal_id for s in optimizer.get_top_signals(5, SignalType.RISK)] == ["s1", "s3"]
+
+    aggregated = optimizer.aggregate_signals(SignalType.TREND)
+    assert aggregated["signal_count"] == 2
+    assert aggregated["aggregated_value"] == pytest.approx((5 * 0.5 + 8 * 0.8) / 1.3)
+
+
+def test_write_behind_batches_and_cleanup(optimizer):
+    """写入按批落盘，过期清理会丢弃未落盘的写入"""
+    optimizer.add_signal(_signal("a", SignalType.TREND, 0.5))
+    optimizer.add_signal(_signal("b", SignalType.TREND, 0.5, expiry=timedelta(seconds=-1)))
+
+    def stored():
+        with sqlite3.connect(optimizer.db_path) as conn:
+            return sorted(row[0] for row in conn.execute("SELECT signal_id FROM signals"))
+
+    assert stored() == []
+    optimizer.cleanup_expired_signals()
+    optimizer.flush()
+    assert stored() == ["a"]
+
+    for i in range(3):
+        optimizer.add_signal(_signal(f"c{i}", SignalType.RISK, 0.5))
+    assert stored() == ["a", "c0", "c1", "c2"]
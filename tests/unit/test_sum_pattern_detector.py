@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+和值模式检测器测试
+验证增量统计引擎与全量重算一致，批量扫描与逐期检测口径一致，列式存储作为历史来源
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import statistics
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'python'))
+
+from sum_pattern_detector import SumPatternDetector, StreamingSumStatistics, scan_sum_history
+from draw_column_store import DrawColumnStore
+
+
+def _sums(n, seed=5):
+    rng = random.Random(seed)
+    return [rng.randint(0, 27) for _ in range(n)]
+
+
+def test_streaming_window_matches_recompute():
+    """滑动窗口 Welford 矩和直方图与窗口全量重算一致"""
+    sums = _sums(2600)
+    engine = StreamingSumStatistics(window_size=500, recent_size=50)
+    engine.load(sums)
+
+    window = sums[-500:]
+    snapshot = engine.snapshot()
+    assert snapshot.count == 500
+    assert snapshot.mean == pytest.approx(statistics.mean(window), abs=1e-9)
+    assert snapshot.std_dev == pytest.approx(statistics.stdev(window), abs=1e-9)
+    assert sum(snapshot.frequencies.values()) == 500
+    assert snapshot.frequencies.get(window[-1]) == window.count(window[-1])
+    assert engine.recent_sums() == sums[-50:]
+
+
+def test_analyze_uses_engine_without_db_reads(tmp_path):
+    """预热后评分不再读取历史表，新增期号增量计入"""
+    detector = SumPatternDetector(db_path=str(tmp_path / "sums.db"), history_limit=200)
+    for i, value in enumerate(_sums(30)):
+        detector.add_historical_sum(f"d{i}", [value], "2026-01-01T00:00:00Z", "test")
+
+    detector.get_historical_sum_data = None  # 评分路径不应再调用
+    detector.analyze_sum_pattern([3], "r1")
+    assert detector.stats_engine.count == 30
+
+    detector.add_historical_sum("d30", [7], "2026-01-01T00:00:00Z", "test")
+    detector.add_historical_sum("d30", [7], "2026-01-01T00:00:00Z", "test")
+    assert detector.stats_engine.count == 31
+    assert detector.stats_engine.recent_sums()[-1] == 7
+
+
+def test_scan_matches_per_draw_detectors(tmp_path):
+    """批量扫描的 Z 分数和周期/等差判断与逐期检测一致"""
+    detector = SumPatternDetector(db_path=str(tmp_path / "scan.db"))
+    sums = _sums(300) + [4, 9, 4, 9] * 15 + [1, 2, 3]
+    scan = scan_sum_history(sums, window_size=100, recent_size=50)
+
+    for i in (150, 330, len(sums) - 1):
+        prior = sums[max(0, i - 100):i]
+        z = abs(sums[i] - statistics.mean(prior)) / statistics.stdev(prior)
+        assert scan["z_score"][i] == pytest.approx(z, abs=1e-9)
+
+        window = sums[i - 50:i + 1]
+        periodic = detector.detect_periodicity(window)
+        assert scan["periodicity_period"][i] == (periodic.evidence["period"] if periodic else 0)
+
+    assert scan["arithmetic"][len(sums) - 1]
+    assert scan["run_length"][len(sums) - 1] == 1
+
+
+def test_column_store_feeds_warmup_and_scan(tmp_path, monkeypatch):
+    """配置列式存储后预热和批量扫描读取和值列（按开奖时间排序），新开奖同时追加到存储"""
+    store = DrawColumnStore(str(tmp_path / "store"))
+    digits = [[i % 10, (i * 7) % 10, (i * 3) % 10] for i in range(300)]
+    draws = [{'draw_id': str(3300000 + i), 'timestamp': f"2026-01-01T{i // 20:02d}:{i % 20 * 3:02d}:00",
+              'result_digits': digits[i]} for i in range(300)]
+    store.append(draws[150:] + draws[:150])  # 乱序回填
+    sums = [sum(d) for d in digits]
+
+    detector = SumPatternDetector(db_path=str(tmp_path / "sums.db"), history_limit=100, column_store=store)
+    monkeypatch.setattr(sqlite3, 'connect', lambda *a, **k: pytest.fail('不应查询SQLite'))
+    engine = detector.get_stats_engine()
+    assert engine.recent_sums() == sums[-50:]
+    assert engine.mean == pytest.approx(statistics.mean(sums[-100:]))
+
+    scan = detector.scan_history()
+    expected = scan_sum_history(sums, window_size=100, thresholds=detector.suspicious_thresholds)
+    assert np.array_equal(scan["z_score"], expected["z_score"])
+
+    monkeypatch.undo()
+    detector.add_historical_sum("3300300", [9, 9, 9], "2026-01-01T15:00:00", "test")
+    assert len(store) == 301 and "3300300" in store
+    assert engine.recent_sums()[-1] == 27
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supabase 同步管理器测试
+使用桩客户端，验证检查点续传的时间比较、同步成功后的检查点清理、失败记录的重试，
+以及按主键范围摘要的完整性校验只拉取有差异的叶子范围
+"""
+
+import os
+import sqlite3
+import sys
+import types
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import supabase_sync_manager
+    from supabase_sync_manager import SupabaseSyncManager
+except (ImportError, ValueError) as e:
+    pytest.skip(f"Supabase 同步模块导入失败或未配置: {e}", allow_module_level=True)
+
+
+class _Response:
+    def __init__(self, data=None):
+        self.data = data or []
+
+
+class _Query:
+    """记录写入、返回空结果的最小查询桩"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def insert(self, data):
+        self.client.inserted.append((self.table, data))
+        return self
+
+    def execute(self):
+        return _Response()
+
+
+class StubClient:
+    def __init__(self):
+        self.inserted = []
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+class _RangeQuery:
+    """支持 select/gt/gte/lt/eq/order/limit 的内存表查询"""
+
+    def __init__(self, server, table):
+        self.server = server
+        self.rows = server.tables[table]
+        self.filters = []
+        self.columns = None
+        self.key = None
+        self.count = None
+
+    def select(self, columns):
+        self.columns = columns.split(',')
+        return self
+
+    def _filter(self, op):
+        def apply(column, value):
+            self.filters.append((column, op, value))
+            return self
+        return apply
+
+    def __getattr__(self, name):
+        ops = {'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b,
+               'lt': lambda a, b: a < b, 'eq': lambda a, b: a == b}
+        if name in ops:
+            return self._filter(ops[name])
+        raise AttributeError(name)
+
+    def order(self, column):
+        self.key = column
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(op(row[c], v) for c, op, v in self.filters)]
+        if self.key:
+            rows.sort(key=lambda row: row[self.key])
+        rows = rows[:self.count] if self.count is not None else rows
+        self.server.rows_returned += len(rows)
+        return _Response([{c: row.get(c) for c in self.columns} for row in rows])
+
+
+class RangeDigestClient:
+    """模拟 Supabase：表查询走内存数据，sync_range_digest RPC 在“服务端”计算摘要"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.rows_returned = 0
+        self.rpc_calls = 0
+
+    def table(self, name):
+        return _RangeQuery(self, name)
+
+    def rpc(self, name, params):
+        assert name == 'sync_range_digest'
+        self.rpc_calls += 1
+        key = params['p_key']
+        rows = [
+            (row[key], SupabaseSyncManager._canonical_row(row, key, params['p_columns']))
+            for row in self.tables[params['p_table']]
+            if (params['p_lo'] is None or row[key] >= params['p_lo'])
+            and (params['p_hi'] is None or row[key] < params['p_hi'])
+        ]
+        count, digest = SupabaseSyncManager._range_digest(rows)
+        return types.SimpleNamespace(execute=lambda: _Response([{'row_count': count, 'digest': digest}]))
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(supabase_sync_manager, 'get_supabase_client', lambda use_service_role=False: StubClient())
+    db_path = str(tmp_path / 'local.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE cloud_pred_today_norm (id INTEGER PRIMARY KEY, draw_id TEXT, created_at TEXT)')
+    conn.executemany('INSERT INTO cloud_pred_today_norm (draw_id, created_at) VALUES (?, ?)', [
+        ('1', '2025-09-29 12:30:00'),
+        ('2', '2025-09-29 13:00:00'),
+        ('3', '2025-09-29 14:00:00'),
+    ])
+    conn.commit()
+    conn.close()
+    return SupabaseSyncManager(sqlite_db_path=db_path)
+
+
+def test_same_day_checkpoint_wins_and_is_cleared(manager, monkeypatch):
+    """同一天内较晚的 SQLite 格式检查点优先于带时区的最后同步时间；全部成功后清除检查点"""
+    upserted = []
+
+    def fake_pipeline(table_name, batches, on_checkpoint=None):
+        for batch, _ in batches:
+            upserted.extend(row['draw_id'] for row in batch)
+        return len(upserted), 0
+
+    monkeypatch.setattr(manager, 'get_last_sync_timestamp',
+                        lambda table: datetime(2025, 9, 29, 12, 0, tzinfo=timezone.utc))
+    monkeypatch.setattr(manager, '_upsert_pipeline', fake_pipeline)
+    manager.save_checkpoint('cloud_pred_today_norm', '2025-09-29 13:00:00', 1)
+
+    success, synced, error = manager.sync_table_incremental('cloud_pred_today_norm')
+
+    assert success and error is None
+    assert upserted == ['2', '3']
+    assert manager.get_checkpoint('cloud_pred_today_norm') is None
+
+
+
+def test_failed_rows_are_retried_on_next_incremental_sync(manager, monkeypatch):
+    """有失败记录时检查点停在失败批次之前、最后同步时间不推进，下次同步重试失败的行"""
+    monkeypatch.setitem(manager.CORE_TABLES['cloud_pred_today_norm'], 'batch_size', 1)
+    monkeypatch.setattr(manager, 'get_last_sync_timestamp', lambda table: next(
+        (datetime.fromisoformat(data['last_sync_timestamp'])
+         for name, data in reversed(manager.supabase_client.inserted)
+         if name == 'sync_status' and data['last_sync_timestamp']), None))
+    upserted = []
+    broken = {'2'}
+
+    def fake_upsert(table_name, records):
+        if any(row['draw_id'] in broken for row in records):
+            return 0, len(records)
+        upserted.extend(row['draw_id'] for row in records)
+        return len(records), 0
+
+    monkeypatch.setattr(manager, '_upsert_with_bisection', fake_upsert)
+
+    success, synced, error = manager.sync_table_incremental('cloud_pred_today_norm')
+    assert success and synced == 2 and error == '1 records failed'
+    assert manager.get_checkpoint('cloud_pred_today_norm') == '2025-09-29 12:30:00'
+    assert manager.supabase_client.inserted[-1][1]['last_sync_timestamp'] is None
+
+    broken.clear()
+    upserted.clear()
+    success, synced, error = manager.sync_table_incremental('cloud_pred_today_norm')
+    assert success and error is None
+    assert sorted(upserted) == ['1', '2', '3']
+    assert manager.get_checkpoint('cloud_pred_today_norm') is None
+
+def test_parse_timestamp_normalizes_formats():
+    """SQLite 列值、带偏移的 ISO 字符串和 Z 后缀都解析为不带时区的 UTC"""
+    parse = SupabaseSyncManager._parse_timestamp
+    assert parse('2025-09-29 13:00:00') == datetime(2025, 9, 29, 13, 0)
+    assert parse('2025-09-29T21:00:00+08:00') == datetime(2025, 9, 29, 13, 0)
+    assert parse('2025-09-29T13:00:00Z') == datetime(2025, 9, 29, 13, 0)
+    assert parse('') is None and parse('not a time') is None
+
+
+def _integrity_fixture(tmp_path, monkeypatch, remote_rows):
+    monkeypatch.setattr(supabase_sync_manager, 'get_supabase_client', lambda use_service_role=False: StubClient())
+    db_path = str(tmp_path / 'integrity.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE lab_push_candidates_v2 (draw_id TEXT, market TEXT, created_at TEXT)')
+    conn.executemany('INSERT INTO lab_push_candidates_v2 VALUES (?, ?, ?)', [
+        (f'd{i:04d}', 'oe', f'2025-09-29 {i // 60 % 24:02d}:{i % 60:02d}:00') for i in range(300)
+    ])
+    conn.commit()
+    conn.close()
+    manager = SupabaseSyncManager(sqlite_db_path=db_path)
+    manager.supabase_client = RangeDigestClient({'lab_push_candidates_v2': remote_rows})
+    return manager
+
+
+def _remote_copy():
+    """Supabase 端同样的 300 行，时间戳为 PostgREST 返回的带时区 ISO 格式"""
+    return [
+        {'id': i, 'draw_id': f'd{i:04d}', 'market': 'oe',
+         'created_at': f'2025-09-29T{i // 60 % 24:02d}:{i % 60:02d}:00+00:00'}
+        for i in range(300)
+    ]
+
+
+def test_integrity_matching_tables_fetch_no_rows(tmp_path, monkeypatch):
+    """两端一致时只比较范围摘要，不拉取任何行"""
+    manager = _integrity_fixture(tmp_path, monkeypatch, _remote_copy())
+    result = manager.validate_sync_integrity('lab_push_candidates_v2', chunk_size=64, leaf_size=8)
+
+    assert result['status'] == 'passed' and result['divergent_keys'] == 0
+    assert result['sqlite_count'] == result['supabase_count'] == 300
+    assert result['rows_fetched'] == 0 and manager.supabase_client.rows_returned == 0
+
+
+def test_integrity_reports_changed_missing_and_duplicate_keys(tmp_path, monkeypatch):
+    """内容变化、缺失和重复主键各自定位到叶子范围，只拉取这些范围的行"""
+    remote = _remote_copy()
+    remote[123]['created_at'] = '2025-09-29T23:59:59+00:00'
+    del remote[50]
+    remote.append(dict(remote[200], id=999))
+
+    manager = _integrity_fixture(tmp_path, monkeypatch, remote)
+    result = manager.validate_sync_integrity('lab_push_candidates_v2', chunk_size=64, leaf_size=8)
+
+    found = {kind: [key for r in result['divergent_ranges'] for key in r[kind]]
+             for kind in ('changed', 'missing_in_supabase', 'missing_in_sqlite', 'duplicates')}
+    assert found == {'changed': ['d0123'], 'missing_in_supabase': ['d0050'],
+                     'missing_in_sqlite': [], 'duplicates': ['d0201']}
+    assert result['supabase_count'] == 300
+    assert result['rows_fetched'] <= 3 * 16
+    assert manager.supabase_client.rows_returned == result['rows_fetched']
+
+
+def test_keyset_paging_keeps_duplicates_across_page_boundary(tmp_path, monkeypatch):
+    """按主键游标分页时，页尾的重复主键单独补读，不跳行也不重复"""
+    remote = [{'draw_id': key, 'created_at': None} for key in ['a', 'b', 'b', 'b', 'c', 'd', 'e']]
+    manager = _integrity_fixture(tmp_path, monkeypatch, remote)
+
+    rows = list(manager._fetch_supabase_range('lab_push_candidates_v2', 'draw_id,created_at',
+                                              'draw_id', 'a', 'e', page_size=2))
+    assert [row['draw_id'] for row in rows] == ['a', 'b', 'b', 'b', 'c', 'd']
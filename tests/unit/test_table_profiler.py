@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表概况引擎测试
+验证单次扫描的列统计、去重估计和按库变化（含 UPDATE）的缓存，
+概况不改动目标库结构，命中缓存时不执行 COUNT(*)
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from data_quality_checker import DataQualityChecker
+except ImportError as e:
+    pytest.skip(f"数据质量模块导入失败: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def sample_db(tmp_path):
+    db_path = str(tmp_path / "sample.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE draws (id INTEGER PRIMARY KEY, market TEXT, p_win REAL, draw_no INTEGER)")
+        conn.executemany(
+            "INSERT INTO draws (market, p_win, draw_no) VALUES (?, ?, ?)",
+            [(['oe', 'size', None][i % 3], 'bad' if i % 10 == 0 else i / 100, i) for i in range(3000)]
+        )
+    return db_path
+
+
+def test_profile_column_statistics(tmp_path, sample_db):
+    """空值、存储类、最值、去重估计和类型违例"""
+    checker = DataQualityChecker(db_path=str(tmp_path / "quality.db"))
+    profile = checker.get_table_profile(sample_db, "draws")
+
+    assert profile.row_count == 3000
+    market = profile.columns["market"]
+    assert market.null_count == 1000
+    assert market.top_values == {"oe": 1000, "size": 1000}
+
+    p_win = profile.columns["p_win"]
+    assert p_win.type_counts["text"] == 300
+    assert p_win.affinity_violations == 300
+
+    draw_no = profile.columns["draw_no"]
+    assert (draw_no.min_value, draw_no.max_value) == (0, 2999)
+    assert draw_no.top_values is None
+    assert draw_no.distinct_estimate == pytest.approx(3000, rel=0.05)
+
+
+def test_checks_share_cached_profile(tmp_path, sample_db):
+    """多项检查共用一次扫描，表变化后重新扫描"""
+    checker = DataQualityChecker(db_path=str(tmp_path / "quality.db"))
+
+    completeness = checker.check_data_completeness(sample_db, "draws")
+    checker.check_data_consistency(sample_db, "draws")
+    checker.generate_data_profile(sample_db, "draws")
+    assert checker.profiler.stats["profiled"] == 1
+    assert completeness.value == pytest.approx((12000 - 1000) / 12000 * 100)
+
+    with sqlite3.connect(sample_db) as conn:
+        conn.execute("INSERT INTO draws (market, p_win, draw_no) VALUES ('oe', 0.5, 3000)")
+
+    assert checker.check_data_integrity(sample_db, "draws").actual_count == 3001
+    assert checker.profiler.stats["profiled"] == 2
+
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_update_invalidates_cached_profile(tmp_path, sample_db, journal_mode):
+    """UPDATE 不改变行数和最大 rowid，缓存仍失效，新鲜度看到更新后的时间戳"""
+    checker = DataQualityChecker(db_path=str(tmp_path / "quality.db"))
+    with sqlite3.connect(sample_db) as conn:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.execute("ALTER TABLE draws ADD COLUMN timestamp TEXT")
+        conn.execute("UPDATE draws SET timestamp = ?", ((datetime.now() - timedelta(days=5)).isoformat(),))
+    assert checker.check_data_freshness(sample_db, "draws").status == "critical"
+
+    with sqlite3.connect(sample_db) as conn:
+        conn.execute("UPDATE draws SET timestamp = ? WHERE id = 42", (datetime.now().isoformat(),))
+
+    assert checker.check_data_freshness(sample_db, "draws").status == "good"
+    assert checker.profiler.stats["profiled"] == 2
+
+
+def test_profiling_leaves_target_schema_untouched(tmp_path, sample_db):
+    """概况不在目标库建表或触发器，库未变化时命中缓存且不执行 COUNT(*)"""
+    checker = DataQualityChecker(db_path=str(tmp_path / "quality.db"))
+    with sqlite3.connect(sample_db) as conn:
+        before = conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+    checker.check_data_completeness(sample_db, "draws")
+
+    statements = []
+    with sqlite3.connect(sample_db) as conn:
+        conn.set_trace_callback(statements.append)
+        checker.profiler.profile(conn, sample_db, "draws")
+        conn.set_trace_callback(None)
+        after = conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+    assert after == before
+    assert checker.profiler.stats == {"profiled": 1, "cache_hits": 1}
+    assert not [sql for sql in statements if "COUNT(*)" in sql]
+
+    with sqlite3.connect(sample_db) as conn:
+        conn.execute("DELETE FROM draws WHERE id = 1")
+    assert checker.check_data_integrity(sample_db, "draws").actual_count == 2999
+    assert checker.profiler.stats["profiled"] == 2
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游共享客户端测试
+验证历史请求走历史接口、相同在途请求合并、实时与回填调用方共用令牌桶、失败请求清理合并表和同步门面超时
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+
+try:
+    from upstream_client import AsyncUpstreamClient, UpstreamClient, DEFAULT_API_URL, DEFAULT_HISTORY_URL
+except ImportError as e:
+    pytest.skip(f"上游客户端模块导入失败: {e}", allow_module_level=True)
+
+
+def _client(http_get, **kwargs):
+    client = AsyncUpstreamClient('appid', 'secret', **kwargs)
+    client._http_get = http_get
+    return client
+
+
+def test_concurrent_identical_requests_share_one_call():
+    """同一时刻参数相同的请求只发一次HTTP请求"""
+    calls = []
+
+    def slow_get(url, params):
+        calls.append(params)
+        time.sleep(0.05)
+        return {'retcode': 0}
+
+    client = _client(slow_get, rate_per_second=100)
+
+    async def run():
+        return await asyncio.gather(*[client.request({'date': '2026-10-16'}) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{'retcode': 0}] * 5
+    assert client.stats['coalesced'] == 4
+    client.close()
+
+
+def test_bucket_limits_realtime_and_backfill_together():
+    """实时与回填线程经同步门面共用同一个令牌桶"""
+    calls = []
+    client = UpstreamClient(_client(lambda url, params: calls.append(time.monotonic()) or {},
+                                    rate_per_second=20, burst=1))
+    try:
+        start = time.monotonic()
+        threads = [threading.Thread(target=client.get_realtime_lottery)] + [
+            threading.Thread(target=client.get_history_lottery, args=(f'2026-10-{day:02d}',))
+            for day in range(1, 5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+    finally:
+        client.close()
+
+    assert len(calls) == 5
+    assert elapsed >= 4 / 20 * 0.9
+
+
+def test_failed_request_is_removed_from_inflight_and_facade_times_out():
+    """失败请求从合并表移除，下一次调用重新请求；事件循环阻塞时同步门面按超时返回"""
+    calls = []
+
+    def failing_get(url, params):
+        calls.append(params)
+        raise ConnectionError('upstream down')
+
+    client = _client(failing_get, rate_per_second=100)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await client.request({})
+        assert client._inflight == {}
+        with pytest.raises(ConnectionError):
+            await client.request({})
+
+    asyncio.run(run())
+    assert len(calls) == 2 and client.stats['errors'] == 2
+    client.close()
+
+    facade = UpstreamClient(_client(lambda url, params: time.sleep(1) or {}, timeout=0.05))
+    try:
+        assert facade.timeout == 0.1
+        facade.loop.call_soon_threadsafe(time.sleep, 0.5)
+        with pytest.raises(concurrent.futures.TimeoutError):
+            facade.get_realtime_lottery()
+
+        # 循环恢复后，超时调用方的取消传到底层请求，合并表被清空
+        deadline = time.monotonic() + 2
+        while facade.async_client._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert facade.async_client._inflight == {} and facade.async_client._waiters == {}
+    finally:
+        facade.close()
+    assert facade.loop.is_closed()
+
+
+def test_history_requests_go_to_history_url(monkeypatch):
+    """历史查询发往历史接口，实时查询发往实时接口；环境变量可覆盖历史接口地址"""
+    urls = []
+    monkeypatch.delenv('PC28_HISTORY_API_URL', raising=False)
+    client = _client(lambda url, params: urls.append(url) or {}, rate_per_second=100)
+
+    async def run():
+        await client.get_history_lottery('2026-10-16')
+        await client.get_realtime_lottery()
+
+    asyncio.run(run())
+    assert urls == [DEFAULT_HISTORY_URL, DEFAULT_API_URL]
+    client.close()
+
+    monkeypatch.setenv('PC28_HISTORY_API_URL', 'https://history.example/api')
+    assert AsyncUpstreamClient('appid', 'secret').history_url == 'https://history.example/api'
+    assert AsyncUpstreamClient('appid', 'secret', history_url='https://override.example').history_url == 'https://override.example'